@@ -1,13 +1,49 @@
 import aiosql
 import aiosqlite
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+# Columns added to tables after they first shipped. CREATE TABLE IF NOT EXISTS
+# leaves existing tables alone, so these are added with ALTER TABLE on startup.
+COLUMN_MIGRATIONS = [
+    ('combat_logs', 'mob_template_id', 'INTEGER'),
+    ('mob_templates', 'hit_points_regen', 'INTEGER DEFAULT 0'),
+    ('mob_templates', 'aggressive', 'BOOLEAN DEFAULT 0'),
+    ('mob_templates', 'wander_seconds', 'INTEGER DEFAULT 0'),
+    ('crews', 'pvp_wins', 'INTEGER DEFAULT 0'),
+    ('crews', 'member_count', 'INTEGER DEFAULT 0'),
+    ('crews', 'vault_count', 'INTEGER DEFAULT 0'),
+    ('character_equipment', 'transfers_remaining', 'INTEGER DEFAULT 10'),
+    ('character_inventory', 'slot_id', 'INTEGER'),
+    ('character_inventory', 'rarity_id', 'INTEGER'),
+    ('character_inventory', 'level_requirement', 'INTEGER'),
+    ('character_inventory', 'item_name', 'TEXT'),
+    ('crew_vault', 'slot_id', 'INTEGER'),
+    ('crew_vault', 'rarity_id', 'INTEGER'),
+    ('crew_vault', 'level_requirement', 'INTEGER'),
+    ('crew_vault', 'item_name', 'TEXT'),
+    ('crew_vault', 'transfers_remaining', 'INTEGER DEFAULT 10'),
+]
+
+# External-content FTS5 tables. Triggers keep them in sync from then on, but
+# rows that existed before the index did are only picked up by a rebuild.
+FTS_INDEXES = ['items_fts', 'mob_templates_fts']
+
+async def add_missing_columns(db, migrations, schema_name="main"):
+    """Add any migration columns a (pre-existing) table doesn't have yet"""
+    for table, column, declaration in migrations:
+        cursor = await db.execute(f"PRAGMA {schema_name}.table_info({table})")
+        existing = {row[1] for row in await cursor.fetchall()}
+        # Missing table: the schema script will create it complete
+        if existing and column not in existing:
+            await db.execute(f"ALTER TABLE {schema_name}.{table} ADD COLUMN {column} {declaration}")
+
 class Database:
     def __init__(self, db_path="game.db"):
         self.db_path = db_path
         self.queries = None
-        
+    
     async def initialize(self):
         sql_dir = Path(__file__).parent / "sql"
         
@@ -16,17 +52,32 @@ class Database:
         
         # Create database and tables
         async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+            # Lets the combat log retention job hand freed pages back to the OS.
+            # Only takes effect on a fresh file; existing ones are converted by
+            # services.combat_retention on its first run.
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            
+            # Bring older databases up to date before the schema references new columns
+            await add_missing_columns(db, COLUMN_MIGRATIONS)
+            
             # Read and execute schema
             schema_path = sql_dir / "schema.sql"
             with open(schema_path, 'r') as f:
                 schema = f.read()
             
+            cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            existing_tables = {row[0] for row in await cursor.fetchall()}
+            
             await db.executescript(schema)
-            await db.commit()
             
+            for index in FTS_INDEXES:
+                if index not in existing_tables:
+                    await db.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+            await db.commit()
+        
         # Insert some basic items for testing
         await self._create_basic_items()
-            
+    
     async def get_connection(self):
         conn = await aiosqlite.connect(
             self.db_path,
@@ -47,11 +98,11 @@ class Database:
         def __init__(self, database):
             self.database = database
             self.conn = None
-            
+        
         async def __aenter__(self):
             self.conn = await self.database.get_connection()
             return self.conn
-            
+        
         async def __aexit__(self, exc_type, exc_val, exc_tb):
             if self.conn:
                 await self.conn.close()
@@ -59,6 +110,18 @@ class Database:
     def get_connection_context(self):
         return self.connection(self)
     
+    @asynccontextmanager
+    async def transaction(self, conn):
+        """One BEGIN IMMEDIATE write transaction on conn: committed when the block
+        finishes, rolled back if it raises (or is cancelled)"""
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            await conn.execute("ROLLBACK")
+            raise
+        await conn.execute("COMMIT")
+    
     async def execute_query(self, query_name, *args, **kwargs):
         """Execute a query and return results"""
         async with aiosqlite.connect(self.db_path, timeout=30.0) as conn:
@@ -77,7 +140,7 @@ class Database:
             result = await query_func(conn, *args, **kwargs)
             await conn.commit()
             return result
-        
+    
     async def _create_basic_items(self):
         """Create some basic starter items"""
         async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
@@ -125,6 +188,17 @@ class Database:
                 ('Infinity Stone', 7, 5, 70, 500, 250, 75, 'Legendary cosmic artifact')
             """)
             
+            # Raid boss loot, by item name: item ids depend on insertion order
+            await db.execute("""
+                INSERT OR IGNORE INTO mob_loot (mob_template_id, item_id, drop_percent)
+                SELECT mt.id, MIN(i.id), loot.column2
+                FROM (VALUES ('Steel Blade', 40.0), ('Chain Mail', 40.0), ('Steel Helmet', 40.0),
+                             ('Plasma Rifle', 10.0), ('Power Armor', 10.0), ('Power Core', 10.0)) AS loot
+                JOIN items i ON i.name = loot.column1
+                JOIN mob_templates mt ON mt.name = 'The Boss'
+                GROUP BY mt.id, loot.column1
+            """)
+            
             await db.commit()
 
 # Global database instance
@@ -132,6 +206,6 @@ db = Database()
 
 async def init_database():
     await db.initialize()
-    
+
 async def get_db():
     return db
\ No newline at end of file
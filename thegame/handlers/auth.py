@@ -5,6 +5,7 @@ import secrets
 from datetime import datetime, timedelta
 
 from database import get_db
+from services.target_finder import get_target_index
 
 async def get_current_user(request: web_request.Request):
     """Get currently logged in user from session"""
@@ -374,6 +375,9 @@ async def logout(request: web_request.Request):
     session = await aiohttp_session.get_session(request)
     session_id = session.get('session_id')
     
+    if session.get('character_id'):
+        get_target_index().remove(session['character_id'])
+    
     if session_id:
         database = await get_db()
         async with await database.get_connection() as conn:
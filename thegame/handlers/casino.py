@@ -6,6 +6,7 @@ from datetime import datetime
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.leaderboards import refresh_characters
 
 async def casino_main(request: web_request.Request):
     """Main casino interface - Outwar style"""
@@ -741,6 +742,7 @@ async def update_gold(request: web_request.Request):
         async with database.get_connection_context() as conn:
             await conn.execute('UPDATE characters SET gold = ? WHERE id = ?', (new_gold, character.id))
             await conn.commit()
+            await refresh_characters(conn, [character.id])
         
         return web.Response(text="Gold updated")
     except Exception as e:
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.raid_engine import get_raid_engine
 
 async def challenges_main(request: web_request.Request):
     """Main challenges interface - Outwar style"""
@@ -18,6 +19,13 @@ async def challenges_main(request: web_request.Request):
     daily_challenges = generate_daily_challenges(character)
     weekly_challenges = generate_weekly_challenges(character)
     
+    # Crew raids: open ones live in the raid engine, finished ones in the database
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        crew = await database.queries.get_crew_by_character(conn, character_id=character.id)
+        recent_raids = await database.queries.get_recent_crew_raids(conn, crew_id=crew['id'], limit=5) if crew else []
+    open_raids = get_raid_engine().raids_for_crew(crew['id']) if crew else []
+    
     html = f"""
     <!DOCTYPE html>
     <html>
@@ -311,7 +319,7 @@ async def challenges_main(request: web_request.Request):
             <div id="raids" class="content-section">
                 <h3 style="color: #ffd700; margin-bottom: 20px;">Crew Raids (Requires Crew)</h3>
                 <div class="challenges-grid">
-                    {generate_raid_cards(character)}
+                    {generate_raid_cards(character, crew, open_raids, recent_raids)}
                 </div>
             </div>
         </div>
@@ -682,32 +690,85 @@ def generate_boss_history():
     </div>
     '''
 
-def generate_raid_cards(character):
+def generate_raid_cards(character, crew, open_raids, recent_raids):
     """Generate raid cards"""
-    return '''
-    <div class="dungeon-card">
+    if not crew:
+        return '''
+    <div class="dungeon-card locked">
         <div class="dungeon-content">
             <div class="dungeon-icon">⚔️</div>
-            <div class="dungeon-name">Crew vs Crew Battle</div>
-            <div class="dungeon-description">Epic battles between crews for territory and rewards.</div>
-            <div class="dungeon-stats">
-                <div class="stat-row">
-                    <span class="stat-label">Crew Size:</span>
-                    <span class="stat-value">5-20 members</span>
-                </div>
-                <div class="stat-row">
-                    <span class="stat-label">Duration:</span>
-                    <span class="stat-value">1-2 hours</span>
+            <div class="dungeon-name">No Crew</div>
+            <div class="dungeon-description">Raids are formed by crews. Join or create a crew to take on raid bosses.</div>
+            <button class="dungeon-btn btn-enter" onclick="window.location.href='/crew'">FIND A CREW</button>
+        </div>
+    </div>
+    '''
+    
+    cards_html = ""
+    for raid in open_raids:
+        joined = character.id in raid.members
+        button_text = "ENTER RAID" if joined else "JOIN RAID"
+        button_action = f"window.location.href='/raids/{raid.id}'" if joined else f"joinRaid({raid.id})"
+        cards_html += f'''
+        <div class="dungeon-card">
+            <div class="dungeon-content">
+                <div class="dungeon-icon">👹</div>
+                <div class="dungeon-name">{raid.template.name}</div>
+                <div class="dungeon-description">{raid.template.description or ''}</div>
+                <div class="dungeon-stats">
+                    <div class="stat-row">
+                        <span class="stat-label">Status:</span>
+                        <span class="stat-value">{raid.status.upper()}</span>
+                    </div>
+                    <div class="stat-row">
+                        <span class="stat-label">Boss Health:</span>
+                        <span class="stat-value">{raid.boss_hp:,}/{raid.boss_hp_max:,}</span>
+                    </div>
+                    <div class="stat-row">
+                        <span class="stat-label">Party:</span>
+                        <span class="stat-value">{len(raid.members)} raiders</span>
+                    </div>
                 </div>
-                <div class="stat-row">
-                    <span class="stat-label">Rewards:</span>
-                    <span class="stat-value">Crew Vault Items</span>
+                <button class="dungeon-btn btn-enter" onclick="{button_action}">{button_text}</button>
+            </div>
+        </div>
+        '''
+    
+    for raid in recent_raids:
+        if raid['status'] not in ('defeated', 'failed'):
+            continue
+        cards_html += f'''
+        <div class="dungeon-card">
+            <div class="dungeon-content">
+                <div class="dungeon-icon">{'👑' if raid['status'] == 'defeated' else '💀'}</div>
+                <div class="dungeon-name">{raid['boss_name']}</div>
+                <div class="dungeon-stats">
+                    <div class="stat-row">
+                        <span class="stat-label">Participants:</span>
+                        <span class="stat-value">{raid['participants']} players</span>
+                    </div>
+                    <div class="stat-row">
+                        <span class="stat-label">Status:</span>
+                        <span class="stat-value">{raid['status'].upper()}</span>
+                    </div>
                 </div>
+                <button class="dungeon-btn btn-locked" onclick="window.location.href='/raids/{raid['id']}'">VIEW RESULTS</button>
             </div>
-            <button class="dungeon-btn btn-enter" onclick="joinRaid('crew_battle')">JOIN RAID</button>
         </div>
-    </div>
-    '''
+        '''
+    
+    if not open_raids:
+        cards_html = '''
+        <div class="dungeon-card">
+            <div class="dungeon-content">
+                <div class="dungeon-icon">⚔️</div>
+                <div class="dungeon-name">Form a Raid</div>
+                <div class="dungeon-description">Find a raid boss in the world and hit RAID! to form a party for your crew.</div>
+            </div>
+        </div>
+        ''' + cards_html
+    
+    return cards_html
 
 async def start_challenge(request: web_request.Request):
     """Start a challenge"""
@@ -1,10 +1,21 @@
 from aiohttp import web, web_request
 import aiohttp_session
+from html import escape
 from typing import Optional
+from urllib.parse import urlencode
 
 from database import get_db
 from handlers.auth import require_login
 from models.character import Character, Equipment, InventoryItem
+from services.catalog import get_catalog
+from services.character_service import EquipError, equip_from_inventory, recompute_power, unequip_to_inventory
+from services.inventory import ITEM_VIEWS, page_items, page_json, parse_item_filters
+from services.leaderboards import refresh_characters
+from services.loadouts import LoadoutError, MAX_LOADOUTS, apply_loadout, delete_loadout, get_loadouts, save_loadout
+from services.ranking_history import get_character_history
+from services.target_finder import get_target_index
+
+PROFILE_HISTORY_DAYS = 90
 
 async def get_current_character(request: web_request.Request) -> Optional[Character]:
     """Get currently selected character from session"""
@@ -19,7 +30,10 @@ async def get_current_character(request: web_request.Request) -> Optional[Charac
     async with database.get_connection_context() as conn:
         result = await database.queries.get_character_by_id(conn, character_id=character_id)
         if result:
-            return Character.from_db_row(result)
+            character = Character.from_db_row(get_catalog().character_row(result))
+            # Every request counts as being online for the target finder
+            get_target_index().update(character)
+            return character
     return None
 
 async def character_list(request: web_request.Request):
@@ -29,9 +43,9 @@ async def character_list(request: web_request.Request):
     database = await get_db()
     async with database.get_connection_context() as conn:
         characters = await database.queries.get_characters_by_account(conn, account_id=user['id'])
-        classes = await database.queries.get_all_classes(conn)
     
     current_char = await get_current_character(request)
+    catalog = get_catalog()
     
     # Generate character cards
     char_cards = ""
@@ -40,7 +54,7 @@ async def character_list(request: web_request.Request):
         char_cards += f"""
         <div class="character-card {selected}">
             <h3>{char['name']}</h3>
-            <p><strong>Class:</strong> {char['class_name']}</p>
+            <p><strong>Class:</strong> {catalog.character_class(char['class_id'])['name']}</p>
             <p><strong>Level:</strong> {char['level']}</p>
             <p><strong>Power:</strong> {char['total_power']}</p>
             <p><strong>HP:</strong> {char['hit_points_current']}/{char['hit_points_max']}</p>
@@ -107,12 +121,8 @@ async def create_character_page(request: web_request.Request):
     """Character creation form"""
     await require_login(request)
     
-    database = await get_db()
-    async with database.get_connection_context() as conn:
-        classes = await database.queries.get_all_classes(conn)
-    
     class_options = ""
-    for char_class in classes:
+    for char_class in get_catalog().all_classes():
         class_options += f"""
         <div class="class-option">
             <label>
@@ -221,6 +231,7 @@ async def create_character(request: web_request.Request):
             print(f"Character created with ID: {char_id}")
             
             await conn.commit()
+            await refresh_characters(conn, [char_id])
             raise web.HTTPFound('/characters')
         except web.HTTPFound:
             # Re-raise HTTP redirects
@@ -263,39 +274,47 @@ async def character_detail(request: web_request.Request):
             if not char_data:
                 raise web.HTTPNotFound(text="Character not found")
             
-            character = Character.from_db_row(char_data)
-        
+            character = Character.from_db_row(get_catalog().character_row(char_data))
+            
+            # Lifetime combat record from the daily rollups
+            combat_totals = await database.queries.get_combat_totals(conn, character_id=character_id)
+            
+            # Power rank over the last 90 days for the history graph
+            rank_history = await get_character_history(conn, character_id, days=PROFILE_HISTORY_DAYS, points=45)
+            
             # Get equipment
             equipment_data = await database.queries.get_character_equipment(conn, character_id=character_id)
+            catalog = get_catalog()
             equipment = {}
             for eq in equipment_data:
-                equipment[eq['slot_name']] = Equipment(
+                item, slot = catalog.item(eq['item_id']), catalog.slot(eq['slot_id'])
+                equipment[slot['name']] = Equipment(
                     slot_id=eq['slot_id'],
-                    slot_name=eq['slot_name'],
+                    slot_name=slot['name'],
                     item_id=eq['item_id'],
-                    item_name=eq['name'],
-                    rarity_name=eq['rarity_name'],
-                    rarity_color=eq['color'],
-                    attack=eq['attack'],
-                    hit_points=eq['hit_points'],
-                    chaos_damage=eq['chaos_damage'],
-                    vile_damage=eq['vile_damage'],
-                    fire_damage=eq['fire_damage'],
-                    kinetic_damage=eq['kinetic_damage'],
-                    arcane_damage=eq['arcane_damage'],
-                    holy_damage=eq['holy_damage'],
-                    shadow_damage=eq['shadow_damage'],
-                    fire_resist=eq['fire_resist'],
-                    kinetic_resist=eq['kinetic_resist'],
-                    arcane_resist=eq['arcane_resist'],
-                    holy_resist=eq['holy_resist'],
-                    shadow_resist=eq['shadow_resist'],
-                    critical_hit_percent=eq['critical_hit_percent'],
-                    rampage_percent=eq['rampage_percent'],
-                    rage_per_hour=eq['rage_per_hour'],
-                    experience_per_hour=eq['experience_per_hour'],
-                    gold_per_turn=eq['gold_per_turn'],
-                    max_rage=eq['max_rage']
+                    item_name=item['name'],
+                    rarity_name=item['rarity_name'],
+                    rarity_color=item['color'],
+                    attack=item['attack'],
+                    hit_points=item['hit_points'],
+                    chaos_damage=item['chaos_damage'],
+                    vile_damage=item['vile_damage'],
+                    fire_damage=item['fire_damage'],
+                    kinetic_damage=item['kinetic_damage'],
+                    arcane_damage=item['arcane_damage'],
+                    holy_damage=item['holy_damage'],
+                    shadow_damage=item['shadow_damage'],
+                    fire_resist=item['fire_resist'],
+                    kinetic_resist=item['kinetic_resist'],
+                    arcane_resist=item['arcane_resist'],
+                    holy_resist=item['holy_resist'],
+                    shadow_resist=item['shadow_resist'],
+                    critical_hit_percent=item['critical_hit_percent'],
+                    rampage_percent=item['rampage_percent'],
+                    rage_per_hour=item['rage_per_hour'],
+                    experience_per_hour=item['experience_per_hour'],
+                    gold_per_turn=item['gold_per_turn'],
+                    max_rage=item['max_rage']
                 )
         
         # Calculate total stats from equipment
@@ -457,7 +476,7 @@ async def character_detail(request: web_request.Request):
                         </div>
                         <div class="action-buttons">
                             {f'<button class="action-btn" onclick="window.location.href=\\"/inventory\\"">🎒 INVENTORY</button>' if is_own_character else f'<button class="action-btn attack" onclick="window.location.href=\\"/attack/{character.id}\\"">⚔️ ATTACK</button>'}
-                            {f'<button class="action-btn" onclick="window.location.href=\\"/character/{character.id}\\"">📝 EDIT PROFILE</button>' if is_own_character else '<button class="action-btn trade">💎 TRADE</button>'}
+                            {f'<button class="action-btn" onclick="window.location.href=\\"/character/{character.id}\\"">📝 EDIT PROFILE</button>' if is_own_character else f'<form method="post" action="/trade/with/{character.id}" style="display: contents;"><button class="action-btn trade">💎 TRADE</button></form>'}
                             {f'<button class="action-btn" onclick="window.location.href=\\"/crew\\"">👥 MY CREW</button>' if is_own_character else '<button class="action-btn">✉️ MESSAGE</button>'}
                             {f'<button class="action-btn" onclick="window.location.href=\\"/rankings\\"">🏆 RANKINGS</button>' if is_own_character else '<button class="action-btn">👥 CREW INV</button>'}
                             {f'<button class="action-btn" onclick="window.location.href=\\"/marketplace\\"">🛒 MARKETPLACE</button>' if is_own_character else '<button class="action-btn">➕ ADD ALLY</button>'}
@@ -513,6 +532,18 @@ async def character_detail(request: web_request.Request):
                         <span class="info-label">ELEMENTAL RESIST</span>
                         <span class="info-value">{total_resist}</span>
                     </div>
+                    <div class="info-row">
+                        <span class="info-label">PVP RECORD</span>
+                        <span class="info-value">{combat_totals['wins']:,}W / {combat_totals['losses']:,}L ({combat_totals['fights']:,} fights)</span>
+                    </div>
+                    <div class="info-row">
+                        <span class="info-label">DAMAGE DEALT / TAKEN</span>
+                        <span class="info-value">{combat_totals['damage_dealt']:,} / {combat_totals['damage_taken']:,}</span>
+                    </div>
+                    <div class="info-row">
+                        <span class="info-label">PVP WINNINGS</span>
+                        <span class="info-value">{combat_totals['gold_won']:,} gold, {combat_totals['experience_won']:,} exp</span>
+                    </div>
                     <div class="info-row">
                         <span class="info-label">WILDERNESS LEVEL</span>
                         <span class="info-value">{character.wilderness_level}</span>
@@ -545,6 +576,12 @@ async def character_detail(request: web_request.Request):
                         No Allies Yet
                     </div>
                 </div>
+                
+                <!-- Rank History Section -->
+                <div class="player-info" style="margin-top: 20px;">
+                    <div class="info-header">POWER RANK ({PROFILE_HISTORY_DAYS} DAYS)</div>
+                    {build_rank_graph(rank_history)}
+                </div>
             </div>
             
             <!-- Right Column - Equipment -->
@@ -653,6 +690,42 @@ async def character_detail(request: web_request.Request):
         """
         return web.Response(text=error_html, content_type='text/html', status=500)
 
+async def character_history(request: web_request.Request):
+    """Downsampled rank and stat history for profile graphs (JSON)"""
+    await require_login(request)
+    
+    try:
+        character_id = int(request.match_info['character_id'])
+        days = min(max(int(request.query.get('days', 90)), 1), 3650)
+        points = min(max(int(request.query.get('points', 60)), 1), 500)
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid history request")
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        series = await get_character_history(conn, character_id, days=days, points=points)
+    
+    return web.json_response({'character_id': character_id, 'days': days, 'series': series})
+
+def build_rank_graph(series, width=240, height=80):
+    """Inline SVG line of power rank over time (best rank at the top)"""
+    if len(series) < 2:
+        return '<div style="padding: 10px; text-align: center; font-size: 11px;">Not enough history yet</div>'
+    
+    ranks = [point['power_rank'] for point in series]
+    best, worst = min(ranks), max(ranks)
+    spread = max(1, worst - best)
+    step = width / (len(series) - 1)
+    points = " ".join(f"{i * step:.1f},{(rank - best) / spread * (height - 10) + 5:.1f}" for i, rank in enumerate(ranks))
+    return f"""
+    <svg width="{width}" height="{height}" style="margin-top: 10px; background: #111;">
+        <polyline points="{points}" fill="none" stroke="#ffd700" stroke-width="2"/>
+    </svg>
+    <div style="display: flex; justify-content: space-between; font-size: 10px;">
+        <span>{series[0]['day']}</span><span>#{series[-1]['power_rank']:,} (best #{best:,})</span><span>{series[-1]['day']}</span>
+    </div>
+    """
+
 def generate_equipment_grid(equipment):
     """Generate Outwar-style equipment grid"""
     # Define slot layout according to Outwar documentation
@@ -788,6 +861,34 @@ def build_item_tooltip(item):
     
     return tooltip_html
 
+def build_item_filter_form(action: str, filters: dict, sorts) -> str:
+    """Slot, rarity, level and sort controls for a paged item view"""
+    catalog = get_catalog()
+    def options(choices, current):
+        return "".join(f'<option value="{value}" {"selected" if value == current else ""}>{label}</option>'
+                       for value, label in choices)
+    slots = [('all', 'All Slots')] + [(slot['name'], slot['name'].title()) for slot in catalog.slots if slot]
+    rarities = [('all', 'All Rarities')] + [(rarity['name'].lower(), rarity['name']) for rarity in catalog.rarities if rarity]
+    return f"""
+    <form class="item-filters" method="get" action="{action}">
+        <select name="slot">{options(slots, filters['slot'])}</select>
+        <select name="rarity">{options(rarities, filters['rarity'])}</select>
+        Level <input type="number" name="min_level" value="{filters['min_level']}" min="1" max="95" style="width: 55px;">
+        to <input type="number" name="max_level" value="{filters['max_level']}" min="1" max="95" style="width: 55px;">
+        <select name="sort">{options([(sort, sort.title()) for sort in sorts], filters['sort'])}</select>
+        <button type="submit" class="btn-xs">FILTER</button>
+    </form>
+    """
+
+def build_page_links(path: str, filters: dict, after, next_cursor) -> str:
+    """First/next links for a keyset-paged view"""
+    links = ""
+    if after:
+        links += f'<a href="{path}?{urlencode(filters)}">← FIRST PAGE</a>'
+    if next_cursor:
+        links += f'<a href="{path}?{urlencode({**filters, "after_value": next_cursor[0], "after_id": next_cursor[1]})}">NEXT PAGE →</a>'
+    return f'<div class="page-links">{links}</div>' if links else ""
+
 async def inventory(request: web_request.Request):
     """Character inventory page"""
     await require_login(request)
@@ -796,26 +897,37 @@ async def inventory(request: web_request.Request):
     if not character:
         raise web.HTTPFound('/characters')
     
+    try:
+        page_args, filters = parse_item_filters(request.query, 'inventory')
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid inventory filters")
+    
     database = await get_db()
     async with database.get_connection_context() as conn:
-        inventory_data = await database.queries.get_character_inventory(conn, character_id=character.id)
+        rows, next_cursor = await page_items(conn, 'inventory', character.id, **page_args)
+        if request.query.get('format') == 'json':
+            return web.json_response(page_json(rows, next_cursor))
+        loadouts = await get_loadouts(conn, character.id)
+        in_crew = await database.queries.get_crew_by_character(conn, character_id=character.id) is not None
     
-    # Group items by slot type
+    # Group the page's items by slot type
+    catalog = get_catalog()
     items_by_slot = {}
-    for item in inventory_data:
+    for row in sorted(rows, key=lambda row: row['slot_id']):
+        item = catalog.item(row['item_id'])
         slot = item['slot_name']
         if slot not in items_by_slot:
             items_by_slot[slot] = []
         items_by_slot[slot].append(InventoryItem(
-            id=item['id'],
-            item_id=item['item_id'],
+            id=row['id'],
+            item_id=row['item_id'],
             name=item['name'],
             slot_name=item['slot_name'],
             rarity_name=item['rarity_name'],
             rarity_color=item['color'],
             level_requirement=item['level_requirement'],
-            quantity=item['quantity'],
-            transfers_remaining=item['transfers_remaining'],
+            quantity=row['quantity'],
+            transfers_remaining=row['transfers_remaining'],
             attack=item['attack'],
             hit_points=item['hit_points']
         ))
@@ -831,6 +943,11 @@ async def inventory(request: web_request.Request):
                 <button type="submit" class="btn-xs" {'disabled' if not can_equip else ''}>EQUIP</button>
             </form>
             """ if can_equip else f"<div class='req-level'>Req: Lv{item.level_requirement}</div>"
+            deposit_button = f"""
+            <form method="post" action="/crew/vault/deposit/{item.id}" style="margin-top: 5px;">
+                <button type="submit" class="btn-xs btn-muted">DEPOSIT</button>
+            </form>
+            """ if in_crew and item.transfers_remaining != 0 else ""
             
             inventory_html += f"""
             <div class="inventory-item" style="border-color: {item.rarity_color}">
@@ -840,10 +957,28 @@ async def inventory(request: web_request.Request):
                     {f'HP: {item.hit_points}' if item.hit_points > 0 else ''}
                 </div>
                 {equip_button}
+                {deposit_button}
             </div>
             """
         inventory_html += "</div>"
     
+    loadouts_html = ""
+    for loadout in loadouts:
+        contents = ', '.join(catalog.item(item_id)['name'] for item_id in loadout['items'].values()) or 'empty'
+        loadouts_html += f"""
+        <div class="loadout">
+            <div><strong>{escape(loadout['name'])}</strong> <span class="loadout-items">{contents}</span></div>
+            <div>
+                <form method="post" action="/loadouts/{loadout['id']}/equip" style="display: inline;">
+                    <button type="submit" class="btn-xs">EQUIP SET</button>
+                </form>
+                <form method="post" action="/loadouts/{loadout['id']}/delete" style="display: inline;">
+                    <button type="submit" class="btn-xs btn-muted">DELETE</button>
+                </form>
+            </div>
+        </div>
+        """
+    
     html = f"""
     <!DOCTYPE html>
     <html>
@@ -862,6 +997,13 @@ async def inventory(request: web_request.Request):
             .btn-xs {{ padding: 5px 10px; font-size: 0.8em; background: #ff6600; color: white; border: none; border-radius: 3px; cursor: pointer; }}
             .btn-xs:disabled {{ background: #666; cursor: not-allowed; }}
             .req-level {{ font-size: 0.8em; color: #ff4444; }}
+            .loadouts {{ background: #262626; border-radius: 8px; padding: 15px; margin-bottom: 30px; }}
+            .loadout {{ display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #333; }}
+            .loadout-items {{ color: #aaa; font-size: 0.85em; margin-left: 10px; }}
+            .btn-muted {{ background: #555; }}
+            .item-filters {{ display: flex; flex-wrap: wrap; gap: 10px; align-items: center; margin-bottom: 20px; font-size: 0.9em; }}
+            .item-filters select, .item-filters input {{ background: #333; color: #fff; border: 1px solid #555; padding: 4px; }}
+            .page-links a {{ color: #88ccff; margin-right: 15px; }}
         </style>
     </head>
     <body>
@@ -873,8 +1015,20 @@ async def inventory(request: web_request.Request):
             </div>
         </div>
         
+        <div class="loadouts">
+            <h3>LOADOUTS ({len(loadouts)}/{MAX_LOADOUTS})</h3>
+            {loadouts_html}
+            <form method="post" action="/loadouts" style="margin-top: 10px;">
+                <input type="text" name="name" maxlength="32" placeholder="Loadout name" required>
+                <button type="submit" class="btn-xs">SAVE CURRENT GEAR</button>
+            </form>
+        </div>
+        
+        {build_item_filter_form('/inventory', filters, ITEM_VIEWS['inventory'][3])}
+        
         <div class="inventory">
             {inventory_html if inventory_html else '<p>No items in inventory.</p>'}
+            {build_page_links('/inventory', filters, page_args['after'], next_cursor)}
         </div>
     </body>
     </html>
@@ -893,37 +1047,13 @@ async def equip_item(request: web_request.Request):
     
     database = await get_db()
     async with database.get_connection_context() as conn:
-        # Get item details
-        inventory_items = await database.queries.get_character_inventory(conn, character_id=character.id)
-        item = None
-        for inv_item in inventory_items:
-            if inv_item['item_id'] == item_id:
-                item = inv_item
-                break
-        
-        if not item:
-            raise web.HTTPNotFound()
-        
-        # Check level requirement
-        if character.level < item['level_requirement']:
-            raise web.HTTPBadRequest()
-        
-        # Get item's slot
-        # We need to get the slot_id from the items table
-        item_details = await conn.execute("SELECT slot_id FROM items WHERE id = :item_id", {"item_id": item_id})
-        item_detail = await item_details.fetchone()
-        if not item_detail:
-            raise web.HTTPNotFound()
-        
-        slot_id = item_detail[0]
-        
-        # Equip the item
-        await database.queries.equip_item(conn, character_id=character.id, slot_id=slot_id, item_id=item_id)
-        
-        # Remove from inventory
-        await database.queries.remove_from_inventory(conn, character_id=character.id, item_id=item_id)
-        
-        await conn.commit()
+        try:
+            async with database.transaction(conn):
+                await equip_from_inventory(conn, character.id, character.level, item_id)
+                await recompute_power(conn, character.id)
+        except EquipError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        await refresh_characters(conn, [character.id])
     
     raise web.HTTPFound('/inventory')
 
@@ -939,23 +1069,74 @@ async def unequip_item(request: web_request.Request):
     
     database = await get_db()
     async with database.get_connection_context() as conn:
-        # Get currently equipped item
-        equipment = await database.queries.get_character_equipment(conn, character_id=character.id)
-        equipped_item = None
-        for eq in equipment:
-            if eq['slot_id'] == slot_id:
-                equipped_item = eq
-                break
-        
-        if not equipped_item:
+        try:
+            async with database.transaction(conn):
+                await unequip_to_inventory(conn, character.id, slot_id)
+                await recompute_power(conn, character.id)
+        except EquipError:
+            raise web.HTTPNotFound()
+        await refresh_characters(conn, [character.id])
+    
+    raise web.HTTPFound(f'/character/{character.id}')
+
+async def save_current_loadout(request: web_request.Request):
+    """Save the equipped items as a named loadout"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    data = await request.post()
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            await save_loadout(conn, character.id, data.get('name', ''))
+    except LoadoutError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound('/inventory')
+
+async def equip_loadout(request: web_request.Request):
+    """Swap in a whole loadout with one request (add ?format=json for a JSON reply)"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    loadout_id = int(request.match_info['loadout_id'])
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        try:
+            async with database.transaction(conn):
+                moved = await apply_loadout(conn, character.id, character.level, loadout_id)
+        except LoadoutError:
+            raise web.HTTPNotFound()
+        except EquipError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        if moved:
+            await refresh_characters(conn, [character.id])
+    
+    if request.query.get('format') == 'json':
+        return web.json_response({'loadout_id': loadout_id, 'moved': moved})
+    raise web.HTTPFound('/inventory')
+
+async def remove_loadout(request: web_request.Request):
+    """Delete a saved loadout"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    loadout_id = int(request.match_info['loadout_id'])
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        if not await delete_loadout(conn, character.id, loadout_id):
             raise web.HTTPNotFound()
-        
-        # Add to inventory
-        await database.queries.add_to_inventory(conn, character.id, equipped_item['item_id'], 1, 10)
-        
-        # Remove from equipment
-        await database.queries.unequip_item(conn, character.id, slot_id)
-        
         await conn.commit()
     
-    raise web.HTTPFound(f'/character/{character.id}')
\ No newline at end of file
+    raise web.HTTPFound('/inventory')
\ No newline at end of file
@@ -1,11 +1,24 @@
 from aiohttp import web, web_request
 import random
 from datetime import datetime
+from urllib.parse import urlencode
 
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
 from models.character import Character
+from models.battle import Combatant, run_battle, new_seed, encode_replay, decode_replay, ATTACKER, DEFENDER
+from services.catalog import get_catalog
+from services.character_cache import resolve_names
+from services.combat_retention import get_archived_battle_replay
+from services.mob_world import get_mob_world
+from services.character_service import save_character_stats
+from services.leaderboards import get_crew_ladders, refresh_characters
+from services.target_finder import get_target_index, DEFAULT_LEVEL_BAND
+
+HISTORY_PAGE_SIZE = 20
+# Sorts after every real (created_at, id), so the first page needs no special query
+HISTORY_CURSOR_START = ('9999-12-31 23:59:59', 2 ** 63 - 1)
 
 async def attack_player(request: web_request.Request):
     """Attack another player"""
@@ -27,7 +40,7 @@ async def attack_player(request: web_request.Request):
         if not target_data:
             raise web.HTTPNotFound(text="Target character not found")
         
-        target = Character.from_db_row(target_data)
+        target = Character.from_db_row(get_catalog().character_row(target_data))
         
         # Check if target is alive
         if not target.is_alive():
@@ -41,33 +54,33 @@ async def attack_player(request: web_request.Request):
         if attacker.rage_current < 10:
             raise web.HTTPBadRequest(text="Not enough rage to attack")
         
-        # Calculate damage
-        damage_breakdown = attacker.calculate_damage_to(target)
-        total_damage = damage_breakdown['total']
+        target_index = get_target_index()
+        cooldown = target_index.cooldown_left(attacker.id, target.id)
+        if cooldown:
+            raise web.HTTPBadRequest(text=f"You attacked {target.name} recently; try again in {cooldown}s")
+        # Start the cooldown before the first await, so parallel requests can't all pass the check
+        target_index.record_attack(attacker.id, target.id)
+        
+        # Snapshot both sides and fight it out round by round from a fresh seed.
+        # Defender only fights back if they have the rage for it.
+        attacker_snapshot = await snapshot_character(conn, attacker)
+        target_snapshot = await snapshot_character(conn, target, can_strike=target.rage_current >= 5)
+        battle = run_battle(new_seed(), attacker_snapshot, target_snapshot)
         
-        # Apply damage
-        actual_damage = target.take_damage(total_damage)
+        attacker.hit_points_current = battle.attacker_hp
+        target.hit_points_current = battle.defender_hp
         
         # Consume rage
         attacker.rage_current = max(0, attacker.rage_current - 10)
-        
-        # Calculate counter-attack if target survives
-        counter_damage = 0
-        counter_breakdown = {}
-        if target.is_alive() and target.rage_current >= 5:
-            counter_breakdown = target.calculate_damage_to(attacker)
-            counter_damage = counter_breakdown['total']
-            actual_counter = attacker.take_damage(counter_damage)
+        if target_snapshot.can_strike:
             target.rage_current = max(0, target.rage_current - 5)
-        else:
-            actual_counter = 0
         
         # Determine winner
-        winner_id = None
+        winner_id = battle.winner_id
         experience_gained = 0
         gold_gained = 0
         
-        if not target.is_alive():
+        if winner_id == attacker.id:
             # Attacker wins
             winner_id = attacker.id
             level_diff = max(1, target.level - attacker.level + 1)
@@ -83,8 +96,8 @@ async def attack_player(request: web_request.Request):
             gold_loss = min(target.gold, gold_gained // 2)
             target.experience = max(0, target.experience - exp_loss)
             target.gold = max(0, target.gold - gold_loss)
-            
-        elif not attacker.is_alive():
+        
+        elif winner_id == target.id:
             # Target wins (counter-attack killed attacker)
             winner_id = target.id
             level_diff = max(1, attacker.level - target.level + 1)
@@ -100,55 +113,148 @@ async def attack_player(request: web_request.Request):
             attacker.experience = max(0, attacker.experience - exp_loss)
             attacker.gold = max(0, attacker.gold - gold_loss)
         
-        # Update both characters in database
-        await database.queries.update_character_stats(
-            conn, level=attacker.level, experience=attacker.experience, gold=attacker.gold,
-            rage_current=attacker.rage_current, rage_max=attacker.rage_max, hit_points_current=attacker.hit_points_current,
-            hit_points_max=attacker.hit_points_max, attack=attacker.attack, total_power=attacker.total_power, character_id=attacker.id
-        )
+        # Both characters, the log and the crew's win land together or not at all
+        async with database.transaction(conn):
+            await save_character_stats(conn, attacker)
+            await save_character_stats(conn, target)
+            
+            combat_log_id = await record_battle(
+                conn, battle, winner_id, experience_gained, gold_gained, 'pvp', defender_id=target.id
+            )
+            
+            if winner_id:
+                await database.queries.record_crew_pvp_win(conn, character_id=winner_id)
+        await refresh_characters(conn, [attacker.id, target.id])
+    
+    if winner_id:
+        get_crew_ladders().pvp_win(winner_id)
+    target_index.update(attacker)
+    target_index.update(target)
+    
+    # Build combat result page
+    result_html = build_combat_result_html(
+        attacker, target, battle, winner_id, experience_gained, gold_gained, combat_log_id
+    )
+    
+    return web.Response(text=result_html, content_type='text/html')
+
+async def attack_mob(request: web_request.Request):
+    """Attack a mob in the current room"""
+    await require_login(request)
+    attacker = await get_current_character(request)
+    
+    if not attacker:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        mob_id = int(request.match_info['mob_id'])
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid mob ID")
+    
+    mob_world = get_mob_world()
+    mob = mob_world.get(mob_id)
+    if not mob:
+        raise web.HTTPNotFound(text="Mob not found")
+    
+    if mob.room_id != attacker.current_room_id:
+        raise web.HTTPBadRequest(text="Target is not in the same location")
+    
+    if mob.template.is_raid_boss:
+        raise web.HTTPBadRequest(text="This boss can only be raided")
+    
+    if attacker.rage_current < 10:
+        raise web.HTTPBadRequest(text="Not enough rage to attack")
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        attacker_snapshot = await snapshot_character(conn, attacker)
         
-        await database.queries.update_character_stats(
-            conn, level=target.level, experience=target.experience, gold=target.gold,
-            rage_current=target.rage_current, rage_max=target.rage_max, hit_points_current=target.hit_points_current,
-            hit_points_max=target.hit_points_max, attack=target.attack, total_power=target.total_power, character_id=target.id
-        )
+        # Fight and apply the damage to the shared mob with no await in
+        # between, so two players can't both spend the mob's last hit points
+        if not mob.is_alive():
+            raise web.HTTPBadRequest(text="Target is already defeated")
+        battle = run_battle(new_seed(), attacker_snapshot, mob.to_combatant())
+        killed = mob_world.apply_damage(mob, battle.damage_dealt_by(ATTACKER), attacker.id)
         
-        # Log combat
-        await database.queries.log_combat(
-            conn, attacker_id=attacker.id, defender_id=target.id, attacker_damage=total_damage, defender_damage=counter_damage,
-            attacker_hp_before=attacker.hit_points_current + actual_counter, attacker_hp_after=attacker.hit_points_current,
-            defender_hp_before=target.hit_points_current + actual_damage, defender_hp_after=target.hit_points_current,
-            winner_id=winner_id, experience_gained=experience_gained, gold_gained=gold_gained, combat_type='pvp'
-        )
+        attacker.hit_points_current = battle.attacker_hp
+        attacker.rage_current = max(0, attacker.rage_current - 10)
         
-        await conn.commit()
+        winner_id = None
+        experience_gained = 0
+        gold_gained = 0
+        
+        if killed:
+            winner_id = attacker.id
+            experience_gained = int(mob.template.experience_reward * random.uniform(0.8, 1.2))
+            gold_gained = int(mob.template.gold_reward * random.uniform(0.8, 1.2))
+            attacker.gain_experience(experience_gained)
+            attacker.gold += gold_gained
+        elif battle.winner_side == DEFENDER:
+            # Beaten by the mob: drop some gold
+            attacker.gold = max(0, attacker.gold - mob.template.gold_reward // 2)
+        
+        async with database.transaction(conn):
+            await save_character_stats(conn, attacker)
+            
+            combat_log_id = await record_battle(
+                conn, battle, winner_id, experience_gained, gold_gained, 'pve', mob_template_id=mob.template.id
+            )
+        await refresh_characters(conn, [attacker.id])
+    
+    get_target_index().update(attacker)
     
-    # Build combat result page
     result_html = build_combat_result_html(
-        attacker, target, damage_breakdown, counter_breakdown,
-        actual_damage, actual_counter, winner_id, experience_gained, gold_gained
+        attacker, mob, battle, winner_id, experience_gained, gold_gained, combat_log_id,
+        attack_path=f"/attack/mob/{mob.id}"
     )
     
     return web.Response(text=result_html, content_type='text/html')
 
-def build_combat_result_html(attacker, target, damage_breakdown, counter_breakdown, 
-                           actual_damage, actual_counter, winner_id, exp_gained, gold_gained):
+async def snapshot_character(conn, character, can_strike=True):
+    """Battle snapshot of a character, with crit/rampage from equipped items"""
+    database = await get_db()
+    bonuses = await database.queries.get_equipment_combat_bonuses(conn, character_id=character.id)
+    return Combatant.from_character(
+        character, bonuses['critical_hit_percent'], bonuses['rampage_percent'], can_strike=can_strike
+    )
+
+async def record_battle(conn, battle, winner_id, experience_gained, gold_gained, combat_type,
+                        defender_id=None, mob_template_id=None):
+    """Log a battle; the replay row is all that's needed to rebuild the fight later"""
+    database = await get_db()
+    combat_log_id = await database.queries.log_combat(
+        conn, attacker_id=battle.attacker.id, defender_id=defender_id,
+        attacker_damage=battle.damage_dealt_by(ATTACKER), defender_damage=battle.damage_dealt_by(DEFENDER),
+        attacker_hp_before=battle.attacker.hit_points, attacker_hp_after=battle.attacker_hp,
+        defender_hp_before=battle.defender.hit_points, defender_hp_after=battle.defender_hp,
+        winner_id=winner_id, experience_gained=experience_gained, gold_gained=gold_gained,
+        combat_type=combat_type, mob_template_id=mob_template_id
+    )
+    await database.queries.save_battle_replay(
+        conn, combat_log_id=combat_log_id, payload=encode_replay(battle.seed, battle.attacker, battle.defender)
+    )
+    return combat_log_id
+
+def build_battle_log(battle, attacker_name, defender_name):
+    """Turn a battle's strikes into Outwar-style combat log lines"""
+    names = (attacker_name, defender_name)
+    entries = []
+    for strike in battle.strikes:
+        source, target = names[strike.side], names[1 - strike.side]
+        if strike.rampage:
+            entries.append(f"{source} goes on a RAMPAGE and hits {target} again for {strike.damage} damage!")
+        elif strike.critical:
+            entries.append(f"{source} lands a CRITICAL hit on {target} for {strike.damage} damage!")
+        else:
+            entries.append(f"{source} hit {target} for {strike.damage} damage!")
+    return entries
+
+def build_combat_result_html(attacker, target, battle, winner_id, exp_gained, gold_gained, combat_log_id=None,
+                             attack_path=None):
     """Build Outwar-style combat result HTML"""
     
     # Build combat log entries
-    combat_log_entries = []
-    
-    # Add attacker's actions
-    if damage_breakdown.get('total', 0) > 0:
-        for dmg_type, amount in damage_breakdown.items():
-            if amount > 0 and dmg_type != 'total':
-                combat_log_entries.append(f"{attacker.name} hit {target.name} for {amount} {dmg_type} damage!")
-    
-    # Add defender's counter-attack
-    if counter_breakdown and counter_breakdown.get('total', 0) > 0:
-        for dmg_type, amount in counter_breakdown.items():
-            if amount > 0 and dmg_type != 'total':
-                combat_log_entries.append(f"{target.name} hit {attacker.name} for {amount} {dmg_type} damage!")
+    combat_log_entries = build_battle_log(battle, attacker.name, target.name)
     
     # Final result
     if winner_id == attacker.id:
@@ -156,14 +262,14 @@ def build_combat_result_html(attacker, target, damage_breakdown, counter_breakdo
         result_message = "You have won the battle!"
         reward_text = f"{attacker.name} gained {exp_gained} strength" if exp_gained > 0 else f"{attacker.name} gained 0 strength"
         gold_text = f"🟡 {attacker.name} gained {gold_gained} gold!" if gold_gained > 0 else ""
-    elif winner_id == target.id:
+    elif battle.winner_side == DEFENDER:
         combat_log_entries.append(f"{target.name} has defeated {attacker.name}!")
         result_message = "You have been defeated!"
         reward_text = f"{attacker.name} lost experience and gold"
         gold_text = ""
     else:
         result_message = "Battle continues..."
-        reward_text = "No one was defeated"
+        reward_text = f"No one was defeated after {battle.rounds} rounds"
         gold_text = ""
     
     # Build combat log HTML
@@ -293,7 +399,7 @@ def build_combat_result_html(attacker, target, damage_breakdown, counter_breakdo
             
             <!-- Battle Result -->
             <div class="battle-result">
-                <div class="result-message {'defeat' if winner_id == target.id else ''}">{result_message}</div>
+                <div class="result-message {'defeat' if battle.winner_side == DEFENDER else ''}">{result_message}</div>
                 <div class="reward-line">{reward_text}</div>
                 {f'<div class="reward-line gold-reward">{gold_text}</div>' if gold_text else ''}
                 <div class="combat-log-toggle" onclick="toggleCombatLog()">Show Combat Log</div>
@@ -302,13 +408,14 @@ def build_combat_result_html(attacker, target, damage_breakdown, counter_breakdo
                     <div style="margin-bottom: 10px; cursor: pointer;" onclick="toggleCombatLog()">Hide Combat Log</div>
                     {combat_log_html}
                 </div>
+                {f'<a class="combat-log-toggle" href="/combat/replay/{combat_log_id}">Permanent link to this battle</a>' if combat_log_id else ''}
             </div>
             
             <!-- Action Buttons -->
             <div class="return-button">
                 <div style="display: flex; gap: 15px; justify-content: center; flex-wrap: wrap;">
                     <a href="/game" class="btn-return">RETURN TO WORLD</a>
-                    {generate_combat_options(attacker, target, winner_id)}
+                    {generate_combat_options(attacker, target, battle, attack_path)}
                 </div>
             </div>
         </div>
@@ -324,19 +431,20 @@ def build_combat_result_html(attacker, target, damage_breakdown, counter_breakdo
     """
     return html
 
-def generate_combat_options(attacker, target, winner_id):
+def generate_combat_options(attacker, target, battle, attack_path=None):
     """Generate additional combat options based on battle outcome"""
     options = []
     
-    if winner_id is None:
+    if battle.winner_side is None:
         # Both still alive - continue fighting
-        options.append(f'<a href="/attack/{target.id}" class="btn-return" style="background: linear-gradient(180deg, #ff4444 0%, #cc3333 100%);">ATTACK AGAIN</a>')
+        options.append(f'<a href="{attack_path or f"/attack/{target.id}"}" class="btn-return" style="background: linear-gradient(180deg, #ff4444 0%, #cc3333 100%);">ATTACK AGAIN</a>')
         options.append(f'<a href="/supplies" class="btn-return" style="background: linear-gradient(180deg, #32cd32 0%, #228b22 100%);">BUY HEALING</a>')
-    elif winner_id == attacker.id:
+    elif battle.winner_side == ATTACKER:
         # Attacker won
-        options.append(f'<a href="/character/{target.id}" class="btn-return" style="background: linear-gradient(180deg, #ffd700 0%, #daa520 100%);">VIEW PROFILE</a>')
+        if isinstance(target, Character):
+            options.append(f'<a href="/character/{target.id}" class="btn-return" style="background: linear-gradient(180deg, #ffd700 0%, #daa520 100%);">VIEW PROFILE</a>')
         options.append(f'<a href="/marketplace" class="btn-return" style="background: linear-gradient(180deg, #4169e1 0%, #1e90ff 100%);">SELL LOOT</a>')
-    elif winner_id == target.id:
+    else:
         # Attacker lost
         options.append(f'<a href="/supplies" class="btn-return" style="background: linear-gradient(180deg, #32cd32 0%, #228b22 100%);">BUY HEALING</a>')
         options.append(f'<a href="/crew" class="btn-return" style="background: linear-gradient(180deg, #8a2be2 0%, #6a1b9a 100%);">GET BACKUP</a>')
@@ -346,6 +454,93 @@ def generate_combat_options(attacker, target, winner_id):
     
     return '\\n'.join(options)
 
+async def find_targets(request: web_request.Request):
+    """Find fair fights: online characters near your level, closest first"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    scope = 'zone' if request.query.get('scope') == 'zone' else 'room'
+    try:
+        band = min(max(int(request.query.get('band', DEFAULT_LEVEL_BAND)), 0), 50)
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid level band")
+    
+    targets = get_target_index().find(character, band=band, scope=scope)
+    
+    targets_html = ""
+    for target in targets:
+        if target.room_id == character.current_room_id:
+            action = f"""<form method="post" action="/attack/{target.character_id}" style="display: inline;">
+                    <button type="submit" class="btn-attack">ATTACK</button>
+                </form>"""
+        else:
+            action = f'<span class="elsewhere">Room {target.room_id}</span>'
+        targets_html += f"""
+        <div class="target">
+            <div>
+                <a href="/character/{target.character_id}" class="target-name">{target.name}</a>
+                <span class="target-meta">Level {target.level} | Power {target.total_power:,}</span>
+            </div>
+            {action}
+        </div>
+        """
+    
+    other_scope = 'room' if scope == 'zone' else 'zone'
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Find a Fight - {character.name}</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #1a1a1a; color: #fff; }}
+            .header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 30px; }}
+            .title {{ color: #ff6600; }}
+            .nav a {{ color: #ff6600; text-decoration: none; padding: 10px 15px; background: #333; border-radius: 5px; margin-left: 10px; }}
+            .filters {{ margin-bottom: 20px; color: #ccc; }}
+            .target {{ background: #333; padding: 15px; margin: 10px 0; border-radius: 8px; border-left: 4px solid #ff6600; display: flex; justify-content: space-between; align-items: center; }}
+            .target-name {{ color: #ffd700; font-weight: bold; text-decoration: none; margin-right: 10px; }}
+            .target-meta {{ color: #ccc; font-size: 0.9em; }}
+            .btn-attack {{ background: #cc3333; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer; font-weight: bold; }}
+            .elsewhere {{ color: #888; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1 class="title">FIND A FIGHT</h1>
+            <div class="nav">
+                <a href="/targets?scope={other_scope}&band={band}">SEARCH {other_scope.upper()}</a>
+                <a href="/game">BACK TO GAME</a>
+            </div>
+        </div>
+        
+        <div class="filters">
+            Online players within {band} levels of you (level {character.level}) in this {scope}, closest match first.
+        </div>
+        
+        {targets_html if targets_html else '<p>No eligible targets right now.</p>'}
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+def parse_history_cursor(query):
+    """The keyset cursor, the (created_at, id) of the last fight on the previous page,
+    from a history URL. No cursor means the first page."""
+    before_ts = query.get('before_ts') or HISTORY_CURSOR_START[0]
+    try:
+        datetime.fromisoformat(before_ts)
+        before_id = int(query.get('before_id', HISTORY_CURSOR_START[1]))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid history cursor")
+    # SQLite can't bind an id outside 64 bits
+    if not 0 <= before_id <= HISTORY_CURSOR_START[1]:
+        raise web.HTTPBadRequest(text="Invalid history cursor")
+    return before_ts, before_id
+
 async def combat_history(request: web_request.Request):
     """View combat history"""
     await require_login(request)
@@ -354,24 +549,37 @@ async def combat_history(request: web_request.Request):
     if not character:
         raise web.HTTPFound('/characters')
     
+    before_ts, before_id = parse_history_cursor(request.query)
+    
     database = await get_db()
     async with database.get_connection_context() as conn:
-        combat_logs = await database.queries.get_combat_history(conn, character_id=character.id)
+        combat_logs = await database.queries.get_combat_history(
+            conn, character_id=character.id, before_created_at=before_ts,
+            before_id=before_id, limit=HISTORY_PAGE_SIZE
+        )
+        names = await resolve_names(conn, [log['attacker_id'] for log in combat_logs] +
+                                          [log['defender_id'] for log in combat_logs])
+    mob_templates = get_mob_world().templates
     
     # Build combat log HTML
     combat_html = ""
     for log in combat_logs:
         timestamp = datetime.fromisoformat(log['created_at']).strftime('%Y-%m-%d %H:%M')
         
+        if log['combat_type'] == 'pve':
+            template = mob_templates.get(log['mob_template_id'])
+            opponent = template.name if template else "Unknown"
+        
         if log['attacker_id'] == character.id:
             # Character was attacker
-            opponent = log['defender_name'] or "Unknown"
+            if log['combat_type'] != 'pve':
+                opponent = names.get(log['defender_id']) or "Unknown"
             action = "attacked"
             damage_dealt = log['attacker_damage']
             damage_received = log['defender_damage']
         else:
             # Character was defender
-            opponent = log['attacker_name'] or "Unknown"
+            opponent = names.get(log['attacker_id']) or "Unknown"
             action = "was attacked by"
             damage_dealt = log['defender_damage']
             damage_received = log['attacker_damage']
@@ -379,7 +587,7 @@ async def combat_history(request: web_request.Request):
         result = ""
         if log['winner_id'] == character.id:
             result = '<span style="color: #00ff00;">VICTORY</span>'
-        elif log['winner_id'] and log['winner_id'] != character.id:
+        elif log['winner_id'] or (log['combat_type'] == 'pve' and log['attacker_hp_after'] == 0):
             result = '<span style="color: #ff4444;">DEFEAT</span>'
         else:
             result = '<span style="color: #ffaa00;">ONGOING</span>'
@@ -396,10 +604,17 @@ async def combat_history(request: web_request.Request):
             <div class="damage-info">
                 Damage dealt: {damage_dealt} | Damage received: {damage_received}
                 {f' | Gained: {log["experience_gained"]} XP, {log["gold_gained"]} gold' if log['experience_gained'] > 0 else ''}
+                | <a href="/combat/replay/{log['id']}" style="color: #88ccff;">Replay</a>
             </div>
         </div>
         """
     
+    # A full page means there may be older fights behind it
+    older_link = ""
+    if len(combat_logs) == HISTORY_PAGE_SIZE:
+        last = combat_logs[-1]
+        older_link = f'''<a href="/combat/history?{urlencode({'before_ts': last['created_at'], 'before_id': last['id']})}">OLDER BATTLES →</a>'''
+    
     html = f"""
     <!DOCTYPE html>
     <html>
@@ -415,6 +630,8 @@ async def combat_history(request: web_request.Request):
             .timestamp {{ color: #ccc; font-size: 0.9em; }}
             .log-details {{ margin: 8px 0; }}
             .damage-info {{ font-size: 0.9em; color: #ccc; }}
+            .pager {{ margin: 20px 0; text-align: right; }}
+            .pager a {{ color: #ff6600; text-decoration: none; padding: 10px 15px; background: #333; border-radius: 5px; }}
         </style>
     </head>
     <body>
@@ -428,7 +645,105 @@ async def combat_history(request: web_request.Request):
         <div class="combat-logs">
             {combat_html if combat_html else '<p>No combat history available.</p>'}
         </div>
+        
+        <div class="pager">
+            {older_link}
+        </div>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+async def combat_replay(request: web_request.Request):
+    """Regenerate a stored battle round by round from its seed and snapshots"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        combat_log_id = int(request.match_info['combat_log_id'])
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid battle ID")
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        replay = await database.queries.get_battle_replay(conn, combat_log_id=combat_log_id)
+        if not replay:
+            replay = await get_archived_battle_replay(conn, combat_log_id)
+        if not replay:
+            raise web.HTTPNotFound(text="Battle replay not found")
+        
+        battle = decode_replay(replay['payload'])
+        names = await resolve_names(conn, [replay['attacker_id'], replay['defender_id']])
+    
+    attacker_name = names.get(battle.attacker.id, "Unknown")
+    if replay['combat_type'] == 'pve':
+        template = get_mob_world().templates.get(replay['mob_template_id'])
+        defender_name = template.name if template else "Unknown"
+    else:
+        defender_name = names.get(battle.defender.id, "Unknown")
+    entries = build_battle_log(battle, attacker_name, defender_name)
+    
+    # Group the log by round
+    rounds_html = ""
+    entry_index = 0
+    for round_number in range(1, battle.rounds + 1):
+        round_entries = ""
+        while entry_index < len(battle.strikes) and battle.strikes[entry_index].round == round_number:
+            round_entries += f"<div class='log-entry'>{entries[entry_index]}</div>"
+            entry_index += 1
+        rounds_html += f"""
+        <div class="round">
+            <div class="round-header">ROUND {round_number}</div>
+            {round_entries}
+        </div>
+        """
+    
+    if battle.winner_side == ATTACKER:
+        outcome = f"{attacker_name} has defeated {defender_name}!"
+    elif battle.winner_side == DEFENDER:
+        outcome = f"{defender_name} has defeated {attacker_name}!"
+    else:
+        outcome = f"No one was defeated after {battle.rounds} rounds"
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Battle Replay - {attacker_name} vs {defender_name}</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #1a1a1a; color: #fff; }}
+            .header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 30px; }}
+            .title {{ color: #ff6600; }}
+            .nav a {{ color: #ff6600; text-decoration: none; padding: 10px 15px; background: #333; border-radius: 5px; margin-left: 10px; }}
+            .summary {{ background: #333; padding: 15px; margin: 10px 0; border-radius: 8px; border-left: 4px solid #ff6600; }}
+            .round {{ background: #2d2d2d; border: 1px solid #555; border-radius: 5px; padding: 10px 15px; margin: 10px 0; }}
+            .round-header {{ color: #ffd700; font-weight: bold; margin-bottom: 5px; }}
+            .log-entry {{ margin: 3px 0; font-family: 'Courier New', monospace; font-size: 11px; }}
+            .outcome {{ font-size: 18px; color: #00ff00; font-weight: bold; margin-top: 20px; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1 class="title">BATTLE REPLAY - {attacker_name} VS {defender_name}</h1>
+            <div class="nav">
+                <a href="/combat/history">COMBAT HISTORY</a>
+                <a href="/game">BACK TO GAME</a>
+            </div>
+        </div>
+        
+        <div class="summary">
+            Fought {replay['created_at']} |
+            {attacker_name}: {battle.attacker.hit_points} → {battle.attacker_hp} HP |
+            {defender_name}: {battle.defender.hit_points} → {battle.defender_hp} HP
+        </div>
+        
+        {rounds_html}
+        
+        <div class="outcome">{outcome}</div>
     </body>
     </html>
     """
-    return web.Response(text=html, content_type='text/html')
\ No newline at end of file
+    return web.Response(text=html, content_type='text/html')
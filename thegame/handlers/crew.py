@@ -1,8 +1,16 @@
-from aiohttp import web, web_request
+from aiohttp import web, web_request, WSMsgType
+from html import escape
+import asyncio
+import json
 
 from database import get_db
 from handlers.auth import require_login
-from handlers.character import get_current_character
+from handlers.character import build_item_filter_form, build_page_links, get_current_character
+from services.catalog import get_catalog
+from services.crew_chat import ChatError, MAX_MESSAGE_LENGTH, get_crew_chat
+from services.crew_service import CrewError, award_item, deposit_item, join, withdraw_item
+from services.inventory import ITEM_VIEWS, page_items, page_json, parse_item_filters
+from services.leaderboards import get_crew_ladders, get_leaderboard
 
 async def crew_main(request: web_request.Request):
     """Main crew interface"""
@@ -21,6 +29,9 @@ async def crew_main(request: web_request.Request):
             # Character is in a crew - show crew interface
             crew_members = await database.queries.get_crew_members(conn, crew_id=crew_data['id'])
             
+            crew_stats = get_crew_ladders().crews.get(crew_data['id'])
+            power_rank = get_leaderboard('crew_power').rank(crew_data['id'])
+            
             # Build member list
             members_html = ""
             for member in crew_members:
@@ -58,6 +69,13 @@ async def crew_main(request: web_request.Request):
                     .actions {{ margin: 20px 0; display: flex; gap: 15px; }}
                     .btn {{ padding: 10px 20px; background: #ff6600; color: white; text-decoration: none; border-radius: 5px; }}
                     .btn:hover {{ background: #ff8833; }}
+                    .chat {{ background: #333; padding: 15px; border-radius: 10px; margin-bottom: 20px; }}
+                    .chat-log {{ height: 250px; overflow-y: auto; background: #222; padding: 10px; border-radius: 5px; margin-bottom: 10px; }}
+                    .chat-line {{ margin: 3px 0; }}
+                    .chat-time {{ color: #888; font-size: 0.8em; margin-right: 5px; }}
+                    .chat-name {{ color: #ff6600; font-weight: bold; margin-right: 5px; }}
+                    .chat form {{ display: flex; gap: 10px; }}
+                    .chat input {{ flex: 1; padding: 8px; background: #444; color: #fff; border: 1px solid #555; border-radius: 5px; }}
                 </style>
             </head>
             <body>
@@ -73,18 +91,67 @@ async def crew_main(request: web_request.Request):
                     <div class="crew-name">{crew_data['name']}</div>
                     <p>{crew_data['description'] or 'No description provided.'}</p>
                     <p><strong>Leader:</strong> {crew_data['leader_name']}</p>
-                    <p><strong>Members:</strong> {len(crew_members)}/{crew_data['max_members']}</p>
+                    <p><strong>Members:</strong> {crew_data['member_count']}/{crew_data['max_members']}</p>
                     <p><strong>Vault Capacity:</strong> {crew_data['vault_capacity']} items</p>
+                    <p><strong>Crew Power:</strong> {crew_stats.total_power if crew_stats else 0:,} (<a href="/rankings?type=crew_power" style="color: #ffd700;">#{power_rank or '-'}</a>) &bull; <strong>PvP Wins:</strong> {crew_stats.pvp_wins if crew_stats else 0:,}</p>
+                </div>
+                
+                {'' if crew_data['leader_id'] == character.id else '<div class="actions"><form method="post" action="/crew/leave"><button class="btn" style="border: none; cursor: pointer;">LEAVE CREW</button></form></div>'}
+                
+                <h3>CREW CHAT</h3>
+                <div class="chat">
+                    <div class="chat-log"></div>
+                    <form>
+                        <input type="text" maxlength="{MAX_MESSAGE_LENGTH}" placeholder="Say something to your crew" autocomplete="off">
+                        <button class="btn" style="border: none; cursor: pointer;">SEND</button>
+                    </form>
                 </div>
                 
                 <h3>CREW MEMBERS</h3>
                 <div class="members-grid">
                     {members_html}
                 </div>
+                
+                <script>
+                // Crew chat: the recent backlog arrives on connect, then new messages as they're sent
+                (function() {{
+                    const log = document.querySelector('.chat-log');
+                    const form = document.querySelector('.chat form');
+                    const input = form.querySelector('input');
+                    const socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/crew/chat');
+                    function addLine(className, parts) {{
+                        const line = document.createElement('div');
+                        line.className = 'chat-line ' + className;
+                        for (const [partClass, text] of parts) {{
+                            const part = document.createElement('span');
+                            part.className = partClass;
+                            part.textContent = text;
+                            line.appendChild(part);
+                        }}
+                        log.appendChild(line);
+                        log.scrollTop = log.scrollHeight;
+                    }}
+                    socket.onmessage = function(event) {{
+                        const data = JSON.parse(event.data);
+                        if (data.type === 'chat') {{
+                            addLine('', [['chat-time', data.sent_at.slice(11, 16)], ['chat-name', data.name], ['chat-text', data.message]]);
+                        }} else if (data.type === 'error') {{
+                            addLine('', [['chat-time', ''], ['chat-text', data.message]]);
+                        }}
+                    }};
+                    form.addEventListener('submit', function(event) {{
+                        event.preventDefault();
+                        if (input.value.trim() && socket.readyState === WebSocket.OPEN) {{
+                            socket.send(JSON.stringify({{message: input.value}}));
+                            input.value = '';
+                        }}
+                    }});
+                }})();
+                </script>
             </body>
             </html>
             """
-            
+        
         else:
             # Character is not in a crew - show join/create options
             html = f"""
@@ -124,7 +191,7 @@ async def crew_main(request: web_request.Request):
                     <div class="option-card">
                         <h3>JOIN A CREW</h3>
                         <p>Find and join an existing crew to participate in group activities.</p>
-                        <a href="#" class="btn">BROWSE CREWS</a>
+                        <a href="/rankings?type=crew_members" class="btn">BROWSE CREWS</a>
                     </div>
                 </div>
             </body>
@@ -208,13 +275,8 @@ async def create_crew(request: web_request.Request):
         raise web.HTTPFound('/crew/create?error=Crew name must be at least 3 characters')
     
     database = await get_db()
-    async with database.get_connection_context() as conn:
-        try:
-            # Check if character is already in a crew
-            existing_crew = await database.queries.get_crew_by_character(conn, character_id=character.id)
-            if existing_crew:
-                raise web.HTTPFound('/crew/create?error=You are already in a crew')
-            
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
             # Create crew
             await database.queries.create_crew(conn, name=name, leader_id=character.id, description=description or None)
             
@@ -223,19 +285,17 @@ async def create_crew(request: web_request.Request):
             crew_row = await new_crew.fetchone()
             crew_id = crew_row[0]
             
-            # Add character as leader
-            await database.queries.join_crew(conn, crew_id=crew_id, character_id=character.id, role='leader')
-            
-            await conn.commit()
-            raise web.HTTPFound('/crew')
-            
-        except web.HTTPFound:
-            # Re-raise HTTP redirects (like the success redirect)
-            raise
-        except Exception as e:
-            if "UNIQUE constraint failed" in str(e):
-                raise web.HTTPFound('/crew/create?error=Crew name already exists')
-            raise web.HTTPFound('/crew/create?error=Crew creation failed')
+            # Add character as leader; refused (and the crew undone) if they're already in one
+            await join(conn, crew_id, character.id, role='leader')
+    except CrewError:
+        raise web.HTTPFound('/crew/create?error=You are already in a crew')
+    except Exception as e:
+        if "UNIQUE constraint failed" in str(e):
+            raise web.HTTPFound('/crew/create?error=Crew name already exists')
+        raise web.HTTPFound('/crew/create?error=Crew creation failed')
+    
+    get_crew_ladders().joined(crew_id, character)
+    raise web.HTTPFound('/crew')
 
 async def join_crew(request: web_request.Request):
     """Join an existing crew"""
@@ -249,30 +309,151 @@ async def join_crew(request: web_request.Request):
     
     database = await get_db()
     async with database.get_connection_context() as conn:
-        # Check if character is already in a crew
-        existing_crew = await database.queries.get_crew_by_character(conn, character_id=character.id)
-        if existing_crew:
-            raise web.HTTPBadRequest(text="Already in a crew")
-        
-        # Check crew exists and has space
-        crew_check = await conn.execute("SELECT max_members FROM crews WHERE id = :crew_id", {"crew_id": crew_id})
-        crew_data = await crew_check.fetchone()
-        if not crew_data:
+        if not await database.queries.get_crew(conn, crew_id=crew_id):
             raise web.HTTPNotFound()
         
-        # Count current members
-        member_count = await conn.execute("SELECT COUNT(*) FROM crew_members WHERE crew_id = :crew_id", {"crew_id": crew_id})
-        count = await member_count.fetchone()
+        # One conditional insert: the room check and the join can't be split by another join
+        try:
+            await join(conn, crew_id, character.id)
+        except CrewError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        await conn.commit()
+    
+    get_crew_ladders().joined(crew_id, character)
+    raise web.HTTPFound('/crew')
+
+async def leave_crew(request: web_request.Request):
+    """Leave your current crew"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        crew_data = await database.queries.get_crew_by_character(conn, character_id=character.id)
+        if not crew_data:
+            raise web.HTTPBadRequest(text="Not in a crew")
         
-        if count[0] >= crew_data[0]:
-            raise web.HTTPBadRequest(text="Crew is full")
+        if crew_data['leader_id'] == character.id:
+            raise web.HTTPBadRequest(text="The crew leader can't leave the crew")
         
-        # Join crew
-        await database.queries.join_crew(conn, crew_id=crew_id, character_id=character.id, role='member')
+        await database.queries.leave_crew(conn, crew_id=crew_data['id'], character_id=character.id)
         await conn.commit()
     
+    get_crew_ladders().left(character.id)
+    get_crew_chat().unsubscribe(crew_data['id'], character.id)
     raise web.HTTPFound('/crew')
 
+async def crew_chat_feed(request: web_request.Request):
+    """WebSocket for crew chat: sends the recent backlog, then every new message; takes messages to send"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        crew_data = await database.queries.get_crew_by_character(conn, character_id=character.id)
+    if not crew_data:
+        raise web.HTTPBadRequest(text="Not in a crew")
+    
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    
+    chat = get_crew_chat()
+    crew_id = crew_data['id']
+    # Taken together, with no await between: every message is either in the backlog or queued, never both
+    backlog = chat.backlog(crew_id)
+    queue = chat.subscribe(crew_id, character.id)
+    
+    async def send_updates():
+        for message in backlog:
+            await ws.send_json(message)
+        while True:
+            await ws.send_json(await queue.get())
+    
+    sender = asyncio.create_task(send_updates())
+    try:
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                chat.post(crew_id, character.id, character.name, str(json.loads(message.data)['message']))
+            except ChatError as e:
+                await ws.send_json({'type': 'error', 'message': str(e)})
+            except (ValueError, KeyError, TypeError):
+                await ws.send_json({'type': 'error', 'message': "Invalid chat message"})
+    finally:
+        sender.cancel()
+        chat.unsubscribe(crew_id, character.id, queue)
+    
+    return ws
+
+async def deposit_to_vault(request: web_request.Request):
+    """Deposit one unit of an inventory item into the crew vault"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    inventory_id = int(request.match_info['inventory_id'])
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            await deposit_item(conn, character.id, inventory_id)
+    except CrewError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound('/crew/vault')
+
+async def withdraw_from_vault(request: web_request.Request):
+    """Take an item out of the crew vault into your own inventory"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    vault_item_id = int(request.match_info['vault_item_id'])
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            await withdraw_item(conn, character.id, vault_item_id)
+    except CrewError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound('/crew/vault')
+
+async def award_from_vault(request: web_request.Request):
+    """Award an item from the crew vault to a crew member (leader only)"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    vault_item_id = int(request.match_info['vault_item_id'])
+    data = await request.post()
+    try:
+        member_id = int(data.get('member_id', ''))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Pick a crew member to award the item to")
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            await award_item(conn, character.id, vault_item_id, member_id)
+    except CrewError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound('/crew/vault')
+
 async def crew_vault(request: web_request.Request):
     """Crew vault interface - Outwar style"""
     await require_login(request)
@@ -288,13 +469,19 @@ async def crew_vault(request: web_request.Request):
         if not crew_data:
             raise web.HTTPFound('/crew')
         
-        # Get vault contents
-        vault_items = await database.queries.get_crew_vault(conn, crew_id=crew_data['id'])
+        try:
+            page_args, filters = parse_item_filters(request.query, 'vault')
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid vault filters")
+        
+        # One page of the vault contents
+        vault_items, next_cursor = await page_items(conn, 'vault', crew_data['id'], **page_args)
+        if request.query.get('format') == 'json':
+            return web.json_response(page_json(vault_items, next_cursor))
         
-        # Get crew members for award dropdown
-        crew_members = await database.queries.get_crew_members(conn, crew_id=crew_data['id'])
+        # Crew members for award dropdown
+        crew_members = await database.queries.get_crew_member_names(conn, crew_id=crew_data['id'])
     
-    # Build vault grid (10x10 + 4 additional = 104 slots total)
     vault_grid_html = build_vault_grid(vault_items)
     
     # Build member dropdown options
@@ -302,6 +489,10 @@ async def crew_vault(request: web_request.Request):
     for member in crew_members:
         member_options += f'<option value="{member["id"]}">{member["name"]}</option>'
     
+    # Members can take items out themselves only in a two-way vault
+    can_take = crew_data['leader_id'] == character.id or crew_data['has_two_way_vault']
+    take_button = '<button class="action-btn" onclick="takeItems()" disabled>Take Items</button>' if can_take else ''
+    
     html = f"""
     <!DOCTYPE html>
     <html>
@@ -339,6 +530,11 @@ async def crew_vault(request: web_request.Request):
             .vault-title {{ font-weight: bold; }}
             .sort-options {{ font-size: 11px; }}
             .sort-options select {{ background: #444; color: white; border: 1px solid #666; padding: 2px 5px; }}
+            .item-filters {{ display: flex; gap: 5px; align-items: center; }}
+            .item-filters input {{ background: #444; color: white; border: 1px solid #666; padding: 2px 5px; }}
+            .item-filters .btn-xs {{ padding: 2px 8px; background: #4169e1; color: white; border: none; border-radius: 3px; cursor: pointer; }}
+            .page-links {{ text-align: center; margin-top: 10px; font-size: 11px; }}
+            .page-links a {{ color: #88ccff; margin: 0 10px; }}
             
             .vault-grid {{ display: grid; grid-template-columns: repeat(10, 48px); gap: 2px; justify-content: center; }}
             .vault-slot {{ width: 48px; height: 48px; background: #444; border: 2px solid #666; border-radius: 3px; display: flex; align-items: center; justify-content: center; cursor: pointer; }}
@@ -402,7 +598,7 @@ async def crew_vault(request: web_request.Request):
                     <button class="dropdown-btn">Storage ▼</button>
                     <button class="dropdown-btn">Accomplishments ▼</button>
                 </div>
-                <div class="vault-status">Currently Storing {len(vault_items)} / {crew_data['vault_capacity']} Items</div>
+                <div class="vault-status">Currently Storing {crew_data['vault_count']} / {crew_data['vault_capacity']} Items</div>
             </div>
             
             <!-- Vault Grid -->
@@ -410,17 +606,14 @@ async def crew_vault(request: web_request.Request):
                 <div class="vault-header">
                     <div class="vault-title">Crew Vault</div>
                     <div class="sort-options">
-                        Order By: 
-                        <select>
-                            <option>Alphabetical</option>
-                            <option>Newest</option>
-                        </select>
+                        {build_item_filter_form('/crew/vault', filters, ITEM_VIEWS['vault'][3])}
                     </div>
                 </div>
                 
                 <div class="vault-grid">
                     {vault_grid_html}
                 </div>
+                {build_page_links('/crew/vault', filters, page_args['after'], next_cursor)}
             </div>
             
             <!-- Management Panels -->
@@ -438,10 +631,11 @@ async def crew_vault(request: web_request.Request):
                         {member_options}
                     </select>
                     <button class="action-btn" onclick="awardItems()" disabled>Award Items</button>
+                    {take_button}
                     <div class="log-link" style="margin-top: 10px;">View awarded item log</div>
                     <div class="note">
-                        <strong>Note:</strong> To deposit an item into your crew's vault, your crew must have 
-                        the Two Way Vault upgrade from the Treasury.
+                        <strong>Note:</strong> To deposit an item into your crew's vault, use DEPOSIT on it 
+                        in your <a href="/inventory" style="color: #88ccff;">inventory</a>.
                     </div>
                 </div>
                 
@@ -486,16 +680,37 @@ async def crew_vault(request: web_request.Request):
             
             document.querySelector('button[onclick="awardItems()"]').disabled = !hasSelection || !hasMember;
             document.querySelector('button[onclick="deleteItems()"]').disabled = !hasSelection || !hasDeleteConfirm;
+            const takeButton = document.querySelector('button[onclick="takeItems()"]');
+            if (takeButton) {{
+                takeButton.disabled = !hasSelection;
+            }}
         }}
         
         document.getElementById('memberSelect').addEventListener('change', updateButtons);
         document.getElementById('confirmDelete').addEventListener('change', updateButtons);
         
+        async function moveItems(path, body) {{
+            for (const slotIndex of selectedItems) {{
+                const vaultId = document.querySelector(`[data-slot="${{slotIndex}}"]`).dataset.vaultId;
+                const response = await fetch(path + vaultId, {{method: 'POST', body: body}});
+                if (!response.ok) {{
+                    alert('Failed: ' + await response.text());
+                    break;
+                }}
+            }}
+            location.reload();
+        }}
+        
         function awardItems() {{
             if (selectedItems.size > 0) {{
                 const member = document.getElementById('memberSelect').value;
-                alert(`Awarding ${{selectedItems.size}} item(s) to member ${{member}}`);
-                // Implement actual award logic here
+                moveItems('/crew/vault/award/', new URLSearchParams({{member_id: member}}));
+            }}
+        }}
+        
+        function takeItems() {{
+            if (selectedItems.size > 0) {{
+                moveItems('/crew/vault/withdraw/');
             }}
         }}
         
@@ -512,17 +727,17 @@ async def crew_vault(request: web_request.Request):
     return web.Response(text=html, content_type='text/html')
 
 def build_vault_grid(vault_items):
-    """Build the 10x10+4 vault grid"""
-    # Create 104 slots (10x10 + 4 additional)
-    total_slots = 104
-    filled_slots = len(vault_items)
+    """Build the vault grid for one page of items, padded to whole rows of 10"""
+    catalog = get_catalog()
+    total_slots = max(10, -(-len(vault_items) // 10) * 10)
     
     grid_html = ""
     for i in range(total_slots):
-        if i < filled_slots:
+        if i < len(vault_items):
             # Filled slot with trophy icon (as per documentation)
+            item = catalog.item(vault_items[i]['item_id'])
             grid_html += f'''
-            <div class="vault-slot filled" data-slot="{i}" onclick="selectItem({i})">
+            <div class="vault-slot filled" data-slot="{i}" data-vault-id="{vault_items[i]['id']}" onclick="selectItem({i})" title="{escape(item['name'])} ({item['rarity_name']}) • Transfers: {vault_items[i]['transfers_remaining']}" style="border-color: {item['color']};">
                 <div class="vault-icon">🏆</div>
             </div>
             '''
@@ -533,4 +748,4 @@ def build_vault_grid(vault_items):
             </div>
             '''
     
-    return grid_html
\ No newline at end of file
+    return grid_html
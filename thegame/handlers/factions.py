@@ -4,6 +4,7 @@ from datetime import datetime
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.catalog import get_catalog
 
 async def factions_main(request: web_request.Request):
     """Faction system - available at level 91+"""
@@ -17,17 +18,10 @@ async def factions_main(request: web_request.Request):
     if character.level < 91:
         return await faction_locked_page(character)
     
-    database = await get_db()
-    async with database.get_connection_context() as conn:
-        # Get all factions
-        factions = await database.queries.get_all_factions(conn)
-        
-        # Get character's current faction info if any
-        current_faction = None
-        if character.faction_id:
-            faction_result = await conn.execute('SELECT * FROM factions WHERE id = :faction_id', 
-                                              {'faction_id': character.faction_id})
-            current_faction = await faction_result.fetchone()
+    catalog = get_catalog()
+    factions = catalog.all_factions()
+    # Character's current faction info if any
+    current_faction = catalog.faction(character.faction_id)
     
     html = f"""
     <!DOCTYPE html>
@@ -1,10 +1,21 @@
 from aiohttp import web, web_request
 from typing import Dict, List, Optional
 import json
+from html import escape
+from urllib.parse import urlencode
 
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.auction_house import get_auction_house, AuctionError, AUCTION_DURATIONS_HOURS
+from services.catalog import get_catalog
+from services.character_cache import resolve_names
+from services.leaderboards import refresh_characters
+from services.marketplace import (LISTINGS_PAGE_SIZE, LISTING_SORTS, DEFAULT_LISTING_SORT, SEARCH_LISTING_SORT,
+                                  CANDLE_PERIODS, MAX_CANDLES, browse_listings, parse_listing_cursor,
+                                  purchase_listing, get_price_history, get_suggested_price, get_listing_cache,
+                                  PURCHASED, ALREADY_SOLD, OWN_LISTING, INSUFFICIENT_GOLD)
+from services.search import fts_query, search_items, SEARCH_LIMIT
 
 async def marketplace_main(request: web_request.Request):
     """Main marketplace interface - Outwar style"""
@@ -18,60 +29,35 @@ async def marketplace_main(request: web_request.Request):
     item_type = request.query.get('type', 'all')
     min_level = request.query.get('min_level', '1')
     max_level = request.query.get('max_level', '95')
-    sort_by = request.query.get('sort', 'name')
+    search = request.query.get('search', '').strip()
+    match = fts_query(search)
+    sort_by = request.query.get('sort', SEARCH_LISTING_SORT if match else DEFAULT_LISTING_SORT)
+    if sort_by not in LISTING_SORTS or (sort_by == SEARCH_LISTING_SORT and not match):
+        sort_by = DEFAULT_LISTING_SORT
     
-    database = await get_db()
-    async with database.get_connection_context() as conn:
-        # Get marketplace listings (using character inventory as sample listings)
-        if item_type == 'all':
-            listings_query = '''
-                SELECT ci.id as listing_id, ci.item_id, ci.quantity, ci.transfers_remaining,
-                       i.name, i.level_requirement, i.attack, i.hit_points,
-                       i.fire_damage, i.kinetic_damage, i.arcane_damage, i.holy_damage, i.shadow_damage,
-                       i.chaos_damage, i.vile_damage,
-                       es.name as slot_name, ir.name as rarity_name, ir.color,
-                       c.name as seller_name, c.level as seller_level,
-                       (i.attack + i.hit_points + i.fire_damage + i.kinetic_damage + i.arcane_damage + i.holy_damage + i.shadow_damage + i.chaos_damage + i.vile_damage) * ir.power_multiplier as estimated_price
-                FROM character_inventory ci
-                JOIN items i ON ci.item_id = i.id
-                JOIN equipment_slots es ON i.slot_id = es.id
-                JOIN item_rarities ir ON i.rarity_id = ir.id
-                JOIN characters c ON ci.character_id = c.id
-                WHERE i.level_requirement >= :min_level AND i.level_requirement <= :max_level
-                ORDER BY estimated_price DESC
-                LIMIT 50
-            '''
-        else:
-            listings_query = '''
-                SELECT ci.id as listing_id, ci.item_id, ci.quantity, ci.transfers_remaining,
-                       i.name, i.level_requirement, i.attack, i.hit_points,
-                       i.fire_damage, i.kinetic_damage, i.arcane_damage, i.holy_damage, i.shadow_damage,
-                       i.chaos_damage, i.vile_damage,
-                       es.name as slot_name, ir.name as rarity_name, ir.color,
-                       c.name as seller_name, c.level as seller_level,
-                       (i.attack + i.hit_points + i.fire_damage + i.kinetic_damage + i.arcane_damage + i.holy_damage + i.shadow_damage + i.chaos_damage + i.vile_damage) * ir.power_multiplier as estimated_price
-                FROM character_inventory ci
-                JOIN items i ON ci.item_id = i.id
-                JOIN equipment_slots es ON i.slot_id = es.id
-                JOIN item_rarities ir ON i.rarity_id = ir.id
-                JOIN characters c ON ci.character_id = c.id
-                WHERE es.name = :item_type AND i.level_requirement >= :min_level AND i.level_requirement <= :max_level
-                ORDER BY estimated_price DESC
-                LIMIT 50
-            '''
-        
-        listings = await conn.execute(listings_query, {
-            'item_type': item_type,
-            'min_level': int(min_level),
-            'max_level': int(max_level)
-        })
-        listings = await listings.fetchall()
+    try:
+        after = parse_listing_cursor(sort_by, request.query.get('after_value'), request.query.get('after_id'))
+        level_range = (int(min_level), int(max_level))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid marketplace filters")
+    
+    listings, next_cursor = await browse_listings(None if item_type == 'all' else item_type,
+                                                  level_range[0], level_range[1], sort_by, after, match=match)
+    
+    filters = {'type': item_type, 'min_level': min_level, 'max_level': max_level, 'sort': sort_by}
+    if match:
+        filters['search'] = search
+    pages_html = ""
+    if after:
+        pages_html += f'<a href="/marketplace?{urlencode(filters)}" style="color: #88ccff;">← FIRST PAGE</a> '
+    if next_cursor:
+        pages_html += f'''<a href="/marketplace?{urlencode({**filters, 'after_value': next_cursor[0], 'after_id': next_cursor[1]})}" style="color: #88ccff;">NEXT PAGE →</a>'''
     
     # Build listings HTML
     listings_html = build_marketplace_listings(listings, character)
     
     # Build filter controls
-    filter_controls = build_filter_controls(item_type, min_level, max_level, sort_by)
+    filter_controls = build_filter_controls(item_type, min_level, max_level, sort_by, bool(match))
     
     html = f"""
     <!DOCTYPE html>
@@ -191,10 +177,10 @@ async def marketplace_main(request: web_request.Request):
                 <div class="marketplace-title">🛒 MARKETPLACE</div>
                 <div class="marketplace-nav">
                     <button class="marketplace-tab active">Browse Items</button>
-                    <button class="marketplace-tab">My Listings</button>
-                    <button class="marketplace-tab">Sell Items</button>
+                    <button class="marketplace-tab" onclick="window.location.href='/marketplace/sell'">My Listings</button>
+                    <button class="marketplace-tab" onclick="window.location.href='/marketplace/sell'">Sell Items</button>
                     <button class="marketplace-tab">Purchase History</button>
-                    <button class="marketplace-tab">Auction House</button>
+                    <button class="marketplace-tab" onclick="window.location.href='/marketplace/auctions'">Auction House</button>
                 </div>
                 <div style="text-align: center; font-size: 12px; color: #ccc;">
                     Trade items with other players • Secure transactions • No scams
@@ -203,7 +189,7 @@ async def marketplace_main(request: web_request.Request):
             
             <!-- Search Panel -->
             <div class="search-panel">
-                <input type="text" class="search-input" placeholder="Search for items by name..." id="searchInput">
+                <input type="text" class="search-input" placeholder="Search for items by name..." id="searchInput" value="{escape(search)}" onkeydown="if (event.key === 'Enter') searchItems()">
                 <button class="search-btn" onclick="searchItems()">SEARCH</button>
                 <button class="search-btn" onclick="clearSearch()" style="background: #666;">CLEAR</button>
             </div>
@@ -217,44 +203,32 @@ async def marketplace_main(request: web_request.Request):
             <div class="listings-container">
                 <div class="listings-header">
                     <div class="listings-title">Available Items</div>
-                    <div class="listings-count">{len(listings)} items found</div>
+                    <div class="listings-count">{len(listings)} items on this page</div>
                 </div>
                 
                 <div class="listings-grid">
                     {listings_html}
                 </div>
+                
+                <div style="display: flex; justify-content: space-between; margin-top: 15px; font-size: 12px;">
+                    {pages_html}
+                </div>
             </div>
         </div>
         
         <script>
         function buyItem(listingId, price, itemName) {{
-            if (confirm(`Purchase ${{itemName}} for ${{price:,}} gold?`)) {{
+            if (confirm(`Purchase ${{itemName}} for ${{price.toLocaleString()}} gold?`)) {{
                 fetch('/marketplace/buy/' + listingId, {{method: 'POST'}})
                 .then(response => {{
                     if (response.ok) {{
                         alert('Purchase successful!');
                         location.reload();
                     }} else {{
-                        alert('Purchase failed. You may not have enough gold.');
-                    }}
-                }});
-            }}
-        }}
-        
-        function placeBid(listingId, currentPrice, itemName) {{
-            const bidAmount = prompt(`Enter your bid for ${{itemName}} (current: ${{currentPrice:,}} gold):`);
-            if (bidAmount && !isNaN(bidAmount) && parseInt(bidAmount) > currentPrice) {{
-                fetch('/marketplace/bid/' + listingId, {{
-                    method: 'POST',
-                    headers: {{'Content-Type': 'application/json'}},
-                    body: JSON.stringify({{bid: parseInt(bidAmount)}})
-                }})
-                .then(response => {{
-                    if (response.ok) {{
-                        alert('Bid placed successfully!');
-                        location.reload();
-                    }} else {{
-                        alert('Bid failed.');
+                        response.text().then(reason => {{
+                            alert('Purchase failed: ' + reason);
+                            location.reload();
+                        }});
                     }}
                 }});
             }}
@@ -272,14 +246,25 @@ async def marketplace_main(request: web_request.Request):
                 max_level: maxLevel,
                 sort: sort
             }});
+            const query = document.getElementById('searchInput').value.trim();
+            if (query) {{
+                params.set('search', query);
+            }}
             
             window.location.href = '/marketplace?' + params.toString();
         }}
         
         function searchItems() {{
-            const query = document.getElementById('searchInput').value;
-            if (query.trim()) {{
-                window.location.href = '/marketplace?search=' + encodeURIComponent(query);
+            const query = document.getElementById('searchInput').value.trim();
+            if (query) {{
+                // Keep the type and level filters, rank by relevance
+                const params = new URLSearchParams({{
+                    type: document.getElementById('typeFilter').value,
+                    min_level: document.getElementById('minLevel').value,
+                    max_level: document.getElementById('maxLevel').value,
+                    search: query
+                }});
+                window.location.href = '/marketplace?' + params.toString();
             }}
         }}
         
@@ -298,10 +283,12 @@ def build_marketplace_listings(listings, character):
     if not listings:
         return '<div class="no-listings">No items available at the moment.<br>Check back later or adjust your filters.</div>'
     
+    catalog = get_catalog()
     listings_html = ""
-    for listing in listings:
-        # Calculate estimated price based on item power
-        estimated_price = int(listing['estimated_price'] * 100)
+    for row in listings:
+        # Listing details with the item's stats, slot and rarity from the catalog
+        listing = {**catalog.item(row['item_id']), **row}
+        price = listing['price']
         
         # Build stats display
         stats_html = ""
@@ -331,10 +318,10 @@ def build_marketplace_listings(listings, character):
             stats_html += f'<div class="stat-line stat-elemental">{", ".join(elemental_stats)}</div>'
         
         # Check if character can afford
-        can_afford = character.gold >= estimated_price
+        can_afford = character.gold >= price
         
         # Determine if it's own listing
-        own_listing = listing['seller_name'] == character.name
+        own_listing = listing['seller_id'] == character.id
         
         listings_html += f"""
         <div class="listing-card">
@@ -343,7 +330,7 @@ def build_marketplace_listings(listings, character):
                     <div class="listing-item-name" style="color: {listing['color']}">{listing['name']}</div>
                     <span class="listing-rarity" style="background: {listing['color']}; color: #000;">{listing['rarity_name']}</span>
                 </div>
-                <div class="listing-price">{estimated_price:,}g</div>
+                <div class="listing-price">{price:,}g</div>
             </div>
             
             <div class="listing-stats">
@@ -361,17 +348,15 @@ def build_marketplace_listings(listings, character):
             </div>
             
             <div class="listing-actions">
-                {'<button class="buy-btn" disabled>Your Item</button>' if own_listing else 
-                 f'<button class="buy-btn" {"" if can_afford else "disabled"} onclick="buyItem({listing['listing_id']}, {estimated_price}, \'{listing['name']}\')">BUY NOW</button>'}
-                {'<button class="bid-btn" disabled>Your Item</button>' if own_listing else
-                 f'<button class="bid-btn" onclick="placeBid({listing['listing_id']}, {estimated_price}, \'{listing['name']}\')">PLACE BID</button>'}
+                {f'<form method="post" action="/marketplace/cancel/{listing['listing_id']}"><button class="bid-btn">CANCEL LISTING</button></form>' if own_listing else 
+                 f'<button class="buy-btn" {"" if can_afford else "disabled"} onclick="buyItem({listing['listing_id']}, {price}, \'{listing['name']}\')">BUY NOW</button>'}
             </div>
         </div>
         """
     
     return listings_html
 
-def build_filter_controls(item_type, min_level, max_level, sort_by):
+def build_filter_controls(item_type, min_level, max_level, sort_by, searching=False):
     """Build filter controls HTML"""
     item_types = [
         ('all', 'All Items'),
@@ -409,12 +394,61 @@ def build_filter_controls(item_type, min_level, max_level, sort_by):
             <option value="price_high" {"selected" if sort_by == "price_high" else ""}>Price (High to Low)</option>
             <option value="level" {"selected" if sort_by == "level" else ""}>Level</option>
             <option value="newest" {"selected" if sort_by == "newest" else ""}>Newest</option>
+            {f'<option value="relevance" {"selected" if sort_by == "relevance" else ""}>Best Match</option>' if searching else ""}
         </select>
         
         <button class="filter-btn" onclick="applyFilters()">APPLY FILTERS</button>
     </div>
     """
 
+async def search_items_api(request: web_request.Request):
+    """Ranked item catalog search (JSON), with optional slot and level filters"""
+    await require_login(request)
+    
+    try:
+        min_level = int(request.query.get('min_level', 1))
+        max_level = int(request.query.get('max_level', 1000))
+        limit = min(max(int(request.query.get('limit', SEARCH_LIMIT)), 1), 100)
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid search filters")
+    slot = request.query.get('slot')
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        items = await search_items(conn, request.query.get('q', ''), None if slot in (None, '', 'all') else slot,
+                                   min_level, max_level, limit)
+    
+    return web.json_response({'results': [
+        {'id': item['id'], 'name': item['name'], 'description': item['description'],
+         'level_requirement': item['level_requirement'], 'slot': item['slot_name'],
+         'rarity': item['rarity_name'], 'color': item['color']}
+        for item in items
+    ]})
+
+async def listing_cache_metrics(request: web_request.Request):
+    """Marketplace page cache hit rate and counters"""
+    return web.json_response(get_listing_cache().snapshot_metrics())
+
+async def price_history_api(request: web_request.Request):
+    """Price candles and a suggested price for one item (JSON), read from the candle aggregates"""
+    await require_login(request)
+    
+    period = request.query.get('period', '1d')
+    try:
+        item_id = int(request.match_info['item_id'])
+        points = min(max(int(request.query.get('points', 30)), 1), MAX_CANDLES)
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid price history request")
+    if period not in CANDLE_PERIODS:
+        raise web.HTTPBadRequest(text=f"Period must be one of {', '.join(CANDLE_PERIODS)}")
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        candles = await get_price_history(conn, item_id, period, points)
+        suggested = await get_suggested_price(conn, item_id)
+    
+    return web.json_response({'item_id': item_id, 'period': period, 'candles': candles, 'suggested': suggested})
+
 async def buy_item(request: web_request.Request):
     """Buy an item from marketplace"""
     await require_login(request)
@@ -427,48 +461,96 @@ async def buy_item(request: web_request.Request):
     
     database = await get_db()
     async with database.get_connection_context() as conn:
-        # Get listing details
-        listing_query = await conn.execute('''
-            SELECT ci.character_id, ci.item_id, ci.quantity,
-                   i.name, (i.attack + i.hit_points + i.fire_damage + i.kinetic_damage + i.arcane_damage + i.holy_damage + i.shadow_damage + i.chaos_damage + i.vile_damage) * ir.power_multiplier * 100 as price
-            FROM character_inventory ci
-            JOIN items i ON ci.item_id = i.id
-            JOIN item_rarities ir ON i.rarity_id = ir.id
-            WHERE ci.id = :listing_id
-        ''', {'listing_id': listing_id})
-        listing = await listing_query.fetchone()
-        
-        if not listing:
-            raise web.HTTPNotFound()
-        
-        price = int(listing['price'])
-        
-        # Check if buyer has enough gold
-        if character.gold < price:
-            return web.Response(text="Insufficient gold", status=400)
-        
-        # Check if trying to buy own item
-        if listing['character_id'] == character.id:
-            return web.Response(text="Cannot buy your own item", status=400)
-        
-        # Process transaction
-        # Remove item from seller's inventory
-        await conn.execute('DELETE FROM character_inventory WHERE id = :listing_id', {'listing_id': listing_id})
-        
-        # Add item to buyer's inventory
-        await database.queries.add_to_inventory(conn, character_id=character.id, 
-                                              item_id=listing['item_id'], quantity=1, transfers_remaining=10)
-        
-        # Transfer gold
-        await conn.execute('UPDATE characters SET gold = gold - :price WHERE id = :buyer_id', 
-                          {'price': price, 'buyer_id': character.id})
-        await conn.execute('UPDATE characters SET gold = gold + :price WHERE id = :seller_id', 
-                          {'price': price, 'seller_id': listing['character_id']})
-        
-        await conn.commit()
+        outcome, listing = await purchase_listing(conn, character.id, listing_id)
+        if outcome == PURCHASED:
+            await refresh_characters(conn, [character.id, listing['seller_id']])
     
+    if outcome == ALREADY_SOLD:
+        return web.Response(text="Item already sold", status=409)
+    if outcome == OWN_LISTING:
+        return web.Response(text="Cannot buy your own item", status=400)
+    if outcome == INSUFFICIENT_GOLD:
+        return web.Response(text="Insufficient gold", status=400)
     return web.Response(text="Purchase successful")
 
+async def sell_page(request: web_request.Request):
+    """Sell items and manage your own listings"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        inventory = await database.queries.get_sellable_inventory(conn, character_id=character.id)
+        my_listings = await database.queries.get_seller_listings(conn, seller_id=character.id)
+    
+    # An auction's price is its starting bid
+    duration_options = '<option value="">Fixed price</option>' + "".join(
+        f'<option value="{hours}">Auction {hours}h</option>' for hours in AUCTION_DURATIONS_HOURS
+    )
+    inventory_html = ""
+    for item in inventory:
+        inventory_html += f"""
+        <form class="row" method="post" action="/marketplace/sell">
+            <input type="hidden" name="inventory_id" value="{item['id']}">
+            <span style="color: {item['color']}; flex: 1;">{item['name']}{f" x{item['quantity']}" if item['quantity'] > 1 else ""}</span>
+            <span class="meta">{item['slot_name'].title()} • Lv{item['level_requirement']} • Transfers: {item['transfers_remaining']}</span>
+            <input type="number" name="price" value="{max(1, item['suggested_price'])}" min="1" class="price-input">
+            <select name="auction_hours" class="price-input">{duration_options}</select>
+            <button class="btn">LIST</button>
+        </form>
+        """
+    
+    listings_html = ""
+    for listing in my_listings:
+        listings_html += f"""
+        <form class="row" method="post" action="/marketplace/cancel/{listing['listing_id']}">
+            <span style="color: {listing['color']}; flex: 1;">{listing['item_name']}</span>
+            <span class="meta">{listing['slot_name'].title()} • Lv{listing['level_requirement']} • Listed {listing['listed_at']}</span>
+            <span class="price">{listing['price']:,}g</span>
+            <button class="btn cancel">CANCEL</button>
+        </form>
+        """
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Sell Items - Marketplace</title>
+        <style>
+            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+            body {{ font-family: Arial, sans-serif; background: #1a1a1a; color: #ffffff; padding: 20px; }}
+            .panel {{ background: #2d2d2d; border: 1px solid #555; border-radius: 8px; padding: 20px; margin-bottom: 20px; }}
+            .panel-title {{ color: #4169e1; font-size: 18px; font-weight: bold; margin-bottom: 15px; }}
+            .row {{ display: flex; gap: 15px; align-items: center; padding: 8px; border-bottom: 1px solid #444; }}
+            .meta {{ color: #ccc; font-size: 11px; }}
+            .price {{ color: #ffd700; font-weight: bold; }}
+            .price-input {{ width: 100px; padding: 5px; background: #444; border: 1px solid #666; border-radius: 3px; color: white; }}
+            .btn {{ padding: 6px 12px; background: #00aa00; color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 11px; }}
+            .btn.cancel {{ background: #aa3300; }}
+            .empty {{ color: #ccc; font-style: italic; }}
+        </style>
+    </head>
+    <body>
+        <div class="panel">
+            <a href="/marketplace" style="color: #88ccff;">← Back to Marketplace</a>
+            <span style="float: right;">GOLD: {character.gold:,}</span>
+        </div>
+        <div class="panel">
+            <div class="panel-title">MY LISTINGS ({len(my_listings)})</div>
+            {listings_html or '<div class="empty">You have nothing listed.</div>'}
+        </div>
+        <div class="panel">
+            <div class="panel-title">SELL ITEMS</div>
+            {inventory_html or '<div class="empty">No tradeable items in your inventory.</div>'}
+        </div>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
 async def sell_item(request: web_request.Request):
     """List item for sale"""
     await require_login(request)
@@ -477,6 +559,193 @@ async def sell_item(request: web_request.Request):
     if not character:
         raise web.HTTPFound('/characters')
     
-    # This would implement selling interface
-    # For now, redirect to main marketplace
-    raise web.HTTPFound('/marketplace')
\ No newline at end of file
+    data = await request.post()
+    try:
+        inventory_id = int(data.get('inventory_id', ''))
+        price = int(data.get('price', ''))
+        auction_hours = int(data['auction_hours']) if data.get('auction_hours') else None
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid listing")
+    if price <= 0:
+        raise web.HTTPBadRequest(text="Price must be positive")
+    
+    auction_house = get_auction_house()
+    auction = None
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            item = await database.queries.get_inventory_row(conn, inventory_id=inventory_id, character_id=character.id)
+            if not item or item['transfers_remaining'] == 0:
+                raise web.HTTPBadRequest(text="Item can't be sold")
+            
+            if auction_hours is not None:
+                auction = await auction_house.create(conn, character.id, item, price, auction_hours)
+            else:
+                # One unit of the stack moves from the inventory into the listing
+                if not await database.queries.decrement_inventory_row(conn, inventory_id=inventory_id):
+                    await database.queries.delete_inventory_row(conn, inventory_id=inventory_id)
+                listing_id = await database.queries.create_market_listing(
+                    conn, seller_id=character.id, item_id=item['item_id'],
+                    transfers_remaining=item['transfers_remaining'], price=price
+                )
+                listing = await database.queries.get_market_listing(conn, listing_id=listing_id)
+    except AuctionError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    if auction:
+        auction_house.open(auction)
+        raise web.HTTPFound('/marketplace/auctions')
+    get_listing_cache().invalidate(listing['slot_name'], listing['level_requirement'])
+    raise web.HTTPFound('/marketplace/sell')
+
+async def cancel_listing(request: web_request.Request):
+    """Take a listing down and return the item to the seller's inventory"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    listing_id = int(request.match_info['listing_id'])
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn, database.transaction(conn):
+        listing = await database.queries.get_market_listing(conn, listing_id=listing_id)
+        if not listing or listing['seller_id'] != character.id:
+            raise web.HTTPNotFound()
+        await database.queries.delete_market_listing(conn, listing_id=listing_id)
+        await database.queries.add_to_inventory(conn, character_id=character.id, item_id=listing['item_id'],
+                                                quantity=listing['quantity'],
+                                                transfers_remaining=listing['transfers_remaining'])
+    
+    get_listing_cache().invalidate(listing['slot_name'], listing['level_requirement'])
+    raise web.HTTPFound('/marketplace/sell')
+
+async def auctions_page(request: web_request.Request):
+    """Open auctions, ending soonest first"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        page = max(int(request.query.get('page', 1)), 1)
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid page")
+    
+    open_auctions = get_auction_house().ending_soonest()
+    auctions = open_auctions[(page - 1) * LISTINGS_PAGE_SIZE:page * LISTINGS_PAGE_SIZE]
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        names = await resolve_names(conn, [auction.seller_id for auction in auctions] +
+                                          [auction.leader_id for auction in auctions])
+    
+    auctions_html = ""
+    for auction in auctions:
+        hours, rest = divmod(auction.seconds_left(), 3600)
+        time_left = f"{hours}h {rest // 60:02d}m" if hours else f"{rest // 60}m {rest % 60:02d}s"
+        leader = names.get(auction.leader_id, '') if auction.leader_id else ''
+        if auction.seller_id == character.id:
+            action = '<span class="meta">Your auction</span>'
+        elif auction.leader_id == character.id:
+            action = f'<span class="meta">You lead</span> <button class="btn" onclick="placeBid({auction.id}, {auction.minimum_bid}, \'{escape(auction.item_name)}\')">RAISE</button>'
+        else:
+            action = f'<button class="btn" onclick="placeBid({auction.id}, {auction.minimum_bid}, \'{escape(auction.item_name)}\')">PLACE BID</button>'
+        auctions_html += f"""
+        <div class="row">
+            <span style="flex: 1;">{escape(auction.item_name)}</span>
+            <span class="meta">Lv{auction.level_requirement} • Seller: {escape(names.get(auction.seller_id, '?'))} • {len(auction.bids)} bids{f" • Leader: {escape(leader)}" if leader else ""}</span>
+            <span class="price">{auction.leading_bid if auction.leader_id else auction.start_price:,}g</span>
+            <span class="meta">min {auction.minimum_bid:,}g • {time_left}</span>
+            {action}
+        </div>
+        """
+    
+    pages_html = ""
+    if page > 1:
+        pages_html += f'<a href="/marketplace/auctions?page={page - 1}" style="color: #88ccff;">← PREVIOUS PAGE</a> '
+    if page * LISTINGS_PAGE_SIZE < len(open_auctions):
+        pages_html += f'<a href="/marketplace/auctions?page={page + 1}" style="color: #88ccff;">NEXT PAGE →</a>'
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Auction House - Marketplace</title>
+        <style>
+            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+            body {{ font-family: Arial, sans-serif; background: #1a1a1a; color: #ffffff; padding: 20px; }}
+            .panel {{ background: #2d2d2d; border: 1px solid #555; border-radius: 8px; padding: 20px; margin-bottom: 20px; }}
+            .panel-title {{ color: #4169e1; font-size: 18px; font-weight: bold; margin-bottom: 15px; }}
+            .row {{ display: flex; gap: 15px; align-items: center; padding: 8px; border-bottom: 1px solid #444; }}
+            .meta {{ color: #ccc; font-size: 11px; }}
+            .price {{ color: #ffd700; font-weight: bold; }}
+            .btn {{ padding: 6px 12px; background: #ff8800; color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 11px; }}
+            .empty {{ color: #ccc; font-style: italic; }}
+        </style>
+    </head>
+    <body>
+        <div class="panel">
+            <a href="/marketplace" style="color: #88ccff;">← Back to Marketplace</a>
+            <a href="/marketplace/sell" style="color: #88ccff; margin-left: 15px;">Start an auction</a>
+            <span style="float: right;">GOLD: {character.gold:,}</span>
+        </div>
+        <div class="panel">
+            <div class="panel-title">AUCTION HOUSE ({len(open_auctions)} open)</div>
+            {auctions_html or '<div class="empty">No auctions are running.</div>'}
+            <div style="display: flex; justify-content: space-between; margin-top: 15px; font-size: 12px;">
+                {pages_html}
+            </div>
+        </div>
+        
+        <script>
+        function placeBid(auctionId, minimumBid, itemName) {{
+            const bidAmount = prompt(`Enter your bid for ${{itemName}} (minimum: ${{minimumBid.toLocaleString()}} gold):`, minimumBid);
+            if (bidAmount && !isNaN(bidAmount)) {{
+                fetch('/marketplace/bid/' + auctionId, {{
+                    method: 'POST',
+                    headers: {{'Content-Type': 'application/json'}},
+                    body: JSON.stringify({{bid: parseInt(bidAmount)}})
+                }})
+                .then(response => {{
+                    if (response.ok) {{
+                        location.reload();
+                    }} else {{
+                        response.text().then(reason => {{
+                            alert('Bid failed: ' + reason);
+                            location.reload();
+                        }});
+                    }}
+                }});
+            }}
+        }}
+        </script>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+async def place_bid(request: web_request.Request):
+    """Bid on an auction; the gold is held in escrow until you're outbid or it closes"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        auction_id = int(request.match_info['auction_id'])
+        amount = int((await request.json())['bid'])
+    except (ValueError, KeyError, TypeError):
+        raise web.HTTPBadRequest(text="Invalid bid")
+    
+    try:
+        auction = await get_auction_house().bid(auction_id, character.id, amount)
+    except AuctionError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    return web.json_response({'auction_id': auction.id, 'leading_bid': auction.leading_bid,
+                              'minimum_bid': auction.minimum_bid, 'seconds_left': auction.seconds_left()})
@@ -0,0 +1,284 @@
+from aiohttp import web, web_request
+import asyncio
+
+from database import get_db
+from handlers.auth import require_login
+from handlers.character import get_current_character
+from handlers.combat import snapshot_character
+from services.mob_world import get_mob_world
+from services.raid_engine import get_raid_engine, RaidError, RAID_MIN_PARTY, RAID_RAGE_COST, RAID_TICK_SECONDS
+
+async def form_raid(request: web_request.Request):
+    """Form (or rejoin) your crew's raid against a raid boss"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        mob_id = int(request.match_info['mob_id'])
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid mob ID")
+    
+    mob = get_mob_world().get(mob_id)
+    if not mob:
+        raise web.HTTPNotFound(text="Mob not found")
+    
+    if mob.room_id != character.current_room_id:
+        raise web.HTTPBadRequest(text="Target is not in the same location")
+    
+    engine = get_raid_engine()
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            crew = await database.queries.get_crew_by_character(conn, character_id=character.id)
+            if not crew:
+                raise web.HTTPBadRequest(text="You need to be in a crew to raid")
+            
+            raid = engine.open_raid_for(crew['id'], mob.template.id)
+            if raid:
+                await engine.join(conn, raid, character.id)
+            else:
+                raid = await engine.form(conn, crew['id'], character.id, mob.template, mob.room_id)
+    except RaidError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound(f'/raids/{raid.id}')
+
+async def join_raid(request: web_request.Request):
+    """Join one of your crew's open raids"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    raid = get_open_raid(request)
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            crew = await database.queries.get_crew_by_character(conn, character_id=character.id)
+            if not crew or crew['id'] != raid.crew_id:
+                raise web.HTTPForbidden(text="This raid belongs to another crew")
+            
+            await get_raid_engine().join(conn, raid, character.id)
+    except RaidError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound(f'/raids/{raid.id}')
+
+async def launch_raid(request: web_request.Request):
+    """Raid leader starts the fight"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    raid = get_open_raid(request)
+    if raid.leader_id != character.id:
+        raise web.HTTPForbidden(text="Only the raid leader can launch the raid")
+    
+    database = await get_db()
+    try:
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            await get_raid_engine().launch(conn, raid)
+    except RaidError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound(f'/raids/{raid.id}')
+
+async def raid_attack(request: web_request.Request):
+    """Queue an attack on the raid boss and wait for the tick that resolves it"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    raid = get_open_raid(request)
+    if raid.status != 'active':
+        raise web.HTTPBadRequest(text="The raid is not in progress")
+    
+    if character.id not in raid.members:
+        raise web.HTTPBadRequest(text="You are not in this raid")
+    
+    if character.current_room_id != raid.room_id:
+        raise web.HTTPBadRequest(text="You need to be in the boss's room to attack")
+    
+    if character.hit_points_current <= 0:
+        raise web.HTTPBadRequest(text="You are too injured to fight")
+    
+    engine = get_raid_engine()
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        snapshot = await snapshot_character(conn, character)
+        spent = await database.queries.spend_rage(conn, character_id=character.id, amount=RAID_RAGE_COST)
+        if not spent:
+            raise web.HTTPBadRequest(text="Not enough rage to attack")
+        
+        try:
+            outcome = engine.submit(raid, character.id, snapshot)
+        except RaidError as e:
+            await database.queries.refund_rage(conn, character_id=character.id, amount=RAID_RAGE_COST)
+            raise web.HTTPBadRequest(text=str(e))
+        await conn.commit()
+    
+    try:
+        result = await asyncio.wait_for(asyncio.shield(outcome), timeout=RAID_TICK_SECONDS * 5)
+    except asyncio.TimeoutError:
+        message = "Your attack is queued and will land shortly."
+    else:
+        message = f"You hit {raid.template.name} for {result['damage']} damage and took {result['taken']} in return."
+        if result['killed']:
+            message += f" {raid.template.name} has fallen!"
+    
+    return await render_raid(raid.id, character, message)
+
+async def raid_page(request: web_request.Request):
+    """Show a raid: boss health, party damage ranking and, once over, the loot"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        raid_id = int(request.match_info['raid_id'])
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid raid ID")
+    
+    return await render_raid(raid_id, character)
+
+def get_open_raid(request: web_request.Request):
+    try:
+        raid_id = int(request.match_info['raid_id'])
+    except (ValueError, KeyError):
+        raise web.HTTPBadRequest(text="Invalid raid ID")
+    
+    raid = get_raid_engine().get(raid_id)
+    if not raid:
+        raise web.HTTPNotFound(text="Raid not found or already over")
+    return raid
+
+async def render_raid(raid_id, character, message=""):
+    """Live raids are read from memory; finished ones from their final checkpoint"""
+    raid = get_raid_engine().get(raid_id)
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        summary = await database.queries.get_raid(conn, raid_id=raid_id)
+        if not summary:
+            raise web.HTTPNotFound(text="Raid not found")
+        participants = await database.queries.get_raid_participants(conn, raid_id=raid_id)
+        loot = await database.queries.get_raid_loot(conn, raid_id=raid_id) if not raid else []
+    
+    names = {row['character_id']: (row['name'], row['level']) for row in participants}
+    if raid:
+        status = raid.outcome or raid.status
+        boss_hp = raid.boss_hp
+        members = [(member.character_id, member.damage_dealt, member.attacks) for member in raid.ranked_members()]
+    else:
+        status = summary['status']
+        boss_hp = summary['boss_hp']
+        members = [(row['character_id'], row['damage_dealt'], row['attacks']) for row in participants]
+    boss_hp_max = summary['boss_hp_max']
+    total_damage = sum(damage for _, damage, _ in members) or 1
+    
+    members_html = ""
+    for rank, (character_id, damage, attacks) in enumerate(members, 1):
+        name, level = names.get(character_id, ("Unknown", "?"))
+        highlight = ' style="color: #ffd700;"' if character_id == character.id else ''
+        members_html += f"""
+        <tr{highlight}>
+            <td>#{rank}</td>
+            <td>{name} (Lvl {level})</td>
+            <td>{damage:,}</td>
+            <td>{damage / total_damage * 100:.1f}%</td>
+            <td>{attacks}</td>
+        </tr>
+        """
+    
+    loot_html = ""
+    for drop in loot:
+        loot_html += f"""<div class="loot-entry">{drop['character_name']} received <span style="color: {drop['color']};">{drop['item_name']}</span> ({drop['rarity_name']})</div>"""
+    
+    actions_html = ""
+    is_member = character.id in {character_id for character_id, _, _ in members}
+    if raid and status == 'forming':
+        if not is_member:
+            actions_html += f'<form method="post" action="/raids/join/{raid_id}"><button class="btn">JOIN RAID</button></form>'
+        if raid.leader_id == character.id:
+            actions_html += f'<form method="post" action="/raids/{raid_id}/launch"><button class="btn">LAUNCH RAID ({len(members)}/{RAID_MIN_PARTY}+)</button></form>'
+        else:
+            actions_html += f'<div class="note">Waiting for the raid leader to launch ({len(members)} in party)</div>'
+    elif raid and status == 'active':
+        if is_member:
+            actions_html += f'<form method="post" action="/raids/{raid_id}/attack"><button class="btn btn-attack">ATTACK ({RAID_RAGE_COST} rage)</button></form>'
+        else:
+            actions_html += f'<form method="post" action="/raids/join/{raid_id}"><button class="btn">JOIN RAID</button></form>'
+    
+    time_left = raid.time_left() if raid else None
+    status_text = status.upper()
+    if time_left is not None:
+        status_text += f" - {time_left // 60}m {time_left % 60}s left"
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Raid - {summary['boss_name']}</title>
+        {'<meta http-equiv="refresh" content="5">' if raid and status == 'active' and not message else ''}
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #1a1a1a; color: #fff; }}
+            .header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 30px; }}
+            .title {{ color: #ff6600; }}
+            .nav a {{ color: #ff6600; text-decoration: none; padding: 10px 15px; background: #333; border-radius: 5px; margin-left: 10px; }}
+            .boss {{ background: #333; padding: 20px; border-radius: 8px; border-left: 4px solid #ff4444; margin-bottom: 20px; }}
+            .boss-name {{ font-size: 1.6em; color: #ff4444; font-weight: bold; }}
+            .health-bar {{ background: #111; height: 20px; border-radius: 10px; margin: 10px 0; overflow: hidden; }}
+            .health-fill {{ background: linear-gradient(90deg, #ff4444, #ff8800); height: 100%; }}
+            .status {{ color: #ffd700; }}
+            .message {{ background: #2d4d2d; padding: 12px; border-radius: 6px; margin-bottom: 20px; }}
+            .actions {{ display: flex; gap: 10px; margin: 20px 0; }}
+            .btn {{ padding: 10px 20px; background: #ff6600; color: white; border: none; border-radius: 5px; cursor: pointer; font-weight: bold; }}
+            .btn-attack {{ background: #cc3333; }}
+            .note {{ color: #ccc; padding: 10px 0; }}
+            table {{ width: 100%; border-collapse: collapse; background: #333; border-radius: 8px; }}
+            th, td {{ padding: 8px 12px; text-align: left; border-bottom: 1px solid #444; }}
+            th {{ color: #ff6600; }}
+            .loot-entry {{ background: #333; padding: 8px 12px; margin: 5px 0; border-radius: 5px; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1 class="title">RAID - {summary['crew_name']}</h1>
+            <div class="nav">
+                <a href="/challenges">RAIDS</a>
+                <a href="/game">BACK TO GAME</a>
+            </div>
+        </div>
+        
+        {f'<div class="message">{message}</div>' if message else ''}
+        
+        <div class="boss">
+            <div class="boss-name">{summary['boss_name']}</div>
+            <div class="health-bar"><div class="health-fill" style="width: {boss_hp / boss_hp_max * 100:.1f}%;"></div></div>
+            <div>Health: {boss_hp:,}/{boss_hp_max:,}</div>
+            <div class="status">{status_text}</div>
+        </div>
+        
+        <div class="actions">{actions_html}</div>
+        
+        <h3>Damage Ranking</h3>
+        <table>
+            <tr><th>Rank</th><th>Raider</th><th>Damage</th><th>Share</th><th>Attacks</th></tr>
+            {members_html}
+        </table>
+        
+        {f'<h3>Loot</h3>{loot_html}' if loot_html else ''}
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
@@ -1,9 +1,13 @@
 from aiohttp import web, web_request
+from datetime import datetime, timezone
 from typing import Dict, List, Optional
+import json
 
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.leaderboards import get_crew_ladders, get_leaderboard, RANKED_COLUMNS
+from services.ranking_snapshots import get_ranking_snapshots, render_page_json, PAGE_SIZE, SNAPSHOT_INTERVAL_SECONDS
 
 async def rankings_main(request: web_request.Request):
     """Main rankings interface - Outwar style"""
@@ -13,35 +17,86 @@ async def rankings_main(request: web_request.Request):
     if not character:
         raise web.HTTPFound('/characters')
     
-    # Get ranking type from query params
+    # Get ranking type and page from query params
     ranking_type = request.query.get('type', 'power')
+    try:
+        page = max(1, int(request.query.get('page', 1)))
+    except ValueError:
+        page = 1
+    as_json = request.query.get('format') == 'json'
     
-    database = await get_db()
-    async with database.get_connection_context() as conn:
-        # Get rankings based on type
-        limit = 50  # Show top 50 players
-        if ranking_type == 'power':
-            rankings = await database.queries.get_power_rankings(conn, limit=limit)
-        elif ranking_type == 'level':
-            rankings = await database.queries.get_level_rankings(conn, limit=limit)
-        elif ranking_type == 'gold':
-            rankings = await database.queries.get_gold_rankings(conn, limit=limit)
-        elif ranking_type == 'experience':
-            rankings = await database.queries.get_experience_rankings(conn, limit=limit)
-        elif ranking_type == 'wilderness':
-            rankings = await database.queries.get_wilderness_rankings(conn, limit=limit)
-        else:
-            rankings = await database.queries.get_power_rankings(conn, limit=limit)
+    # Ladders are kept in memory, so any rank and any page is a cheap lookup
+    leaderboard = get_leaderboard(ranking_type)
+    total = len(leaderboard)
+    last_page = max(1, -(-total // PAGE_SIZE))
+    page = min(page, last_page)
+    offset = (page - 1) * PAGE_SIZE
     
-    # Find character's position
-    char_position = None
-    for i, rank in enumerate(rankings):
-        if rank['id'] == character.id:
-            char_position = i + 1
-            break
+    # Find character's position (their crew's, on the crew ladders)
+    is_crew_ranking = leaderboard.name.startswith('crew_')
+    char_position = leaderboard.rank(get_crew_ladders().crew_of.get(character.id) if is_crew_ranking else character.id)
+    my_page = (char_position - 1) // PAGE_SIZE + 1 if char_position else None
+    
+    snapshots = get_ranking_snapshots()
+    snapshot = snapshots.page(leaderboard.name, page)
+    if snapshot:
+        # Top pages are served pre-rendered from the last snapshot, without touching the database
+        if as_json:
+            return conditional_response(request, snapshot.etag, body=snapshot.json, content_type='application/json')
+        etag = snapshot.etag[:-1] + f'-{ranking_type}-{character.id}-{char_position}-{character.level}-{character.experience}-{character.rage_current}"'
+        if etag_matches(request, etag):
+            return web.Response(status=304, headers={'ETag': etag})
+        total = snapshots.totals.get(leaderboard.name, 0)
+        last_page = snapshots.last_page(leaderboard.name)
+        shown = len(snapshot.rows)
+        rankings_html = snapshot.html
+        footer = f"Rankings updated every {SNAPSHOT_INTERVAL_SECONDS // 60} minutes • Last updated: {snapshots.taken_at} UTC"
+    elif is_crew_ranking:
+        # Crew ladders are small and always live
+        ids = leaderboard.page(offset, PAGE_SIZE)
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            rows = await database.queries.get_crew_ranking_rows(conn, crew_ids=json.dumps(ids))
+        names = {row['id']: row for row in rows}
+        crews = get_crew_ladders().crews
+        column = RANKED_COLUMNS[leaderboard.name]
+        rankings = []
+        for crew_id in ids:
+            if crew_id in names:
+                stats = crews[crew_id].as_row()
+                rankings.append({'rank': offset + len(rankings) + 1, 'crew_id': crew_id, 'name': names[crew_id]['name'],
+                                 'leader_name': names[crew_id]['leader_name'], 'members': stats['members'],
+                                 'average_level': round(stats['average_level'], 1), 'value': stats[column]})
+        if as_json:
+            return web.json_response({'type': leaderboard.name, 'page': page, 'last_page': last_page,
+                                      'total': total, 'rankings': rankings})
+        etag = None
+        shown = len(rankings)
+        rankings_html = build_crew_rankings_html(rankings)
+        footer = "Live rankings"
+    else:
+        # Deeper pages are read live
+        ids = leaderboard.page(offset, PAGE_SIZE)
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            rows = await database.queries.get_ranking_rows(conn, character_ids=json.dumps(ids))
+        by_id = {row['id']: row for row in rows}
+        column = RANKED_COLUMNS[leaderboard.name]
+        rankings = [
+            {'rank': offset + i, 'character_id': row['id'], 'name': row['name'], 'class_name': row['class_name'],
+             'level': row['level'], 'value': row[column], 'last_active': row['last_active']}
+            for i, row in enumerate((by_id[character_id] for character_id in ids if character_id in by_id), 1)
+        ]
+        if as_json:
+            return web.Response(body=render_page_json(leaderboard.name, page, total, None, rankings),
+                                content_type='application/json')
+        etag = None
+        shown = len(rankings)
+        rankings_html = build_rankings_html(rankings, datetime.now(timezone.utc))
+        footer = "Live rankings"
     
     # Build rankings HTML
-    rankings_html = build_rankings_html(rankings, character.id)
+    pager_html = build_pager_html(ranking_type, page, last_page, my_page)
     
     html = f"""
     <!DOCTYPE html>
@@ -89,8 +144,8 @@ async def rankings_main(request: web_request.Request):
             .rankings-table th {{ background: #444; color: #ffd700; padding: 15px; text-align: left; font-weight: bold; border-bottom: 2px solid #666; }}
             .rankings-table td {{ padding: 12px 15px; border-bottom: 1px solid #444; }}
             .rankings-table tr:hover {{ background: #333; }}
-            .rankings-table tr.own-character {{ background: #1a3d5c; }}
-            .rankings-table tr.own-character:hover {{ background: #2a4d6c; }}
+            .rankings-table tr[data-character-id="{character.id}"] {{ background: #1a3d5c; }}
+            .rankings-table tr[data-character-id="{character.id}"]:hover {{ background: #2a4d6c; }}
             
             /* Rank Styling */
             .rank-number {{ font-weight: bold; font-size: 16px; width: 60px; text-align: center; }}
@@ -110,7 +165,7 @@ async def rankings_main(request: web_request.Request):
             /* Table Links */
             .rankings-table .name a {{ color: #88ccff; text-decoration: none; font-weight: bold; }}
             .rankings-table .name a:hover {{ color: #aaddff; text-decoration: underline; }}
-            .rankings-table tr.current-player .name a {{ color: #ffd700; }}
+            .rankings-table tr[data-character-id="{character.id}"] .name a {{ color: #ffd700; }}
             
             /* Stats */
             .stat-value {{ font-weight: bold; }}
@@ -128,6 +183,12 @@ async def rankings_main(request: web_request.Request):
             /* Footer */
             .rankings-footer {{ background: #333; padding: 15px; text-align: center; color: #ccc; font-size: 12px; }}
             
+            /* Pages */
+            .pager {{ display: flex; justify-content: center; gap: 10px; margin: 15px 0; }}
+            .pager a, .pager span {{ padding: 8px 14px; background: #444; color: #fff; border-radius: 5px; text-decoration: none; font-size: 12px; }}
+            .pager a:hover {{ background: #555; }}
+            .pager .current {{ background: #ffd700; color: #000; font-weight: bold; }}
+            
             /* Responsive */
             @media (max-width: 768px) {{
                 .rankings-table {{ font-size: 12px; }}
@@ -183,9 +244,15 @@ async def rankings_main(request: web_request.Request):
                 <button class="ranking-tab {'active' if ranking_type == 'wilderness' else ''}" onclick="switchRanking('wilderness')">🌲 Wilderness</button>
                 <button class="ranking-tab {'active' if ranking_type == 'pvp' else ''}" onclick="switchRanking('pvp')">⚔️ PvP Wins</button>
             </div>
+            <div class="ranking-tabs">
+                <button class="ranking-tab {'active' if ranking_type == 'crew_power' else ''}" onclick="switchRanking('crew_power')">🛡️ Crew Power</button>
+                <button class="ranking-tab {'active' if ranking_type == 'crew_level' else ''}" onclick="switchRanking('crew_level')">⭐ Crew Avg Level</button>
+                <button class="ranking-tab {'active' if ranking_type == 'crew_members' else ''}" onclick="switchRanking('crew_members')">👥 Crew Size</button>
+                <button class="ranking-tab {'active' if ranking_type == 'crew_pvp' else ''}" onclick="switchRanking('crew_pvp')">⚔️ Crew PvP Wins</button>
+            </div>
             
             <!-- Player Position -->
-            {f'<div class="player-position"><div class="position-text">Your Current Rank: <span class="position-rank">#{char_position}</span> of {len(rankings)}</div></div>' if char_position else ''}
+            {f'<div class="player-position"><div class="position-text">{"Your Crew's Rank" if is_crew_ranking else "Your Current Rank"}: <span class="position-rank">#{char_position:,}</span> of {total:,}</div></div>' if char_position else ''}
             
             <!-- Rankings Table -->
             <div class="rankings-container">
@@ -193,11 +260,11 @@ async def rankings_main(request: web_request.Request):
                     <thead>
                         <tr>
                             <th>Rank</th>
-                            <th>Character</th>
-                            <th>Class</th>
+                            <th>{'Crew' if is_crew_ranking else 'Character'}</th>
+                            <th>{'Leader' if is_crew_ranking else 'Class'}</th>
                             <th>{get_ranking_column_header(ranking_type)}</th>
-                            <th>Level</th>
-                            <th>Last Active</th>
+                            <th>{'Members' if is_crew_ranking else 'Level'}</th>
+                            <th>{'Avg Level' if is_crew_ranking else 'Last Active'}</th>
                         </tr>
                     </thead>
                     <tbody>
@@ -206,9 +273,12 @@ async def rankings_main(request: web_request.Request):
                 </table>
             </div>
             
+            <!-- Pages -->
+            {pager_html}
+            
             <!-- Footer -->
             <div class="rankings-footer">
-                Rankings updated every 5 minutes • Only active players shown • Last updated: Now
+                {footer} • Showing ranks {offset + 1:,}-{offset + shown:,} of {total:,}
             </div>
         </div>
         
@@ -220,48 +290,100 @@ async def rankings_main(request: web_request.Request):
     </body>
     </html>
     """
-    return web.Response(text=html, content_type='text/html')
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'} if etag else None
+    return web.Response(text=html, content_type='text/html', headers=headers)
+
+def etag_matches(request: web_request.Request, etag: str) -> bool:
+    """Whether the client already holds this version (If-None-Match)"""
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
 
-def build_rankings_html(rankings, current_char_id):
+def conditional_response(request: web_request.Request, etag: str, **kwargs) -> web.Response:
+    """304 if the client's copy is current, otherwise the full response tagged with its ETag"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request, etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(headers=headers, **kwargs)
+
+def prerender_rankings():
+    """Render the table rows of every page in the current snapshot"""
+    snapshots = get_ranking_snapshots()
+    if not snapshots.taken_at:
+        return
+    taken_at = datetime.fromisoformat(snapshots.taken_at).replace(tzinfo=timezone.utc)
+    for snapshot in snapshots.pages.values():
+        if not snapshot.html:
+            snapshot.html = build_rankings_html(snapshot.rows, taken_at)
+
+def build_rankings_html(rankings, now: datetime):
     """Build HTML for rankings list"""
     if not rankings:
         return '<div class="no-data">No rankings data available</div>'
     
     html = ""
-    for i, rank in enumerate(rankings):
-        rank_num = i + 1
-        is_current = rank['id'] == current_char_id
-        row_class = 'current-player' if is_current else ''
-        
-        # Handle sqlite3.Row objects properly
-        total_power = rank['total_power'] if 'total_power' in rank.keys() else 0
-        
-        # Simulate realistic online status
-        import random
-        online_status_options = ["Online", "1 min ago", "5 min ago", "15 min ago", "1 hour ago", "2 hours ago", "1 day ago", "3 days ago", "1 week ago"]
-        # Current player and top players more likely to be online
-        if is_current:
-            status = "Online"
-        elif rank_num <= 3:
-            status = random.choice(online_status_options[:4])  # More likely recent
-        else:
-            status = random.choice(online_status_options)
-        
+    for rank in rankings:
         html += f"""
-        <tr class="{row_class}">
-            <td class="rank">#{rank_num}</td>
+        <tr data-character-id="{rank['character_id']}">
+            <td class="rank">#{rank['rank']:,}</td>
             <td class="name">
-                <a href="/character/{rank['id']}">{rank['name']}</a>
+                <a href="/character/{rank['character_id']}">{rank['name']}</a>
             </td>
             <td class="class">{rank['class_name']}</td>
-            <td class="power">{total_power:,}</td>
+            <td class="power">{rank['value']:,}</td>
             <td class="level">{rank['level']}</td>
-            <td class="last-active">{status}</td>
+            <td class="last-active">{format_last_active(rank['last_active'], now)}</td>
         </tr>
         """
     
     return html
 
+def build_crew_rankings_html(rankings):
+    """Build HTML for a crew rankings list"""
+    if not rankings:
+        return '<div class="no-data">No rankings data available</div>'
+    
+    html = ""
+    for rank in rankings:
+        value = f"{rank['value']:,.1f}" if isinstance(rank['value'], float) else f"{rank['value']:,}"
+        html += f"""
+        <tr>
+            <td class="rank">#{rank['rank']:,}</td>
+            <td class="name">{rank['name']}</td>
+            <td class="class">{rank['leader_name']}</td>
+            <td class="power">{value}</td>
+            <td class="level">{rank['members']}</td>
+            <td class="level">{rank['average_level']}</td>
+        </tr>
+        """
+    
+    return html
+
+def format_last_active(last_active, now: datetime) -> str:
+    """How long before now a character was last active"""
+    if not last_active:
+        return "Never"
+    seconds = (now - datetime.fromisoformat(str(last_active)).replace(tzinfo=timezone.utc)).total_seconds()
+    if seconds < 300:
+        return "Online"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} hours ago"
+    return f"{int(seconds // 86400)} days ago"
+
+def build_pager_html(ranking_type, page, last_page, my_page=None):
+    """Previous/next links, the page count and a jump to the viewer's own page"""
+    links = []
+    if page > 1:
+        links.append(f'<a href="/rankings?type={ranking_type}&page=1">« First</a>')
+        links.append(f'<a href="/rankings?type={ranking_type}&page={page - 1}">‹ Prev</a>')
+    links.append(f'<span class="current">Page {page:,} of {last_page:,}</span>')
+    if page < last_page:
+        links.append(f'<a href="/rankings?type={ranking_type}&page={page + 1}">Next ›</a>')
+        links.append(f'<a href="/rankings?type={ranking_type}&page={last_page}">Last »</a>')
+    if my_page and my_page != page:
+        links.append(f'<a href="/rankings?type={ranking_type}&page={my_page}">Find Me</a>')
+    return f'<div class="pager">{"".join(links)}</div>'
+
 def get_ranking_column_header(ranking_type):
     """Get the appropriate column header for ranking type"""
     headers = {
@@ -269,6 +391,10 @@ def get_ranking_column_header(ranking_type):
         'level': 'Level', 
         'experience': 'Experience',
         'gold': 'Gold',
-        'wilderness': 'Wilderness Level'
+        'wilderness': 'Wilderness Level',
+        'crew_power': 'Total Power',
+        'crew_level': 'Average Level',
+        'crew_members': 'Members',
+        'crew_pvp': 'PvP Wins'
     }
     return headers.get(ranking_type, 'Power')
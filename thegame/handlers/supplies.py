@@ -4,6 +4,7 @@ import random
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.leaderboards import refresh_characters
 
 async def supplies_main(request: web_request.Request):
     """Supplies shop interface"""
@@ -353,6 +354,7 @@ async def buy_supplies(request: web_request.Request):
             await conn.execute('UPDATE characters SET gold = gold - ? WHERE id = ?', 
                              (total_price, character.id))
             await conn.commit()
+            await refresh_characters(conn, [character.id])
         
         return web.Response(text="Purchase successful")
         
@@ -0,0 +1,244 @@
+from aiohttp import web, web_request, WSMsgType
+import asyncio
+import json
+from html import escape
+
+from database import get_db
+from handlers.auth import require_login
+from handlers.character import get_current_character
+from services.character_cache import resolve_names
+from services.trade import get_trade_desk, TradeError
+
+async def start_trade(request: web_request.Request):
+    """Open a trade window with another player"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    try:
+        partner_id = int(request.match_info['character_id'])
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid character ID")
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        if not await database.queries.get_character_by_id(conn, character_id=partner_id):
+            raise web.HTTPNotFound(text="Character not found")
+    
+    try:
+        get_trade_desk().open(character.id, partner_id)
+    except TradeError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    
+    raise web.HTTPFound('/trade')
+
+async def trade_page(request: web_request.Request):
+    """The trade window; its state arrives over /ws/trade"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    session = get_trade_desk().session_for(character.id)
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        inventory = await database.queries.get_sellable_inventory(conn, character_id=character.id)
+        partner_id = session.partner_of(character.id) if session else None
+        names = await resolve_names(conn, [partner_id])
+    
+    inventory_html = ""
+    for item in inventory:
+        inventory_html += f"""
+        <div class="row">
+            <span style="color: {item['color']}; flex: 1;">{escape(item['name'])}{f" x{item['quantity']}" if item['quantity'] > 1 else ""}</span>
+            <span class="meta">Transfers: {item['transfers_remaining']}</span>
+            <input type="number" id="qty-{item['id']}" value="1" min="1" max="{item['quantity']}" class="qty-input">
+            <button class="btn" onclick="stage({item['id']})">OFFER</button>
+        </div>
+        """
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Trade - Outwar</title>
+        <style>
+            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+            body {{ font-family: Arial, sans-serif; background: #1a1a1a; color: #ffffff; padding: 20px; }}
+            .panel {{ background: #2d2d2d; border: 1px solid #555; border-radius: 8px; padding: 20px; margin-bottom: 20px; }}
+            .panel-title {{ color: #4169e1; font-size: 18px; font-weight: bold; margin-bottom: 15px; }}
+            .offers {{ display: flex; gap: 20px; }}
+            .offers .panel {{ flex: 1; }}
+            .row {{ display: flex; gap: 15px; align-items: center; padding: 8px; border-bottom: 1px solid #444; }}
+            .meta {{ color: #ccc; font-size: 11px; }}
+            .gold {{ color: #ffd700; font-weight: bold; }}
+            .confirmed {{ color: #32cd32; font-weight: bold; }}
+            .qty-input {{ width: 70px; padding: 5px; background: #444; border: 1px solid #666; border-radius: 3px; color: white; }}
+            .btn {{ padding: 6px 12px; background: #4169e1; color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 11px; }}
+            .btn.confirm {{ background: #00aa00; }}
+            .btn.cancel {{ background: #aa3300; }}
+            .empty {{ color: #ccc; font-style: italic; }}
+            #message {{ color: #ff8800; margin-top: 10px; }}
+        </style>
+    </head>
+    <body>
+        <div class="panel">
+            <a href="/game" style="color: #88ccff;">← Back to Game</a>
+            <span style="float: right;">GOLD: {character.gold:,}</span>
+        </div>
+        <div class="panel" id="no-trade" style="{'display: none;' if session else ''}">
+            <div class="empty">You're not trading with anyone. Use TRADE on another player's profile to start.</div>
+        </div>
+        <div id="trade" style="{'' if session else 'display: none;'}">
+            <div class="offers">
+                <div class="panel">
+                    <div class="panel-title">YOUR OFFER <span id="you-confirmed"></span></div>
+                    <div id="you-items"></div>
+                    <div class="row">
+                        <span style="flex: 1;">Gold</span>
+                        <input type="number" id="gold-input" value="0" min="0" class="qty-input">
+                        <button class="btn" onclick="setGold()">SET</button>
+                    </div>
+                </div>
+                <div class="panel">
+                    <div class="panel-title">{escape(names.get(partner_id, 'THEIR'))}'S OFFER <span id="them-confirmed"></span></div>
+                    <div id="them-items"></div>
+                    <div class="row"><span style="flex: 1;">Gold</span><span class="gold" id="them-gold">0</span></div>
+                </div>
+            </div>
+            <div class="panel">
+                <button class="btn confirm" onclick="confirmTrade()">CONFIRM TRADE</button>
+                <button class="btn cancel" onclick="send({{action: 'cancel'}})">CANCEL</button>
+                <div id="message"></div>
+            </div>
+            <div class="panel">
+                <div class="panel-title">YOUR TRADEABLE ITEMS</div>
+                {inventory_html or '<div class="empty">No tradeable items in your inventory.</div>'}
+            </div>
+        </div>
+        
+        <script>
+        let version = 0;
+        const socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/trade');
+        
+        function send(message) {{
+            socket.send(JSON.stringify(message));
+        }}
+        
+        function stage(inventoryId) {{
+            send({{action: 'stage', inventory_id: inventoryId, quantity: parseInt(document.getElementById('qty-' + inventoryId).value)}});
+        }}
+        
+        function setGold() {{
+            send({{action: 'gold', amount: parseInt(document.getElementById('gold-input').value) || 0}});
+        }}
+        
+        function confirmTrade() {{
+            send({{action: 'confirm', version: version}});
+        }}
+        
+        function renderItems(element, items, removable) {{
+            element.innerHTML = '';
+            if (!items.length) {{
+                element.innerHTML = '<div class="empty">Nothing offered.</div>';
+            }}
+            items.forEach(item => {{
+                const row = document.createElement('div');
+                row.className = 'row';
+                const name = document.createElement('span');
+                name.style.flex = '1';
+                name.style.color = item.color;
+                name.textContent = item.name + (item.quantity > 1 ? ' x' + item.quantity : '');
+                row.appendChild(name);
+                if (removable) {{
+                    const button = document.createElement('button');
+                    button.className = 'btn cancel';
+                    button.textContent = 'REMOVE';
+                    button.onclick = () => send({{action: 'unstage', inventory_id: item.inventory_id}});
+                    row.appendChild(button);
+                }}
+                element.appendChild(row);
+            }});
+        }}
+        
+        socket.onmessage = function(event) {{
+            const data = JSON.parse(event.data);
+            const message = document.getElementById('message');
+            if (data.type === 'error') {{
+                message.textContent = data.message;
+                return;
+            }}
+            document.getElementById('no-trade').style.display = 'none';
+            document.getElementById('trade').style.display = '';
+            version = data.version;
+            renderItems(document.getElementById('you-items'), data.you.items, data.status === 'open');
+            renderItems(document.getElementById('them-items'), data.them.items, false);
+            document.getElementById('them-gold').textContent = data.them.gold.toLocaleString();
+            document.getElementById('you-confirmed').textContent = data.you.confirmed ? '✔ CONFIRMED' : '';
+            document.getElementById('them-confirmed').textContent = data.them.confirmed ? '✔ CONFIRMED' : '';
+            document.getElementById('you-confirmed').className = document.getElementById('them-confirmed').className = 'confirmed';
+            message.textContent = data.message;
+            if (data.status !== 'open') {{
+                setTimeout(() => location.reload(), 1500);
+            }}
+        }};
+        </script>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+async def trade_feed(request: web_request.Request):
+    """WebSocket for the trade window: pushes session state, takes trade actions"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    
+    desk = get_trade_desk()
+    queue = desk.subscribe(character.id)
+    
+    async def send_updates():
+        while True:
+            await ws.send_json(await queue.get())
+    
+    sender = asyncio.create_task(send_updates())
+    try:
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                await handle_trade_action(character.id, json.loads(message.data))
+            except TradeError as e:
+                await ws.send_json({'type': 'error', 'message': str(e)})
+            except (ValueError, KeyError, TypeError):
+                await ws.send_json({'type': 'error', 'message': "Invalid trade action"})
+    finally:
+        sender.cancel()
+        desk.unsubscribe(character.id, queue)
+    
+    return ws
+
+async def handle_trade_action(character_id: int, action: dict):
+    """Apply one action sent from a trade window"""
+    desk = get_trade_desk()
+    kind = action['action']
+    if kind == 'stage':
+        await desk.stage_item(character_id, int(action['inventory_id']), int(action['quantity']))
+    elif kind == 'unstage':
+        await desk.unstage_item(character_id, int(action['inventory_id']))
+    elif kind == 'gold':
+        await desk.set_gold(character_id, int(action['amount']))
+    elif kind == 'confirm':
+        await desk.confirm(character_id, int(action['version']))
+    elif kind == 'cancel':
+        desk.cancel(character_id)
+    else:
+        raise ValueError(kind)
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.leaderboards import refresh_characters
 
 async def treasury_main(request: web_request.Request):
     """Treasury interface for character banking and investments"""
@@ -550,6 +551,7 @@ async def handle_banking(request: web_request.Request):
                                  (amount, character.id))
             
             await conn.commit()
+            await refresh_characters(conn, [character.id])
         
         return web.Response(text="Transaction successful")
         
@@ -581,6 +583,7 @@ async def handle_investment(request: web_request.Request):
             await conn.execute('UPDATE characters SET gold = gold - ? WHERE id = ?', 
                              (amount, character.id))
             await conn.commit()
+            await refresh_characters(conn, [character.id])
         
         return web.Response(text="Investment successful")
         
@@ -610,6 +613,7 @@ async def handle_insurance(request: web_request.Request):
             await conn.execute('UPDATE characters SET gold = gold - ? WHERE id = ?', 
                              (premium, character.id))
             await conn.commit()
+            await refresh_characters(conn, [character.id])
         
         return web.Response(text="Insurance purchased successfully")
         
@@ -1,10 +1,15 @@
 from aiohttp import web, web_request
+import asyncio
 from typing import Dict, List
 import random
 
 from database import get_db
 from handlers.auth import require_login
 from handlers.character import get_current_character
+from services.mob_world import get_mob_world
+from services.presence import get_presence
+from services.search import search_mobs
+from services.target_finder import get_target_index
 
 async def game_main(request: web_request.Request):
     """Main game interface - Outwar style"""
@@ -52,26 +57,24 @@ async def game_main(request: web_request.Request):
             </div>
             """
     
-    # Add some sample NPCs for better UI demonstration
-    sample_npcs = [
-        {"name": "High Roller", "level": 20},
-        {"name": "High Roller", "level": 20},
-        {"name": "High Roller", "level": 20},
-        {"name": "High Roller", "level": 20},
-        {"name": "The Boss", "level": 22, "special": True}
-    ]
-    
-    for npc in sample_npcs:
-        action_btn = "RAID!" if npc.get("special") else "ATTACK"
-        btn_class = "btn-raid" if npc.get("special") else "btn-attack"
+    # Live mobs in this room
+    for mob in get_mob_world().mobs_in_room(character.current_room_id):
+        if mob.template.is_raid_boss:
+            action_html = f"""<form method="post" action="/raids/form/{mob.id}" style="display: inline;">
+                    <button type="submit" class="btn-raid">RAID!</button>
+                </form>"""
+        else:
+            action_html = f"""<form method="post" action="/attack/mob/{mob.id}" style="display: inline;">
+                    <button type="submit" class="btn-attack">ATTACK</button>
+                </form>"""
         npcs_html += f"""
-        <div class="npc-entry">
+        <div class="npc-entry" data-mob-id="{mob.id}">
             <div class="npc-info">
                 <span class="npc-icon">👤</span>
-                <span class="npc-name">{npc['name']}</span>
+                <span class="npc-name">{mob.name}</span>
             </div>
-            <div class="npc-level">Level {npc['level']}</div>
-            <button class="{btn_class}">{action_btn}</button>
+            <div class="npc-level">Level {mob.level} <span class="mob-hp">{mob.hit_points_current}/{mob.hit_points_max}</span></div>
+            {action_html}
         </div>
         """
     
@@ -276,6 +279,7 @@ async def game_main(request: web_request.Request):
                                 <button class="action-btn" onclick="window.location.href='/treasury'">Treasury</button>
                                 <button class="action-btn" onclick="window.location.href='/challenges'">Dungeons</button>
                                 <button class="action-btn" onclick="window.location.href='/wilderness'">Wilderness</button>
+                                <button class="action-btn" onclick="window.location.href='/targets'">Find Fight</button>
                             </div>
                             
                             <div class="npc-list">
@@ -328,7 +332,8 @@ async def game_main(request: web_request.Request):
             <div class="right-sidebar">
                 <div class="quest-helper" onclick="window.location.href='/quests'" style="cursor: pointer;">
                     <div class="quest-header">QUEST HELPER</div>
-                    <input type="text" class="quest-search" placeholder="Search for a Quest Mob">
+                    <input type="text" class="quest-search" placeholder="Search for a Quest Mob" onclick="event.stopPropagation()" oninput="searchMobs(this.value)">
+                    <div id="mobResults" style="font-size: 10px; margin-bottom: 10px;"></div>
                     <div class="quest-target">
                         <div>🧙 Current Target</div>
                         <div style="margin: 10px 0;">
@@ -343,6 +348,26 @@ async def game_main(request: web_request.Request):
         </div>
         
         <script>
+        let mobSearchTimer = null;
+        function searchMobs(query) {{
+            clearTimeout(mobSearchTimer);
+            mobSearchTimer = setTimeout(() => {{
+                const results = document.getElementById('mobResults');
+                if (!query.trim()) {{
+                    results.innerHTML = '';
+                    return;
+                }}
+                fetch('/api/search/mobs?q=' + encodeURIComponent(query))
+                .then(response => response.json())
+                .then(data => {{
+                    results.innerHTML = data.results.length ? data.results.map(mob =>
+                        `<div style="margin: 4px 0;"><b>${{mob.name}}</b> (Lv${{mob.level}}${{mob.raid_boss ? ', raid boss' : ''}})` +
+                        `<br><span style="color: #ccc;">${{mob.rooms.join(', ') || 'No spawn room'}}</span></div>`
+                    ).join('') : '<div style="color: #ccc;">No mobs found</div>';
+                }});
+            }}, 200);
+        }}
+        
         function showActionsMenu() {{
             const actions = [
                 'Equipment Manager',
@@ -600,12 +625,89 @@ async def game_main(request: web_request.Request):
                 }}
             }}
         }});
+        
+        // Live mob updates for this room
+        (function() {{
+            const roomId = {character.current_room_id};
+            const characterId = {character.id};
+            const list = document.querySelector('.npc-list');
+            const socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/room');
+            socket.onmessage = function(event) {{
+                const data = JSON.parse(event.data);
+                if (data.type !== 'mob') return;
+                let entry = list.querySelector('[data-mob-id="' + data.id + '"]');
+                if (data.room !== roomId || data.hp <= 0) {{
+                    if (entry) entry.remove();
+                    return;
+                }}
+                if (!entry) {{
+                    entry = document.createElement('div');
+                    entry.className = 'npc-entry';
+                    entry.dataset.mobId = data.id;
+                    entry.innerHTML = '<div class="npc-info"><span class="npc-icon">👤</span><span class="npc-name"></span></div>' +
+                        '<div class="npc-level">Level ' + data.level + ' <span class="mob-hp"></span></div>' +
+                        '<form method="post" action="/attack/mob/' + data.id + '" style="display: inline;"><button type="submit" class="btn-attack">ATTACK</button></form>';
+                    entry.querySelector('.npc-name').textContent = data.name;
+                    list.appendChild(entry);
+                }}
+                entry.querySelector('.mob-hp').textContent = data.hp + '/' + data.hp_max;
+                entry.querySelector('.npc-name').style.color = data.target === characterId ? '#ff4444' : '';
+            }};
+        }})();
         </script>
     </body>
     </html>
     """
     return web.Response(text=html, content_type='text/html')
 
+async def room_feed(request: web_request.Request):
+    """WebSocket stream of mob changes in the character's current room"""
+    await require_login(request)
+    character = await get_current_character(request)
+    
+    if not character:
+        raise web.HTTPFound('/characters')
+    
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    
+    presence = get_presence()
+    room_id = character.current_room_id
+    queue = presence.join(room_id, character.id)
+    
+    async def send_updates():
+        while True:
+            await ws.send_json(await queue.get())
+    
+    sender = asyncio.create_task(send_updates())
+    try:
+        # Nothing to read from the client; this just waits for it to go away
+        async for _ in ws:
+            pass
+    finally:
+        sender.cancel()
+        presence.leave(room_id, character.id, queue)
+    
+    return ws
+
+async def search_mobs_api(request: web_request.Request):
+    """Ranked mob search (JSON) for the quest helper"""
+    await require_login(request)
+    
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        mobs = await search_mobs(conn, request.query.get('q', ''))
+    
+    return web.json_response({'results': [
+        {'id': mob['id'], 'name': mob['name'], 'level': mob['level'], 'raid_boss': bool(mob['is_raid_boss']),
+         'rooms': mob['rooms'].split(', ') if mob['rooms'] else []}
+        for mob in mobs
+    ]})
+
+async def mob_metrics(request: web_request.Request):
+    """Mob AI tick timings and counters"""
+    return web.json_response(get_mob_world().snapshot_metrics())
+
 def generate_minimap(current_room_id, connections):
     """Generate street-based city minimap with walkable paths"""
     available_directions = [conn['direction'].lower() for conn in connections]
@@ -667,7 +769,7 @@ def generate_minimap(current_room_id, connections):
                     current_row += 1
                 elif current_row > dest_row:
                     current_row -= 1
-                    
+                
                 if current_col < dest_col:
                     current_col += 1
                 elif current_col > dest_col:
@@ -1001,10 +1103,13 @@ async def move_character(request: web_request.Request):
             await database.queries.move_character(conn, room_id=target_room, character_id=character.id)
             await conn.commit()
             
+            character.current_room_id = target_room
+            get_target_index().update(character)
+            
             print(f"[MOVEMENT] Movement successful! Character now in room {target_room}")
         
         raise web.HTTPFound('/game')
-        
+    
     except Exception as e:
         print(f"[MOVEMENT ERROR] {type(e).__name__}: {e}")
         raise
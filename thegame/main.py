@@ -3,10 +3,20 @@ import aiohttp_session
 from aiohttp_session import SimpleCookieStorage
 import asyncio
 import secrets
+import signal
 from pathlib import Path
 
 from database import init_database, get_db
-from handlers import auth, character, world, crew, combat, marketplace, rankings, casino, challenges, wilderness, factions, supplies, treasury, quests
+from services.mob_world import get_mob_world, load_mob_world, TICK_SECONDS
+from services.raid_engine import get_raid_engine, load_raid_engine, RAID_TICK_SECONDS
+from services.auction_house import get_auction_house, load_auction_house, AUCTION_TICK_SECONDS
+from services.catalog import get_catalog, load_catalog
+from services.crew_chat import get_crew_chat, load_crew_chat, CHAT_FLUSH_SECONDS
+from services.leaderboards import load_leaderboards
+from services.ranking_history import get_ranking_history, load_ranking_history, HISTORY_INTERVAL_SECONDS
+from services.ranking_snapshots import get_ranking_snapshots, load_ranking_snapshots, SNAPSHOT_INTERVAL_SECONDS
+from services.target_finder import load_target_index
+from handlers import auth, character, world, crew, combat, marketplace, rankings, casino, challenges, wilderness, factions, supplies, treasury, quests, raids, trade
 
 @web.middleware
 async def error_middleware(request, handler):
@@ -55,6 +65,17 @@ async def init_app():
     
     # Initialize database
     await init_database()
+    await load_catalog()
+    await load_mob_world()
+    await load_raid_engine()
+    await load_auction_house()
+    await load_crew_chat()
+    await load_target_index()
+    await load_leaderboards()
+    await load_ranking_snapshots()
+    rankings.prerender_rankings()
+    await load_ranking_history()
+    app.on_cleanup.append(save_buffered_writes)
     
     # Setup routes
     app.router.add_routes([
@@ -71,6 +92,7 @@ async def init_app():
         web.get('/character/create', character.create_character_page),
         web.post('/character/create', character.create_character),
         web.get('/character/{character_id}', character.character_detail),
+        web.get('/character/{character_id}/history', character.character_history),
         web.post('/character/{character_id}/select', character.select_character),
         
         # Game world
@@ -82,22 +104,44 @@ async def init_app():
         web.get('/inventory', character.inventory),
         web.post('/equip/{item_id}', character.equip_item),
         web.post('/unequip/{slot_id}', character.unequip_item),
+        web.post('/loadouts', character.save_current_loadout),
+        web.post('/loadouts/{loadout_id}/equip', character.equip_loadout),
+        web.post('/loadouts/{loadout_id}/delete', character.remove_loadout),
         
         # Combat
         web.post('/attack/{target_id}', combat.attack_player),
+        web.post('/attack/mob/{mob_id}', combat.attack_mob),
+        web.get('/targets', combat.find_targets),
+        web.get('/ws/room', world.room_feed),
+        web.get('/ws/trade', trade.trade_feed),
+        web.get('/ws/crew/chat', crew.crew_chat_feed),
+        web.get('/api/mobs/metrics', world.mob_metrics),
+        web.get('/api/search/mobs', world.search_mobs_api),
         web.get('/combat/history', combat.combat_history),
+        web.get('/combat/replay/{combat_log_id}', combat.combat_replay),
         
         # Crew system
         web.get('/crew', crew.crew_main),
         web.get('/crew/create', crew.create_crew_page),
         web.post('/crew/create', crew.create_crew),
         web.post('/crew/{crew_id}/join', crew.join_crew),
+        web.post('/crew/leave', crew.leave_crew),
         web.get('/crew/vault', crew.crew_vault),
+        web.post('/crew/vault/deposit/{inventory_id}', crew.deposit_to_vault),
+        web.post('/crew/vault/withdraw/{vault_item_id}', crew.withdraw_from_vault),
+        web.post('/crew/vault/award/{vault_item_id}', crew.award_from_vault),
         
         # Marketplace system
         web.get('/marketplace', marketplace.marketplace_main),
         web.post('/marketplace/buy/{listing_id}', marketplace.buy_item),
+        web.get('/api/search/items', marketplace.search_items_api),
+        web.get('/api/market/items/{item_id}/prices', marketplace.price_history_api),
+        web.get('/api/market/metrics', marketplace.listing_cache_metrics),
+        web.get('/marketplace/sell', marketplace.sell_page),
         web.post('/marketplace/sell', marketplace.sell_item),
+        web.post('/marketplace/cancel/{listing_id}', marketplace.cancel_listing),
+        web.get('/marketplace/auctions', marketplace.auctions_page),
+        web.post('/marketplace/bid/{auction_id}', marketplace.place_bid),
         
         # Rankings system
         web.get('/rankings', rankings.rankings_main),
@@ -111,6 +155,17 @@ async def init_app():
         web.post('/challenges/start/{challenge_id}', challenges.start_challenge),
         web.post('/challenges/claim/{challenge_id}', challenges.claim_reward),
         
+        # Raids
+        web.post('/raids/form/{mob_id}', raids.form_raid),
+        web.post('/raids/join/{raid_id}', raids.join_raid),
+        web.post('/raids/{raid_id}/launch', raids.launch_raid),
+        web.post('/raids/{raid_id}/attack', raids.raid_attack),
+        web.get('/raids/{raid_id}', raids.raid_page),
+        
+        # Player-to-player trade
+        web.get('/trade', trade.trade_page),
+        web.post('/trade/with/{character_id}', trade.start_trade),
+        
         # Wilderness exploration
         web.get('/wilderness', wilderness.wilderness_main),
         web.post('/wilderness/explore', wilderness.explore_wilderness),
@@ -179,12 +234,119 @@ async def heal_characters():
         # Heal every 5 minutes
         await asyncio.sleep(300)
 
+async def archive_combat_logs():
+    """Move old combat logs to the archive database once a day"""
+    from services.combat_retention import archive_combat_logs as run_archive
+    while True:
+        try:
+            archived = await run_archive()
+            if archived:
+                print(f"Archived {archived} combat log rows")
+        except Exception as e:
+            print(f"Error archiving combat logs: {e}")
+        
+        # Archive once a day
+        await asyncio.sleep(86400)
+
+async def tick_mobs():
+    """Advance mob AI and respawns on a fixed step"""
+    while True:
+        try:
+            strikes = get_mob_world().tick()
+            if strikes:
+                database = await get_db()
+                async with database.get_connection_context() as conn:
+                    await database.queries.apply_mob_damage(conn, [
+                        {'character_id': character_id, 'damage': damage} for _, character_id, damage in strikes
+                    ])
+        except Exception as e:
+            print(f"Error ticking mobs: {e}")
+        
+        await asyncio.sleep(TICK_SECONDS)
+
+async def tick_raids():
+    """Resolve queued raid attacks and checkpoint raid state"""
+    while True:
+        try:
+            await get_raid_engine().tick()
+        except Exception as e:
+            print(f"Error ticking raids: {e}")
+        
+        await asyncio.sleep(RAID_TICK_SECONDS)
+
+async def tick_auctions():
+    """Close finished auctions and write out the bid log"""
+    while True:
+        try:
+            await get_auction_house().tick()
+        except Exception as e:
+            print(f"Error ticking auctions: {e}")
+        
+        await asyncio.sleep(AUCTION_TICK_SECONDS)
+
+async def flush_crew_chat():
+    """Write out crew chat messages in batches"""
+    while True:
+        try:
+            await get_crew_chat().flush()
+        except Exception as e:
+            print(f"Error saving crew chat: {e}")
+        
+        await asyncio.sleep(CHAT_FLUSH_SECONDS)
+
+async def save_buffered_writes(app):
+    """Write out chat messages and auction bids still held in memory before the server stops"""
+    for name, flush in (("crew chat", get_crew_chat().flush), ("auction bids", get_auction_house().tick)):
+        try:
+            await flush(force=True)
+        except Exception as e:
+            print(f"Error saving {name} on shutdown: {e}")
+
+async def snapshot_rankings():
+    """Materialize the ranking ladders and pre-render their pages"""
+    while True:
+        # init_app already loaded (or took) a snapshot
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            await get_ranking_snapshots().take()
+            rankings.prerender_rankings()
+        except Exception as e:
+            print(f"Error snapshotting rankings: {e}")
+
+async def record_ranking_history():
+    """Append each character's daily rank sample"""
+    while True:
+        try:
+            recorded = await get_ranking_history().record()
+            if recorded:
+                print(f"Recorded ranking history for {recorded} characters")
+        except Exception as e:
+            print(f"Error recording ranking history: {e}")
+        
+        await asyncio.sleep(HISTORY_INTERVAL_SECONDS)
+
+async def reload_catalog():
+    """Pick up edits to the static tables without a restart (kill -HUP)"""
+    try:
+        await load_catalog()
+        print(f"Catalog reloaded (version {get_catalog().version})")
+    except Exception as e:
+        print(f"Error reloading catalog: {e}")
+
 async def main():
     app = await init_app()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(reload_catalog()))
     
     # Start background tasks
     asyncio.create_task(cleanup_sessions())
     asyncio.create_task(heal_characters())
+    asyncio.create_task(archive_combat_logs())
+    asyncio.create_task(tick_mobs())
+    asyncio.create_task(tick_raids())
+    asyncio.create_task(tick_auctions())
+    asyncio.create_task(flush_crew_chat())
+    asyncio.create_task(snapshot_rankings())
+    asyncio.create_task(record_ranking_history())
     
     # Run the web application
     runner = web.AppRunner(app)
@@ -193,11 +355,15 @@ async def main():
     print("Starting server at http://localhost:8082")
     await site.start()
     
-    # Keep running
+    # Keep running until Ctrl-C or SIGTERM, then shut down cleanly so buffered writes are saved
+    stop = asyncio.get_running_loop().create_future()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.cancel)
     try:
-        await asyncio.Future()  # Run forever
-    except KeyboardInterrupt:
+        await stop
+    except (KeyboardInterrupt, asyncio.CancelledError):
         pass
+    finally:
+        await runner.cleanup()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
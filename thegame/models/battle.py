@@ -0,0 +1,192 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import random
+import secrets
+import struct
+
+# Bump whenever the round rules below change, so stored replays keep
+# regenerating with the rules they were fought under.
+ENGINE_VERSION = 1
+MAX_ROUNDS = 25
+CRIT_MULTIPLIER = 2
+
+# version, seed, max rounds
+_HEADER = struct.Struct('<BIB')
+# id, level, hp, hp max, attack, chaos, vile, 5 elemental damages,
+# 5 resistances, crit and rampage in hundredths of a percent, flags
+_COMBATANT = struct.Struct('<IH15iHHB')
+_FLAG_CAN_STRIKE = 0x01
+
+@dataclass
+class Combatant:
+    """Stat snapshot of one side of a battle, taken when the fight starts"""
+    id: int
+    level: int
+    hit_points: int
+    hit_points_max: int
+    attack: int
+    chaos_damage: int = 0
+    vile_damage: int = 0
+    fire_damage: int = 0
+    kinetic_damage: int = 0
+    arcane_damage: int = 0
+    holy_damage: int = 0
+    shadow_damage: int = 0
+    fire_resist: int = 0
+    kinetic_resist: int = 0
+    arcane_resist: int = 0
+    holy_resist: int = 0
+    shadow_resist: int = 0
+    critical_hit_percent: float = 0.0
+    rampage_percent: float = 0.0
+    can_strike: bool = True
+    
+    @classmethod
+    def from_character(cls, character, critical_hit_percent: float = 0.0,
+                       rampage_percent: float = 0.0, can_strike: bool = True) -> 'Combatant':
+        """Snapshot a Character (class bonuses applied) for the battle engine"""
+        return cls(
+            id=character.id,
+            level=character.level,
+            hit_points=character.hit_points_current,
+            hit_points_max=character.hit_points_max,
+            attack=character.get_effective_attack(),
+            chaos_damage=character.chaos_damage,
+            vile_damage=character.vile_damage,
+            fire_damage=character.fire_damage,
+            kinetic_damage=character.kinetic_damage,
+            arcane_damage=character.arcane_damage,
+            holy_damage=character.holy_damage,
+            shadow_damage=character.shadow_damage,
+            fire_resist=character.fire_resist,
+            kinetic_resist=character.kinetic_resist,
+            arcane_resist=character.arcane_resist,
+            holy_resist=character.holy_resist,
+            shadow_resist=character.shadow_resist,
+            # Stored as hundredths of a percent; round now so the live fight
+            # and every later replay see exactly the same numbers
+            critical_hit_percent=round(min(critical_hit_percent, 100.0), 2),
+            rampage_percent=round(min(rampage_percent, 100.0), 2),
+            can_strike=can_strike
+        )
+    
+    def pack(self) -> bytes:
+        return _COMBATANT.pack(
+            self.id, self.level, self.hit_points, self.hit_points_max, self.attack,
+            self.chaos_damage, self.vile_damage,
+            self.fire_damage, self.kinetic_damage, self.arcane_damage, self.holy_damage, self.shadow_damage,
+            self.fire_resist, self.kinetic_resist, self.arcane_resist, self.holy_resist, self.shadow_resist,
+            round(self.critical_hit_percent * 100), round(self.rampage_percent * 100),
+            _FLAG_CAN_STRIKE if self.can_strike else 0
+        )
+    
+    @classmethod
+    def unpack(cls, data: bytes) -> 'Combatant':
+        values = list(_COMBATANT.unpack(data))
+        flags = values.pop()
+        rampage = values.pop() / 100
+        crit = values.pop() / 100
+        return cls(*values, critical_hit_percent=crit, rampage_percent=rampage,
+                   can_strike=bool(flags & _FLAG_CAN_STRIKE))
+
+ATTACKER = 0
+DEFENDER = 1
+
+@dataclass
+class Strike:
+    """One hit in a battle; side is who struck (ATTACKER or DEFENDER)"""
+    round: int
+    side: int
+    damage: int
+    critical: bool = False
+    rampage: bool = False
+    target_hp_after: int = 0
+
+@dataclass
+class BattleResult:
+    seed: int
+    attacker: Combatant
+    defender: Combatant
+    strikes: List[Strike] = field(default_factory=list)
+    rounds: int = 0
+    attacker_hp: int = 0
+    defender_hp: int = 0
+    winner_side: Optional[int] = None
+    
+    @property
+    def winner_id(self) -> Optional[int]:
+        if self.winner_side is None:
+            return None
+        return self.attacker.id if self.winner_side == ATTACKER else self.defender.id
+    
+    def damage_dealt_by(self, side: int) -> int:
+        return sum(s.damage for s in self.strikes if s.side == side)
+
+def new_seed() -> int:
+    return secrets.randbits(32)
+
+def _roll_damage(rng: random.Random, source: Combatant, target: Combatant) -> int:
+    """Same formula as Character.calculate_damage_to, drawing from the battle RNG"""
+    elemental = (max(0, source.fire_damage - target.fire_resist) +
+                 max(0, source.kinetic_damage - target.kinetic_resist) +
+                 max(0, source.arcane_damage - target.arcane_resist) +
+                 max(0, source.holy_damage - target.holy_resist) +
+                 max(0, source.shadow_damage - target.shadow_resist))
+    total = source.attack + elemental + source.chaos_damage + source.vile_damage
+    return int(total * rng.uniform(0.8, 1.2))
+
+def run_battle(seed: int, attacker: Combatant, defender: Combatant, max_rounds: int = MAX_ROUNDS) -> BattleResult:
+    """Fight until one side drops or the round cap is hit.
+    
+    Every random draw comes from a Random seeded with `seed`, so the same seed
+    and snapshots always produce the same strikes.
+    """
+    rng = random.Random(seed)
+    sides = (attacker, defender)
+    hp = [attacker.hit_points, defender.hit_points]
+    result = BattleResult(seed=seed, attacker=attacker, defender=defender)
+    
+    def strike(rnd: int, side: int, rampage: bool = False):
+        source, target = sides[side], sides[1 - side]
+        damage = _roll_damage(rng, source, target)
+        critical = rng.random() * 100 < source.critical_hit_percent
+        if critical:
+            damage *= CRIT_MULTIPLIER
+        damage = min(max(1, damage), hp[1 - side])
+        hp[1 - side] -= damage
+        result.strikes.append(Strike(rnd, side, damage, critical, rampage, hp[1 - side]))
+        
+        # A rampage grants one immediate follow-up hit (never chains)
+        if not rampage and hp[1 - side] > 0 and rng.random() * 100 < source.rampage_percent:
+            strike(rnd, side, rampage=True)
+    
+    for rnd in range(1, max_rounds + 1):
+        result.rounds = rnd
+        strike(rnd, ATTACKER)
+        if hp[DEFENDER] <= 0:
+            break
+        if defender.can_strike:
+            strike(rnd, DEFENDER)
+            if hp[ATTACKER] <= 0:
+                break
+    
+    result.attacker_hp, result.defender_hp = hp
+    if result.defender_hp <= 0:
+        result.winner_side = ATTACKER
+    elif result.attacker_hp <= 0:
+        result.winner_side = DEFENDER
+    return result
+
+def encode_replay(seed: int, attacker: Combatant, defender: Combatant, max_rounds: int = MAX_ROUNDS) -> bytes:
+    """Everything needed to regenerate a battle, in a fixed-size record"""
+    return _HEADER.pack(ENGINE_VERSION, seed, max_rounds) + attacker.pack() + defender.pack()
+
+def decode_replay(payload: bytes) -> BattleResult:
+    """Re-run a stored battle from its seed and stat snapshot"""
+    version, seed, max_rounds = _HEADER.unpack_from(payload)
+    if version != ENGINE_VERSION:
+        raise ValueError(f"Unsupported battle engine version {version}")
+    offset = _HEADER.size
+    attacker = Combatant.unpack(payload[offset:offset + _COMBATANT.size])
+    defender = Combatant.unpack(payload[offset + _COMBATANT.size:offset + 2 * _COMBATANT.size])
+    return run_battle(seed, attacker, defender, max_rounds)
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+from models.battle import Combatant
+
+@dataclass
+class MobTemplate:
+    id: int
+    name: str
+    level: int = 1
+    hit_points: int = 100
+    attack: int = 10
+    chaos_damage: int = 0
+    critical_hit_percent: float = 0.0
+    rampage_percent: float = 0.0
+    experience_reward: int = 0
+    gold_reward: int = 0
+    respawn_seconds: int = 60
+    is_raid_boss: bool = False
+    description: Optional[str] = None
+    hit_points_regen: int = 0
+    aggressive: bool = False
+    wander_seconds: int = 0
+    
+    @classmethod
+    def from_db_row(cls, row: Dict[str, Any]) -> 'MobTemplate':
+        """Create MobTemplate from database row"""
+        import dataclasses
+        field_names = {f.name for f in dataclasses.fields(cls)}
+        return cls(**{k: v for k, v in dict(row).items() if k in field_names})
+
+class MobInstance:
+    """A live mob standing in a room.
+    
+    A thin view onto one row of the mob world's state array, so reads and
+    writes always see what the AI tick sees.
+    """
+    __slots__ = ('id', 'template', '_row')
+    
+    def __init__(self, mob_id: int, template: MobTemplate, row):
+        self.id = mob_id
+        self.template = template
+        self._row = row
+    
+    @property
+    def name(self) -> str:
+        return self.template.name
+    
+    @property
+    def level(self) -> int:
+        return self.template.level
+    
+    @property
+    def hit_points_max(self) -> int:
+        return self.template.hit_points
+    
+    @property
+    def hit_points_current(self) -> int:
+        return int(self._row['hp'])
+    
+    @property
+    def room_id(self) -> int:
+        return int(self._row['room'])
+    
+    @property
+    def target_id(self) -> Optional[int]:
+        target = int(self._row['target'])
+        return target if target >= 0 else None
+    
+    def is_alive(self) -> bool:
+        return self.hit_points_current > 0
+    
+    def to_combatant(self) -> Combatant:
+        """Battle snapshot; keyed by template id so replays can name the mob"""
+        return Combatant(
+            id=self.template.id,
+            level=self.template.level,
+            hit_points=self.hit_points_current,
+            hit_points_max=self.template.hit_points,
+            attack=self.template.attack,
+            chaos_damage=self.template.chaos_damage,
+            critical_hit_percent=round(min(self.template.critical_hit_percent, 100.0), 2),
+            rampage_percent=round(min(self.template.rampage_percent, 100.0), 2)
+        )
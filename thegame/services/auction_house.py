@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from database import get_db
+from services.leaderboards import refresh_characters
+from services.timer_wheel import Timer, TimerWheel
+
+AUCTION_TICK_SECONDS = 1.0
+# Bid history and bid counts are written at most this often
+AUCTION_FLUSH_SECONDS = 5.0
+AUCTION_DURATIONS_HOURS = (1, 6, 12, 24, 48)
+# Default minimum raise: this fraction of the starting price (at least 1 gold)
+MIN_INCREMENT_FRACTION = 0.05
+
+class AuctionError(Exception):
+    """A bid or listing that isn't allowed"""
+
+@dataclass
+class Bid:
+    bidder_id: int
+    amount: int
+    placed_at: str
+
+@dataclass
+class Auction:
+    """An open auction. leader_id/leading_bid always match its auction_escrow row."""
+    id: int
+    seller_id: int
+    item_id: int
+    quantity: int
+    transfers_remaining: Optional[int]
+    item_name: str
+    level_requirement: int
+    start_price: int
+    min_increment: int
+    ends_at: datetime
+    leader_id: Optional[int] = None
+    leading_bid: int = 0
+    bids: List[Bid] = field(default_factory=list)
+    timer: Optional[Timer] = None
+    # Bids on one auction are placed one at a time, in arrival order
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    
+    @property
+    def minimum_bid(self) -> int:
+        return self.start_price if self.leader_id is None else self.leading_bid + self.min_increment
+    
+    def seconds_left(self, now: Optional[datetime] = None) -> int:
+        return max(0, int((self.ends_at - (now or _utcnow())).total_seconds()))
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _parse(timestamp: str) -> datetime:
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc)
+
+class AuctionHouse:
+    """Open auctions held in memory, closed by a timer wheel rather than by polling.
+    
+    Gold moves when a bid is placed: the new leader's bid is debited into
+    escrow and the player they outbid is refunded, in one transaction. The
+    bid log and counters follow in batches; settlement pays the seller (or
+    returns an unsold item) and delivers the item in one transaction.
+    """
+    
+    def __init__(self):
+        self.auctions: Dict[int, Auction] = {}
+        self.wheel = TimerWheel()
+        self._clock_start = time.monotonic()
+        self._last_flush = time.monotonic()
+        self._unsaved_bids: List[dict] = []
+        self._unsaved_counts: Dict[int, int] = {}
+    
+    def _current_tick(self) -> int:
+        return int((time.monotonic() - self._clock_start) / AUCTION_TICK_SECONDS)
+    
+    def _schedule(self, auction: Auction):
+        ticks = math.ceil(auction.seconds_left() / AUCTION_TICK_SECONDS)
+        auction.timer = self.wheel.schedule(ticks + self._current_tick() - self.wheel.current_tick, auction.id)
+    
+    def load(self, auctions, escrows, bids):
+        """Rebuild open auctions, their escrowed leaders and bid history"""
+        self.auctions.clear()
+        self.wheel = TimerWheel()
+        self._clock_start = time.monotonic()
+        for row in auctions:
+            auction = Auction(id=row['id'], seller_id=row['seller_id'], item_id=row['item_id'],
+                              quantity=row['quantity'], transfers_remaining=row['transfers_remaining'],
+                              item_name=row['item_name'], level_requirement=row['level_requirement'],
+                              start_price=row['start_price'], min_increment=row['min_increment'],
+                              ends_at=_parse(row['ends_at']))
+            self.auctions[auction.id] = auction
+            self._schedule(auction)
+        for row in escrows:
+            auction = self.auctions.get(row['auction_id'])
+            if auction:
+                auction.leader_id, auction.leading_bid = row['bidder_id'], row['amount']
+        for row in bids:
+            auction = self.auctions.get(row['auction_id'])
+            if auction:
+                auction.bids.append(Bid(row['bidder_id'], row['amount'], row['placed_at']))
+    
+    def get(self, auction_id: int) -> Optional[Auction]:
+        return self.auctions.get(auction_id)
+    
+    def ending_soonest(self) -> List[Auction]:
+        return sorted(self.auctions.values(), key=lambda auction: (auction.ends_at, auction.id))
+    
+    async def create(self, conn, seller_id: int, item, start_price: int, hours: int) -> Auction:
+        """Auction one unit of an inventory row (from get_inventory_row); the caller holds the transaction"""
+        if hours not in AUCTION_DURATIONS_HOURS:
+            raise AuctionError("Invalid auction duration")
+        if start_price <= 0:
+            raise AuctionError("Starting price must be positive")
+        
+        database = await get_db()
+        if not await database.queries.decrement_inventory_row(conn, inventory_id=item['id']):
+            await database.queries.delete_inventory_row(conn, inventory_id=item['id'])
+        ends_at = _utcnow() + timedelta(hours=hours)
+        min_increment = max(1, int(start_price * MIN_INCREMENT_FRACTION))
+        auction_id = await database.queries.create_auction(
+            conn, seller_id=seller_id, item_id=item['item_id'], transfers_remaining=item['transfers_remaining'],
+            start_price=start_price, min_increment=min_increment, ends_at=_timestamp(ends_at)
+        )
+        row = await database.queries.get_auction(conn, auction_id=auction_id)
+        auction = Auction(id=auction_id, seller_id=seller_id, item_id=item['item_id'], quantity=1,
+                          transfers_remaining=item['transfers_remaining'], item_name=row['item_name'],
+                          level_requirement=row['level_requirement'], start_price=start_price,
+                          min_increment=min_increment, ends_at=ends_at)
+        return auction
+    
+    def open(self, auction: Auction):
+        """Start taking bids, once the listing transaction has committed"""
+        self.auctions[auction.id] = auction
+        self._schedule(auction)
+    
+    async def bid(self, auction_id: int, bidder_id: int, amount: int) -> Auction:
+        """Place a bid; the bidder's gold goes into escrow and the previous leader is refunded"""
+        auction = self.auctions.get(auction_id)
+        if not auction:
+            raise AuctionError("This auction has ended")
+        
+        async with auction.lock:
+            # Re-check under the lock: the auction may have closed or moved on while we waited
+            if self.auctions.get(auction_id) is not auction or auction.seconds_left() == 0:
+                raise AuctionError("This auction has ended")
+            if bidder_id == auction.seller_id:
+                raise AuctionError("You can't bid on your own auction")
+            if amount < auction.minimum_bid:
+                raise AuctionError(f"The minimum bid is {auction.minimum_bid:,} gold")
+            
+            previous_id, previous_bid = auction.leader_id, auction.leading_bid
+            # Raising your own winning bid only escrows the difference
+            debit = amount - previous_bid if previous_id == bidder_id else amount
+            
+            database = await get_db()
+            async with database.get_connection_context() as conn:
+                async with database.transaction(conn):
+                    if not await database.queries.debit_gold(conn, character_id=bidder_id, amount=debit):
+                        raise AuctionError("Insufficient gold")
+                    if previous_id is not None and previous_id != bidder_id:
+                        await database.queries.credit_gold(conn, character_id=previous_id, amount=previous_bid)
+                    await database.queries.hold_auction_escrow(conn, auction_id=auction_id, bidder_id=bidder_id,
+                                                               amount=amount)
+                await refresh_characters(conn, [bidder_id] + ([previous_id] if previous_id else []))
+            
+            bid = Bid(bidder_id, amount, _timestamp(_utcnow()))
+            auction.leader_id, auction.leading_bid = bidder_id, amount
+            auction.bids.append(bid)
+            self._unsaved_bids.append({'auction_id': auction_id, 'bidder_id': bidder_id, 'amount': amount,
+                                       'placed_at': bid.placed_at})
+            self._unsaved_counts[auction_id] = len(auction.bids)
+        return auction
+    
+    async def tick(self, force: bool = False):
+        """Close auctions whose time is up and write out the bid log when it's due (or now, if forced)"""
+        ended = [self.auctions[auction_id] for auction_id in self.wheel.advance_to(self._current_tick())
+                 if auction_id in self.auctions]
+        flush_due = force or time.monotonic() - self._last_flush >= AUCTION_FLUSH_SECONDS
+        if not ended and not (flush_due and self._unsaved_bids):
+            return
+        
+        closing = []
+        for auction in ended:
+            # Wait out a bid that's mid-flight, then take the auction out of play
+            await auction.lock.acquire()
+            self.auctions.pop(auction.id, None)
+            closing.append(auction)
+        
+        bids, counts = self._unsaved_bids, self._unsaved_counts
+        self._unsaved_bids, self._unsaved_counts = [], {}
+        database = await get_db()
+        try:
+            async with database.get_connection_context() as conn:
+                async with database.transaction(conn):
+                    if bids:
+                        await database.queries.save_auction_bids(conn, bids)
+                        await database.queries.update_auction_bid_counts(conn, [
+                            {'auction_id': auction_id, 'bid_count': count} for auction_id, count in counts.items()
+                        ])
+                    for auction in closing:
+                        await self._settle(conn, auction)
+                await refresh_characters(conn, [auction.seller_id for auction in closing if auction.leader_id])
+        except Exception:
+            # Nothing was written: keep the bids for the next flush and retry the closings next tick
+            self._unsaved_bids = bids + self._unsaved_bids
+            for auction_id, count in counts.items():
+                self._unsaved_counts.setdefault(auction_id, count)
+            for auction in closing:
+                self.auctions[auction.id] = auction
+                auction.timer = self.wheel.schedule(1, auction.id)
+            raise
+        finally:
+            for auction in closing:
+                auction.lock.release()
+        self._last_flush = time.monotonic()
+    
+    async def _settle(self, conn, auction: Auction):
+        """Pay the seller out of escrow and deliver the item, or return it unsold"""
+        database = await get_db()
+        settled_at = _timestamp(_utcnow())
+        if auction.leader_id is None:
+            if not await database.queries.settle_auction(conn, auction_id=auction.id, status='expired',
+                                                         winner_id=None, final_price=None, settled_at=settled_at):
+                raise RuntimeError(f"Auction {auction.id} was already settled")
+            await database.queries.add_to_inventory(conn, character_id=auction.seller_id, item_id=auction.item_id,
+                                                    quantity=auction.quantity,
+                                                    transfers_remaining=auction.transfers_remaining)
+            return
+        
+        if not await database.queries.release_auction_escrow(conn, auction_id=auction.id, bidder_id=auction.leader_id):
+            raise RuntimeError(f"Auction {auction.id} has no escrow for its winning bid")
+        if not await database.queries.settle_auction(conn, auction_id=auction.id, status='sold',
+                                                     winner_id=auction.leader_id, final_price=auction.leading_bid,
+                                                     settled_at=settled_at):
+            raise RuntimeError(f"Auction {auction.id} was already settled")
+        await database.queries.credit_gold(conn, character_id=auction.seller_id, amount=auction.leading_bid)
+        await database.queries.record_market_trade(conn, item_id=auction.item_id, seller_id=auction.seller_id,
+                                                   buyer_id=auction.leader_id, quantity=auction.quantity,
+                                                   price=auction.leading_bid, source='auction')
+        # Winning an auction uses up one of the item's transfers, like a sale
+        transfers = auction.transfers_remaining
+        await database.queries.add_to_inventory(conn, character_id=auction.leader_id, item_id=auction.item_id,
+                                                quantity=auction.quantity,
+                                                transfers_remaining=None if transfers is None else transfers - 1)
+
+# Global auction house instance
+auction_house = AuctionHouse()
+
+def get_auction_house() -> AuctionHouse:
+    return auction_house
+
+async def load_auction_house():
+    """Restore open auctions from the database"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        auctions = await database.queries.get_open_auctions(conn)
+        escrows = await database.queries.get_auction_escrows(conn)
+        bids = await database.queries.get_open_auction_bids(conn)
+    auction_house.load(auctions, escrows, bids)
@@ -0,0 +1,110 @@
+from typing import Dict, List, Optional
+
+from database import get_db
+
+def _by_id(rows) -> List[Optional[dict]]:
+    """Rows as dicts in a list indexed by id (gaps are None)"""
+    rows = [dict(row) for row in rows]
+    table: List[Optional[dict]] = [None] * (max((row['id'] for row in rows), default=0) + 1)
+    for row in rows:
+        table[row['id']] = row
+    return table
+
+def _get(table: List[Optional[dict]], row_id: Optional[int]) -> Optional[dict]:
+    return table[row_id] if row_id is not None and 0 <= row_id < len(table) else None
+
+class Catalog:
+    """The static game tables, held in memory as id-indexed arrays.
+    
+    Items, rarities, equipment slots, classes and factions only change with
+    a deploy, so queries return their ids and pages resolve names, colors
+    and stats here instead of re-joining the tables. Each item dict also
+    carries its slot_name, rarity_name, color and power_multiplier. load()
+    swaps in complete new tables and bumps `version`, so a reload never
+    leaves a half-updated catalog.
+    """
+    
+    def __init__(self):
+        self.version = 0
+        self.items: List[Optional[dict]] = []
+        self.rarities: List[Optional[dict]] = []
+        self.slots: List[Optional[dict]] = []
+        self.classes: List[Optional[dict]] = []
+        self.factions: List[Optional[dict]] = []
+        self.slot_ids: Dict[str, int] = {}
+        self.rarity_ids: Dict[str, int] = {}
+    
+    def load(self, items, rarities, slots, classes, factions):
+        rarities, slots = _by_id(rarities), _by_id(slots)
+        items = _by_id(items)
+        for item in items:
+            if item is None:
+                continue
+            slot, rarity = _get(slots, item['slot_id']), _get(rarities, item['rarity_id'])
+            item['slot_name'] = slot['name'] if slot else None
+            item['rarity_name'] = rarity['name'] if rarity else None
+            item['color'] = rarity['color'] if rarity else None
+            item['power_multiplier'] = rarity['power_multiplier'] if rarity else 1.0
+        
+        self.items, self.rarities, self.slots = items, rarities, slots
+        self.classes, self.factions = _by_id(classes), _by_id(factions)
+        self.slot_ids = {slot['name']: slot['id'] for slot in slots if slot}
+        self.rarity_ids = {rarity['name'].lower(): rarity['id'] for rarity in rarities if rarity}
+        self.version += 1
+    
+    def item(self, item_id: int) -> Optional[dict]:
+        return _get(self.items, item_id)
+    
+    def rarity(self, rarity_id: int) -> Optional[dict]:
+        return _get(self.rarities, rarity_id)
+    
+    def slot(self, slot_id: int) -> Optional[dict]:
+        return _get(self.slots, slot_id)
+    
+    def slot_id(self, name: str) -> Optional[int]:
+        return self.slot_ids.get(name)
+    
+    def rarity_id(self, name: str) -> Optional[int]:
+        return self.rarity_ids.get(name.lower())
+    
+    def character_class(self, class_id: int) -> Optional[dict]:
+        return _get(self.classes, class_id)
+    
+    def faction(self, faction_id: int) -> Optional[dict]:
+        return _get(self.factions, faction_id)
+    
+    def character_row(self, row) -> dict:
+        """A characters row with its class name and bonuses and its faction name filled in"""
+        character = dict(row)
+        character_class = self.character_class(character['class_id']) or {}
+        faction = self.faction(character.get('faction_id'))
+        character.update(class_name=character_class.get('name'),
+                         attack_bonus=character_class.get('attack_bonus', 0.0),
+                         defense_bonus=character_class.get('defense_bonus', 0.0),
+                         rage_per_turn_bonus=character_class.get('rage_per_turn_bonus', 0.0),
+                         max_rage_bonus=character_class.get('max_rage_bonus', 0.0),
+                         faction_name=faction['name'] if faction else None)
+        return character
+    
+    def all_classes(self) -> List[dict]:
+        return [row for row in self.classes if row]
+    
+    def all_factions(self) -> List[dict]:
+        return [row for row in self.factions if row]
+
+# Global catalog instance
+catalog = Catalog()
+
+def get_catalog() -> Catalog:
+    return catalog
+
+async def load_catalog():
+    """Read the static tables into the catalog; also the hot-reload hook after editing them"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        items = await database.queries.get_catalog_items(conn)
+        rarities = await database.queries.get_catalog_rarities(conn)
+        slots = await database.queries.get_catalog_slots(conn)
+        classes = await database.queries.get_all_classes(conn)
+        factions = await database.queries.get_all_factions(conn)
+    catalog.load(items, rarities, slots, classes, factions)
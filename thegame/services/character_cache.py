@@ -0,0 +1,29 @@
+import json
+from typing import Dict, Iterable
+
+from database import get_db
+
+# Character names are unique and never change once created, so an id -> name
+# map can be kept for the life of the process and filled lazily.
+_names: Dict[int, str] = {}
+
+async def resolve_names(conn, character_ids: Iterable[int]) -> Dict[int, str]:
+    """Return {character_id: name} for the given ids, loading misses in one query"""
+    wanted = {cid for cid in character_ids if cid is not None}
+    missing = [cid for cid in wanted if cid not in _names]
+    
+    if missing:
+        database = await get_db()
+        rows = await database.queries.get_character_names(conn, character_ids=json.dumps(missing))
+        for row in rows:
+            _names[row['id']] = row['name']
+    
+    return {cid: _names[cid] for cid in wanted if cid in _names}
+
+def remember_name(character_id: int, name: str):
+    """Seed the cache when a character row is already in hand"""
+    _names[character_id] = name
+
+def forget(character_id: int):
+    """Drop a cached name (e.g. after a character is deleted)"""
+    _names.pop(character_id, None)
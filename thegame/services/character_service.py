@@ -1,6 +1,13 @@
+from typing import Optional
+
 from database import get_db
+from services.catalog import get_catalog
+from services.leaderboards import refresh_characters
 import random
 
+class EquipError(Exception):
+    """An equip or unequip that can't be made (item not held, level too low, empty slot)"""
+
 async def give_starter_equipment(character_id: int):
     """Give new characters basic starter equipment"""
     database = await get_db()
@@ -21,18 +28,68 @@ async def give_starter_equipment(character_id: int):
     finally:
         await conn.close()
 
+async def _bag_equipped(conn, character_id: int, slot_id: int) -> Optional[int]:
+    """Move whatever is in a slot back onto its inventory stack; returns its item_id"""
+    database = await get_db()
+    equipped = await database.queries.get_equipped_item(conn, character_id=character_id, slot_id=slot_id)
+    if equipped is None or equipped['item_id'] is None:
+        return None
+    await database.queries.add_to_inventory(conn, character_id=character_id, item_id=equipped['item_id'],
+                                            quantity=1, transfers_remaining=equipped['transfers_remaining'])
+    await database.queries.unequip_item(conn, character_id=character_id, slot_id=slot_id)
+    return equipped['item_id']
+
+async def equip_from_inventory(conn, character_id: int, level: int, item_id: int) -> int:
+    """Move one unit of an item from its inventory stack into its slot, bagging the slot's
+    current item; returns the slot_id. Runs inside the caller's transaction."""
+    database = await get_db()
+    item = get_catalog().item(item_id)
+    stack = await database.queries.get_inventory_stack(conn, character_id=character_id, item_id=item_id)
+    if item is None or stack is None:
+        raise EquipError("You don't have that item")
+    if level < item['level_requirement']:
+        raise EquipError(f"{item['name']} requires level {item['level_requirement']}")
+    
+    if not await database.queries.decrement_inventory_row(conn, inventory_id=stack['id']):
+        await database.queries.delete_inventory_row(conn, inventory_id=stack['id'])
+    await _bag_equipped(conn, character_id, item['slot_id'])
+    await database.queries.equip_item(conn, character_id=character_id, slot_id=item['slot_id'], item_id=item_id,
+                                      transfers_remaining=stack['transfers_remaining'])
+    return item['slot_id']
+
+async def unequip_to_inventory(conn, character_id: int, slot_id: int) -> int:
+    """Move a slot's item back onto its inventory stack; returns the item_id. Runs inside
+    the caller's transaction."""
+    item_id = await _bag_equipped(conn, character_id, slot_id)
+    if item_id is None:
+        raise EquipError("Nothing is equipped there")
+    return item_id
+
+async def save_character_stats(conn, character):
+    """Write a character's level, gold, rage and HP back after a fight; re-rank after committing"""
+    database = await get_db()
+    await database.queries.update_character_stats(
+        conn, level=character.level, experience=character.experience, gold=character.gold,
+        rage_current=character.rage_current, rage_max=character.rage_max, hit_points_current=character.hit_points_current,
+        hit_points_max=character.hit_points_max, attack=character.attack, total_power=character.total_power, character_id=character.id
+    )
+
+async def recompute_power(conn, character_id: int) -> int:
+    """Recalculate total_power from base stats and equipment; re-rank after committing"""
+    database = await get_db()
+    result = await database.queries.calculate_character_total_power(conn, character_id=character_id)
+    total_power = result['total_power'] if result else 0
+    await database.queries.update_character_total_power(conn, total_power=total_power, character_id=character_id)
+    return total_power
+
 async def calculate_character_power(character_id: int) -> int:
     """Calculate and update character's total power"""
     database = await get_db()
     conn = await database.get_connection()
     try:
-        # Get power calculation from database
-        result = await database.queries.calculate_character_total_power(conn, character_id=character_id)
-        total_power = result['total_power'] if result else 0
-        
-        # Update character's total power
-        await database.queries.update_character_total_power(conn, total_power=total_power, character_id=character_id)
+        total_power = await recompute_power(conn, character_id)
         await conn.commit()
+        await refresh_characters(conn, [character_id])
         
         return total_power
     finally:
@@ -0,0 +1,142 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from database import get_db, add_missing_columns
+
+# Raw combat_logs rows older than this are moved to the archive database.
+# Per-character totals survive in combat_daily_rollups regardless.
+COMBAT_LOG_RETENTION_DAYS = int(os.environ.get('COMBAT_LOG_RETENTION_DAYS', 30))
+ARCHIVE_CHUNK_SIZE = int(os.environ.get('COMBAT_ARCHIVE_CHUNK_SIZE', 5000))
+ARCHIVE_DB_PATH = os.environ.get('COMBAT_ARCHIVE_PATH')
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+ARCHIVED_COLUMNS = (
+    'id', 'attacker_id', 'defender_id', 'attacker_damage', 'defender_damage',
+    'attacker_hp_before', 'attacker_hp_after', 'defender_hp_before', 'defender_hp_after',
+    'winner_id', 'experience_gained', 'gold_gained', 'combat_type', 'mob_template_id', 'created_at'
+)
+
+def get_archive_path(db_path: str) -> str:
+    """Archive lives next to the game database unless configured otherwise"""
+    if ARCHIVE_DB_PATH:
+        return ARCHIVE_DB_PATH
+    return str(Path(db_path).with_name('combat_archive.db'))
+
+async def _ensure_archive(conn, archive_path: str):
+    """Attach the archive database and make sure its table exists"""
+    await conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive.combat_logs (
+            id INTEGER PRIMARY KEY,
+            attacker_id INTEGER NOT NULL,
+            defender_id INTEGER,
+            attacker_damage INTEGER DEFAULT 0,
+            defender_damage INTEGER DEFAULT 0,
+            attacker_hp_before INTEGER,
+            attacker_hp_after INTEGER,
+            defender_hp_before INTEGER,
+            defender_hp_after INTEGER,
+            winner_id INTEGER,
+            experience_gained INTEGER DEFAULT 0,
+            gold_gained INTEGER DEFAULT 0,
+            combat_type TEXT DEFAULT 'pve',
+            mob_template_id INTEGER,
+            created_at TIMESTAMP
+        )
+    """)
+    await add_missing_columns(conn, [('combat_logs', 'mob_template_id', 'INTEGER')], schema_name="archive")
+    await conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_combat_logs_created ON combat_logs(created_at)")
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive.battle_replays (
+            combat_log_id INTEGER PRIMARY KEY,
+            payload BLOB NOT NULL
+        )
+    """)
+
+async def _ensure_incremental_vacuum(conn):
+    """Switch an existing database to incremental auto-vacuum (one full VACUUM, once)"""
+    cursor = await conn.execute("PRAGMA main.auto_vacuum")
+    row = await cursor.fetchone()
+    if row[0] != AUTO_VACUUM_INCREMENTAL:
+        print("Converting game database to incremental auto-vacuum (one-time full VACUUM)")
+        await conn.execute("PRAGMA main.auto_vacuum=INCREMENTAL")
+        await conn.execute("VACUUM main")
+
+async def archive_combat_logs(retention_days: int = None, chunk_size: int = None) -> int:
+    """Move combat logs older than the retention window into the archive database"""
+    retention_days = COMBAT_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    chunk_size = chunk_size or ARCHIVE_CHUNK_SIZE
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    columns = ', '.join(ARCHIVED_COLUMNS)
+    
+    database = await get_db()
+    archived = 0
+    async with database.get_connection_context() as conn:
+        await _ensure_archive(conn, get_archive_path(database.db_path))
+        
+        while True:
+            cursor = await conn.execute("""
+                SELECT id FROM combat_logs WHERE created_at < ? ORDER BY id LIMIT ?
+            """, (cutoff, chunk_size))
+            ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                break
+            
+            # Each chunk is its own short write transaction so players are never
+            # blocked behind one long archive run. The archive insert ignores
+            # rows it already has, so a chunk that was copied but not deleted
+            # (crash between the two files) is simply redone next time.
+            first_id, last_id = ids[0], ids[-1]
+            async with database.transaction(conn):
+                await conn.execute(f"""
+                    INSERT OR IGNORE INTO archive.combat_logs ({columns})
+                    SELECT {columns} FROM main.combat_logs
+                    WHERE created_at < ? AND id BETWEEN ? AND ?
+                """, (cutoff, first_id, last_id))
+                await conn.execute("""
+                    INSERT OR IGNORE INTO archive.battle_replays (combat_log_id, payload)
+                    SELECT br.combat_log_id, br.payload FROM main.battle_replays br
+                    JOIN main.combat_logs cl ON cl.id = br.combat_log_id
+                    WHERE cl.created_at < ? AND br.combat_log_id BETWEEN ? AND ?
+                """, (cutoff, first_id, last_id))
+                await conn.execute("""
+                    DELETE FROM main.battle_replays WHERE combat_log_id IN (
+                        SELECT id FROM main.combat_logs WHERE created_at < ? AND id BETWEEN ? AND ?
+                    )
+                """, (cutoff, first_id, last_id))
+                await conn.execute("""
+                    DELETE FROM main.combat_logs
+                    WHERE created_at < ? AND id BETWEEN ? AND ?
+                """, (cutoff, first_id, last_id))
+            archived += len(ids)
+        
+        await conn.execute("DETACH DATABASE archive")
+        
+        if archived:
+            await _ensure_incremental_vacuum(conn)
+            await conn.execute("PRAGMA main.incremental_vacuum")
+    
+    return archived
+
+async def get_archived_battle_replay(conn, combat_log_id: int):
+    """Look up a replay that has already been moved to the archive database"""
+    database = await get_db()
+    archive_path = get_archive_path(database.db_path)
+    if not Path(archive_path).exists():
+        return None
+    
+    await _ensure_archive(conn, archive_path)
+    try:
+        cursor = await conn.execute("""
+            SELECT cl.id, cl.attacker_id, cl.defender_id, cl.winner_id, cl.experience_gained, cl.gold_gained,
+                   cl.combat_type, cl.mob_template_id, cl.created_at, br.payload
+            FROM archive.combat_logs cl
+            JOIN archive.battle_replays br ON br.combat_log_id = cl.id
+            WHERE cl.id = ?
+        """, (combat_log_id,))
+        return await cursor.fetchone()
+    finally:
+        await conn.execute("DETACH DATABASE archive")
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List
+
+from database import get_db
+from services.presence import SEND_QUEUE_SIZE
+
+# Messages kept per crew for the backfill a new connection gets
+CHAT_HISTORY_SIZE = 50
+# Messages are written to crew_chat_messages at most this often
+CHAT_FLUSH_SECONDS = 2.0
+MAX_MESSAGE_LENGTH = 500
+
+class ChatError(Exception):
+    """A chat message that can't be sent"""
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class CrewChat:
+    """Crew chat channels held in memory.
+    
+    Each crew has a set of connected members, each with a bounded send queue,
+    and a ring buffer of its latest messages. Posting a message fans it out to
+    the queues and the ring without touching the database; the message log is
+    written out in batches by flush().
+    """
+    
+    def __init__(self):
+        self.subscribers: Dict[int, Dict[int, asyncio.Queue]] = {}
+        self.history: Dict[int, Deque[dict]] = {}
+        self._last_flush = time.monotonic()
+        self._unsaved: List[dict] = []
+    
+    def load(self, messages):
+        """Seed each crew's ring buffer with its latest messages, oldest first"""
+        self.history.clear()
+        for row in messages:
+            self._ring(row['crew_id']).append({'type': 'chat', 'character_id': row['character_id'], 'name': row['name'],
+                                               'message': row['message'], 'sent_at': row['sent_at']})
+    
+    def _ring(self, crew_id: int) -> Deque[dict]:
+        ring = self.history.get(crew_id)
+        if ring is None:
+            ring = self.history[crew_id] = deque(maxlen=CHAT_HISTORY_SIZE)
+        return ring
+    
+    def subscribe(self, crew_id: int, character_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.subscribers.setdefault(crew_id, {})[character_id] = queue
+        return queue
+    
+    def unsubscribe(self, crew_id: int, character_id: int, queue: asyncio.Queue = None):
+        members = self.subscribers.get(crew_id)
+        if not members:
+            return
+        # A newer tab for the same character may have replaced this queue
+        if queue is None or members.get(character_id) is queue:
+            members.pop(character_id, None)
+        if not members:
+            del self.subscribers[crew_id]
+    
+    def backlog(self, crew_id: int) -> List[dict]:
+        """The crew's latest messages, oldest first"""
+        return list(self.history.get(crew_id, ()))
+    
+    def post(self, crew_id: int, character_id: int, name: str, text: str) -> dict:
+        """Send a message to everyone connected to the crew's chat and queue it for saving"""
+        text = text.strip()
+        if not text:
+            raise ChatError("Message is empty")
+        if len(text) > MAX_MESSAGE_LENGTH:
+            raise ChatError(f"Messages are limited to {MAX_MESSAGE_LENGTH} characters")
+        # Only a connected member can post; leaving the crew drops the connection's subscription
+        if character_id not in self.subscribers.get(crew_id, {}):
+            raise ChatError("You're not in this crew's chat")
+        
+        message = {'type': 'chat', 'character_id': character_id, 'name': name, 'message': text, 'sent_at': _timestamp()}
+        self._ring(crew_id).append(message)
+        self._unsaved.append({'crew_id': crew_id, 'character_id': character_id, 'message': text,
+                              'sent_at': message['sent_at']})
+        for queue in self.subscribers[crew_id].values():
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+        return message
+    
+    async def flush(self, force: bool = False):
+        """Write out the messages posted since the last flush, when it's due (or now, if forced)"""
+        if not self._unsaved or (not force and time.monotonic() - self._last_flush < CHAT_FLUSH_SECONDS):
+            return
+        
+        messages, self._unsaved = self._unsaved, []
+        database = await get_db()
+        try:
+            async with database.get_connection_context() as conn, database.transaction(conn):
+                await database.queries.save_crew_chat_messages(conn, messages)
+        except Exception:
+            # Nothing was written: keep the messages for the next flush
+            self._unsaved = messages + self._unsaved
+            raise
+        self._last_flush = time.monotonic()
+
+# Global crew chat instance
+crew_chat = CrewChat()
+
+def get_crew_chat() -> CrewChat:
+    return crew_chat
+
+async def load_crew_chat():
+    """Restore each crew's recent messages from the database"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        messages = await database.queries.get_recent_crew_chat(conn, limit=CHAT_HISTORY_SIZE)
+    crew_chat.load(messages)
@@ -0,0 +1,73 @@
+from database import get_db
+
+class CrewError(Exception):
+    """A crew join or vault move that can't be made"""
+
+async def join(conn, crew_id: int, character_id: int, role: str = 'member'):
+    """Add a character to a crew, unless it's full or they already belong to one"""
+    database = await get_db()
+    if not await database.queries.join_crew(conn, crew_id=crew_id, character_id=character_id, role=role):
+        if await database.queries.get_crew_by_character(conn, character_id=character_id):
+            raise CrewError("Already in a crew")
+        raise CrewError("Crew is full")
+
+async def deposit_item(conn, character_id: int, inventory_id: int) -> int:
+    """Move one unit of an inventory stack into the character's crew vault if it has room;
+    returns the crew id. Runs inside the caller's transaction."""
+    database = await get_db()
+    crew = await database.queries.get_crew_by_character(conn, character_id=character_id)
+    if not crew:
+        raise CrewError("You're not in a crew")
+    item = await database.queries.get_inventory_row(conn, inventory_id=inventory_id, character_id=character_id)
+    if not item:
+        raise CrewError("You don't have that item")
+    if item['transfers_remaining'] is not None and item['transfers_remaining'] <= 0:
+        raise CrewError("That item can't change hands any more")
+    
+    if not await database.queries.add_to_crew_vault(conn, crew_id=crew['id'], item_id=item['item_id'],
+                                                    quantity=1, deposited_by=character_id,
+                                                    transfers_remaining=item['transfers_remaining']):
+        raise CrewError("The crew vault is full")
+    if not await database.queries.decrement_inventory_row(conn, inventory_id=inventory_id):
+        await database.queries.delete_inventory_row(conn, inventory_id=inventory_id)
+    return crew['id']
+
+async def _release(conn, crew_id: int, vault_item_id: int, recipient_id: int):
+    """Move a vault item into the recipient's inventory. Handing it to anyone but
+    its depositor uses up one of its transfers."""
+    database = await get_db()
+    item = await database.queries.get_crew_vault_item(conn, vault_item_id=vault_item_id, crew_id=crew_id)
+    if not item or not await database.queries.remove_from_crew_vault(conn, vault_item_id=vault_item_id,
+                                                                     crew_id=crew_id):
+        raise CrewError("That item isn't in the vault")
+    
+    transfers = item['transfers_remaining']
+    if recipient_id != item['deposited_by'] and transfers is not None:
+        transfers -= 1
+    await database.queries.add_to_inventory(conn, character_id=recipient_id, item_id=item['item_id'],
+                                            quantity=item['quantity'], transfers_remaining=transfers)
+
+async def withdraw_item(conn, character_id: int, vault_item_id: int) -> int:
+    """Take an item out of the character's crew vault; members can only do this
+    in a two-way vault. Returns the crew id. Runs inside the caller's transaction."""
+    database = await get_db()
+    crew = await database.queries.get_crew_by_character(conn, character_id=character_id)
+    if not crew:
+        raise CrewError("You're not in a crew")
+    if crew['leader_id'] != character_id and not crew['has_two_way_vault']:
+        raise CrewError("Only the crew leader can take items out of the vault")
+    await _release(conn, crew['id'], vault_item_id, character_id)
+    return crew['id']
+
+async def award_item(conn, leader_id: int, vault_item_id: int, member_id: int) -> int:
+    """Give a vault item to a member of the leader's crew; returns the crew id.
+    Runs inside the caller's transaction."""
+    database = await get_db()
+    crew = await database.queries.get_crew_by_character(conn, character_id=leader_id)
+    if not crew or crew['leader_id'] != leader_id:
+        raise CrewError("Only the crew leader can award items")
+    member_crew = await database.queries.get_crew_by_character(conn, character_id=member_id)
+    if not member_crew or member_crew['id'] != crew['id']:
+        raise CrewError("That character isn't in your crew")
+    await _release(conn, crew['id'], vault_item_id, member_id)
+    return crew['id']
@@ -0,0 +1,109 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from services.catalog import get_catalog
+
+ITEMS_PAGE_SIZE = 50
+MAX_ITEM_LEVEL = 95
+
+# View -> (table, owner column, the view's own columns, its sorts; the first
+# is the default). Rows carry their item's slot, rarity, level requirement
+# and name, so a page never joins items.
+ITEM_VIEWS = {
+    'inventory': ('character_inventory', 'character_id', ('quantity', 'transfers_remaining'), ('name', 'level')),
+    'vault': ('crew_vault', 'crew_id', ('quantity', 'deposited_by', 'deposited_at', 'transfers_remaining'), ('newest', 'name', 'level')),
+}
+
+# Sort -> (column, direction). Each has an (owner, column) and an (owner,
+# slot_id, column) index on both tables; ties fall back to the row id, which
+# SQLite appends to every index entry, so the keyset is (value, id).
+ITEM_SORTS = {
+    'name': ('item_name', 'ASC'),
+    'level': ('level_requirement', 'DESC'),
+    'newest': ('id', 'DESC'),
+}
+
+def parse_item_filters(query: Mapping[str, str], view: str) -> Tuple[dict, dict]:
+    """page_items arguments and the normalized filters (for page links) from a
+    view's query string; ValueError if malformed"""
+    sorts = ITEM_VIEWS[view][3]
+    catalog = get_catalog()
+    sort = query.get('sort', sorts[0])
+    if sort not in sorts:
+        sort = sorts[0]
+    slot, rarity = query.get('slot', 'all'), query.get('rarity', 'all')
+    min_level, max_level = int(query.get('min_level', 1)), int(query.get('max_level', MAX_ITEM_LEVEL))
+    
+    slot_id = None if slot == 'all' else catalog.slot_id(slot)
+    rarity_id = None if rarity == 'all' else catalog.rarity_id(rarity)
+    if (slot != 'all' and slot_id is None) or (rarity != 'all' and rarity_id is None):
+        raise ValueError("unknown slot or rarity")
+    
+    after = None
+    if query.get('after_id') is not None:
+        after_id = int(query['after_id'])
+        if sort == 'newest':
+            after = (after_id, after_id)
+        elif query.get('after_value') is None:
+            raise ValueError("cursor has no sort value")
+        else:
+            after = (query['after_value'] if sort == 'name' else int(query['after_value']), after_id)
+    
+    filters = {'slot': slot, 'rarity': rarity, 'min_level': min_level, 'max_level': max_level, 'sort': sort}
+    return {'sort': sort, 'slot_id': slot_id, 'rarity_id': rarity_id,
+            'min_level': min_level, 'max_level': max_level, 'after': after}, filters
+
+async def page_items(conn, view: str, owner_id: int, sort: str, slot_id: Optional[int] = None,
+                     rarity_id: Optional[int] = None, min_level: int = 1, max_level: int = MAX_ITEM_LEVEL,
+                     after: Optional[Tuple] = None, limit: int = ITEMS_PAGE_SIZE) -> Tuple[List, Optional[Tuple]]:
+    """One keyset page of an inventory or vault and the cursor for the next page (None on the last page).
+    
+    The page walks the owner's index for the sort (slot-scoped when a slot is
+    given), so it costs the same however many items the owner holds; rarity
+    and level are checked on the rows the walk passes.
+    """
+    table, owner, columns, _ = ITEM_VIEWS[view]
+    expression, direction = ITEM_SORTS[sort]
+    # Unary + keeps the level range from being used as an index (and the page
+    # sorted afterwards) unless the page is sorted by level anyway
+    level = 'level_requirement' if expression == 'level_requirement' else '+level_requirement'
+    conditions = [f"{owner} = :owner_id", f"{level} BETWEEN :min_level AND :max_level"]
+    if slot_id is not None:
+        conditions.append("slot_id = :slot_id")
+    if rarity_id is not None:
+        conditions.append("rarity_id = :rarity_id")
+    if after:
+        operator = '>' if direction == 'ASC' else '<'
+        conditions.append(f"id {operator} :after_id" if expression == 'id'
+                          else f"({expression}, id) {operator} (:after_value, :after_id)")
+    
+    cursor = await conn.execute(f"""
+        SELECT id, item_id, {', '.join(columns)}, slot_id, rarity_id, level_requirement, item_name,
+               {expression} as sort_value
+        FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {expression} {direction}, id {direction}
+        LIMIT :limit
+    """, {
+        'owner_id': owner_id, 'slot_id': slot_id, 'rarity_id': rarity_id,
+        'min_level': min_level, 'max_level': max_level,
+        'after_value': after[0] if after else None, 'after_id': after[1] if after else None,
+        'limit': limit + 1
+    })
+    rows = await cursor.fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]['sort_value'], rows[-1]['id'])
+
+def item_json(row) -> Dict:
+    """A page row with its item's stats, slot, rarity and color from the catalog"""
+    item = get_catalog().item(row['item_id']) or {}
+    entry = {**item, **dict(row)}
+    entry.pop('sort_value', None)
+    return entry
+
+def page_json(rows, next_cursor: Optional[Tuple]) -> Dict:
+    return {
+        'items': [item_json(row) for row in rows],
+        'next': {'after_value': next_cursor[0], 'after_id': next_cursor[1]} if next_cursor else None,
+    }
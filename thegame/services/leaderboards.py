@@ -0,0 +1,310 @@
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_db
+
+MAX_LEVELS = 32
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+    
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * levels
+        # width[i]: how many bottom-level steps next[i] jumps over
+        self.width = [1] * levels
+
+class RankedSkipList:
+    """Sorted keys with O(log n) insert, remove, rank and index lookups.
+    
+    An indexable skip list: every forward link also records how many
+    bottom-level nodes it skips, so positions can be counted on the way down.
+    """
+    
+    def __init__(self):
+        self.head = _Node(None, MAX_LEVELS)
+        self.size = 0
+        # Highest level any node has reached; searches start here, not at MAX_LEVELS
+        self.levels = 1
+        self._rng = random.Random()
+    
+    def __len__(self):
+        return self.size
+    
+    def _random_levels(self) -> int:
+        levels = 1
+        while levels < MAX_LEVELS and self._rng.random() < 0.5:
+            levels += 1
+        self.levels = max(self.levels, levels)
+        return levels
+    
+    def _path(self, key) -> Tuple[List[_Node], List[int]]:
+        """Last node before key on each level, and its position (head = 0)"""
+        chain = [self.head] * MAX_LEVELS
+        positions = [0] * MAX_LEVELS
+        node, position = self.head, 0
+        for level in range(self.levels - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+    
+    def build(self, sorted_keys: List[Any]):
+        """Replace the contents with already-sorted keys in O(n)"""
+        self.head = _Node(None, MAX_LEVELS)
+        self.levels = 1
+        last = [self.head] * MAX_LEVELS
+        last_position = [0] * MAX_LEVELS
+        for position, key in enumerate(sorted_keys, start=1):
+            node = _Node(key, self._random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        self.size = len(sorted_keys)
+        # Links that run off the end still count the distance to one past the last node
+        for level in range(MAX_LEVELS):
+            last[level].width[level] = self.size + 1 - last_position[level]
+    
+    def insert(self, key):
+        chain, positions = self._path(key)
+        position = positions[0]
+        node = _Node(key, self._random_levels())
+        for level in range(len(node.next)):
+            before = chain[level]
+            node.next[level] = before.next[level]
+            before.next[level] = node
+            node.width[level] = before.width[level] - (position - positions[level])
+            before.width[level] = position - positions[level] + 1
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+    
+    def remove(self, key):
+        chain, _ = self._path(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            before = chain[level]
+            before.width[level] += node.width[level] - 1
+            before.next[level] = node.next[level]
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+    
+    def rank(self, key) -> int:
+        """1-based position of a key that is in the list"""
+        chain, positions = self._path(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0] + 1
+    
+    def slice(self, offset: int, limit: int) -> List[Any]:
+        """Keys at positions offset .. offset + limit - 1 (0-based)"""
+        if offset >= self.size or limit <= 0:
+            return []
+        node, remaining = self.head, offset + 1
+        for level in range(self.levels - 1, -1, -1):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < limit:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+class Leaderboard:
+    """One ranking ladder: character id -> sort key, ordered best first"""
+    
+    def __init__(self, name: str, key: Callable[[Any], Tuple], include: Callable[[Any], bool] = lambda c: True):
+        self.name = name
+        self._key = key
+        self._include = include
+        self.keys: Dict[int, Tuple] = {}
+        self.ladder = RankedSkipList()
+    
+    def __len__(self):
+        return len(self.ladder)
+    
+    def seed(self, characters):
+        keys = {character['id']: self._key(character) for character in characters if self._include(character)}
+        self.keys = keys
+        self.ladder.build(sorted(keys.values()))
+    
+    def update(self, character):
+        character_id = character['id']
+        old_key = self.keys.get(character_id)
+        new_key = self._key(character) if self._include(character) else None
+        if old_key == new_key:
+            return
+        if old_key is not None:
+            self.ladder.remove(old_key)
+            del self.keys[character_id]
+        if new_key is not None:
+            self.ladder.insert(new_key)
+            self.keys[character_id] = new_key
+    
+    def rank(self, character_id: int) -> Optional[int]:
+        key = self.keys.get(character_id)
+        return self.ladder.rank(key) if key is not None else None
+    
+    def page(self, offset: int, limit: int) -> List[int]:
+        """Character ids ranked offset + 1 .. offset + limit"""
+        return [key[-1] for key in self.ladder.slice(offset, limit)]
+
+# Best first: negate the stats, character id breaks ties and is always last
+LEADERBOARDS = {
+    'power': Leaderboard('power', lambda c: (-c['total_power'], -c['level'], c['id'])),
+    'level': Leaderboard('level', lambda c: (-c['level'], -c['experience'], c['id'])),
+    'gold': Leaderboard('gold', lambda c: (-c['gold'], -c['level'], c['id'])),
+    'experience': Leaderboard('experience', lambda c: (-c['experience'], -c['level'], c['id'])),
+    'wilderness': Leaderboard('wilderness', lambda c: (-c['wilderness_level'], -c['level'], c['id']),
+                              include=lambda c: c['wilderness_level'] > 0),
+}
+
+# The stat each ladder is ranked by, as shown in the rankings table
+RANKED_COLUMNS = {
+    'power': 'total_power',
+    'level': 'level',
+    'experience': 'experience',
+    'gold': 'gold',
+    'wilderness': 'wilderness_level',
+    'crew_power': 'total_power',
+    'crew_level': 'average_level',
+    'crew_members': 'members',
+    'crew_pvp': 'pvp_wins'
+}
+
+# Columns every ladder's key needs
+RANKED_STATS = ('id', 'level', 'experience', 'gold', 'total_power', 'wilderness_level')
+
+@dataclass
+class CrewStats:
+    id: int
+    pvp_wins: int = 0
+    members: int = 0
+    total_power: int = 0
+    total_level: int = 0
+    
+    def as_row(self) -> dict:
+        return {'id': self.id, 'pvp_wins': self.pvp_wins, 'members': self.members, 'total_power': self.total_power,
+                'average_level': self.total_level / self.members if self.members else 0}
+
+class CrewLadders:
+    """Running per-crew totals, adjusted by the delta of every join, leave and member stat change"""
+    
+    def __init__(self):
+        self.crews: Dict[int, CrewStats] = {}
+        self.crew_of: Dict[int, int] = {}
+        # Each member's power and level as last counted into their crew's totals
+        self.counted: Dict[int, Tuple[int, int]] = {}
+        self.leaderboards = {
+            'crew_power': Leaderboard('crew_power', lambda c: (-c['total_power'], -c['members'], c['id']), include=_has_members),
+            'crew_level': Leaderboard('crew_level', lambda c: (-c['average_level'], -c['members'], c['id']), include=_has_members),
+            'crew_members': Leaderboard('crew_members', lambda c: (-c['members'], -c['total_power'], c['id']), include=_has_members),
+            'crew_pvp': Leaderboard('crew_pvp', lambda c: (-c['pvp_wins'], -c['total_power'], c['id']), include=_has_members),
+        }
+    
+    def seed(self, crews, memberships, characters):
+        self.crews = {row['id']: CrewStats(row['id'], pvp_wins=row['pvp_wins']) for row in crews}
+        self.crew_of = {row['character_id']: row['crew_id'] for row in memberships}
+        self.counted = {}
+        for character in characters:
+            crew = self.crews.get(self.crew_of.get(character['id']))
+            if crew:
+                self._count(crew, character['id'], character['total_power'], character['level'])
+        rows = [crew.as_row() for crew in self.crews.values()]
+        for leaderboard in self.leaderboards.values():
+            leaderboard.seed(rows)
+    
+    def _count(self, crew: CrewStats, character_id: int, total_power: int, level: int):
+        crew.members += 1
+        crew.total_power += total_power
+        crew.total_level += level
+        self.counted[character_id] = (total_power, level)
+    
+    def _rerank(self, crew: CrewStats):
+        row = crew.as_row()
+        for leaderboard in self.leaderboards.values():
+            leaderboard.update(row)
+    
+    def joined(self, crew_id: int, character):
+        self.left(character.id)
+        crew = self.crews.setdefault(crew_id, CrewStats(crew_id))
+        self.crew_of[character.id] = crew_id
+        self._count(crew, character.id, character.total_power, character.level)
+        self._rerank(crew)
+    
+    def left(self, character_id: int):
+        crew = self.crews.get(self.crew_of.pop(character_id, None))
+        if not crew:
+            return
+        total_power, level = self.counted.pop(character_id)
+        crew.members -= 1
+        crew.total_power -= total_power
+        crew.total_level -= level
+        self._rerank(crew)
+    
+    def character_changed(self, character: dict):
+        crew = self.crews.get(self.crew_of.get(character['id']))
+        if not crew:
+            return
+        old_power, old_level = self.counted[character['id']]
+        if (old_power, old_level) == (character['total_power'], character['level']):
+            return
+        crew.total_power += character['total_power'] - old_power
+        crew.total_level += character['level'] - old_level
+        self.counted[character['id']] = (character['total_power'], character['level'])
+        self._rerank(crew)
+    
+    def pvp_win(self, character_id: int):
+        crew = self.crews.get(self.crew_of.get(character_id))
+        if crew:
+            crew.pvp_wins += 1
+            self._rerank(crew)
+
+def _has_members(crew) -> bool:
+    return crew['members'] > 0
+
+# Global crew ladders instance
+crew_ladders = CrewLadders()
+
+def get_crew_ladders() -> CrewLadders:
+    return crew_ladders
+
+def get_leaderboard(name: str) -> Leaderboard:
+    return LEADERBOARDS.get(name) or crew_ladders.leaderboards.get(name) or LEADERBOARDS['power']
+
+def update_character(character):
+    """Re-rank one character from a Character object (or a stats row)"""
+    if not isinstance(character, dict):
+        character = {stat: getattr(character, stat) for stat in RANKED_STATS}
+    for leaderboard in LEADERBOARDS.values():
+        leaderboard.update(character)
+    crew_ladders.character_changed(character)
+
+async def refresh_characters(conn, character_ids):
+    """Re-rank characters after a raw SQL write to their stats"""
+    database = await get_db()
+    rows = await database.queries.get_ranked_stats(conn, character_ids=json.dumps(list(character_ids)))
+    for row in rows:
+        update_character(dict(row))
+
+async def load_leaderboards():
+    """Seed every character and crew ladder; from here on they're only adjusted incrementally"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        rows = [dict(row) for row in await database.queries.get_all_ranked_stats(conn)]
+        crews = await database.queries.get_crew_ranking_seed(conn)
+        memberships = await database.queries.get_crew_memberships(conn)
+    for leaderboard in LEADERBOARDS.values():
+        leaderboard.seed(rows)
+    crew_ladders.seed(crews, memberships, rows)
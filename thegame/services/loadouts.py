@@ -0,0 +1,65 @@
+from typing import List
+
+from database import get_db
+from services.character_service import equip_from_inventory, recompute_power
+
+MAX_LOADOUTS = 10
+MAX_NAME_LENGTH = 32
+
+class LoadoutError(Exception):
+    """A loadout that can't be saved or doesn't exist"""
+
+async def get_loadouts(conn, character_id: int) -> List[dict]:
+    """The character's loadouts by name, each with its {slot_id: item_id} map"""
+    database = await get_db()
+    loadouts = {}
+    for row in await database.queries.get_character_loadouts(conn, character_id=character_id):
+        loadout = loadouts.setdefault(row['id'], {'id': row['id'], 'name': row['name'], 'items': {}})
+        if row['slot_id'] is not None:
+            loadout['items'][row['slot_id']] = row['item_id']
+    return list(loadouts.values())
+
+async def save_loadout(conn, character_id: int, name: str) -> int:
+    """Save what the character is wearing under `name`, overwriting a loadout of that name"""
+    database = await get_db()
+    name = name.strip()
+    if not name or len(name) > MAX_NAME_LENGTH:
+        raise LoadoutError(f"Loadout names are 1-{MAX_NAME_LENGTH} characters")
+    
+    existing = await database.queries.get_loadout_by_name(conn, character_id=character_id, name=name)
+    if existing:
+        loadout_id = existing['id']
+        await database.queries.clear_loadout_items(conn, loadout_id=loadout_id)
+    else:
+        count = await database.queries.count_character_loadouts(conn, character_id=character_id)
+        if count['count'] >= MAX_LOADOUTS:
+            raise LoadoutError(f"You can keep at most {MAX_LOADOUTS} loadouts")
+        loadout_id = await database.queries.create_loadout(conn, character_id=character_id, name=name)
+    await database.queries.save_loadout_items(conn, loadout_id=loadout_id, character_id=character_id)
+    return loadout_id
+
+async def apply_loadout(conn, character_id: int, level: int, loadout_id: int) -> int:
+    """Equip every loadout item not already worn and recompute power once; returns how many
+    moved. Runs inside the caller's transaction, so a missing item undoes the whole swap."""
+    database = await get_db()
+    if not await database.queries.get_loadout(conn, loadout_id=loadout_id, character_id=character_id):
+        raise LoadoutError("No such loadout")
+    
+    worn = {row['slot_id']: row['item_id']
+            for row in await database.queries.get_character_equipment(conn, character_id=character_id)}
+    moved = 0
+    for row in await database.queries.get_loadout_items(conn, loadout_id=loadout_id):
+        if worn.get(row['slot_id']) != row['item_id']:
+            await equip_from_inventory(conn, character_id, level, row['item_id'])
+            moved += 1
+    if moved:
+        await recompute_power(conn, character_id)
+    return moved
+
+async def delete_loadout(conn, character_id: int, loadout_id: int) -> bool:
+    database = await get_db()
+    if not await database.queries.get_loadout(conn, loadout_id=loadout_id, character_id=character_id):
+        return False
+    await database.queries.clear_loadout_items(conn, loadout_id=loadout_id)
+    await database.queries.delete_loadout(conn, loadout_id=loadout_id, character_id=character_id)
+    return True
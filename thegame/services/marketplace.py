@@ -0,0 +1,241 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import get_db
+
+LISTINGS_PAGE_SIZE = 50
+
+# Candle periods kept by the market_trades trigger, and how many a chart may ask for
+CANDLE_PERIODS = ('1h', '1d')
+MAX_CANDLES = 500
+# Suggested prices average this many days of trades
+PRICE_WINDOW_DAYS = 7
+
+# Browse sort -> (sort expression, direction). Every column sort has a
+# (column) and a (slot_id, column) index; ties fall back to the listing id,
+# which SQLite appends to each index entry, so the keyset is (value, id).
+# Relevance is the bm25 rank of a text search (lower is better).
+LISTING_SORTS = {
+    'name': ('ml.item_name', 'ASC'),
+    'price_low': ('ml.price', 'ASC'),
+    'price_high': ('ml.price', 'DESC'),
+    'level': ('ml.level_requirement', 'DESC'),
+    'newest': ('ml.id', 'DESC'),
+    'relevance': ('matches.rank', 'ASC'),
+}
+DEFAULT_LISTING_SORT = 'name'
+SEARCH_LISTING_SORT = 'relevance'
+
+def parse_listing_cursor(sort: str, after_value: Optional[str], after_id: Optional[str]) -> Optional[Tuple]:
+    """The (sort value, listing id) of the last listing on the previous page; ValueError if malformed"""
+    if after_id is None:
+        return None
+    expression = LISTING_SORTS[sort][0]
+    listing_id = int(after_id)
+    if expression == 'ml.id':
+        return (listing_id, listing_id)
+    if after_value is None:
+        raise ValueError("cursor has no sort value")
+    if expression == 'ml.item_name':
+        return (after_value, listing_id)
+    return (float(after_value) if sort == 'relevance' else int(after_value), listing_id)
+
+async def search_listings(conn, slot: Optional[str], min_level: int, max_level: int, sort: str,
+                          after: Optional[Tuple] = None, limit: int = LISTINGS_PAGE_SIZE,
+                          match: Optional[str] = None) -> Tuple[List, Optional[Tuple]]:
+    """One keyset page of listings and the cursor for the next page (None on the last page).
+    
+    The page is picked from market_listings alone, walking the index for the
+    sort (slot-scoped when a slot is given); seller details are joined onto
+    those rows only, and item stats, slot and rarity come from the catalog.
+    CROSS JOIN keeps the page as the outer loop, so the planner can't trade
+    it for a scan of every listing.
+    
+    `match` is an FTS5 query (services.search.fts_query) over item names and
+    descriptions; the relevance sort requires one.
+    """
+    expression, direction = LISTING_SORTS[sort]
+    # Unary + keeps the level range from being used as an index (and the page
+    # sorted afterwards) unless the page is sorted by level anyway
+    level = 'ml.level_requirement' if expression == 'ml.level_requirement' else '+ml.level_requirement'
+    conditions = [f"{level} BETWEEN :min_level AND :max_level"]
+    if slot:
+        conditions.append("ml.slot_id = (SELECT id FROM equipment_slots WHERE name = :slot)")
+    if sort == 'relevance':
+        source = """(SELECT rowid as item_id, bm25(items_fts, 10.0, 1.0) as rank FROM items_fts
+                     WHERE items_fts MATCH :match) matches
+                    JOIN market_listings ml ON ml.item_id = matches.item_id"""
+    else:
+        source = "market_listings ml"
+        if match:
+            conditions.append("ml.item_id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH :match)")
+    if after:
+        operator = '>' if direction == 'ASC' else '<'
+        conditions.append(f"ml.id {operator} :after_id" if expression == 'ml.id'
+                          else f"({expression}, ml.id) {operator} (:after_value, :after_id)")
+    
+    cursor = await conn.execute(f"""
+        SELECT page.sort_value, ml.id as listing_id, ml.seller_id, ml.item_id, ml.quantity, ml.transfers_remaining,
+               ml.price, ml.item_name, ml.level_requirement, ml.listed_at,
+               c.name as seller_name, c.level as seller_level
+        FROM (
+            SELECT ml.id, {expression} as sort_value FROM {source}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {expression} {direction}, ml.id {direction}
+            LIMIT :limit
+        ) page
+        CROSS JOIN market_listings ml ON ml.id = page.id
+        JOIN characters c ON ml.seller_id = c.id
+        ORDER BY page.sort_value {direction}, ml.id {direction}
+    """, {
+        'min_level': min_level, 'max_level': max_level, 'slot': slot, 'match': match,
+        'after_value': after[0] if after else None, 'after_id': after[1] if after else None,
+        'limit': limit + 1
+    })
+    rows = await cursor.fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]['sort_value'], rows[-1]['listing_id'])
+
+# Most-recently-used filtered pages kept by the listing cache
+LISTING_CACHE_ENTRIES = 256
+
+class ListingCache:
+    """Browse pages keyed by their normalized filters, dropped when a listing that could be on them changes.
+    
+    Every listing create, sale or cancel invalidates the pages whose slot
+    filter (or "all") and level range cover that listing, so there is no
+    TTL and a page is never served stale. Text searches aren't cached. A
+    page read while a write was committing isn't stored: `generation`
+    moves on every invalidation and put() ignores results loaded under an
+    older one.
+    """
+    
+    def __init__(self, max_entries: int = LISTING_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Tuple[List, Optional[Tuple]]]" = OrderedDict()
+        self.generation = 0
+        self.metrics = {'hits': 0, 'misses': 0, 'invalidations': 0, 'invalidated_entries': 0, 'evictions': 0}
+    
+    @staticmethod
+    def key(slot: Optional[str], min_level: int, max_level: int, sort: str, after: Optional[Tuple]) -> Tuple:
+        return (slot, min_level, max_level, sort, after)
+    
+    def get(self, key: Tuple) -> Optional[Tuple[List, Optional[Tuple]]]:
+        page = self.entries.get(key)
+        if page is None:
+            self.metrics['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.metrics['hits'] += 1
+        return page
+    
+    def put(self, key: Tuple, page: Tuple[List, Optional[Tuple]], generation: int):
+        if generation != self.generation:
+            return
+        self.entries[key] = page
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.metrics['evictions'] += 1
+    
+    def invalidate(self, slot: str, level: int):
+        """Drop every page a listing in this slot at this level requirement could appear on"""
+        self.generation += 1
+        self.metrics['invalidations'] += 1
+        stale = [key for key in self.entries
+                 if key[0] in (None, slot) and key[1] <= level <= key[2]]
+        for key in stale:
+            del self.entries[key]
+        self.metrics['invalidated_entries'] += len(stale)
+    
+    def snapshot_metrics(self) -> Dict:
+        lookups = self.metrics['hits'] + self.metrics['misses']
+        return dict(self.metrics, entries=len(self.entries),
+                    hit_rate=round(self.metrics['hits'] / lookups, 3) if lookups else 0.0)
+
+# Global listing cache instance
+listing_cache = ListingCache()
+
+def get_listing_cache() -> ListingCache:
+    return listing_cache
+
+async def browse_listings(slot: Optional[str], min_level: int, max_level: int, sort: str,
+                          after: Optional[Tuple] = None, match: Optional[str] = None) -> Tuple[List, Optional[Tuple]]:
+    """search_listings for a browse page; cached pages are served without opening a connection"""
+    key = None if match else listing_cache.key(slot, min_level, max_level, sort, after)
+    page = listing_cache.get(key) if key else None
+    if page is None:
+        generation = listing_cache.generation
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            page = await search_listings(conn, slot, min_level, max_level, sort, after, match=match)
+        if key:
+            listing_cache.put(key, page, generation)
+    return page
+
+# purchase_listing outcomes
+PURCHASED = 'purchased'
+ALREADY_SOLD = 'already_sold'
+OWN_LISTING = 'own_listing'
+INSUFFICIENT_GOLD = 'insufficient_gold'
+
+class _PurchaseRefused(Exception):
+    """Rolls a purchase back with its outcome"""
+    def __init__(self, outcome: str):
+        super().__init__(outcome)
+        self.outcome = outcome
+
+async def purchase_listing(conn, buyer_id: int, listing_id: int):
+    """Buy a listing in one transaction; returns (outcome, listing).
+    
+    The listing row is claimed by deleting it and the buyer is debited only
+    if `gold >= price`, each checked by rowcount, so of any number of racing
+    buyers exactly one gets the item and nobody's gold goes negative. Either
+    check failing rolls the whole purchase back.
+    """
+    database = await get_db()
+    listing = None
+    try:
+        async with database.transaction(conn):
+            listing = await database.queries.get_market_listing(conn, listing_id=listing_id)
+            if not listing:
+                raise _PurchaseRefused(ALREADY_SOLD)
+            if listing['seller_id'] == buyer_id:
+                raise _PurchaseRefused(OWN_LISTING)
+            if not await database.queries.delete_market_listing(conn, listing_id=listing_id):
+                raise _PurchaseRefused(ALREADY_SOLD)
+            if not await database.queries.debit_gold(conn, character_id=buyer_id, amount=listing['price']):
+                raise _PurchaseRefused(INSUFFICIENT_GOLD)
+            
+            # The sale uses up one of the item's transfers
+            transfers = listing['transfers_remaining']
+            await database.queries.add_to_inventory(conn, character_id=buyer_id, item_id=listing['item_id'],
+                                                    quantity=listing['quantity'],
+                                                    transfers_remaining=None if transfers is None else transfers - 1)
+            await database.queries.credit_gold(conn, character_id=listing['seller_id'], amount=listing['price'])
+            await database.queries.record_market_trade(conn, item_id=listing['item_id'], seller_id=listing['seller_id'],
+                                                       buyer_id=buyer_id, quantity=listing['quantity'],
+                                                       price=listing['price'], source='listing')
+    except _PurchaseRefused as refused:
+        return refused.outcome, listing
+    listing_cache.invalidate(listing['slot_name'], listing['level_requirement'])
+    return PURCHASED, listing
+
+async def get_price_history(conn, item_id: int, period: str, points: int) -> List[dict]:
+    """The item's last `points` candles for the period, oldest first"""
+    database = await get_db()
+    rows = await database.queries.get_market_candles(conn, item_id=item_id, period=period, points=points)
+    return [dict(row) for row in reversed(rows)]
+
+async def get_suggested_price(conn, item_id: int) -> Optional[dict]:
+    """Average price over the last PRICE_WINDOW_DAYS of daily candles and the last trade; None if never traded"""
+    database = await get_db()
+    since = (datetime.now(timezone.utc) - timedelta(days=PRICE_WINDOW_DAYS - 1)).strftime('%Y-%m-%d')
+    row = await database.queries.get_market_price(conn, item_id=item_id, since=since)
+    if row['last_price'] is None:
+        return None
+    return {'price': row['average_price'] if row['average_price'] is not None else row['last_price'],
+            'average_price': row['average_price'], 'last_price': row['last_price'], 'volume': row['volume']}
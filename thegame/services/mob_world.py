@@ -0,0 +1,300 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database import get_db
+from models.mob import MobTemplate, MobInstance
+from services.presence import get_presence
+from services.timer_wheel import Timer, TimerWheel
+
+# Fixed AI step; respawn timers count in the same ticks
+TICK_SECONDS = 1.0
+# After a stall, replay at most this many steps and skip the rest
+MAX_CATCH_UP_TICKS = 10
+MOB_ATTACK_COOLDOWN_TICKS = 5
+NO_TARGET = -1
+
+# One row per mob instance; mob id = row index + 1
+MOB_DTYPE = np.dtype([
+    ('template', np.int32),
+    ('home', np.int32),            # spawn room, where respawns come back
+    ('room', np.int32),
+    ('hp', np.int32),
+    ('attack_cooldown', np.int32),
+    ('wander_cooldown', np.int32),
+    ('target', np.int64),          # character id, NO_TARGET when idle
+])
+
+class MobWorld:
+    """Every mob instance in a structured NumPy array, advanced by a vectorized tick"""
+    
+    def __init__(self):
+        self.templates: Dict[int, MobTemplate] = {}
+        self.state = np.zeros(0, dtype=MOB_DTYPE)
+        self.respawns = TimerWheel()
+        self.respawn_timers: Dict[int, Timer] = {}
+        self.rng = np.random.default_rng()
+        self.ticks = 0
+        self._clock_start = time.monotonic()
+        self.metrics = {'ticks': 0, 'last_tick_ms': 0.0, 'avg_tick_ms': 0.0, 'max_tick_ms': 0.0,
+                        'changed_rows': 0, 'messages': 0, 'strikes': 0}
+        self._load_room_graph(())
+    
+    def load(self, templates, spawns, connections=()):
+        """Build templates and spawn every room's mobs at full health"""
+        self.templates = {row['id']: MobTemplate.from_db_row(row) for row in templates}
+        
+        # Per-template parameters, indexed by template id
+        size = max(self.templates, default=0) + 1
+        self._hp_max = np.zeros(size, dtype=np.int32)
+        self._regen = np.zeros(size, dtype=np.int32)
+        self._attack = np.zeros(size, dtype=np.int32)
+        self._aggressive = np.zeros(size, dtype=bool)
+        self._wander_ticks = np.zeros(size, dtype=np.int32)
+        for template in self.templates.values():
+            self._hp_max[template.id] = template.hit_points
+            self._regen[template.id] = template.hit_points_regen
+            self._attack[template.id] = template.attack
+            self._aggressive[template.id] = bool(template.aggressive) and not template.is_raid_boss
+            self._wander_ticks[template.id] = math.ceil(template.wander_seconds / TICK_SECONDS)
+        
+        rows = []
+        for spawn in spawns:
+            if spawn['mob_template_id'] in self.templates:
+                rows += [(spawn['mob_template_id'], spawn['room_id'])] * spawn['spawn_count']
+        self.state = np.zeros(len(rows), dtype=MOB_DTYPE)
+        if rows:
+            spawn_rows = np.array(rows, dtype=np.int32)
+            self.state['template'] = spawn_rows[:, 0]
+            self.state['home'] = spawn_rows[:, 1]
+        
+        self._load_room_graph(connections)
+        self.respawns = TimerWheel()
+        self.respawn_timers.clear()
+        self.ticks = 0
+        self._clock_start = time.monotonic()
+        
+        self.state['room'] = self.state['home']
+        self.state['hp'] = self._hp_max[self.state['template']]
+        self.state['target'] = NO_TARGET
+        # Stagger wandering so mobs don't all move on the same tick
+        wander = self._wander_ticks[self.state['template']]
+        self.state['wander_cooldown'] = self.rng.integers(0, wander + 1)
+    
+    def _load_room_graph(self, connections):
+        """Room exits in CSR form: room r leads to _exits[_exit_start[r]:_exit_start[r] + _exit_count[r]]"""
+        pairs = np.array([(c['from_room_id'], c['to_room_id']) for c in connections], dtype=np.int32).reshape(-1, 2)
+        pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+        rooms = max(int(pairs.max(initial=0)), int(self.state['home'].max(initial=0))) + 1
+        self._exit_count = np.bincount(pairs[:, 0], minlength=rooms).astype(np.int32)
+        self._exit_start = (np.cumsum(self._exit_count) - self._exit_count).astype(np.int32)
+        self._exits = pairs[:, 1].copy()
+    
+    def _instance(self, index: int) -> MobInstance:
+        return MobInstance(index + 1, self.templates[int(self.state['template'][index])], self.state[index])
+    
+    def get(self, mob_id: int) -> Optional[MobInstance]:
+        if 1 <= mob_id <= len(self.state):
+            return self._instance(mob_id - 1)
+        return None
+    
+    def mobs_in_room(self, room_id: int) -> List[MobInstance]:
+        """Living mobs in a room"""
+        indices = np.flatnonzero((self.state['room'] == room_id) & (self.state['hp'] > 0))
+        return [self._instance(int(index)) for index in indices]
+    
+    def apply_damage(self, mob: MobInstance, damage: int, attacker_id: Optional[int] = None) -> bool:
+        """Take damage off a live mob; returns True if this blow killed it.
+        
+        A mob that survives turns on whoever hit it.
+        """
+        if not mob.is_alive():
+            return False
+        index = mob.id - 1
+        row = self.state[index]
+        row['hp'] = max(0, int(row['hp']) - damage)
+        if row['hp'] == 0:
+            self.kill(mob)
+        elif attacker_id is not None:
+            row['target'] = attacker_id
+        self.publish_rows(np.array([index]))
+        return not mob.is_alive()
+    
+    def kill(self, mob: MobInstance):
+        index = mob.id - 1
+        row = self.state[index]
+        row['hp'] = 0
+        row['target'] = NO_TARGET
+        if index not in self.respawn_timers:
+            ticks = math.ceil(mob.template.respawn_seconds / TICK_SECONDS)
+            self.respawn_timers[index] = self.respawns.schedule(ticks, index)
+    
+    def respawn(self, mob: MobInstance):
+        self._respawn(mob.id - 1)
+    
+    def _respawn(self, index: int):
+        timer = self.respawn_timers.pop(index, None)
+        if timer is not None:
+            self.respawns.cancel(timer)
+        row = self.state[index]
+        row['hp'] = self._hp_max[row['template']]
+        row['room'] = row['home']
+        row['attack_cooldown'] = 0
+        row['target'] = NO_TARGET
+    
+    def tick(self) -> List[Tuple[int, int, int]]:
+        """Run every fixed step due by the wall clock.
+        
+        Publishes the rows that changed to the rooms being watched and
+        returns the mob strikes on players as (mob_id, character_id, damage).
+        """
+        due = int((time.monotonic() - self._clock_start) / TICK_SECONDS) - self.ticks
+        if due <= 0:
+            return []
+        started = time.perf_counter()
+        
+        if due > MAX_CATCH_UP_TICKS:
+            skipped = due - MAX_CATCH_UP_TICKS
+            for index in self.respawns.advance(skipped):
+                self.respawn_timers.pop(index, None)
+                self._respawn(index)
+            self.ticks += skipped
+            due = MAX_CATCH_UP_TICKS
+        
+        before = self.state.copy()
+        present = self._present_keys()
+        strikes = []
+        for _ in range(due):
+            strikes += self._step(present)
+        
+        s = self.state
+        changed = np.flatnonzero((before['hp'] != s['hp']) | (before['room'] != s['room']) |
+                                 (before['target'] != s['target']))
+        messages = self.publish_rows(changed, before['room'][changed])
+        presence = get_presence()
+        for mob_id, character_id, damage in strikes:
+            presence.publish(int(s['room'][mob_id - 1]), {
+                'type': 'mob_strike', 'id': mob_id, 'character_id': character_id, 'damage': damage
+            })
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics = self.metrics
+        metrics['ticks'] += due
+        metrics['last_tick_ms'] = round(elapsed, 3)
+        metrics['avg_tick_ms'] = round(0.9 * metrics['avg_tick_ms'] + 0.1 * elapsed, 3)
+        metrics['max_tick_ms'] = max(metrics['max_tick_ms'], metrics['last_tick_ms'])
+        metrics['changed_rows'] = int(len(changed))
+        metrics['messages'] += messages + len(strikes)
+        metrics['strikes'] += len(strikes)
+        return strikes
+    
+    def _present_keys(self) -> np.ndarray:
+        """(room << 32 | character_id) for every character watching a room"""
+        presence = get_presence()
+        keys = [(room_id << 32) | character_id
+                for room_id in presence.watched_rooms() for character_id in presence.characters_in(room_id)]
+        return np.array(keys, dtype=np.int64)
+    
+    def _step(self, present: np.ndarray) -> List[Tuple[int, int, int]]:
+        """One fixed AI step over every mob at once"""
+        self.ticks += 1
+        for index in self.respawns.advance(1):
+            self.respawn_timers.pop(index, None)
+            self._respawn(index)
+        
+        s = self.state
+        template = s['template']
+        hp = s['hp']
+        target = s['target']
+        alive = hp > 0
+        
+        # Regenerate
+        hp_max = self._hp_max[template]
+        healing = alive & (hp < hp_max)
+        hp[healing] = np.minimum(hp[healing] + self._regen[template[healing]], hp_max[healing])
+        
+        # Cool down
+        for field in ('attack_cooldown', 'wander_cooldown'):
+            cooldown = s[field]
+            np.subtract(cooldown, 1, out=cooldown, where=cooldown > 0)
+        
+        # Forget targets that died, left the room or stopped watching it
+        room_keys = s['room'].astype(np.int64) << 32
+        has_target = target != NO_TARGET
+        lost = has_target & ~(alive & np.isin(room_keys | np.where(has_target, target, 0), present))
+        target[lost] = NO_TARGET
+        
+        # Aggressive mobs pick a fight with someone in their room
+        if len(present):
+            watched_rooms = np.unique(present >> 32)
+            hunting = np.flatnonzero(alive & self._aggressive[template] & (target == NO_TARGET) &
+                                     np.isin(s['room'], watched_rooms))
+            if len(hunting):
+                presence = get_presence()
+                for index in hunting:
+                    candidates = presence.characters_in(int(s['room'][index]))
+                    if candidates:
+                        target[index] = candidates[self.rng.integers(len(candidates))]
+        
+        # Idle wanderers move to a random neighbouring room
+        room = s['room']
+        exits = self._exit_count[room]
+        wandering = np.flatnonzero(alive & (target == NO_TARGET) & (self._wander_ticks[template] > 0) &
+                                   (exits > 0) & (s['wander_cooldown'] == 0))
+        if len(wandering):
+            picks = self._exit_start[room[wandering]] + self.rng.integers(0, exits[wandering])
+            room[wandering] = self._exits[picks]
+            s['wander_cooldown'][wandering] = self._wander_ticks[template[wandering]]
+        
+        # Mobs with a target and no cooldown strike
+        striking = np.flatnonzero(alive & (target != NO_TARGET) & (s['attack_cooldown'] == 0))
+        if not len(striking):
+            return []
+        damage = (self._attack[template[striking]] * self.rng.uniform(0.8, 1.2, len(striking))).astype(np.int32)
+        s['attack_cooldown'][striking] = MOB_ATTACK_COOLDOWN_TICKS
+        return [(int(index) + 1, int(character_id), int(amount))
+                for index, character_id, amount in zip(striking, target[striking], damage)]
+    
+    def publish_rows(self, indices: np.ndarray, old_rooms: np.ndarray = None) -> int:
+        """Send the given rows to whoever watches the room they are in (or just left)"""
+        presence = get_presence()
+        watched = presence.watched_rooms()
+        if not len(indices) or not watched:
+            return 0
+        
+        rooms = self.state['room'][indices]
+        if old_rooms is None:
+            old_rooms = rooms
+        visible = np.isin(rooms, watched) | np.isin(old_rooms, watched)
+        sent = 0
+        for index, room_id, old_room_id in zip(indices[visible], rooms[visible], old_rooms[visible]):
+            mob = self._instance(int(index))
+            message = {
+                'type': 'mob', 'id': mob.id, 'name': mob.name, 'level': mob.level, 'room': int(room_id),
+                'hp': mob.hit_points_current, 'hp_max': mob.hit_points_max, 'target': mob.target_id
+            }
+            for message_room in {int(room_id), int(old_room_id)}:
+                presence.publish(message_room, message)
+                sent += 1
+        return sent
+    
+    def snapshot_metrics(self) -> dict:
+        alive = int(np.count_nonzero(self.state['hp'] > 0))
+        return dict(self.metrics, mobs=len(self.state), alive=alive, pending_respawns=self.respawns.pending)
+
+# Global mob world instance
+mob_world = MobWorld()
+
+def get_mob_world() -> MobWorld:
+    return mob_world
+
+async def load_mob_world():
+    """Load mob templates, spawn tables and the room graph from the database"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        templates = await database.queries.get_mob_templates(conn)
+        spawns = await database.queries.get_room_spawns(conn)
+        connections = await database.queries.get_all_room_connections(conn)
+    mob_world.load(templates, spawns, connections)
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Dict, List
+
+# Per-connection send queue. A client that can't keep up loses its oldest
+# updates rather than growing server memory without bound.
+SEND_QUEUE_SIZE = 256
+
+class Presence:
+    """Which characters are watching which room, each with a bounded send queue"""
+    
+    def __init__(self):
+        self.rooms: Dict[int, Dict[int, asyncio.Queue]] = {}
+    
+    def join(self, room_id: int, character_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.rooms.setdefault(room_id, {})[character_id] = queue
+        return queue
+    
+    def leave(self, room_id: int, character_id: int, queue: asyncio.Queue = None):
+        watchers = self.rooms.get(room_id)
+        if not watchers:
+            return
+        # A newer tab for the same character may have replaced this queue
+        if queue is None or watchers.get(character_id) is queue:
+            watchers.pop(character_id, None)
+        if not watchers:
+            del self.rooms[room_id]
+    
+    def watched_rooms(self) -> List[int]:
+        return list(self.rooms)
+    
+    def characters_in(self, room_id: int) -> List[int]:
+        return list(self.rooms.get(room_id, ()))
+    
+    def publish(self, room_id: int, message: dict):
+        """Queue a message for everyone watching a room"""
+        for queue in self.rooms.get(room_id, {}).values():
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+# Global presence instance
+presence = Presence()
+
+def get_presence() -> Presence:
+    return presence
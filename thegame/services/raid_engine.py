@@ -0,0 +1,330 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from database import get_db
+from models.battle import Combatant, run_battle, new_seed, ATTACKER, DEFENDER
+from models.character import Character
+from models.mob import MobTemplate
+from services.catalog import get_catalog
+from services.character_service import save_character_stats
+from services.leaderboards import refresh_characters
+from services.mob_world import get_mob_world
+
+RAID_TICK_SECONDS = 1.0
+# Boss HP and damage totals are written at most this often while a raid runs
+RAID_CHECKPOINT_SECONDS = 10.0
+RAID_TIME_LIMIT_SECONDS = 3600
+RAID_MIN_PARTY = 2
+RAID_MAX_PARTY = 50
+RAID_RAGE_COST = 10
+# Each queued attack is a short exchange with the boss, not a fight to the death
+RAID_ROUNDS_PER_ATTACK = 3
+# Participants below this share of the boss's HP don't roll for loot
+RAID_LOOT_MIN_SHARE = 0.01
+
+class RaidError(Exception):
+    """A raid action that isn't allowed right now"""
+
+@dataclass
+class RaidMember:
+    character_id: int
+    damage_dealt: int = 0
+    attacks: int = 0
+
+@dataclass
+class RaidAttack:
+    character_id: int
+    combatant: Combatant
+    future: asyncio.Future
+
+@dataclass
+class Raid:
+    """A raid in progress. boss_hp is only ever changed through take_damage()."""
+    id: int
+    crew_id: int
+    leader_id: int
+    template: MobTemplate
+    room_id: int
+    boss_hp: int
+    status: str = 'forming'
+    started_at: Optional[str] = None
+    started_clock: Optional[float] = None
+    members: Dict[int, RaidMember] = field(default_factory=dict)
+    pending: Dict[int, RaidAttack] = field(default_factory=dict)
+    dirty: bool = False
+    # 'defeated' or 'failed' once the raid is over; status follows when the settlement commits
+    outcome: Optional[str] = None
+    
+    @property
+    def boss_hp_max(self) -> int:
+        return self.template.hit_points
+    
+    def take_damage(self, amount: int) -> int:
+        """Take damage off the shared pool; returns how much actually landed.
+        
+        Runs without awaiting, so on the event loop it is atomic: concurrent
+        attackers can never spend the same hit points twice.
+        """
+        applied = min(self.boss_hp, max(0, amount))
+        self.boss_hp -= applied
+        return applied
+    
+    def time_left(self) -> Optional[int]:
+        if self.started_clock is None:
+            return None
+        return max(0, int(RAID_TIME_LIMIT_SECONDS - (time.monotonic() - self.started_clock)))
+    
+    def ranked_members(self) -> List[RaidMember]:
+        return sorted(self.members.values(), key=lambda member: member.damage_dealt, reverse=True)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class RaidEngine:
+    """Open raids held in memory; attacks are queued and resolved once per tick"""
+    
+    def __init__(self):
+        self.raids: Dict[int, Raid] = {}
+        self._last_checkpoint = time.monotonic()
+        self._unsaved_damage: Dict[int, int] = {}
+    
+    def load(self, raids, participants):
+        """Rebuild open raids from their last checkpoint"""
+        templates = get_mob_world().templates
+        self.raids.clear()
+        for row in raids:
+            template = templates.get(row['mob_template_id'])
+            if not template:
+                continue
+            raid = Raid(id=row['id'], crew_id=row['crew_id'], leader_id=row['leader_id'], template=template,
+                        room_id=row['room_id'], boss_hp=row['boss_hp'], status=row['status'],
+                        started_at=row['started_at'])
+            if raid.started_at:
+                started = datetime.fromisoformat(raid.started_at).replace(tzinfo=timezone.utc)
+                elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+                raid.started_clock = time.monotonic() - elapsed
+            self.raids[raid.id] = raid
+        for row in participants:
+            raid = self.raids.get(row['raid_id'])
+            if raid:
+                raid.members[row['character_id']] = RaidMember(row['character_id'], row['damage_dealt'], row['attacks'])
+    
+    def get(self, raid_id: int) -> Optional[Raid]:
+        return self.raids.get(raid_id)
+    
+    def open_raid_for(self, crew_id: int, template_id: int) -> Optional[Raid]:
+        for raid in self.raids.values():
+            if raid.crew_id == crew_id and raid.template.id == template_id:
+                return raid
+        return None
+    
+    def raids_for_crew(self, crew_id: int) -> List[Raid]:
+        return [raid for raid in self.raids.values() if raid.crew_id == crew_id]
+    
+    async def form(self, conn, crew_id: int, leader_id: int, template: MobTemplate, room_id: int) -> Raid:
+        if not template.is_raid_boss:
+            raise RaidError("Only raid bosses can be raided")
+        if self.open_raid_for(crew_id, template.id):
+            raise RaidError("Your crew already has a raid against this boss")
+        
+        database = await get_db()
+        raid_id = await database.queries.create_raid(
+            conn, crew_id=crew_id, leader_id=leader_id, mob_template_id=template.id,
+            room_id=room_id, boss_hp=template.hit_points
+        )
+        await database.queries.save_raid_participants(conn, [
+            {'raid_id': raid_id, 'character_id': leader_id, 'damage_dealt': 0, 'attacks': 0}
+        ])
+        raid = Raid(id=raid_id, crew_id=crew_id, leader_id=leader_id, template=template,
+                    room_id=room_id, boss_hp=template.hit_points)
+        raid.members[leader_id] = RaidMember(leader_id)
+        self.raids[raid.id] = raid
+        return raid
+    
+    async def join(self, conn, raid: Raid, character_id: int):
+        if character_id in raid.members:
+            return
+        if len(raid.members) >= RAID_MAX_PARTY:
+            raise RaidError("The raid party is full")
+        
+        database = await get_db()
+        await database.queries.save_raid_participants(conn, [
+            {'raid_id': raid.id, 'character_id': character_id, 'damage_dealt': 0, 'attacks': 0}
+        ])
+        raid.members[character_id] = RaidMember(character_id)
+    
+    async def launch(self, conn, raid: Raid):
+        if raid.status != 'forming':
+            raise RaidError("The raid has already started")
+        if len(raid.members) < RAID_MIN_PARTY:
+            raise RaidError(f"A raid needs at least {RAID_MIN_PARTY} members")
+        
+        raid.status = 'active'
+        raid.started_at = _now()
+        raid.started_clock = time.monotonic()
+        database = await get_db()
+        await database.queries.update_raid(conn, raid_id=raid.id, status=raid.status, boss_hp=raid.boss_hp,
+                                           started_at=raid.started_at, ended_at=None)
+    
+    def submit(self, raid: Raid, character_id: int, combatant: Combatant) -> asyncio.Future:
+        """Queue an attack for the next tick; the future resolves with its outcome"""
+        if raid.status != 'active' or raid.outcome:
+            raise RaidError("The raid is not in progress")
+        if character_id not in raid.members:
+            raise RaidError("You are not in this raid")
+        if character_id in raid.pending:
+            raise RaidError("Your last attack hasn't landed yet")
+        
+        future = asyncio.get_running_loop().create_future()
+        raid.pending[character_id] = RaidAttack(character_id, combatant, future)
+        return future
+    
+    def resolve(self, raid: Raid) -> Dict[int, int]:
+        """Resolve every queued attack against the boss; returns damage taken per character"""
+        damage_taken = {}
+        attacks = list(raid.pending.values())
+        raid.pending.clear()
+        random.shuffle(attacks)
+        
+        for attack in attacks:
+            if raid.boss_hp == 0:
+                attack.future.set_result({'damage': 0, 'taken': 0, 'killed': False, 'boss_hp': 0})
+                continue
+            
+            boss = Combatant(
+                id=raid.template.id, level=raid.template.level, hit_points=raid.boss_hp,
+                hit_points_max=raid.template.hit_points, attack=raid.template.attack,
+                chaos_damage=raid.template.chaos_damage,
+                critical_hit_percent=raid.template.critical_hit_percent,
+                rampage_percent=raid.template.rampage_percent
+            )
+            battle = run_battle(new_seed(), attack.combatant, boss, max_rounds=RAID_ROUNDS_PER_ATTACK)
+            landed = raid.take_damage(battle.damage_dealt_by(ATTACKER))
+            taken = battle.damage_dealt_by(DEFENDER)
+            
+            member = raid.members[attack.character_id]
+            member.damage_dealt += landed
+            member.attacks += 1
+            damage_taken[attack.character_id] = damage_taken.get(attack.character_id, 0) + taken
+            raid.dirty = True
+            
+            attack.future.set_result({'damage': landed, 'taken': taken, 'killed': raid.boss_hp == 0,
+                                      'boss_hp': raid.boss_hp})
+        return damage_taken
+    
+    async def tick(self):
+        """Resolve queued attacks, settle finished raids and checkpoint the rest.
+        
+        Nothing changes in memory until the write commits: a raid that fails to
+        settle keeps its outcome and is settled again next tick, and damage
+        that fails to save is kept for the next write.
+        """
+        finished = []
+        for raid in list(self.raids.values()):
+            if raid.status != 'active':
+                continue
+            if not raid.outcome:
+                for character_id, damage in self.resolve(raid).items():
+                    self._unsaved_damage[character_id] = self._unsaved_damage.get(character_id, 0) + damage
+                if raid.boss_hp == 0:
+                    raid.outcome = 'defeated'
+                elif raid.time_left() == 0:
+                    raid.outcome = 'failed'
+            if raid.outcome:
+                finished.append(raid)
+        
+        checkpoint_due = time.monotonic() - self._last_checkpoint >= RAID_CHECKPOINT_SECONDS
+        to_checkpoint = [raid for raid in self.raids.values()
+                         if raid.dirty and raid.status == 'active' and not raid.outcome] if checkpoint_due else []
+        if not (self._unsaved_damage or finished or to_checkpoint):
+            return
+        
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            damage, self._unsaved_damage = self._unsaved_damage, {}
+            try:
+                async with database.transaction(conn):
+                    if damage:
+                        await database.queries.apply_raid_damage(conn, [
+                            {'character_id': character_id, 'damage': amount} for character_id, amount in damage.items()
+                        ])
+                    for raid in to_checkpoint:
+                        await self._checkpoint(conn, raid)
+                    for raid in finished:
+                        await self._settle(conn, raid)
+            except Exception:
+                for character_id, amount in damage.items():
+                    self._unsaved_damage[character_id] = self._unsaved_damage.get(character_id, 0) + amount
+                raise
+            
+            if checkpoint_due:
+                self._last_checkpoint = time.monotonic()
+            for raid in to_checkpoint:
+                raid.dirty = False
+            for raid in finished:
+                raid.status = raid.outcome
+                del self.raids[raid.id]
+            
+            rewarded = [member.character_id for raid in finished if raid.outcome == 'defeated'
+                        for member in raid.members.values() if member.damage_dealt > 0]
+            if rewarded:
+                await refresh_characters(conn, rewarded)
+    
+    async def _checkpoint(self, conn, raid: Raid, ended_at: Optional[str] = None):
+        database = await get_db()
+        await database.queries.update_raid(conn, raid_id=raid.id, status=raid.outcome or raid.status,
+                                           boss_hp=raid.boss_hp, started_at=raid.started_at, ended_at=ended_at)
+        await database.queries.save_raid_participants(conn, [
+            {'raid_id': raid.id, 'character_id': member.character_id,
+             'damage_dealt': member.damage_dealt, 'attacks': member.attacks}
+            for member in raid.members.values()
+        ])
+    
+    async def _settle(self, conn, raid: Raid):
+        """Final checkpoint, plus rewards split by damage share and loot if the boss fell"""
+        await self._checkpoint(conn, raid, ended_at=_now())
+        if raid.outcome != 'defeated':
+            return
+        
+        database = await get_db()
+        loot_table = await database.queries.get_mob_loot(conn, mob_template_id=raid.template.id)
+        total_damage = sum(member.damage_dealt for member in raid.members.values()) or 1
+        
+        for member in raid.members.values():
+            share = member.damage_dealt / total_damage
+            if share <= 0:
+                continue
+            row = await database.queries.get_character_by_id(conn, character_id=member.character_id)
+            if not row:
+                continue
+            character = Character.from_db_row(get_catalog().character_row(row))
+            character.gain_experience(int(raid.template.experience_reward * share))
+            character.gold += int(raid.template.gold_reward * share)
+            await save_character_stats(conn, character)
+            
+            if member.damage_dealt < raid.boss_hp_max * RAID_LOOT_MIN_SHARE:
+                continue
+            for loot in loot_table:
+                if random.random() * 100 < loot['drop_percent']:
+                    await database.queries.add_to_inventory(conn, character_id=member.character_id,
+                                                            item_id=loot['item_id'], quantity=1, transfers_remaining=10)
+                    await database.queries.record_raid_loot(conn, raid_id=raid.id, character_id=member.character_id,
+                                                            item_id=loot['item_id'])
+
+# Global raid engine instance
+raid_engine = RaidEngine()
+
+def get_raid_engine() -> RaidEngine:
+    return raid_engine
+
+async def load_raid_engine():
+    """Restore open raids from the database"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        raids = await database.queries.get_open_raids(conn)
+        participants = await database.queries.get_open_raid_participants(conn)
+    raid_engine.load(raids, participants)
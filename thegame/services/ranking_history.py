@@ -0,0 +1,144 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import get_db
+from services.leaderboards import LEADERBOARDS
+
+# How often the recorder wakes; a character gets at most one sample per day
+HISTORY_INTERVAL_SECONDS = 3600
+HISTORY_BATCH_SIZE = 10000
+SAMPLE_FIELDS = ('day', 'power_rank', 'level_rank', 'total_power', 'level', 'gold')
+
+def encode_samples(samples: List[Tuple[int, ...]], previous: Optional[Tuple[int, ...]] = None) -> bytes:
+    """Samples as zigzag varint deltas from the one before (from zero for the first in a row)"""
+    out = bytearray()
+    previous = previous or (0,) * len(SAMPLE_FIELDS)
+    for sample in samples:
+        for value, before in zip(sample, previous):
+            delta = value - before
+            delta = (delta << 1) ^ (delta >> 63)
+            while delta >= 0x80:
+                out.append((delta & 0x7f) | 0x80)
+                delta >>= 7
+            out.append(delta)
+        previous = sample
+    return bytes(out)
+
+def decode_samples(blob: bytes) -> List[Tuple[int, ...]]:
+    samples = []
+    values, previous = [], (0,) * len(SAMPLE_FIELDS)
+    delta, shift = 0, 0
+    for byte in blob:
+        delta |= (byte & 0x7f) << shift
+        shift += 7
+        if byte & 0x80:
+            continue
+        values.append(previous[len(values)] + ((delta >> 1) ^ -(delta & 1)))
+        delta, shift = 0, 0
+        if len(values) == len(SAMPLE_FIELDS):
+            previous = tuple(values)
+            samples.append(previous)
+            values = []
+    return samples
+
+def day_number(day: date) -> int:
+    return day.toordinal()
+
+def downsample(samples: List[Tuple[int, ...]], first_day: int, last_day: int, points: int) -> List[dict]:
+    """Daily series (each day carries the latest sample forward), bucketed down to at most `points`"""
+    bucket = max(1, -(-(last_day - first_day + 1) // max(1, points)))
+    series = []
+    index, current = 0, None
+    for day in range(first_day, last_day + 1):
+        while index < len(samples) and samples[index][0] <= day:
+            current = samples[index]
+            index += 1
+        # Each bucket is represented by its last day
+        if current and ((day - first_day + 1) % bucket == 0 or day == last_day):
+            entry = dict(zip(SAMPLE_FIELDS, current))
+            entry['day'] = date.fromordinal(day).isoformat()
+            series.append(entry)
+    return series
+
+class RankingHistory:
+    """Appends one compact sample per character per day, only when their rank or stats moved"""
+    
+    def __init__(self):
+        self.month: Optional[str] = None
+        # Last sample written to each character's row for self.month
+        self.last: Dict[int, Tuple[int, ...]] = {}
+    
+    def load(self, month: str, rows):
+        self.month = month
+        self.last = {}
+        for row in rows:
+            samples = decode_samples(row['samples'])
+            if samples:
+                self.last[row['character_id']] = samples[-1]
+    
+    def current_samples(self, today: int) -> Dict[int, Tuple[int, ...]]:
+        """Today's sample for every character, straight from the in-memory ladders"""
+        power, level, gold = LEADERBOARDS['power'], LEADERBOARDS['level'], LEADERBOARDS['gold']
+        level_ranks = {character_id: rank for rank, character_id in enumerate(level.page(0, len(level)), 1)}
+        samples = {}
+        for rank, character_id in enumerate(power.page(0, len(power)), 1):
+            total_power, character_level, _ = power.keys[character_id]
+            samples[character_id] = (today, rank, level_ranks.get(character_id, 0), -total_power, -character_level,
+                                     -gold.keys[character_id][0])
+        return samples
+    
+    async def record(self, now: Optional[datetime] = None):
+        """Write today's samples for characters whose rank or stats changed since their last one"""
+        now = now or datetime.now(timezone.utc)
+        today, month = day_number(now.date()), now.strftime('%Y-%m')
+        if month != self.month:
+            # New month, new rows: their first sample is stored in full
+            self.month, self.last = month, {}
+        
+        changes = []
+        for character_id, sample in self.current_samples(today).items():
+            previous = self.last.get(character_id)
+            if previous and (previous[0] >= today or previous[1:] == sample[1:]):
+                continue
+            changes.append((character_id, sample, previous))
+        if not changes:
+            return 0
+        
+        database = await get_db()
+        async with database.get_connection_context() as conn, database.transaction(conn):
+            for start in range(0, len(changes), HISTORY_BATCH_SIZE):
+                await database.queries.append_ranking_history(conn, [
+                    {'character_id': character_id, 'month': month,
+                     'samples': encode_samples([sample], previous)}
+                    for character_id, sample, previous in changes[start:start + HISTORY_BATCH_SIZE]
+                ])
+        
+        for character_id, sample, _ in changes:
+            self.last[character_id] = sample
+        return len(changes)
+
+# Global ranking history instance
+ranking_history = RankingHistory()
+
+def get_ranking_history() -> RankingHistory:
+    return ranking_history
+
+async def load_ranking_history():
+    """Pick up this month's last samples so appends continue the delta chain"""
+    month = datetime.now(timezone.utc).strftime('%Y-%m')
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        rows = await database.queries.get_month_ranking_history(conn, month=month)
+    ranking_history.load(month, rows)
+
+async def get_character_history(conn, character_id: int, days: int, points: int) -> List[dict]:
+    """A character's downsampled daily series over the last `days` days"""
+    last_day = day_number(datetime.now(timezone.utc).date())
+    first_day = last_day - days + 1
+    # Start a month early: the sample in force on first_day may be from before it
+    since = (date.fromordinal(first_day).replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    database = await get_db()
+    samples = []
+    for row in await database.queries.get_ranking_history(conn, character_id=character_id, since=since):
+        samples.extend(decode_samples(row['samples']))
+    return downsample(samples, first_day, last_day, points)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import get_db
+from services.leaderboards import LEADERBOARDS, RANKED_COLUMNS
+
+SNAPSHOT_INTERVAL_SECONDS = 300
+PAGE_SIZE = 50
+# Ranks materialized with their display rows and pre-rendered; deeper pages are read live
+SNAPSHOT_TOP = 1000
+
+@dataclass
+class SnapshotPage:
+    ranking_type: str
+    page: int
+    rows: List[dict]
+    etag: str
+    json: bytes
+    # Filled in by the rankings handler when it pre-renders the page
+    html: str = ''
+
+def render_page_json(ranking_type: str, page: int, total: int, taken_at: Optional[str], rows) -> bytes:
+    """The JSON form of one rankings page"""
+    return json.dumps({
+        'type': ranking_type, 'page': page, 'last_page': max(1, -(-total // PAGE_SIZE)), 'total': total,
+        'taken_at': taken_at,
+        'rankings': [{'rank': row['rank'], 'id': row['character_id'], 'name': row['name'],
+                      'class_name': row['class_name'], 'level': row['level'], 'value': row['value']}
+                     for row in rows]
+    }).encode()
+
+class RankingSnapshots:
+    """The last materialized snapshot of every ladder, split into ready-to-serve pages"""
+    
+    def __init__(self):
+        self.taken_at: Optional[str] = None
+        self.totals: Dict[str, int] = {}
+        self.pages: Dict[Tuple[str, int], SnapshotPage] = {}
+    
+    def page(self, ranking_type: str, page: int) -> Optional[SnapshotPage]:
+        return self.pages.get((ranking_type, page))
+    
+    def last_page(self, ranking_type: str) -> int:
+        return max(1, -(-self.totals.get(ranking_type, 0) // PAGE_SIZE))
+    
+    def load(self, rows, totals: Dict[str, int], taken_at: str):
+        """Split snapshot rows (ordered by type, rank) into pages"""
+        by_page: Dict[Tuple[str, int], List[dict]] = {(name, 1): [] for name in LEADERBOARDS}
+        for row in rows:
+            by_page.setdefault((row['ranking_type'], (row['rank'] - 1) // PAGE_SIZE + 1), []).append(dict(row))
+        
+        pages = {}
+        for (ranking_type, page), page_rows in by_page.items():
+            etag = '"' + hashlib.sha1(f"{taken_at}:{ranking_type}:{page}".encode()).hexdigest()[:16] + '"'
+            body = render_page_json(ranking_type, page, totals.get(ranking_type, 0), taken_at, page_rows)
+            pages[(ranking_type, page)] = SnapshotPage(ranking_type, page, page_rows, etag, body)
+        
+        self.pages = pages
+        self.totals = dict(totals)
+        self.taken_at = taken_at
+    
+    async def take(self):
+        """Materialize the top SNAPSHOT_TOP of every ladder with their display rows"""
+        taken_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        order = {name: leaderboard.page(0, len(leaderboard)) for name, leaderboard in LEADERBOARDS.items()}
+        totals = {name: len(ids) for name, ids in order.items()}
+        top_ids = {character_id for ids in order.values() for character_id in ids[:SNAPSHOT_TOP]}
+        
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            details = {row['id']: row for row in
+                       await database.queries.get_ranking_rows(conn, character_ids=json.dumps(list(top_ids)))}
+            snapshot_rows = []
+            for name, ids in order.items():
+                rank = 0
+                for character_id in ids[:SNAPSHOT_TOP]:
+                    row = details.get(character_id)
+                    if not row:
+                        continue
+                    rank += 1
+                    snapshot_rows.append({
+                        'ranking_type': name, 'rank': rank, 'character_id': character_id, 'name': row['name'],
+                        'class_name': row['class_name'], 'level': row['level'], 'value': row[RANKED_COLUMNS[name]],
+                        'last_active': row['last_active'], 'taken_at': taken_at
+                    })
+            
+            async with database.transaction(conn):
+                await database.queries.clear_ranking_snapshot(conn)
+                await database.queries.save_ranking_snapshot(conn, snapshot_rows)
+        
+        self.load(snapshot_rows, totals, taken_at)
+
+# Global ranking snapshots instance
+ranking_snapshots = RankingSnapshots()
+
+def get_ranking_snapshots() -> RankingSnapshots:
+    return ranking_snapshots
+
+def _is_current(taken_at: str) -> bool:
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(taken_at).replace(tzinfo=timezone.utc)
+    return age.total_seconds() < SNAPSHOT_INTERVAL_SECONDS
+
+async def load_ranking_snapshots():
+    """Serve the last snapshot straight away after a restart if it's still current, else take a new one"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        rows = await database.queries.get_ranking_snapshot(conn)
+    # An older snapshot's ranks would disagree with the live ladders and their totals
+    if not rows or not _is_current(rows[0]['taken_at']):
+        await ranking_snapshots.take()
+        return
+    totals = {name: len(leaderboard) for name, leaderboard in LEADERBOARDS.items()}
+    ranking_snapshots.load(rows, totals, rows[0]['taken_at'])
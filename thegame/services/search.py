@@ -0,0 +1,39 @@
+import re
+from typing import List, Optional
+
+from database import get_db
+
+SEARCH_LIMIT = 20
+# Longer queries are cut down to their first few words
+MAX_SEARCH_TERMS = 8
+# One-letter prefixes match (and have to rank) most of the catalog
+MIN_TERM_LENGTH = 2
+
+def fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match as a prefix.
+    
+    Words are quoted, so nothing the player types is read as FTS5 syntax.
+    Two- and three-letter prefixes are served by the index's prefix tables.
+    """
+    words = [word for word in re.findall(r'\w+', text.lower()) if len(word) >= MIN_TERM_LENGTH][:MAX_SEARCH_TERMS]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+async def search_items(conn, text: str, slot: Optional[str] = None, min_level: int = 1, max_level: int = 1000,
+                       limit: int = SEARCH_LIMIT) -> List:
+    """Best-matching items for the text, optionally within a slot and level range"""
+    match = fts_query(text)
+    if not match:
+        return []
+    database = await get_db()
+    return await database.queries.search_items(conn, match=match, slot=slot, min_level=min_level,
+                                               max_level=max_level, limit=limit)
+
+async def search_mobs(conn, text: str, limit: int = SEARCH_LIMIT) -> List:
+    """Best-matching mobs for the text, with the rooms they spawn in"""
+    match = fts_query(text)
+    if not match:
+        return []
+    database = await get_db()
+    return await database.queries.search_mobs(conn, match=match, limit=limit)
@@ -0,0 +1,139 @@
+import bisect
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from database import get_db
+
+# A character counts as online for this long after their last request
+ONLINE_SECONDS = 300
+# The same attacker can't hit the same target again within this window
+ATTACK_COOLDOWN_SECONDS = 60
+DEFAULT_LEVEL_BAND = 5
+
+@dataclass
+class TargetEntry:
+    character_id: int
+    name: str
+    level: int
+    total_power: int
+    room_id: int
+    zone_id: int
+    last_seen: float
+
+class TargetIndex:
+    """Online, alive characters bucketed by room and by zone.
+    
+    Each bucket is a list of (level, character_id) kept sorted, so a level
+    band is two bisects away and the closest fights are found by walking
+    outwards from the attacker's own level.
+    """
+    
+    def __init__(self):
+        self.entries: Dict[int, TargetEntry] = {}
+        self.by_room: Dict[int, List[Tuple[int, int]]] = {}
+        self.by_zone: Dict[int, List[Tuple[int, int]]] = {}
+        self.room_zones: Dict[int, int] = {}
+        self.cooldowns: Dict[int, Dict[int, float]] = {}
+    
+    def load(self, rooms):
+        self.room_zones = {row['id']: row['zone_id'] for row in rooms}
+    
+    def update(self, character):
+        """Refresh a character after a request or a fight; drops them if they're down"""
+        if character.hit_points_current <= 0:
+            self.remove(character.id)
+            return
+        
+        entry = self.entries.get(character.id)
+        zone_id = self.room_zones.get(character.current_room_id, 0)
+        if entry and (entry.level, entry.room_id) == (character.level, character.current_room_id):
+            entry.last_seen = time.monotonic()
+            entry.total_power = character.total_power
+            return
+        
+        self.remove(character.id)
+        entry = TargetEntry(character.id, character.name, character.level, character.total_power,
+                            character.current_room_id, zone_id, time.monotonic())
+        self.entries[character.id] = entry
+        key = (entry.level, entry.character_id)
+        bisect.insort(self.by_room.setdefault(entry.room_id, []), key)
+        bisect.insort(self.by_zone.setdefault(entry.zone_id, []), key)
+    
+    def remove(self, character_id: int):
+        entry = self.entries.pop(character_id, None)
+        if not entry:
+            return
+        key = (entry.level, entry.character_id)
+        for buckets, bucket_id in ((self.by_room, entry.room_id), (self.by_zone, entry.zone_id)):
+            bucket = buckets[bucket_id]
+            bucket.pop(bisect.bisect_left(bucket, key))
+            if not bucket:
+                del buckets[bucket_id]
+    
+    def record_attack(self, attacker_id: int, target_id: int):
+        self.cooldowns.setdefault(attacker_id, {})[target_id] = time.monotonic() + ATTACK_COOLDOWN_SECONDS
+    
+    def active_cooldowns(self, attacker_id: int) -> Dict[int, float]:
+        """{target_id: monotonic expiry} for the attacker, dropping expired ones"""
+        recent = self.cooldowns.get(attacker_id)
+        if not recent:
+            return {}
+        now = time.monotonic()
+        for target_id in [tid for tid, until in recent.items() if until <= now]:
+            del recent[target_id]
+        if not recent:
+            del self.cooldowns[attacker_id]
+        return recent
+    
+    def cooldown_left(self, attacker_id: int, target_id: int) -> int:
+        """Seconds until attacker may hit target again (0 if they can now)"""
+        until = self.active_cooldowns(attacker_id).get(target_id)
+        return int(until - time.monotonic()) + 1 if until else 0
+    
+    def find(self, attacker, band: int = DEFAULT_LEVEL_BAND, scope: str = 'room', limit: int = 20) -> List[TargetEntry]:
+        """Closest-level online targets within +/- band levels, skipping cooled-down ones"""
+        if scope == 'zone':
+            bucket = self.by_zone.get(self.room_zones.get(attacker.current_room_id, 0), [])
+        else:
+            bucket = self.by_room.get(attacker.current_room_id, [])
+        
+        low = bisect.bisect_left(bucket, (attacker.level - band, -1))
+        high = bisect.bisect_right(bucket, (attacker.level + band, float('inf')))
+        # Walk outwards from the attacker's level so the fairest fights come first
+        right = bisect.bisect_left(bucket, (attacker.level, -1), low, high)
+        left = right - 1
+        
+        now = time.monotonic()
+        cooling = self.active_cooldowns(attacker.id)
+        found, stale = [], []
+        while len(found) < limit and (left >= low or right < high):
+            if right >= high or (left >= low and attacker.level - bucket[left][0] <= bucket[right][0] - attacker.level):
+                _, character_id = bucket[left]
+                left -= 1
+            else:
+                _, character_id = bucket[right]
+                right += 1
+            
+            entry = self.entries[character_id]
+            if now - entry.last_seen > ONLINE_SECONDS:
+                stale.append(character_id)
+            elif character_id != attacker.id and character_id not in cooling:
+                found.append(entry)
+        
+        for character_id in stale:
+            self.remove(character_id)
+        return found
+
+# Global target index instance
+target_index = TargetIndex()
+
+def get_target_index() -> TargetIndex:
+    return target_index
+
+async def load_target_index():
+    """Load the room -> zone map the index buckets by"""
+    database = await get_db()
+    async with database.get_connection_context() as conn:
+        rooms = await database.queries.get_room_zones(conn)
+    target_index.load(rooms)
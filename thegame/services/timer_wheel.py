@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional
+
+SLOT_BITS = 6
+SLOTS_PER_LEVEL = 1 << SLOT_BITS
+SLOT_MASK = SLOTS_PER_LEVEL - 1
+
+class Timer:
+    """Handle for a scheduled entry; pass it to cancel()"""
+    __slots__ = ('expires', 'payload', 'slot')
+    
+    def __init__(self, expires: int, payload: Any):
+        self.expires = expires
+        self.payload = payload
+        self.slot: Optional[Dict['Timer', None]] = None
+
+class TimerWheel:
+    """Hierarchical timer wheel (Varghese & Lauck style).
+    
+    Level 0 has one slot per tick, level 1 one slot per 64 ticks, level 2 one
+    per 4096 ticks and so on. Scheduling and cancelling are O(1); a timer is
+    only touched again when its level rolls over and it cascades one level
+    down, so the cost per tick does not grow with the number of pending timers.
+    """
+    
+    def __init__(self, levels: int = 4, start_tick: int = 0):
+        self.levels = levels
+        self.current_tick = start_tick
+        self.wheels: List[List[Dict[Timer, None]]] = [
+            [{} for _ in range(SLOTS_PER_LEVEL)] for _ in range(levels)
+        ]
+        self.pending = 0
+    
+    @property
+    def horizon(self) -> int:
+        """Furthest a timer can be scheduled ahead, in ticks"""
+        return (1 << (SLOT_BITS * self.levels)) - 1
+    
+    def schedule(self, delay_ticks: int, payload: Any) -> Timer:
+        """Fire payload after delay_ticks (at least one tick from now)"""
+        delay_ticks = min(max(1, int(delay_ticks)), self.horizon)
+        timer = Timer(self.current_tick + delay_ticks, payload)
+        self._place(timer)
+        self.pending += 1
+        return timer
+    
+    def cancel(self, timer: Timer) -> bool:
+        if timer.slot is None:
+            return False
+        del timer.slot[timer]
+        timer.slot = None
+        self.pending -= 1
+        return True
+    
+    def _place(self, timer: Timer):
+        delta = timer.expires - self.current_tick
+        level = 0
+        while level < self.levels - 1 and delta >= (1 << (SLOT_BITS * (level + 1))):
+            level += 1
+        slot = self.wheels[level][(timer.expires >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot[timer] = None
+        timer.slot = slot
+    
+    def advance(self, ticks: int = 1) -> List[Any]:
+        """Move the wheel forward and return the payloads of every timer that fired"""
+        fired = []
+        for _ in range(ticks):
+            self.current_tick += 1
+            tick = self.current_tick
+            
+            # Cascade every level whose lower level just wrapped around,
+            # highest first so timers can trickle all the way down this tick
+            top = 0
+            while top + 1 < self.levels and (tick & ((1 << (SLOT_BITS * (top + 1))) - 1)) == 0:
+                top += 1
+            for level in range(top, 0, -1):
+                slot = self.wheels[level][(tick >> (SLOT_BITS * level)) & SLOT_MASK]
+                timers = list(slot)
+                slot.clear()
+                for timer in timers:
+                    self._place(timer)
+            
+            slot = self.wheels[0][tick & SLOT_MASK]
+            if slot:
+                for timer in list(slot):
+                    if timer.expires <= tick:
+                        del slot[timer]
+                        timer.slot = None
+                        self.pending -= 1
+                        fired.append(timer.payload)
+        return fired
+    
+    def advance_to(self, tick: int) -> List[Any]:
+        """Catch up to an absolute tick (e.g. after the event loop stalled)"""
+        if tick <= self.current_tick:
+            return []
+        return self.advance(tick - self.current_tick)
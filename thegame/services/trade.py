@@ -0,0 +1,248 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from database import get_db
+from services.catalog import get_catalog
+from services.leaderboards import refresh_characters
+from services.presence import SEND_QUEUE_SIZE
+
+# A trade nobody has touched for this long is dropped when either side starts another
+TRADE_IDLE_SECONDS = 600
+MAX_TRADE_ITEMS = 12
+
+class TradeError(Exception):
+    """A trade action that isn't allowed"""
+
+@dataclass
+class StagedItem:
+    inventory_id: int
+    item_id: int
+    name: str
+    color: str
+    quantity: int
+    transfers_remaining: Optional[int]
+
+@dataclass
+class TradeOffer:
+    items: Dict[int, StagedItem] = field(default_factory=dict)
+    gold: int = 0
+    confirmed: bool = False
+
+@dataclass
+class TradeSession:
+    """Two players' offers. Any change bumps `version` and clears both confirmations."""
+    id: int
+    offers: Dict[int, TradeOffer]
+    status: str = 'open'  # open, completed, cancelled
+    version: int = 1
+    message: str = ''
+    touched: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    
+    def partner_of(self, character_id: int) -> int:
+        return next(party for party in self.offers if party != character_id)
+    
+    def changed(self, message: str = ''):
+        self.version += 1
+        self.message = message
+        self.touched = time.monotonic()
+        for offer in self.offers.values():
+            offer.confirmed = False
+
+class TradeDesk:
+    """Live trade sessions, held in memory until both sides confirm.
+    
+    Staging items and gold only changes the session and pushes the new
+    state to both players' send queues; nothing is written until both
+    confirm the same version, when settle() swaps everything in one
+    transaction. Items are taken with conditional updates, so a stack that
+    was sold or used meanwhile fails the whole trade instead of duping it.
+    """
+    
+    def __init__(self):
+        self.sessions: Dict[int, TradeSession] = {}
+        self.by_character: Dict[int, TradeSession] = {}
+        self.subscribers: Dict[int, asyncio.Queue] = {}
+        self._ids = itertools.count(1)
+    
+    def session_for(self, character_id: int) -> Optional[TradeSession]:
+        return self.by_character.get(character_id)
+    
+    def open(self, character_id: int, partner_id: int) -> TradeSession:
+        """Start a trade; an idle trade either side left behind is cancelled first"""
+        if character_id == partner_id:
+            raise TradeError("You can't trade with yourself")
+        for party in (character_id, partner_id):
+            session = self.by_character.get(party)
+            if session and time.monotonic() - session.touched >= TRADE_IDLE_SECONDS:
+                self._close(session, 'cancelled', "The trade timed out")
+        current = self.by_character.get(character_id)
+        if current:
+            if set(current.offers) == {character_id, partner_id}:
+                return current
+            raise TradeError("Finish your current trade first")
+        if partner_id in self.by_character:
+            raise TradeError("That player is already trading")
+        
+        session = TradeSession(id=next(self._ids), offers={character_id: TradeOffer(), partner_id: TradeOffer()})
+        self.sessions[session.id] = session
+        self.by_character[character_id] = self.by_character[partner_id] = session
+        self.publish(session)
+        return session
+    
+    def _session(self, character_id: int) -> TradeSession:
+        session = self.by_character.get(character_id)
+        if not session:
+            raise TradeError("You're not trading with anyone")
+        return session
+    
+    async def stage_item(self, character_id: int, inventory_id: int, quantity: int):
+        """Offer `quantity` of one of your inventory stacks"""
+        session = self._session(character_id)
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            row = await database.queries.get_inventory_row(conn, inventory_id=inventory_id, character_id=character_id)
+        if not row or (row['transfers_remaining'] is not None and row['transfers_remaining'] <= 0):
+            raise TradeError("That item can't be traded")
+        item = get_catalog().item(row['item_id'])
+        if not 1 <= quantity <= row['quantity']:
+            raise TradeError(f"You have {row['quantity']} of that item")
+        
+        async with session.lock:
+            offer = self._open_offer(session, character_id)
+            if inventory_id not in offer.items and len(offer.items) >= MAX_TRADE_ITEMS:
+                raise TradeError(f"A trade holds at most {MAX_TRADE_ITEMS} items per side")
+            offer.items[inventory_id] = StagedItem(inventory_id, row['item_id'], item['name'], item['color'],
+                                                   quantity, row['transfers_remaining'])
+            session.changed()
+            self.publish(session)
+    
+    async def unstage_item(self, character_id: int, inventory_id: int):
+        session = self._session(character_id)
+        async with session.lock:
+            if self._open_offer(session, character_id).items.pop(inventory_id, None):
+                session.changed()
+                self.publish(session)
+    
+    async def set_gold(self, character_id: int, amount: int):
+        if amount < 0:
+            raise TradeError("Gold can't be negative")
+        session = self._session(character_id)
+        async with session.lock:
+            offer = self._open_offer(session, character_id)
+            if offer.gold != amount:
+                offer.gold = amount
+                session.changed()
+                self.publish(session)
+    
+    def _open_offer(self, session: TradeSession, character_id: int) -> TradeOffer:
+        if session.status != 'open':
+            raise TradeError("This trade is over")
+        return session.offers[character_id]
+    
+    async def confirm(self, character_id: int, version: int):
+        """Accept the trade as of `version`; the second confirmation settles it"""
+        session = self._session(character_id)
+        async with session.lock:
+            offer = self._open_offer(session, character_id)
+            if version != session.version:
+                raise TradeError("The trade changed; check it again before confirming")
+            offer.confirmed = True
+            session.touched = time.monotonic()
+            if not all(offer.confirmed for offer in session.offers.values()):
+                self.publish(session)
+                return
+            try:
+                await self.settle(session)
+            except TradeError as e:
+                session.changed(str(e))
+                self.publish(session)
+                raise
+            except Exception:
+                session.changed("The trade couldn't be completed; try again")
+                self.publish(session)
+                raise
+            self._close(session, 'completed', "Trade complete")
+    
+    def cancel(self, character_id: int):
+        session = self.by_character.get(character_id)
+        if session and session.status == 'open' and not session.lock.locked():
+            self._close(session, 'cancelled', "The trade was cancelled")
+    
+    def _close(self, session: TradeSession, status: str, message: str):
+        session.status, session.message = status, message
+        self.sessions.pop(session.id, None)
+        for party in session.offers:
+            if self.by_character.get(party) is session:
+                del self.by_character[party]
+        self.publish(session)
+    
+    async def settle(self, session: TradeSession):
+        """Swap both offers in one transaction, or raise TradeError and change nothing"""
+        database = await get_db()
+        async with database.get_connection_context() as conn:
+            async with database.transaction(conn):
+                for giver, offer in session.offers.items():
+                    receiver = session.partner_of(giver)
+                    if offer.gold:
+                        if not await database.queries.debit_gold(conn, character_id=giver, amount=offer.gold):
+                            raise TradeError("Not enough gold to cover the offer")
+                        await database.queries.credit_gold(conn, character_id=receiver, amount=offer.gold)
+                    for staged in offer.items.values():
+                        taken = (await database.queries.take_inventory_units(
+                                     conn, inventory_id=staged.inventory_id, character_id=giver, quantity=staged.quantity)
+                                 or await database.queries.delete_inventory_units(
+                                     conn, inventory_id=staged.inventory_id, character_id=giver, quantity=staged.quantity))
+                        if not taken:
+                            raise TradeError(f"{staged.name} is no longer available")
+                        # Trading uses up one of the item's transfers, like a sale
+                        transfers = staged.transfers_remaining
+                        await database.queries.add_to_inventory(
+                            conn, character_id=receiver, item_id=staged.item_id, quantity=staged.quantity,
+                            transfers_remaining=None if transfers is None else transfers - 1
+                        )
+            await refresh_characters(conn, list(session.offers))
+    
+    def subscribe(self, character_id: int) -> asyncio.Queue:
+        """A send queue for the character's trade window (a newer window replaces an older one)"""
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.subscribers[character_id] = queue
+        session = self.by_character.get(character_id)
+        if session:
+            queue.put_nowait(self.view(session, character_id))
+        return queue
+    
+    def unsubscribe(self, character_id: int, queue: asyncio.Queue):
+        if self.subscribers.get(character_id) is queue:
+            del self.subscribers[character_id]
+    
+    def publish(self, session: TradeSession):
+        """Queue each side's view of the session for them"""
+        for party in session.offers:
+            queue = self.subscribers.get(party)
+            if queue is None:
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(self.view(session, party))
+    
+    @staticmethod
+    def view(session: TradeSession, character_id: int) -> dict:
+        def offer_json(offer: TradeOffer) -> dict:
+            return {'gold': offer.gold, 'confirmed': offer.confirmed,
+                    'items': [{'inventory_id': item.inventory_id, 'name': item.name, 'color': item.color,
+                               'quantity': item.quantity, 'transfers_remaining': item.transfers_remaining}
+                              for item in offer.items.values()]}
+        partner_id = session.partner_of(character_id)
+        return {'type': 'trade', 'id': session.id, 'status': session.status, 'version': session.version,
+                'message': session.message, 'partner_id': partner_id,
+                'you': offer_json(session.offers[character_id]), 'them': offer_json(session.offers[partner_id])}
+
+# Global trade desk instance
+trade_desk = TradeDesk()
+
+def get_trade_desk() -> TradeDesk:
+    return trade_desk
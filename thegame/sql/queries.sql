@@ -5,18 +5,13 @@ SELECT * FROM accounts WHERE username = :username;
 INSERT INTO accounts (username, password_hash, email) VALUES (:username, :password_hash, :email);
 
 -- name: get_character_by_id^
-SELECT c.*, cc.name as class_name, cc.attack_bonus, cc.defense_bonus, cc.rage_per_turn_bonus, cc.max_rage_bonus,
-       f.name as faction_name
-FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-LEFT JOIN factions f ON c.faction_id = f.id
-WHERE c.id = :character_id;
+-- Class bonuses and faction name come from the catalog (services.catalog.Catalog.character_row)
+SELECT * FROM characters WHERE id = :character_id;
 
 -- name: get_characters_by_account
-SELECT c.*, cc.name as class_name FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-WHERE c.account_id = :account_id
-ORDER BY c.last_active DESC;
+SELECT * FROM characters
+WHERE account_id = :account_id
+ORDER BY last_active DESC;
 
 -- name: create_character!
 INSERT INTO characters (account_id, name, class_id, current_room_id) VALUES (:account_id, :name, :class_id, 1);
@@ -29,40 +24,70 @@ UPDATE characters SET
 WHERE id = :character_id;
 
 -- name: get_character_equipment
-SELECT ce.slot_id, ce.item_id, i.name, i.attack, i.hit_points, i.chaos_damage, i.vile_damage,
-       i.fire_damage, i.kinetic_damage, i.arcane_damage, i.holy_damage, i.shadow_damage,
-       i.fire_resist, i.kinetic_resist, i.arcane_resist, i.holy_resist, i.shadow_resist,
-       i.critical_hit_percent, i.rampage_percent, i.rage_per_hour, i.experience_per_hour,
-       i.gold_per_turn, i.max_rage, es.name as slot_name, ir.name as rarity_name, ir.color
-FROM character_equipment ce
-JOIN items i ON ce.item_id = i.id
-JOIN equipment_slots es ON ce.slot_id = es.id
-JOIN item_rarities ir ON i.rarity_id = ir.id
-WHERE ce.character_id = :character_id;
+-- Item stats, slot names and rarities come from the catalog
+SELECT slot_id, item_id FROM character_equipment WHERE character_id = :character_id;
+
+-- name: get_equipped_item^
+SELECT item_id, transfers_remaining FROM character_equipment
+WHERE character_id = :character_id AND slot_id = :slot_id;
 
 -- name: equip_item!
-INSERT OR REPLACE INTO character_equipment (character_id, slot_id, item_id) VALUES (:character_id, :slot_id, :item_id);
+INSERT OR REPLACE INTO character_equipment (character_id, slot_id, item_id, transfers_remaining)
+VALUES (:character_id, :slot_id, :item_id, :transfers_remaining);
 
 -- name: unequip_item!
 DELETE FROM character_equipment WHERE character_id = :character_id AND slot_id = :slot_id;
 
--- name: get_character_inventory
-SELECT ci.id, ci.item_id, ci.quantity, ci.transfers_remaining,
-       i.name, i.level_requirement, i.attack, i.hit_points,
-       es.name as slot_name, ir.name as rarity_name, ir.color
-FROM character_inventory ci
-JOIN items i ON ci.item_id = i.id
-JOIN equipment_slots es ON i.slot_id = es.id
-JOIN item_rarities ir ON i.rarity_id = ir.id
-WHERE ci.character_id = :character_id
-ORDER BY i.slot_id, i.name;
+-- name: get_inventory_stack^
+-- Point lookup on idx_character_inventory_stack. Of several stacks of the same
+-- item, the one with the fewest transfers left comes first (NULL = unlimited).
+SELECT id, item_id, quantity, transfers_remaining
+FROM character_inventory
+WHERE character_id = :character_id AND item_id = :item_id
+ORDER BY transfers_remaining IS NULL, transfers_remaining
+LIMIT 1;
 
 -- name: add_to_inventory!
+-- Merges into the character's existing stack of the item with the same transfers left
 INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining)
-VALUES (:character_id, :item_id, :quantity, :transfers_remaining);
+VALUES (:character_id, :item_id, :quantity, :transfers_remaining)
+ON CONFLICT (character_id, item_id, IFNULL(transfers_remaining, -1))
+DO UPDATE SET quantity = quantity + excluded.quantity;
 
--- name: remove_from_inventory!
-DELETE FROM character_inventory WHERE character_id = :character_id AND item_id = :item_id;
+-- name: get_character_loadouts
+-- One row per loadout slot (or a single NULL row for an empty loadout)
+SELECT l.id, l.name, li.slot_id, li.item_id
+FROM character_loadouts l
+LEFT JOIN character_loadout_items li ON li.loadout_id = l.id
+WHERE l.character_id = :character_id
+ORDER BY l.name, li.slot_id;
+
+-- name: get_loadout^
+SELECT id, name FROM character_loadouts WHERE id = :loadout_id AND character_id = :character_id;
+
+-- name: get_loadout_by_name^
+SELECT id, name FROM character_loadouts WHERE character_id = :character_id AND name = :name;
+
+-- name: count_character_loadouts^
+SELECT COUNT(*) as count FROM character_loadouts WHERE character_id = :character_id;
+
+-- name: create_loadout<!
+INSERT INTO character_loadouts (character_id, name) VALUES (:character_id, :name);
+
+-- name: get_loadout_items
+SELECT slot_id, item_id FROM character_loadout_items WHERE loadout_id = :loadout_id ORDER BY slot_id;
+
+-- name: save_loadout_items!
+-- Snapshot of what the character is wearing right now
+INSERT INTO character_loadout_items (loadout_id, slot_id, item_id)
+SELECT :loadout_id, slot_id, item_id FROM character_equipment
+WHERE character_id = :character_id AND item_id IS NOT NULL;
+
+-- name: clear_loadout_items!
+DELETE FROM character_loadout_items WHERE loadout_id = :loadout_id;
+
+-- name: delete_loadout!
+DELETE FROM character_loadouts WHERE id = :loadout_id AND character_id = :character_id;
 
 -- name: get_room_info^
 SELECT r.*, z.name as zone_name, z.description as zone_description
@@ -96,8 +121,35 @@ JOIN crew_members cm ON cr.id = cm.crew_id
 JOIN characters c ON cr.leader_id = c.id
 WHERE cm.character_id = :character_id;
 
+-- name: get_crew^
+SELECT id, name, leader_id, max_members, member_count, vault_capacity, vault_count FROM crews WHERE id = :crew_id;
+
 -- name: join_crew!
-INSERT INTO crew_members (crew_id, character_id, role) VALUES (:crew_id, :character_id, :role);
+-- Conditional: adds nobody if the crew is full (or gone) or the character is
+-- already in a crew. member_count is kept by trg_crew_members_count_*.
+INSERT INTO crew_members (crew_id, character_id, role)
+SELECT id, :character_id, :role FROM crews
+WHERE id = :crew_id AND member_count < max_members
+  AND NOT EXISTS (SELECT 1 FROM crew_members WHERE character_id = :character_id);
+
+-- name: leave_crew!
+DELETE FROM crew_members WHERE crew_id = :crew_id AND character_id = :character_id;
+
+-- name: record_crew_pvp_win!
+UPDATE crews SET pvp_wins = pvp_wins + 1
+WHERE id = (SELECT crew_id FROM crew_members WHERE character_id = :character_id);
+
+-- name: get_crew_ranking_seed
+SELECT id, pvp_wins FROM crews;
+
+-- name: get_crew_memberships
+SELECT crew_id, character_id FROM crew_members;
+
+-- name: get_crew_ranking_rows
+SELECT cr.id, cr.name, c.name as leader_name
+FROM crews cr
+JOIN characters c ON cr.leader_id = c.id
+WHERE cr.id IN (SELECT value FROM json_each(:crew_ids));
 
 -- name: get_crew_members
 SELECT c.id, c.name, c.level, cc.name as class_name, cm.role, cm.joined_at
@@ -107,43 +159,196 @@ JOIN character_classes cc ON c.class_id = cc.id
 WHERE cm.crew_id = :crew_id
 ORDER BY cm.role DESC, c.level DESC;
 
--- name: get_crew_vault
-SELECT cv.id, cv.item_id, cv.quantity, i.name, ir.name as rarity_name, ir.color,
-       c.name as deposited_by_name, cv.deposited_at
-FROM crew_vault cv
-JOIN items i ON cv.item_id = i.id
-JOIN item_rarities ir ON i.rarity_id = ir.id
-LEFT JOIN characters c ON cv.deposited_by = c.id
-WHERE cv.crew_id = :crew_id
-ORDER BY cv.deposited_at DESC;
+-- name: get_crew_member_names
+SELECT c.id, c.name
+FROM crew_members cm
+JOIN characters c ON cm.character_id = c.id
+WHERE cm.crew_id = :crew_id
+ORDER BY c.name;
+
+-- name: get_recent_crew_chat
+-- The last :limit messages of each crew, oldest first; one index walk per crew
+SELECT m.crew_id, m.character_id, c.name, m.message, m.sent_at
+FROM crews cr
+JOIN crew_chat_messages m ON m.id IN (
+    SELECT id FROM crew_chat_messages WHERE crew_id = cr.id ORDER BY id DESC LIMIT :limit
+)
+JOIN characters c ON c.id = m.character_id
+ORDER BY m.crew_id, m.id;
+
+-- name: save_crew_chat_messages*!
+INSERT INTO crew_chat_messages (crew_id, character_id, message, sent_at)
+VALUES (:crew_id, :character_id, :message, :sent_at);
 
 -- name: add_to_crew_vault!
-INSERT INTO crew_vault (crew_id, item_id, quantity, deposited_by) VALUES (:crew_id, :item_id, :quantity, :deposited_by);
+-- Conditional: stores nothing once the vault holds vault_capacity items
+-- (vault_count is kept by trg_crew_vault_count_*)
+INSERT INTO crew_vault (crew_id, item_id, quantity, deposited_by, transfers_remaining)
+SELECT id, :item_id, :quantity, :deposited_by, :transfers_remaining FROM crews
+WHERE id = :crew_id AND vault_count < vault_capacity;
 
--- name: remove_from_crew_vault!
-DELETE FROM crew_vault WHERE id = :vault_item_id;
+-- name: get_crew_vault_item^
+SELECT id, crew_id, item_id, quantity, deposited_by, transfers_remaining
+FROM crew_vault
+WHERE id = :vault_item_id AND crew_id = :crew_id;
 
--- name: award_from_crew_vault!
-UPDATE crew_vault SET crew_id = NULL WHERE id = :vault_item_id;
+-- name: remove_from_crew_vault!
+-- Conditional: matches no row once another withdrawal or award has taken the item
+DELETE FROM crew_vault WHERE id = :vault_item_id AND crew_id = :crew_id;
 
--- name: log_combat!
+-- name: log_combat<!
 INSERT INTO combat_logs (attacker_id, defender_id, attacker_damage, defender_damage,
                         attacker_hp_before, attacker_hp_after, defender_hp_before, defender_hp_after,
-                        winner_id, experience_gained, gold_gained, combat_type)
+                        winner_id, experience_gained, gold_gained, combat_type, mob_template_id)
 VALUES (:attacker_id, :defender_id, :attacker_damage, :defender_damage,
         :attacker_hp_before, :attacker_hp_after, :defender_hp_before, :defender_hp_after,
-        :winner_id, :experience_gained, :gold_gained, :combat_type);
+        :winner_id, :experience_gained, :gold_gained, :combat_type, :mob_template_id);
 
--- name: get_combat_history
-SELECT cl.*, 
-       ca.name as attacker_name, cd.name as defender_name, cw.name as winner_name
+-- name: get_equipment_combat_bonuses^
+SELECT COALESCE(SUM(i.critical_hit_percent), 0) as critical_hit_percent,
+       COALESCE(SUM(i.rampage_percent), 0) as rampage_percent
+FROM character_equipment ce
+JOIN items i ON ce.item_id = i.id
+WHERE ce.character_id = :character_id;
+
+-- name: save_battle_replay!
+INSERT INTO battle_replays (combat_log_id, payload) VALUES (:combat_log_id, :payload);
+
+-- name: get_battle_replay^
+SELECT cl.id, cl.attacker_id, cl.defender_id, cl.winner_id, cl.experience_gained, cl.gold_gained,
+       cl.combat_type, cl.mob_template_id, cl.created_at, br.payload
 FROM combat_logs cl
-JOIN characters ca ON cl.attacker_id = ca.id
-LEFT JOIN characters cd ON cl.defender_id = cd.id
-LEFT JOIN characters cw ON cl.winner_id = cw.id
-WHERE cl.attacker_id = :character_id OR cl.defender_id = :character_id
-ORDER BY cl.created_at DESC
-LIMIT 20;
+JOIN battle_replays br ON br.combat_log_id = cl.id
+WHERE cl.id = :combat_log_id;
+
+-- name: get_combat_history
+-- Keyset page over a character's fights, newest first. Each UNION ALL branch
+-- seeks its own (participant, created_at, id) index and stops after :limit
+-- rows, so the cost does not depend on how deep the cursor is.
+SELECT cl.id, cl.attacker_id, cl.defender_id, cl.attacker_damage, cl.defender_damage, cl.attacker_hp_after,
+       cl.winner_id, cl.experience_gained, cl.gold_gained, cl.combat_type, cl.mob_template_id, cl.created_at
+FROM (
+    SELECT id FROM (
+        SELECT id, created_at FROM combat_logs
+        WHERE attacker_id = :character_id
+          AND (created_at, id) < (:before_created_at, :before_id)
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    )
+    UNION ALL
+    SELECT id FROM (
+        SELECT id, created_at FROM combat_logs
+        WHERE defender_id = :character_id
+          AND (created_at, id) < (:before_created_at, :before_id)
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    )
+) page
+JOIN combat_logs cl ON cl.id = page.id
+ORDER BY cl.created_at DESC, cl.id DESC
+LIMIT :limit;
+
+-- name: get_character_names
+SELECT id, name FROM characters WHERE id IN (SELECT value FROM json_each(:character_ids));
+
+-- name: get_combat_totals^
+SELECT COALESCE(SUM(fights), 0) as fights, COALESCE(SUM(wins), 0) as wins,
+       COALESCE(SUM(losses), 0) as losses, COALESCE(SUM(damage_dealt), 0) as damage_dealt,
+       COALESCE(SUM(damage_taken), 0) as damage_taken, COALESCE(SUM(gold_won), 0) as gold_won,
+       COALESCE(SUM(experience_won), 0) as experience_won
+FROM combat_daily_rollups
+WHERE character_id = :character_id;
+
+-- name: get_mob_templates
+SELECT * FROM mob_templates ORDER BY id;
+
+-- name: get_room_spawns
+SELECT room_id, mob_template_id, spawn_count FROM room_spawns ORDER BY room_id, mob_template_id;
+
+-- name: get_room_zones
+SELECT id, zone_id FROM rooms;
+
+-- name: get_all_room_connections
+SELECT from_room_id, to_room_id FROM room_connections ORDER BY from_room_id, to_room_id;
+
+-- name: apply_mob_damage*!
+-- Mobs rough players up but never finish them off
+UPDATE characters SET hit_points_current = MAX(1, hit_points_current - :damage)
+WHERE id = :character_id;
+
+-- name: spend_rage!
+UPDATE characters SET rage_current = rage_current - :amount
+WHERE id = :character_id AND rage_current >= :amount;
+
+-- name: refund_rage!
+UPDATE characters SET rage_current = MIN(rage_max, rage_current + :amount)
+WHERE id = :character_id;
+
+-- name: get_mob_loot
+SELECT item_id, drop_percent FROM mob_loot WHERE mob_template_id = :mob_template_id;
+
+-- name: create_raid<!
+INSERT INTO raids (crew_id, leader_id, mob_template_id, room_id, boss_hp)
+VALUES (:crew_id, :leader_id, :mob_template_id, :room_id, :boss_hp);
+
+-- name: get_open_raids
+SELECT * FROM raids WHERE status IN ('forming', 'active') ORDER BY id;
+
+-- name: get_open_raid_participants
+SELECT rp.raid_id, rp.character_id, rp.damage_dealt, rp.attacks
+FROM raid_participants rp
+JOIN raids r ON r.id = rp.raid_id
+WHERE r.status IN ('forming', 'active')
+ORDER BY rp.raid_id, rp.joined_at;
+
+-- name: update_raid!
+UPDATE raids SET status = :status, boss_hp = :boss_hp, started_at = :started_at, ended_at = :ended_at
+WHERE id = :raid_id;
+
+-- name: save_raid_participants*!
+INSERT INTO raid_participants (raid_id, character_id, damage_dealt, attacks)
+VALUES (:raid_id, :character_id, :damage_dealt, :attacks)
+ON CONFLICT (raid_id, character_id) DO UPDATE SET
+    damage_dealt = excluded.damage_dealt,
+    attacks = excluded.attacks;
+
+-- name: apply_raid_damage*!
+UPDATE characters SET hit_points_current = MAX(0, hit_points_current - :damage)
+WHERE id = :character_id;
+
+-- name: record_raid_loot!
+INSERT INTO raid_loot (raid_id, character_id, item_id) VALUES (:raid_id, :character_id, :item_id);
+
+-- name: get_raid^
+SELECT r.*, mt.name as boss_name, mt.hit_points as boss_hp_max, cr.name as crew_name
+FROM raids r
+JOIN mob_templates mt ON mt.id = r.mob_template_id
+JOIN crews cr ON cr.id = r.crew_id
+WHERE r.id = :raid_id;
+
+-- name: get_raid_participants
+SELECT rp.character_id, c.name, c.level, rp.damage_dealt, rp.attacks
+FROM raid_participants rp
+JOIN characters c ON c.id = rp.character_id
+WHERE rp.raid_id = :raid_id
+ORDER BY rp.damage_dealt DESC;
+
+-- name: get_raid_loot
+SELECT rl.character_id, c.name as character_name, i.name as item_name, ir.name as rarity_name, ir.color
+FROM raid_loot rl
+JOIN characters c ON c.id = rl.character_id
+JOIN items i ON i.id = rl.item_id
+JOIN item_rarities ir ON ir.id = i.rarity_id
+WHERE rl.raid_id = :raid_id;
+
+-- name: get_recent_crew_raids
+SELECT r.id, r.status, r.boss_hp, r.created_at, r.ended_at, mt.name as boss_name, mt.hit_points as boss_hp_max,
+       (SELECT COUNT(*) FROM raid_participants rp WHERE rp.raid_id = r.id) as participants
+FROM raids r
+JOIN mob_templates mt ON mt.id = r.mob_template_id
+WHERE r.crew_id = :crew_id
+ORDER BY r.created_at DESC
+LIMIT :limit;
 
 -- name: create_session!
 INSERT INTO sessions (id, account_id, expires_at) VALUES (:session_id, :account_id, :expires_at);
@@ -165,6 +370,15 @@ SELECT * FROM character_classes ORDER BY id;
 -- name: get_all_factions
 SELECT * FROM factions ORDER BY id;
 
+-- name: get_catalog_items
+SELECT * FROM items ORDER BY id;
+
+-- name: get_catalog_rarities
+SELECT * FROM item_rarities ORDER BY id;
+
+-- name: get_catalog_slots
+SELECT * FROM equipment_slots ORDER BY id;
+
 -- name: get_items_by_slot
 SELECT i.*, ir.name as rarity_name, ir.color, es.name as slot_name
 FROM items i
@@ -194,40 +408,209 @@ GROUP BY c.id;
 -- name: update_character_total_power!
 UPDATE characters SET total_power = :total_power WHERE id = :character_id;
 
--- name: get_power_rankings
-SELECT c.id, c.name, c.level, c.total_power, cc.name as class_name
-FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-ORDER BY c.total_power DESC, c.level DESC
-LIMIT :limit;
+-- name: count_total_characters^
+SELECT COUNT(*) as total FROM characters;
 
--- name: get_level_rankings
-SELECT c.id, c.name, c.level, c.experience, cc.name as class_name
-FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-ORDER BY c.level DESC, c.experience DESC
-LIMIT :limit;
+-- name: get_all_ranked_stats
+SELECT id, level, experience, gold, total_power, wilderness_level FROM characters;
 
--- name: get_gold_rankings
-SELECT c.id, c.name, c.level, c.gold, cc.name as class_name
-FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-ORDER BY c.gold DESC, c.level DESC
-LIMIT :limit;
+-- name: get_ranked_stats
+SELECT id, level, experience, gold, total_power, wilderness_level
+FROM characters WHERE id IN (SELECT value FROM json_each(:character_ids));
 
--- name: get_experience_rankings
-SELECT c.id, c.name, c.level, c.experience, cc.name as class_name
+-- name: get_ranking_rows
+SELECT c.id, c.name, c.level, c.experience, c.gold, c.total_power, c.wilderness_level, c.last_active,
+       cc.name as class_name
 FROM characters c
 JOIN character_classes cc ON c.class_id = cc.id
-ORDER BY c.experience DESC, c.level DESC
+WHERE c.id IN (SELECT value FROM json_each(:character_ids));
+
+-- name: get_ranking_snapshot
+SELECT ranking_type, rank, character_id, name, class_name, level, value, last_active, taken_at
+FROM ranking_snapshots
+ORDER BY ranking_type, rank;
+
+-- name: clear_ranking_snapshot!
+DELETE FROM ranking_snapshots;
+
+-- name: save_ranking_snapshot*!
+INSERT INTO ranking_snapshots (ranking_type, rank, character_id, name, class_name, level, value, last_active, taken_at)
+VALUES (:ranking_type, :rank, :character_id, :name, :class_name, :level, :value, :last_active, :taken_at);
+
+-- name: append_ranking_history*!
+INSERT INTO ranking_history (character_id, month, samples) VALUES (:character_id, :month, :samples)
+ON CONFLICT (character_id, month) DO UPDATE SET samples = CAST(samples || excluded.samples AS BLOB);
+
+-- name: get_month_ranking_history
+SELECT character_id, samples FROM ranking_history WHERE month = :month;
+
+-- name: get_ranking_history
+SELECT month, samples FROM ranking_history
+WHERE character_id = :character_id AND month >= :since
+ORDER BY month;
+
+-- name: get_sellable_inventory
+-- Unequipped items that can still change hands, priced at their average
+-- over the last week of daily candles, else their last trade, else the
+-- estimate from their stats
+SELECT ci.id, ci.item_id, ci.quantity, ci.transfers_remaining,
+       i.name, i.level_requirement, es.name as slot_name, ir.name as rarity_name, ir.color,
+       COALESCE(
+           (SELECT SUM(mc.turnover) / SUM(mc.volume) FROM market_candles mc
+            WHERE mc.item_id = ci.item_id AND mc.period = '1d' AND mc.bucket >= date('now', '-6 days')),
+           (SELECT mc.close FROM market_candles mc
+            WHERE mc.item_id = ci.item_id AND mc.period = '1d' ORDER BY mc.bucket DESC LIMIT 1),
+           CAST((i.attack + i.hit_points + i.fire_damage + i.kinetic_damage + i.arcane_damage + i.holy_damage +
+                 i.shadow_damage + i.chaos_damage + i.vile_damage) * ir.power_multiplier * 100 AS INTEGER)
+       ) as suggested_price
+FROM character_inventory ci
+JOIN items i ON ci.item_id = i.id
+JOIN equipment_slots es ON i.slot_id = es.id
+JOIN item_rarities ir ON i.rarity_id = ir.id
+WHERE ci.character_id = :character_id AND (ci.transfers_remaining IS NULL OR ci.transfers_remaining > 0)
+ORDER BY i.slot_id, i.name;
+
+-- name: get_inventory_row^
+SELECT id, character_id, item_id, quantity, transfers_remaining
+FROM character_inventory
+WHERE id = :inventory_id AND character_id = :character_id;
+
+-- name: decrement_inventory_row!
+UPDATE character_inventory SET quantity = quantity - 1 WHERE id = :inventory_id AND quantity > 1;
+
+-- name: delete_inventory_row!
+DELETE FROM character_inventory WHERE id = :inventory_id;
+
+-- name: take_inventory_units!
+-- Conditional: matches no row unless the character's stack still has more than :quantity
+UPDATE character_inventory SET quantity = quantity - :quantity
+WHERE id = :inventory_id AND character_id = :character_id AND quantity > :quantity
+  AND (transfers_remaining IS NULL OR transfers_remaining > 0);
+
+-- name: delete_inventory_units!
+-- Conditional: removes the stack only if it's exactly :quantity (the rest of take_inventory_units)
+DELETE FROM character_inventory
+WHERE id = :inventory_id AND character_id = :character_id AND quantity = :quantity
+  AND (transfers_remaining IS NULL OR transfers_remaining > 0);
+
+-- name: create_market_listing<!
+INSERT INTO market_listings (seller_id, item_id, quantity, transfers_remaining, price,
+                             slot_id, rarity_id, level_requirement, item_name)
+SELECT :seller_id, i.id, 1, :transfers_remaining, :price, i.slot_id, i.rarity_id, i.level_requirement, i.name
+FROM items i
+WHERE i.id = :item_id;
+
+-- name: get_market_listing^
+SELECT id, seller_id, item_id, quantity, transfers_remaining, price, item_name, level_requirement,
+       (SELECT name FROM equipment_slots WHERE id = slot_id) as slot_name
+FROM market_listings
+WHERE id = :listing_id;
+
+-- name: get_seller_listings
+SELECT ml.id as listing_id, ml.item_id, ml.price, ml.transfers_remaining, ml.item_name, ml.level_requirement,
+       ml.listed_at, es.name as slot_name, ir.name as rarity_name, ir.color
+FROM market_listings ml
+JOIN equipment_slots es ON ml.slot_id = es.id
+JOIN item_rarities ir ON ml.rarity_id = ir.id
+WHERE ml.seller_id = :seller_id
+ORDER BY ml.id DESC;
+
+-- name: delete_market_listing!
+DELETE FROM market_listings WHERE id = :listing_id;
+
+-- name: debit_gold!
+-- Conditional: matches no row (rowcount 0) when the character can't afford it
+UPDATE characters SET gold = gold - :amount WHERE id = :character_id AND gold >= :amount;
+
+-- name: credit_gold!
+UPDATE characters SET gold = gold + :amount WHERE id = :character_id;
+
+-- name: search_items
+-- Ranked full-text search over item names and descriptions (a name hit
+-- counts ten times a description hit), narrowed by slot and level
+SELECT i.id, i.name, i.description, i.level_requirement, es.name as slot_name, ir.name as rarity_name, ir.color,
+       bm25(items_fts, 10.0, 1.0) as rank
+FROM items_fts
+JOIN items i ON i.id = items_fts.rowid
+JOIN equipment_slots es ON i.slot_id = es.id
+JOIN item_rarities ir ON i.rarity_id = ir.id
+WHERE items_fts MATCH :match
+  AND i.level_requirement BETWEEN :min_level AND :max_level
+  AND (:slot IS NULL OR es.name = :slot)
+ORDER BY rank
 LIMIT :limit;
 
--- name: get_wilderness_rankings
-SELECT c.id, c.name, c.level, c.wilderness_level, cc.name as class_name
-FROM characters c
-JOIN character_classes cc ON c.class_id = cc.id
-WHERE c.wilderness_level > 0
-ORDER BY c.wilderness_level DESC, c.level DESC
+-- name: search_mobs
+SELECT mt.id, mt.name, mt.level, mt.is_raid_boss, mt.description,
+       (SELECT group_concat(r.name, ', ') FROM room_spawns rs JOIN rooms r ON rs.room_id = r.id
+        WHERE rs.mob_template_id = mt.id) as rooms,
+       bm25(mob_templates_fts, 10.0, 1.0) as rank
+FROM mob_templates_fts
+JOIN mob_templates mt ON mt.id = mob_templates_fts.rowid
+WHERE mob_templates_fts MATCH :match
+ORDER BY rank
 LIMIT :limit;
--- name: count_total_characters^
-SELECT COUNT(*) as total FROM characters;
+
+-- name: create_auction<!
+INSERT INTO auctions (seller_id, item_id, quantity, transfers_remaining, item_name, level_requirement,
+                      start_price, min_increment, ends_at)
+SELECT :seller_id, i.id, 1, :transfers_remaining, i.name, i.level_requirement, :start_price, :min_increment, :ends_at
+FROM items i
+WHERE i.id = :item_id;
+
+-- name: get_auction^
+SELECT * FROM auctions WHERE id = :auction_id;
+
+-- name: get_open_auctions
+SELECT id, seller_id, item_id, quantity, transfers_remaining, item_name, level_requirement,
+       start_price, min_increment, ends_at
+FROM auctions
+WHERE status = 'open';
+
+-- name: get_auction_escrows
+SELECT auction_id, bidder_id, amount FROM auction_escrow;
+
+-- name: get_open_auction_bids
+SELECT ab.auction_id, ab.bidder_id, ab.amount, ab.placed_at
+FROM auction_bids ab
+JOIN auctions a ON ab.auction_id = a.id
+WHERE a.status = 'open'
+ORDER BY ab.id;
+
+-- name: hold_auction_escrow!
+INSERT OR REPLACE INTO auction_escrow (auction_id, bidder_id, amount) VALUES (:auction_id, :bidder_id, :amount);
+
+-- name: release_auction_escrow!
+DELETE FROM auction_escrow WHERE auction_id = :auction_id AND bidder_id = :bidder_id;
+
+-- name: save_auction_bids*!
+INSERT INTO auction_bids (auction_id, bidder_id, amount, placed_at)
+VALUES (:auction_id, :bidder_id, :amount, :placed_at);
+
+-- name: update_auction_bid_counts*!
+UPDATE auctions SET bid_count = :bid_count WHERE id = :auction_id;
+
+-- name: settle_auction!
+UPDATE auctions
+SET status = :status, winner_id = :winner_id, final_price = :final_price, settled_at = :settled_at
+WHERE id = :auction_id AND status = 'open';
+
+-- name: record_market_trade!
+-- The candle trigger on market_trades updates the item's 1h and 1d candles
+INSERT INTO market_trades (item_id, seller_id, buyer_id, quantity, price, source)
+VALUES (:item_id, :seller_id, :buyer_id, :quantity, :price, :source);
+
+-- name: get_market_candles
+SELECT bucket, open, high, low, close, volume, trades, turnover
+FROM market_candles
+WHERE item_id = :item_id AND period = :period
+ORDER BY bucket DESC
+LIMIT :points;
+
+-- name: get_market_price^
+-- Volume-weighted average over the daily candles since :since, and the last trade price
+SELECT SUM(turnover) / SUM(volume) as average_price, COALESCE(SUM(volume), 0) as volume,
+       (SELECT close FROM market_candles
+        WHERE item_id = :item_id AND period = '1d' ORDER BY bucket DESC LIMIT 1) as last_price
+FROM market_candles
+WHERE item_id = :item_id AND period = '1d' AND bucket >= :since;
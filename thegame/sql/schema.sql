@@ -182,6 +182,7 @@ CREATE TABLE IF NOT EXISTS character_equipment (
     character_id INTEGER NOT NULL,
     slot_id INTEGER NOT NULL,
     item_id INTEGER,
+    transfers_remaining INTEGER DEFAULT 10,  -- carried over from the inventory stack it came from
     
     PRIMARY KEY (character_id, slot_id),
     FOREIGN KEY (character_id) REFERENCES characters(id),
@@ -196,6 +197,10 @@ CREATE TABLE IF NOT EXISTS character_inventory (
     item_id INTEGER NOT NULL,
     quantity INTEGER DEFAULT 1,
     transfers_remaining INTEGER,
+    slot_id INTEGER,                     -- copied from items by trg_character_inventory_item
+    rarity_id INTEGER,
+    level_requirement INTEGER,
+    item_name TEXT,
     
     FOREIGN KEY (character_id) REFERENCES characters(id),
     FOREIGN KEY (item_id) REFERENCES items(id)
@@ -210,6 +215,9 @@ CREATE TABLE IF NOT EXISTS crews (
     max_members INTEGER DEFAULT 20,
     vault_capacity INTEGER DEFAULT 100,
     has_two_way_vault BOOLEAN DEFAULT 0,
+    pvp_wins INTEGER DEFAULT 0,
+    member_count INTEGER DEFAULT 0,      -- kept by the crew_members / crew_vault triggers
+    vault_count INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     FOREIGN KEY (leader_id) REFERENCES characters(id)
@@ -235,12 +243,29 @@ CREATE TABLE IF NOT EXISTS crew_vault (
     quantity INTEGER DEFAULT 1,
     deposited_by INTEGER,
     deposited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    transfers_remaining INTEGER DEFAULT 10,  -- carried over from the inventory stack it came from
+    slot_id INTEGER,                     -- copied from items by trg_crew_vault_item
+    rarity_id INTEGER,
+    level_requirement INTEGER,
+    item_name TEXT,
     
     FOREIGN KEY (crew_id) REFERENCES crews(id),
     FOREIGN KEY (item_id) REFERENCES items(id),
     FOREIGN KEY (deposited_by) REFERENCES characters(id)
 );
 
+-- Crew chat log, written in batches; recent messages are served from memory
+CREATE TABLE IF NOT EXISTS crew_chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    crew_id INTEGER NOT NULL,
+    character_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    sent_at TIMESTAMP NOT NULL,
+    
+    FOREIGN KEY (crew_id) REFERENCES crews(id),
+    FOREIGN KEY (character_id) REFERENCES characters(id)
+);
+
 -- World/Rooms system
 CREATE TABLE IF NOT EXISTS zones (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -294,6 +319,107 @@ INSERT OR IGNORE INTO room_connections (from_room_id, to_room_id, direction) VAL
 (1, 4, 'east'),
 (4, 1, 'west');
 
+-- Mob templates (PvE enemies)
+CREATE TABLE IF NOT EXISTS mob_templates (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    level INTEGER DEFAULT 1,
+    hit_points INTEGER DEFAULT 100,
+    attack INTEGER DEFAULT 10,
+    chaos_damage INTEGER DEFAULT 0,
+    critical_hit_percent REAL DEFAULT 0.0,
+    rampage_percent REAL DEFAULT 0.0,
+    experience_reward INTEGER DEFAULT 0,
+    gold_reward INTEGER DEFAULT 0,
+    respawn_seconds INTEGER DEFAULT 60,
+    is_raid_boss BOOLEAN DEFAULT 0,
+    description TEXT,
+    hit_points_regen INTEGER DEFAULT 0,  -- per AI tick
+    aggressive BOOLEAN DEFAULT 0,        -- picks fights with players in its room
+    wander_seconds INTEGER DEFAULT 0     -- 0 = stays in its spawn room
+);
+
+INSERT OR IGNORE INTO mob_templates (id, name, level, hit_points, attack, chaos_damage, critical_hit_percent, rampage_percent,
+                                     experience_reward, gold_reward, respawn_seconds, is_raid_boss, description,
+                                     hit_points_regen, aggressive, wander_seconds) VALUES
+(1, 'Street Thug', 1, 60, 6, 0, 0.0, 0.0, 25, 10, 60, 0, 'Small-time crook working the city center', 1, 1, 45),
+(2, 'Arena Brawler', 5, 150, 14, 0, 2.0, 0.0, 80, 25, 90, 0, 'Pit fighter looking for a warm-up', 3, 0, 0),
+(3, 'Corrupt Official', 10, 300, 25, 0, 0.0, 5.0, 200, 80, 180, 0, 'Bureaucrat with hired muscle', 5, 0, 90),
+(4, 'High Roller', 20, 700, 55, 5, 5.0, 0.0, 600, 250, 120, 0, 'Casino regular who hates losing', 10, 1, 0),
+(5, 'The Boss', 22, 25000, 120, 20, 10.0, 5.0, 5000, 3000, 3600, 1, 'Runs the Underground Casino. Bring a crew.', 0, 0, 0);
+
+-- Which mobs spawn where, and how many at once
+CREATE TABLE IF NOT EXISTS room_spawns (
+    room_id INTEGER NOT NULL,
+    mob_template_id INTEGER NOT NULL,
+    spawn_count INTEGER DEFAULT 1,
+    
+    PRIMARY KEY (room_id, mob_template_id),
+    FOREIGN KEY (room_id) REFERENCES rooms(id),
+    FOREIGN KEY (mob_template_id) REFERENCES mob_templates(id)
+);
+
+INSERT OR IGNORE INTO room_spawns (room_id, mob_template_id, spawn_count) VALUES
+(1, 1, 3),
+(2, 4, 4),
+(2, 5, 1),
+(3, 3, 2),
+(4, 2, 3);
+
+-- Items a mob can drop, rolled per eligible participant when it dies
+CREATE TABLE IF NOT EXISTS mob_loot (
+    mob_template_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    drop_percent REAL NOT NULL,
+    
+    PRIMARY KEY (mob_template_id, item_id),
+    FOREIGN KEY (mob_template_id) REFERENCES mob_templates(id),
+    FOREIGN KEY (item_id) REFERENCES items(id)
+);
+
+-- Seeded by Database._create_basic_items, once the items it names exist
+
+-- Raids: a crew party against a raid boss. Boss HP and damage totals live in
+-- memory while the raid runs and are only checkpointed here periodically.
+CREATE TABLE IF NOT EXISTS raids (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    crew_id INTEGER NOT NULL,
+    leader_id INTEGER NOT NULL,
+    mob_template_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'forming',  -- forming, active, defeated, failed
+    boss_hp INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    ended_at TIMESTAMP,
+    
+    FOREIGN KEY (crew_id) REFERENCES crews(id),
+    FOREIGN KEY (leader_id) REFERENCES characters(id),
+    FOREIGN KEY (mob_template_id) REFERENCES mob_templates(id)
+);
+
+CREATE TABLE IF NOT EXISTS raid_participants (
+    raid_id INTEGER NOT NULL,
+    character_id INTEGER NOT NULL,
+    damage_dealt INTEGER DEFAULT 0,
+    attacks INTEGER DEFAULT 0,
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (raid_id, character_id),
+    FOREIGN KEY (raid_id) REFERENCES raids(id),
+    FOREIGN KEY (character_id) REFERENCES characters(id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS raid_loot (
+    raid_id INTEGER NOT NULL,
+    character_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    
+    FOREIGN KEY (raid_id) REFERENCES raids(id),
+    FOREIGN KEY (character_id) REFERENCES characters(id),
+    FOREIGN KEY (item_id) REFERENCES items(id)
+);
+
 -- Combat log
 CREATE TABLE IF NOT EXISTS combat_logs (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -309,6 +435,7 @@ CREATE TABLE IF NOT EXISTS combat_logs (
     experience_gained INTEGER DEFAULT 0,
     gold_gained INTEGER DEFAULT 0,
     combat_type TEXT DEFAULT 'pve',
+    mob_template_id INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     FOREIGN KEY (attacker_id) REFERENCES characters(id),
@@ -316,6 +443,347 @@ CREATE TABLE IF NOT EXISTS combat_logs (
     FOREIGN KEY (winner_id) REFERENCES characters(id)
 );
 
+-- Compact battle replays: engine version, RNG seed and both participants'
+-- stat snapshots. The round-by-round log is regenerated from this on demand.
+CREATE TABLE IF NOT EXISTS battle_replays (
+    combat_log_id INTEGER PRIMARY KEY,
+    payload BLOB NOT NULL,
+    
+    FOREIGN KEY (combat_log_id) REFERENCES combat_logs(id)
+);
+
+-- Daily per-character PvP totals. Kept current by the trigger below so
+-- profile stats never have to scan combat_logs, and so raw logs can be
+-- archived without losing the long-term record.
+CREATE TABLE IF NOT EXISTS combat_daily_rollups (
+    character_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    fights INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    losses INTEGER DEFAULT 0,
+    damage_dealt INTEGER DEFAULT 0,
+    damage_taken INTEGER DEFAULT 0,
+    gold_won INTEGER DEFAULT 0,
+    experience_won INTEGER DEFAULT 0,
+    
+    PRIMARY KEY (character_id, day),
+    FOREIGN KEY (character_id) REFERENCES characters(id)
+) WITHOUT ROWID;
+
+-- One-time backfill of logs written before the rollup trigger existed
+INSERT OR IGNORE INTO combat_daily_rollups (character_id, day, fights, wins, losses,
+                                            damage_dealt, damage_taken, gold_won, experience_won)
+SELECT character_id, day, COUNT(*), SUM(won), SUM(lost), SUM(dealt), SUM(taken), SUM(gold), SUM(xp)
+FROM (
+    SELECT attacker_id AS character_id, date(created_at) AS day,
+           COALESCE(winner_id = attacker_id, 0) AS won,
+           COALESCE(winner_id != attacker_id, 0) AS lost,
+           attacker_damage AS dealt, defender_damage AS taken,
+           CASE WHEN winner_id = attacker_id THEN gold_gained ELSE 0 END AS gold,
+           CASE WHEN winner_id = attacker_id THEN experience_gained ELSE 0 END AS xp
+    FROM combat_logs
+    WHERE combat_type = 'pvp'
+    UNION ALL
+    SELECT defender_id, date(created_at),
+           COALESCE(winner_id = defender_id, 0),
+           COALESCE(winner_id != defender_id, 0),
+           defender_damage, attacker_damage,
+           CASE WHEN winner_id = defender_id THEN gold_gained ELSE 0 END,
+           CASE WHEN winner_id = defender_id THEN experience_gained ELSE 0 END
+    FROM combat_logs
+    WHERE combat_type = 'pvp' AND defender_id IS NOT NULL
+)
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_combat_logs_rollup')
+GROUP BY character_id, day;
+
+CREATE TRIGGER IF NOT EXISTS trg_combat_logs_rollup AFTER INSERT ON combat_logs
+WHEN NEW.combat_type = 'pvp'
+BEGIN
+    INSERT INTO combat_daily_rollups (character_id, day, fights, wins, losses,
+                                      damage_dealt, damage_taken, gold_won, experience_won)
+    VALUES (NEW.attacker_id, date(NEW.created_at), 1,
+            COALESCE(NEW.winner_id = NEW.attacker_id, 0),
+            COALESCE(NEW.winner_id != NEW.attacker_id, 0),
+            NEW.attacker_damage, NEW.defender_damage,
+            CASE WHEN NEW.winner_id = NEW.attacker_id THEN NEW.gold_gained ELSE 0 END,
+            CASE WHEN NEW.winner_id = NEW.attacker_id THEN NEW.experience_gained ELSE 0 END)
+    ON CONFLICT (character_id, day) DO UPDATE SET
+        fights = fights + 1,
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        damage_dealt = damage_dealt + excluded.damage_dealt,
+        damage_taken = damage_taken + excluded.damage_taken,
+        gold_won = gold_won + excluded.gold_won,
+        experience_won = experience_won + excluded.experience_won;
+    
+    INSERT INTO combat_daily_rollups (character_id, day, fights, wins, losses,
+                                      damage_dealt, damage_taken, gold_won, experience_won)
+    SELECT NEW.defender_id, date(NEW.created_at), 1,
+           COALESCE(NEW.winner_id = NEW.defender_id, 0),
+           COALESCE(NEW.winner_id != NEW.defender_id, 0),
+           NEW.defender_damage, NEW.attacker_damage,
+           CASE WHEN NEW.winner_id = NEW.defender_id THEN NEW.gold_gained ELSE 0 END,
+           CASE WHEN NEW.winner_id = NEW.defender_id THEN NEW.experience_gained ELSE 0 END
+    WHERE NEW.defender_id IS NOT NULL
+    ON CONFLICT (character_id, day) DO UPDATE SET
+        fights = fights + 1,
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        damage_dealt = damage_dealt + excluded.damage_dealt,
+        damage_taken = damage_taken + excluded.damage_taken,
+        gold_won = gold_won + excluded.gold_won,
+        experience_won = experience_won + excluded.experience_won;
+END;
+
+-- The top of every ranking ladder as of the last snapshot, with everything
+-- the rankings page shows, so pages are rebuilt without touching characters
+CREATE TABLE IF NOT EXISTS ranking_snapshots (
+    ranking_type TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    character_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    last_active TIMESTAMP,
+    taken_at TIMESTAMP NOT NULL,
+    
+    PRIMARY KEY (ranking_type, rank)
+) WITHOUT ROWID;
+
+-- Daily rank and key stats per character, one row per month. samples is a
+-- run of zigzag varint deltas (services/ranking_history.py); a day's sample is
+-- only appended when something changed, so idle characters cost nothing.
+CREATE TABLE IF NOT EXISTS ranking_history (
+    character_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    samples BLOB NOT NULL,
+    
+    PRIMARY KEY (character_id, month),
+    FOREIGN KEY (character_id) REFERENCES characters(id)
+) WITHOUT ROWID;
+
+-- Items up for sale. The listed item leaves the seller's inventory; slot,
+-- rarity, level requirement and name are copied from items at listing time
+-- so browsing filters and sorts on this table alone.
+CREATE TABLE IF NOT EXISTS market_listings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seller_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    transfers_remaining INTEGER,
+    price INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    rarity_id INTEGER NOT NULL,
+    level_requirement INTEGER NOT NULL,
+    item_name TEXT NOT NULL,
+    listed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (seller_id) REFERENCES characters(id),
+    FOREIGN KEY (item_id) REFERENCES items(id),
+    FOREIGN KEY (slot_id) REFERENCES equipment_slots(id),
+    FOREIGN KEY (rarity_id) REFERENCES item_rarities(id)
+);
+
+-- Timed auctions (services/auction_house.py). The item leaves the seller's
+-- inventory when the auction opens and is delivered when it is settled.
+CREATE TABLE IF NOT EXISTS auctions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seller_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    transfers_remaining INTEGER,
+    item_name TEXT NOT NULL,
+    level_requirement INTEGER NOT NULL,
+    start_price INTEGER NOT NULL,
+    min_increment INTEGER NOT NULL,
+    ends_at TIMESTAMP NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',  -- open, sold, expired
+    bid_count INTEGER NOT NULL DEFAULT 0,
+    winner_id INTEGER,
+    final_price INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    settled_at TIMESTAMP,
+    
+    FOREIGN KEY (seller_id) REFERENCES characters(id),
+    FOREIGN KEY (item_id) REFERENCES items(id),
+    FOREIGN KEY (winner_id) REFERENCES characters(id)
+);
+
+-- Gold held for each open auction's current high bid. Written in the same
+-- transaction that debits the new leader and refunds the one they outbid.
+CREATE TABLE IF NOT EXISTS auction_escrow (
+    auction_id INTEGER PRIMARY KEY,
+    bidder_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    
+    FOREIGN KEY (auction_id) REFERENCES auctions(id),
+    FOREIGN KEY (bidder_id) REFERENCES characters(id)
+);
+
+-- Every bid placed, appended in batches
+CREATE TABLE IF NOT EXISTS auction_bids (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    auction_id INTEGER NOT NULL,
+    bidder_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    placed_at TIMESTAMP NOT NULL,
+    
+    FOREIGN KEY (auction_id) REFERENCES auctions(id),
+    FOREIGN KEY (bidder_id) REFERENCES characters(id)
+);
+
+-- Completed marketplace sales and auctions; rows are only ever appended
+CREATE TABLE IF NOT EXISTS market_trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,
+    buyer_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    price INTEGER NOT NULL,  -- gold paid for the whole quantity
+    source TEXT NOT NULL,  -- listing, auction
+    traded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (item_id) REFERENCES items(id),
+    FOREIGN KEY (seller_id) REFERENCES characters(id),
+    FOREIGN KEY (buyer_id) REFERENCES characters(id)
+);
+
+-- Per-item price candles, kept up to date by the trigger below.
+-- Prices are per unit; turnover / volume is the average price.
+CREATE TABLE IF NOT EXISTS market_candles (
+    item_id INTEGER NOT NULL,
+    period TEXT NOT NULL,  -- 1h, 1d
+    bucket TIMESTAMP NOT NULL,  -- start of the hour or day
+    open INTEGER NOT NULL,
+    high INTEGER NOT NULL,
+    low INTEGER NOT NULL,
+    close INTEGER NOT NULL,
+    volume INTEGER NOT NULL,
+    trades INTEGER NOT NULL,
+    turnover INTEGER NOT NULL,
+    
+    PRIMARY KEY (item_id, period, bucket)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_market_trades_candles AFTER INSERT ON market_trades
+BEGIN
+    INSERT INTO market_candles (item_id, period, bucket, open, high, low, close, volume, trades, turnover)
+    VALUES (NEW.item_id, '1h', strftime('%Y-%m-%d %H:00:00', NEW.traded_at),
+            NEW.price / NEW.quantity, NEW.price / NEW.quantity, NEW.price / NEW.quantity, NEW.price / NEW.quantity,
+            NEW.quantity, 1, NEW.price)
+    ON CONFLICT (item_id, period, bucket) DO UPDATE SET
+        high = max(high, excluded.high),
+        low = min(low, excluded.low),
+        close = excluded.close,
+        volume = volume + excluded.volume,
+        trades = trades + 1,
+        turnover = turnover + excluded.turnover;
+    
+    INSERT INTO market_candles (item_id, period, bucket, open, high, low, close, volume, trades, turnover)
+    VALUES (NEW.item_id, '1d', strftime('%Y-%m-%d 00:00:00', NEW.traded_at),
+            NEW.price / NEW.quantity, NEW.price / NEW.quantity, NEW.price / NEW.quantity, NEW.price / NEW.quantity,
+            NEW.quantity, 1, NEW.price)
+    ON CONFLICT (item_id, period, bucket) DO UPDATE SET
+        high = max(high, excluded.high),
+        low = min(low, excluded.low),
+        close = excluded.close,
+        volume = volume + excluded.volume,
+        trades = trades + 1,
+        turnover = turnover + excluded.turnover;
+END;
+
+-- Saved equipment sets: a named slot -> item map per character, applied in
+-- one transaction by /loadouts/{id}/equip
+CREATE TABLE IF NOT EXISTS character_loadouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    character_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    UNIQUE (character_id, name),
+    FOREIGN KEY (character_id) REFERENCES characters(id)
+);
+
+CREATE TABLE IF NOT EXISTS character_loadout_items (
+    loadout_id INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    
+    PRIMARY KEY (loadout_id, slot_id),
+    FOREIGN KEY (loadout_id) REFERENCES character_loadouts(id),
+    FOREIGN KEY (slot_id) REFERENCES equipment_slots(id),
+    FOREIGN KEY (item_id) REFERENCES items(id)
+) WITHOUT ROWID;
+
+-- Inventory and vault rows carry their item's slot, rarity, level requirement
+-- and name, as market listings do, so the paged views (services/inventory.py)
+-- filter and sort on their own indexes. The triggers fill them in on insert;
+-- rows from before the columns existed are backfilled once.
+UPDATE character_inventory
+SET (slot_id, rarity_id, level_requirement, item_name) =
+    (SELECT slot_id, rarity_id, level_requirement, name FROM items WHERE items.id = character_inventory.item_id)
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_character_inventory_item');
+
+CREATE TRIGGER IF NOT EXISTS trg_character_inventory_item AFTER INSERT ON character_inventory
+WHEN NEW.item_name IS NULL
+BEGIN
+    UPDATE character_inventory
+    SET (slot_id, rarity_id, level_requirement, item_name) =
+        (SELECT slot_id, rarity_id, level_requirement, name FROM items WHERE items.id = NEW.item_id)
+    WHERE id = NEW.id;
+END;
+
+UPDATE crew_vault
+SET (slot_id, rarity_id, level_requirement, item_name) =
+    (SELECT slot_id, rarity_id, level_requirement, name FROM items WHERE items.id = crew_vault.item_id)
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_crew_vault_item');
+
+CREATE TRIGGER IF NOT EXISTS trg_crew_vault_item AFTER INSERT ON crew_vault
+WHEN NEW.item_name IS NULL
+BEGIN
+    UPDATE crew_vault
+    SET (slot_id, rarity_id, level_requirement, item_name) =
+        (SELECT slot_id, rarity_id, level_requirement, name FROM items WHERE items.id = NEW.item_id)
+    WHERE id = NEW.id;
+END;
+
+-- crews.member_count and vault_count mirror COUNT(*) of each crew's members
+-- and vault items. Joins and deposits are conditional inserts against them
+-- (join_crew, add_to_crew_vault), so the caps hold however many race; these
+-- triggers keep them exact. Counted once for crews from before the columns.
+UPDATE crews
+SET member_count = (SELECT COUNT(*) FROM crew_members WHERE crew_members.crew_id = crews.id),
+    vault_count = (SELECT COUNT(*) FROM crew_vault WHERE crew_vault.crew_id = crews.id)
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_crew_members_count_insert');
+
+CREATE TRIGGER IF NOT EXISTS trg_crew_members_count_insert AFTER INSERT ON crew_members
+BEGIN
+    UPDATE crews SET member_count = member_count + 1 WHERE id = NEW.crew_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_crew_members_count_delete AFTER DELETE ON crew_members
+BEGIN
+    UPDATE crews SET member_count = member_count - 1 WHERE id = OLD.crew_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_crew_vault_count_insert AFTER INSERT ON crew_vault
+BEGIN
+    UPDATE crews SET vault_count = vault_count + 1 WHERE id = NEW.crew_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_crew_vault_count_delete AFTER DELETE ON crew_vault
+BEGIN
+    UPDATE crews SET vault_count = vault_count - 1 WHERE id = OLD.crew_id;
+END;
+
+-- An item moved to another crew's vault
+CREATE TRIGGER IF NOT EXISTS trg_crew_vault_count_move AFTER UPDATE OF crew_id ON crew_vault
+BEGIN
+    UPDATE crews SET vault_count = vault_count - 1 WHERE id = OLD.crew_id;
+    UPDATE crews SET vault_count = vault_count + 1 WHERE id = NEW.crew_id;
+END;
+
 -- Sessions for web authentication
 CREATE TABLE IF NOT EXISTS sessions (
     id TEXT PRIMARY KEY,
@@ -330,8 +798,103 @@ CREATE TABLE IF NOT EXISTS sessions (
 CREATE INDEX IF NOT EXISTS idx_characters_account ON characters(account_id);
 CREATE INDEX IF NOT EXISTS idx_characters_name ON characters(name);
 CREATE INDEX IF NOT EXISTS idx_character_equipment_character ON character_equipment(character_id);
-CREATE INDEX IF NOT EXISTS idx_character_inventory_character ON character_inventory(character_id);
 CREATE INDEX IF NOT EXISTS idx_crew_members_character ON crew_members(character_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_account ON sessions(account_id);
-CREATE INDEX IF NOT EXISTS idx_combat_logs_attacker ON combat_logs(attacker_id);
-CREATE INDEX IF NOT EXISTS idx_combat_logs_defender ON combat_logs(defender_id);
\ No newline at end of file
+
+-- Inventory is stacked: one row per (character, item, transfers left), and
+-- adding items merges into it. Rows from before the unique index existed are
+-- folded into the oldest row of their stack first. The index leads with
+-- character_id, so it also replaces the old per-character one.
+UPDATE character_inventory
+SET quantity = (SELECT SUM(COALESCE(d.quantity, 1)) FROM character_inventory d
+                WHERE d.character_id = character_inventory.character_id
+                  AND d.item_id = character_inventory.item_id
+                  AND d.transfers_remaining IS character_inventory.transfers_remaining)
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_character_inventory_stack')
+  AND id IN (SELECT MIN(id) FROM character_inventory
+             GROUP BY character_id, item_id, transfers_remaining HAVING COUNT(*) > 1);
+DELETE FROM character_inventory
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_character_inventory_stack')
+  AND id NOT IN (SELECT MIN(id) FROM character_inventory GROUP BY character_id, item_id, transfers_remaining);
+DROP INDEX IF EXISTS idx_character_inventory_character;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_character_inventory_stack
+    ON character_inventory(character_id, item_id, IFNULL(transfers_remaining, -1));
+
+-- Combat history is paged newest-first per participant; these replace the old
+-- single-column attacker/defender indexes. The rowid (id) is appended to every
+-- index entry, so they cover the (created_at, id) keyset without a table read.
+DROP INDEX IF EXISTS idx_combat_logs_attacker;
+DROP INDEX IF EXISTS idx_combat_logs_defender;
+CREATE INDEX IF NOT EXISTS idx_combat_logs_attacker_time ON combat_logs(attacker_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_combat_logs_defender_time ON combat_logs(defender_id, created_at);
+
+-- Marketplace browsing: one index per sort in build_filter_controls, plus a
+-- slot-scoped twin for the item type filter ("newest" by slot is (slot_id)
+-- alone, as the listing id rides along in every entry)
+CREATE INDEX IF NOT EXISTS idx_market_listings_seller ON market_listings(seller_id);
+CREATE INDEX IF NOT EXISTS idx_market_listings_item ON market_listings(item_id);
+CREATE INDEX IF NOT EXISTS idx_market_listings_name ON market_listings(item_name);
+CREATE INDEX IF NOT EXISTS idx_market_listings_price ON market_listings(price);
+CREATE INDEX IF NOT EXISTS idx_market_listings_level ON market_listings(level_requirement);
+CREATE INDEX IF NOT EXISTS idx_market_listings_slot ON market_listings(slot_id);
+CREATE INDEX IF NOT EXISTS idx_market_listings_slot_name ON market_listings(slot_id, item_name);
+CREATE INDEX IF NOT EXISTS idx_market_listings_slot_price ON market_listings(slot_id, price);
+CREATE INDEX IF NOT EXISTS idx_market_listings_slot_level ON market_listings(slot_id, level_requirement);
+CREATE INDEX IF NOT EXISTS idx_market_trades_item ON market_trades(item_id, traded_at);
+
+-- Paged inventory and vault views: an (owner, column) index per sort in
+-- services.inventory.ITEM_SORTS and an (owner, slot_id, column) twin for the
+-- slot filter. Inventory has no "newest" sort; the vault's is (crew_id) and
+-- (crew_id, slot_id), as the row id rides along in every entry.
+CREATE INDEX IF NOT EXISTS idx_character_inventory_name ON character_inventory(character_id, item_name);
+CREATE INDEX IF NOT EXISTS idx_character_inventory_level ON character_inventory(character_id, level_requirement);
+CREATE INDEX IF NOT EXISTS idx_character_inventory_slot_name ON character_inventory(character_id, slot_id, item_name);
+CREATE INDEX IF NOT EXISTS idx_character_inventory_slot_level ON character_inventory(character_id, slot_id, level_requirement);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_crew ON crew_vault(crew_id);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_name ON crew_vault(crew_id, item_name);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_level ON crew_vault(crew_id, level_requirement);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_slot ON crew_vault(crew_id, slot_id);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_slot_name ON crew_vault(crew_id, slot_id, item_name);
+CREATE INDEX IF NOT EXISTS idx_crew_vault_slot_level ON crew_vault(crew_id, slot_id, level_requirement);
+CREATE INDEX IF NOT EXISTS idx_crew_chat_messages_crew ON crew_chat_messages(crew_id, id);
+
+CREATE INDEX IF NOT EXISTS idx_auctions_open ON auctions(ends_at) WHERE status = 'open';
+CREATE INDEX IF NOT EXISTS idx_auction_bids_auction ON auction_bids(auction_id);
+
+-- Full-text search over the item and mob catalogs (services/search.py). These
+-- are external-content FTS5 tables: they index the rows of items and
+-- mob_templates without storing a second copy, and the triggers below keep
+-- them in step. Database.initialize rebuilds them once when first created.
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    name, description, content='items', content_rowid='id', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name, description ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO items_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS mob_templates_fts USING fts5(
+    name, description, content='mob_templates', content_rowid='id', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS mob_templates_fts_insert AFTER INSERT ON mob_templates BEGIN
+    INSERT INTO mob_templates_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mob_templates_fts_delete AFTER DELETE ON mob_templates BEGIN
+    INSERT INTO mob_templates_fts (mob_templates_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mob_templates_fts_update AFTER UPDATE OF name, description ON mob_templates BEGIN
+    INSERT INTO mob_templates_fts (mob_templates_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO mob_templates_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
\ No newline at end of file
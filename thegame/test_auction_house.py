@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.auction_house import AuctionHouse, AuctionError
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+START_PRICE = 100
+
+async def start_auction(house, seller_id, item_id):
+    """Put one unit of a fresh 3-transfer item up for a 1 hour auction"""
+    db = database.db
+    async with db.get_connection_context() as conn:
+        await db.queries.add_to_inventory(conn, character_id=seller_id, item_id=item_id, quantity=1,
+                                          transfers_remaining=3)
+        item = await (await conn.execute("SELECT * FROM character_inventory WHERE character_id = ?",
+                                         (seller_id,))).fetchone()
+        async with db.transaction(conn):
+            auction = await house.create(conn, seller_id, item, START_PRICE, 1)
+    house.open(auction)
+    return auction
+
+async def run_out_the_clock(house):
+    """Move the auction clock past every end time and close what's due"""
+    house._clock_start -= 2 * 3600
+    await house.tick()
+
+def test_bids_escrow_and_settle():
+    """Racing bids leave one leader in escrow, refund everyone else and settle to the seller"""
+    def scenario(path):
+        (seller, *bidders), item_id = add_characters(path, [0] + [1000] * 10)
+        house = AuctionHouse()
+        
+        async def play():
+            auction = await start_auction(house, seller, item_id)
+            
+            async def bid(bidder_id, amount):
+                try:
+                    await house.bid(auction.id, bidder_id, amount)
+                    return True
+                except AuctionError:
+                    return False
+            accepted = await asyncio.gather(*(bid(bidder, START_PRICE + 10 * (n * 7 % len(bidders))) for n, bidder in enumerate(bidders)))
+            # The leader raising their own bid only escrows the difference
+            await house.bid(auction.id, auction.leader_id, auction.leading_bid + auction.min_increment)
+            return auction, accepted
+        auction, accepted = asyncio.run(play())
+        leader, leading_bid = auction.leader_id, auction.leading_bid
+        
+        conn = sqlite3.connect(path)
+        gold = dict(conn.execute("SELECT id, gold FROM characters"))
+        escrow = conn.execute("SELECT bidder_id, amount FROM auction_escrow").fetchall()
+        conn.close()
+        
+        print(f"{sum(accepted)} of {len(bidders)} racing bids accepted; {leader} leads at {leading_bid}")
+        assert accepted[0] and escrow == [(leader, leading_bid)]
+        assert gold[leader] == 1000 - leading_bid
+        assert all(gold[bidder] == 1000 for bidder in bidders if bidder != leader)
+        assert sum(gold.values()) + leading_bid == 1000 * len(bidders)
+        
+        asyncio.run(run_out_the_clock(house))
+        
+        conn = sqlite3.connect(path)
+        gold = dict(conn.execute("SELECT id, gold FROM characters"))
+        owners = conn.execute("SELECT character_id, transfers_remaining FROM character_inventory").fetchall()
+        status, winner, price, bid_count = conn.execute(
+            "SELECT status, winner_id, final_price, bid_count FROM auctions").fetchone()
+        logged = conn.execute("SELECT COUNT(*) FROM auction_bids").fetchone()[0]
+        escrowed = conn.execute("SELECT COUNT(*) FROM auction_escrow").fetchone()[0]
+        conn.close()
+        
+        assert (status, winner, price) == ('sold', leader, leading_bid)
+        assert logged == bid_count == sum(accepted) + 1
+        assert escrowed == 0 and gold[seller] == leading_bid
+        assert owners == [(leader, 2)] and house.get(auction.id) is None
+    run_on_fresh_database(scenario)
+
+def test_unsold_item_returns():
+    """An auction nobody bid on returns the item to the seller untouched"""
+    def scenario(path):
+        (seller, bidder), item_id = add_characters(path, [0, 1000])
+        house = AuctionHouse()
+        
+        async def play():
+            auction = await start_auction(house, seller, item_id)
+            try:
+                await house.bid(auction.id, bidder, START_PRICE - 1)
+                raise AssertionError("a bid under the starting price was accepted")
+            except AuctionError:
+                pass
+            await run_out_the_clock(house)
+            return auction
+        auction = asyncio.run(play())
+        
+        conn = sqlite3.connect(path)
+        status = conn.execute("SELECT status FROM auctions WHERE id = ?", (auction.id,)).fetchone()[0]
+        owners = conn.execute("SELECT character_id, transfers_remaining FROM character_inventory").fetchall()
+        gold = dict(conn.execute("SELECT id, gold FROM characters"))
+        conn.close()
+        
+        assert status == 'expired' and owners == [(seller, 3)]
+        assert gold == {seller: 0, bidder: 1000}
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_bids_escrow_and_settle()
+    test_unsold_item_returns()
+    print("All auction house tests passed")
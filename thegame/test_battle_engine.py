@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from models.battle import Combatant, run_battle, encode_replay, decode_replay, ATTACKER, DEFENDER
+
+def make_combatants():
+    attacker = Combatant(id=7, level=20, hit_points=400, hit_points_max=400, attack=45,
+                         fire_damage=12, chaos_damage=5, critical_hit_percent=12.5, rampage_percent=8.25)
+    defender = Combatant(id=9, level=22, hit_points=420, hit_points_max=450, attack=40,
+                         fire_resist=10, shadow_damage=8, critical_hit_percent=5.0)
+    return attacker, defender
+
+def test_same_seed_same_battle():
+    """A seed and snapshot pair must always produce the same fight"""
+    attacker, defender = make_combatants()
+    first = run_battle(12345, attacker, defender)
+    second = run_battle(12345, attacker, defender)
+    
+    print(f"Rounds: {first.rounds}, strikes: {len(first.strikes)}, winner: {first.winner_id}")
+    assert first.strikes == second.strikes
+    assert first.winner_id == second.winner_id
+    assert run_battle(54321, attacker, defender).strikes != first.strikes
+
+def test_replay_round_trip():
+    """Decoding a stored replay regenerates the live battle exactly"""
+    attacker, defender = make_combatants()
+    live = run_battle(987654321, attacker, defender)
+    payload = encode_replay(987654321, attacker, defender)
+    replayed = decode_replay(payload)
+    
+    print(f"Replay payload: {len(payload)} bytes for {len(live.strikes)} strikes")
+    assert len(payload) < 200
+    assert replayed.attacker == attacker and replayed.defender == defender
+    assert replayed.strikes == live.strikes
+    assert (replayed.attacker_hp, replayed.defender_hp) == (live.attacker_hp, live.defender_hp)
+
+def test_battle_ends_on_death_or_cap():
+    """Battles stop when someone drops, and never run past the round cap"""
+    attacker, defender = make_combatants()
+    for seed in range(200):
+        battle = run_battle(seed, attacker, defender, max_rounds=10)
+        assert battle.rounds <= 10
+        if battle.winner_id is not None:
+            loser_hp = battle.defender_hp if battle.winner_id == attacker.id else battle.attacker_hp
+            assert loser_hp == 0
+        total = battle.damage_dealt_by(ATTACKER) + battle.damage_dealt_by(DEFENDER)
+        assert total == (attacker.hit_points - battle.attacker_hp) + (defender.hit_points - battle.defender_hp)
+
+def test_passive_defender_never_strikes():
+    """A defender without rage to fight back takes hits but deals none"""
+    attacker, defender = make_combatants()
+    defender.can_strike = False
+    battle = run_battle(42, attacker, defender)
+    assert battle.damage_dealt_by(DEFENDER) == 0
+    assert battle.winner_id == attacker.id
+
+if __name__ == "__main__":
+    test_same_seed_same_battle()
+    test_replay_round_trip()
+    test_battle_ends_on_death_or_cap()
+    test_passive_defender_never_strikes()
+    print("All battle engine tests passed")
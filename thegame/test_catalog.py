@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.catalog import get_catalog, load_catalog
+from test_marketplace_purchase import run_on_fresh_database
+
+def test_catalog_matches_tables():
+    """Items carry their slot and rarity; a reload picks up edits and bumps the version"""
+    def scenario(path):
+        catalog = get_catalog()
+        asyncio.run(load_catalog())
+        version = catalog.version
+
+        conn = sqlite3.connect(path)
+        joined = conn.execute("""
+            SELECT i.id, i.name, es.name, ir.name, ir.color FROM items i
+            JOIN equipment_slots es ON i.slot_id = es.id JOIN item_rarities ir ON i.rarity_id = ir.id
+        """).fetchall()
+        assert joined and all(
+            (item['name'], item['slot_name'], item['rarity_name'], item['color']) == row[1:]
+            for row in joined for item in [catalog.item(row[0])]
+        )
+        assert catalog.item(10 ** 6) is None and catalog.slot_id('weapon') == 5
+
+        character = catalog.character_row({'id': 7, 'name': 'Tester', 'class_id': 1, 'faction_id': 2})
+        assert (character['name'], character['class_name'], character['faction_name']) == \
+            ('Tester', 'Gangster', 'Delruk Alliance')
+        assert character['defense_bonus'] == 0.10
+
+        conn.execute("UPDATE item_rarities SET color = '#123456' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        asyncio.run(load_catalog())
+        assert catalog.version == version + 1 and catalog.rarity(1)['color'] == '#123456'
+        assert all(item['color'] == '#123456' for item in catalog.items if item and item['rarity_id'] == 1)
+        print(f"{len(joined)} items, catalog version {catalog.version}")
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_catalog_matches_tables()
+    print("All catalog tests passed")
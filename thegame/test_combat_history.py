@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+from urllib.parse import parse_qsl, urlencode
+sys.path.insert(0, os.path.dirname(__file__))
+
+from aiohttp import web
+
+import database
+from handlers.combat import HISTORY_CURSOR_START, parse_history_cursor
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def add_logs(path, fights):
+    """Insert (attacker_id, defender_id, created_at) fights; returns their ids in order"""
+    conn = sqlite3.connect(path)
+    ids = [conn.execute("INSERT INTO combat_logs (attacker_id, defender_id, combat_type, created_at) VALUES (?, ?, ?, ?)",
+                        (attacker_id, defender_id, 'pvp' if defender_id else 'pve', created_at)).lastrowid
+           for attacker_id, defender_id, created_at in fights]
+    conn.commit()
+    conn.close()
+    return ids
+
+async def walk(character_id, limit):
+    """Every page of a character's history, following the cursor the OLDER BATTLES link carries"""
+    pages = []
+    query = {}
+    async with database.db.get_connection_context() as conn:
+        while True:
+            before_ts, before_id = parse_history_cursor(query)
+            page = await database.db.queries.get_combat_history(conn, character_id=character_id, before_created_at=before_ts,
+                                                                before_id=before_id, limit=limit)
+            pages.append([log['id'] for log in page])
+            if len(page) < limit:
+                return pages
+            query = dict(parse_qsl(urlencode({'before_ts': page[-1]['created_at'], 'before_id': page[-1]['id']})))
+
+def test_pages_cover_every_fight_once():
+    """Paging newest first visits each of a character's fights once, attacking or defending,
+    even when a page boundary falls inside a run of fights logged in the same second"""
+    def scenario(path):
+        (hero, rival, other), _ = add_characters(path, [0, 0, 0])
+        same_second = '2026-03-01 12:00:00'
+        fights = [(hero, None, '2026-02-28 09:00:00')]
+        fights += [(hero, rival, same_second), (rival, hero, same_second)] * 3
+        fights += [(rival, other, same_second), (other, hero, '2026-03-02 08:30:00'), (hero, other, '2026-03-02 08:30:00')]
+        ids = add_logs(path, fights)
+        
+        mine = sorted((created_at, log_id) for log_id, (attacker_id, defender_id, created_at) in zip(ids, fights)
+                      if hero in (attacker_id, defender_id))
+        expected = [log_id for _, log_id in reversed(mine)]
+        assert len(expected) == 9
+        for limit in (1, 2, 4, 9, 20):
+            pages = asyncio.run(walk(hero, limit))
+            assert [log_id for page in pages for log_id in page] == expected, limit
+            assert all(len(page) == limit for page in pages[:-1])
+        # The rival's fights with the hero show up on the rival's side too
+        assert sum(asyncio.run(walk(rival, 3)), []) == [log_id for log_id, fight in zip(ids, fights)
+                                                      if rival in fight[:2]][::-1]
+    run_on_fresh_database(scenario)
+
+def test_first_page_cursor():
+    """No cursor starts from HISTORY_CURSOR_START, which sorts after any real fight"""
+    assert parse_history_cursor({}) == HISTORY_CURSOR_START
+    assert parse_history_cursor({'before_ts': ''}) == HISTORY_CURSOR_START
+    assert parse_history_cursor({'before_ts': '2026-03-01 12:00:00', 'before_id': '42'}) == ('2026-03-01 12:00:00', 42)
+    
+    def scenario(path):
+        (hero, rival), _ = add_characters(path, [0, 0])
+        ids = add_logs(path, [(hero, rival, '9999-12-31 23:59:58'), (rival, hero, '2026-03-01 12:00:00')])
+        assert asyncio.run(walk(hero, 20)) == [ids]
+    run_on_fresh_database(scenario)
+
+def test_bad_cursor_is_a_bad_request():
+    """A tampered cursor is refused with a 400 rather than reaching the query"""
+    for query in ({'before_id': 'abc'}, {'before_id': '1.5'}, {'before_id': '-1'}, {'before_id': str(2 ** 63)},
+                  {'before_ts': 'yesterday', 'before_id': '5'}, {'before_ts': "2026-03-01' OR 1=1 --", 'before_id': '5'}):
+        try:
+            parse_history_cursor(query)
+            raise AssertionError(f"cursor accepted: {query}")
+        except web.HTTPBadRequest as e:
+            assert e.status == 400
+
+if __name__ == "__main__":
+    test_pages_cover_every_fight_once()
+    test_first_page_cursor()
+    test_bad_cursor_is_a_bad_request()
+    print("All combat history tests passed")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from handlers.combat import record_battle
+from models.battle import ATTACKER, Combatant, decode_replay, new_seed, run_battle
+from services.combat_retention import archive_combat_logs, get_archive_path, get_archived_battle_replay
+from test_inventory_stacks import in_transaction
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+async def fight(conn, attacker_id, defender_id):
+    """Log one PvP battle with its replay, as attack_player does"""
+    battle = run_battle(new_seed(), Combatant(id=attacker_id, level=5, hit_points=80, hit_points_max=80, attack=12),
+                        Combatant(id=defender_id, level=5, hit_points=80, hit_points_max=80, attack=10))
+    winner_id = attacker_id if battle.winner_side == ATTACKER else defender_id
+    return await record_battle(conn, battle, winner_id, 10, 5, 'pvp', defender_id=defender_id)
+
+async def replay(combat_log_id):
+    """The lookup combat_replay makes: the live tables first, then the archive"""
+    async with database.db.get_connection_context() as conn:
+        row = await database.db.queries.get_battle_replay(conn, combat_log_id=combat_log_id)
+        return row or await get_archived_battle_replay(conn, combat_log_id)
+
+def test_old_logs_move_to_the_archive():
+    """Logs past the retention window move in chunks to the archive, where replays still find them;
+    recent logs and the rollups stay put"""
+    def scenario(path):
+        (hero, rival), _ = add_characters(path, [0, 0])
+        
+        async def log(count):
+            return [await in_transaction(fight, hero, rival) for _ in range(count)]
+        old_ids, new_ids = asyncio.run(log(5)), asyncio.run(log(2))
+        conn = sqlite3.connect(path)
+        conn.execute(f"UPDATE combat_logs SET created_at = datetime('now', '-40 days') "
+                     f"WHERE id IN ({', '.join('?' * len(old_ids))})", old_ids)
+        conn.commit()
+        # A database from before incremental auto-vacuum
+        conn.execute("PRAGMA auto_vacuum=NONE")
+        conn.execute("VACUUM")
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        rollups = conn.execute("SELECT SUM(fights) FROM combat_daily_rollups").fetchone()[0]
+        before = {row[0]: row for row in conn.execute("SELECT * FROM combat_logs")}
+        conn.close()
+        
+        assert asyncio.run(archive_combat_logs(retention_days=30, chunk_size=2)) == 5
+        conn = sqlite3.connect(path)
+        assert [row[0] for row in conn.execute("SELECT id FROM combat_logs ORDER BY id")] == new_ids
+        assert [row[0] for row in conn.execute("SELECT combat_log_id FROM battle_replays ORDER BY 1")] == new_ids
+        assert conn.execute("SELECT SUM(fights) FROM combat_daily_rollups").fetchone()[0] == rollups == 14
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        conn.close()
+        archive = sqlite3.connect(get_archive_path(path))
+        assert {row[0]: row for row in archive.execute("SELECT * FROM combat_logs")} == \
+            {log_id: before[log_id] for log_id in old_ids}
+        archive.close()
+        
+        for log_id in old_ids + new_ids:
+            row = asyncio.run(replay(log_id))
+            assert row['id'] == log_id and row['attacker_id'] == hero and row['defender_id'] == rival
+            assert decode_replay(row['payload']).attacker.id == hero
+        assert asyncio.run(replay(max(new_ids) + 1)) is None
+        # Nothing left to move
+        assert asyncio.run(archive_combat_logs(retention_days=30)) == 0
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_old_logs_move_to_the_archive()
+    print("All combat retention tests passed")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def log_fights(path, attacker_id, defender_id):
+    """A PvP win for the attacker, then a mob fight the attacker wins"""
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO combat_logs (attacker_id, defender_id, attacker_damage, defender_damage, winner_id, "
+                 "experience_gained, gold_gained, combat_type) VALUES (?, ?, 40, 10, ?, 100, 20, 'pvp')",
+                 (attacker_id, defender_id, attacker_id))
+    conn.execute("INSERT INTO combat_logs (attacker_id, attacker_damage, defender_damage, winner_id, "
+                 "experience_gained, gold_gained, combat_type, mob_template_id) VALUES (?, 70, 5, ?, 30, 9, 'pve', 1)",
+                 (attacker_id, attacker_id))
+    conn.commit()
+    conn.close()
+
+def totals(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""
+        SELECT character_id, SUM(fights), SUM(wins), SUM(losses), SUM(damage_dealt), SUM(damage_taken),
+               SUM(gold_won), SUM(experience_won)
+        FROM combat_daily_rollups GROUP BY character_id ORDER BY character_id
+    """).fetchall()
+    conn.close()
+    return rows
+
+def test_rollups_count_pvp_only():
+    """Mob fights are logged but stay out of the PvP record"""
+    def scenario(path):
+        (hero, rival), _ = add_characters(path, [0, 0])
+        log_fights(path, hero, rival)
+        assert totals(path) == [(hero, 1, 1, 0, 40, 10, 20, 100), (rival, 1, 0, 1, 10, 40, 0, 0)]
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_rollups_count_pvp_only()
+    print("All combat rollup tests passed")
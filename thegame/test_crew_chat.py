@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.crew_chat import CHAT_FLUSH_SECONDS, CHAT_HISTORY_SIZE, ChatError, CrewChat, load_crew_chat, get_crew_chat
+from services.presence import SEND_QUEUE_SIZE
+from test_crew_limits import add_crew
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def saved(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT crew_id, character_id, message FROM crew_chat_messages ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+def test_messages_fan_out_to_the_crew_only():
+    """A message reaches every connected member of its crew and nobody else"""
+    async def play():
+        chat = CrewChat()
+        queues = {character_id: chat.subscribe(1, character_id) for character_id in (1, 2, 3)}
+        outsider = chat.subscribe(2, 4)
+        chat.post(1, 2, 'Bob', '  meet at the docks ')
+        for queue in queues.values():
+            message = queue.get_nowait()
+            assert (message['name'], message['message']) == ('Bob', 'meet at the docks')
+        assert outsider.empty()
+        
+        for text in ('', 'x' * 501):
+            try:
+                chat.post(1, 2, 'Bob', text)
+                raise AssertionError(f"{len(text)} characters accepted")
+            except ChatError:
+                pass
+        # A character who isn't connected to the crew's chat can't post to it
+        chat.unsubscribe(1, 3)
+        try:
+            chat.post(1, 3, 'Cat', 'hello?')
+            raise AssertionError("posted without a subscription")
+        except ChatError:
+            pass
+        # A stale tab's disconnect leaves the newer tab subscribed
+        newer = chat.subscribe(1, 1)
+        chat.unsubscribe(1, 1, queues[1])
+        chat.post(1, 1, 'Ann', 'still here')
+        assert newer.get_nowait()['message'] == 'still here'
+    asyncio.run(play())
+
+def test_ring_buffer_and_slow_consumers_are_bounded():
+    """History keeps the last CHAT_HISTORY_SIZE messages; a full send queue drops its oldest"""
+    async def play():
+        chat = CrewChat()
+        slow = chat.subscribe(1, 1)
+        total = SEND_QUEUE_SIZE + 10
+        for n in range(total):
+            chat.post(1, 1, 'Ann', f"message {n}")
+        assert [m['message'] for m in chat.backlog(1)] == [f"message {n}" for n in range(total - CHAT_HISTORY_SIZE, total)]
+        assert slow.qsize() == SEND_QUEUE_SIZE
+        assert slow.get_nowait()['message'] == f"message {total - SEND_QUEUE_SIZE}"
+        assert chat.backlog(2) == []
+    asyncio.run(play())
+
+def test_messages_saved_in_batches_and_reloaded():
+    """Posting writes nothing; the next due flush saves the batch, and a restart restores the history"""
+    def scenario(path):
+        (ann, bob, cat), _ = add_characters(path, [0, 0, 0])
+        conn = sqlite3.connect(path)
+        names = dict(conn.execute("SELECT id, name FROM characters"))
+        conn.close()
+        crew_id = add_crew(path, ann)
+        other_crew = add_crew(path, cat)
+        
+        async def play():
+            chat = get_crew_chat()
+            chat._last_flush = time.monotonic()
+            chat.subscribe(crew_id, ann)
+            chat.subscribe(crew_id, bob)
+            chat.subscribe(other_crew, cat)
+            for n in range(CHAT_HISTORY_SIZE + 5):
+                speaker = (ann, bob)[n % 2]
+                chat.post(crew_id, speaker, names[speaker], f"line {n}")
+            chat.post(other_crew, cat, names[cat], 'hi')
+            
+            await chat.flush()
+            assert saved(path) == []
+            chat._last_flush -= CHAT_FLUSH_SECONDS
+            await chat.flush()
+            assert len(saved(path)) == CHAT_HISTORY_SIZE + 6
+            
+            before = {crew: chat.backlog(crew) for crew in (crew_id, other_crew)}
+            await load_crew_chat()
+            for crew in (crew_id, other_crew):
+                reloaded = chat.backlog(crew)
+                assert [(m['character_id'], m['name'], m['message'], m['sent_at']) for m in reloaded] == \
+                    [(m['character_id'], m['name'], m['message'], m['sent_at']) for m in before[crew]]
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_messages_fan_out_to_the_crew_only()
+    test_ring_buffer_and_slow_consumers_are_bounded()
+    test_messages_saved_in_batches_and_reloaded()
+    print("All crew chat tests passed")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+from collections import Counter
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.crew_service import CrewError, award_item, deposit_item, join, withdraw_item
+from test_inventory_stacks import in_transaction
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def add_crew(path, leader_id, max_members=20, vault_capacity=100):
+    conn = sqlite3.connect(path)
+    crew_id = conn.execute("INSERT INTO crews (name, leader_id, max_members, vault_capacity) VALUES (?, ?, ?, ?)",
+                           (f"Crew{leader_id}", leader_id, max_members, vault_capacity)).lastrowid
+    conn.execute("INSERT INTO crew_members (crew_id, character_id, role) VALUES (?, ?, 'leader')", (crew_id, leader_id))
+    conn.commit()
+    conn.close()
+    return crew_id
+
+def counters(path, crew_id):
+    """(member_count, COUNT(*) of members, vault_count, COUNT(*) of vault items)"""
+    conn = sqlite3.connect(path)
+    row = conn.execute("""
+        SELECT member_count, (SELECT COUNT(*) FROM crew_members WHERE crew_id = crews.id),
+               vault_count, (SELECT COUNT(*) FROM crew_vault WHERE crew_id = crews.id)
+        FROM crews WHERE id = ?
+    """, (crew_id,)).fetchone()
+    conn.close()
+    return row
+
+async def attempt(action, *args):
+    try:
+        await in_transaction(action, *args)
+        return 'ok'
+    except CrewError as e:
+        return str(e)
+
+def test_racing_joins_fill_the_crew_exactly():
+    """Of many characters joining at once only max_members get in, and nobody joins two crews"""
+    def scenario(path):
+        (leader, other_leader, *joiners), _ = add_characters(path, [0] * 22)
+        crew_id = add_crew(path, leader, max_members=5)
+        other_crew = add_crew(path, other_leader)
+        
+        async def burst():
+            return await asyncio.gather(*(attempt(join, crew_id, joiner) for joiner in joiners),
+                                        attempt(join, other_crew, joiners[0]))
+        outcomes = asyncio.run(burst())
+        print(f"Join outcomes: {dict(Counter(outcomes))}")
+        assert counters(path, crew_id)[:2] == (5, 5)
+        assert outcomes.count('ok') == 4 + (outcomes[-1] == 'ok')
+        assert set(outcomes) <= {'ok', 'Crew is full', 'Already in a crew'}
+        
+        # Leaving frees the seat
+        conn = sqlite3.connect(path)
+        conn.execute("DELETE FROM crew_members WHERE crew_id = ? AND character_id != ?", (crew_id, leader))
+        conn.commit()
+        conn.close()
+        assert counters(path, crew_id)[:2] == (1, 1)
+    run_on_fresh_database(scenario)
+
+def test_racing_deposits_stop_at_capacity():
+    """Deposits past vault_capacity are refused and leave the item in the inventory"""
+    def scenario(path):
+        (leader, outsider), item_id = add_characters(path, [0, 0])
+        crew_id = add_crew(path, leader, vault_capacity=3)
+        conn = sqlite3.connect(path)
+        stack = conn.execute("INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining) "
+                             "VALUES (?, ?, 10, 2)", (leader, item_id)).lastrowid
+        conn.commit()
+        conn.close()
+        
+        async def burst():
+            return await asyncio.gather(*(attempt(deposit_item, leader, stack) for _ in range(8)),
+                                        attempt(deposit_item, outsider, stack))
+        outcomes = asyncio.run(burst())
+        print(f"Deposit outcomes: {dict(Counter(outcomes))}")
+        assert Counter(outcomes) == {'ok': 3, 'The crew vault is full': 5, "You're not in a crew": 1}
+        assert counters(path, crew_id)[2:] == (3, 3)
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT quantity FROM character_inventory WHERE id = ?", (stack,)).fetchone()[0] == 7
+        # Taking an item out of the vault frees its slot
+        conn.execute("DELETE FROM crew_vault WHERE id = (SELECT MIN(id) FROM crew_vault)")
+        conn.commit()
+        conn.close()
+        assert counters(path, crew_id)[2:] == (2, 2)
+    run_on_fresh_database(scenario)
+
+def test_vault_items_leave_with_their_transfers():
+    """Withdrawals and awards put the item back in an inventory: unchanged for its depositor,
+    one transfer spent for anyone else, and each vault item goes out exactly once"""
+    def scenario(path):
+        (leader, member, outsider), item_id = add_characters(path, [0, 0, 0])
+        crew_id = add_crew(path, leader)
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO crew_members (crew_id, character_id) VALUES (?, ?)", (crew_id, member))
+        stack = conn.execute("INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining) "
+                             "VALUES (?, ?, 4, 2)", (leader, item_id)).lastrowid
+        conn.commit()
+        conn.close()
+        
+        def holdings():
+            conn = sqlite3.connect(path)
+            rows = conn.execute("SELECT character_id, quantity, transfers_remaining FROM character_inventory "
+                                "ORDER BY character_id, transfers_remaining").fetchall()
+            vault = [row[0] for row in conn.execute("SELECT id FROM crew_vault ORDER BY id")]
+            conn.close()
+            return rows, vault
+        
+        async def play():
+            for _ in range(3):
+                assert await attempt(deposit_item, leader, stack) == 'ok'
+            _, (first, second, third) = holdings()
+            
+            # One-way vault: only the leader takes items out or awards them, and only to members
+            assert await attempt(withdraw_item, member, first) == "Only the crew leader can take items out of the vault"
+            assert await attempt(award_item, member, first, member) == "Only the crew leader can award items"
+            assert await attempt(award_item, leader, first, outsider) == "That character isn't in your crew"
+            
+            assert await attempt(withdraw_item, leader, first) == 'ok'
+            outcomes = await asyncio.gather(*(attempt(award_item, leader, second, member) for _ in range(4)))
+            assert Counter(outcomes) == {'ok': 1, "That item isn't in the vault": 3}
+            assert await attempt(withdraw_item, leader, second) == "That item isn't in the vault"
+            assert holdings() == ([(leader, 2, 2), (member, 1, 1)], [third])
+            assert counters(path, crew_id)[2:] == (1, 1)
+            
+            # A two-way vault lets members take items out themselves
+            conn = sqlite3.connect(path)
+            conn.execute("UPDATE crews SET has_two_way_vault = 1 WHERE id = ?", (crew_id,))
+            conn.commit()
+            conn.close()
+            assert await attempt(withdraw_item, member, third) == 'ok'
+            assert holdings() == ([(leader, 2, 2), (member, 2, 1)], [])
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_counters_backfilled_for_existing_crews():
+    """Crews from before the counters get them counted once at startup"""
+    def scenario(path):
+        (leader, member), item_id = add_characters(path, [0, 0])
+        crew_id = add_crew(path, leader)
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO crew_members (crew_id, character_id) VALUES (?, ?)", (crew_id, member))
+        conn.execute("INSERT INTO crew_vault (crew_id, item_id) VALUES (?, ?)", (crew_id, item_id))
+        conn.execute("DROP TRIGGER trg_crew_members_count_insert")
+        conn.execute("UPDATE crews SET member_count = 0, vault_count = 0")
+        conn.commit()
+        conn.close()
+        
+        asyncio.run(database.db.initialize())
+        assert counters(path, crew_id) == (2, 2, 1, 1)
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_racing_joins_fill_the_crew_exactly()
+    test_racing_deposits_stop_at_capacity()
+    test_vault_items_leave_with_their_transfers()
+    test_counters_backfilled_for_existing_crews()
+    print("All crew limit tests passed")
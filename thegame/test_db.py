@@ -21,9 +21,9 @@ async def test_db():
             result = await database.queries.get_all_classes(conn)
             print(f"Classes query successful! Found {len(result)} classes")
             
-            # Test the new ranking queries
-            rankings = await database.queries.get_power_rankings(conn, limit=10)
-            print(f"Power rankings query successful! Found {len(rankings)} characters")
+            # Test the query the ranking ladders are seeded from
+            rankings = await database.queries.get_all_ranked_stats(conn)
+            print(f"Ranked stats query successful! Found {len(rankings)} characters")
             
     except Exception as e:
         print(f"Database error: {e}")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.catalog import load_catalog
+from services.character_service import EquipError, equip_from_inventory, unequip_to_inventory
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def state(path, character_id):
+    conn = sqlite3.connect(path)
+    bag = sorted(conn.execute("SELECT item_id, quantity, transfers_remaining FROM character_inventory "
+                              "WHERE character_id = ?", (character_id,)))
+    worn = sorted(conn.execute("SELECT slot_id, item_id, transfers_remaining FROM character_equipment "
+                               "WHERE character_id = ?", (character_id,)))
+    conn.close()
+    return bag, worn
+
+async def in_transaction(action, *args):
+    async with database.db.get_connection_context() as conn, database.db.transaction(conn):
+        return await action(conn, *args)
+
+def test_equip_and_unequip_keep_one_stack():
+    """Equipping takes one unit off the stack and unequipping merges it back, transfers included"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [0])
+        conn = sqlite3.connect(path)
+        sword, axe, high_level = [row[0] for row in conn.execute(
+            "SELECT id FROM items WHERE slot_id = 5 ORDER BY level_requirement, id LIMIT 2")] + \
+            [conn.execute("SELECT id FROM items WHERE level_requirement > 1 LIMIT 1").fetchone()[0]]
+        conn.close()
+        asyncio.run(load_catalog())
+        
+        async def play():
+            add = database.db.queries.add_to_inventory
+            async with database.db.get_connection_context() as conn:
+                for quantity in (2, 1):
+                    await add(conn, character_id=hero, item_id=sword, quantity=quantity, transfers_remaining=4)
+                await add(conn, character_id=hero, item_id=axe, quantity=1, transfers_remaining=None)
+                await conn.commit()
+            assert state(path, hero)[0] == sorted([(sword, 3, 4), (axe, 1, None)])
+            
+            slot = await in_transaction(equip_from_inventory, hero, 99, sword)
+            assert state(path, hero) == (sorted([(sword, 2, 4), (axe, 1, None)]), [(slot, sword, 4)])
+            # Swapping in the axe bags the sword onto its old stack
+            await in_transaction(equip_from_inventory, hero, 99, axe)
+            assert state(path, hero) == ([(sword, 3, 4)], [(slot, axe, None)])
+            await in_transaction(unequip_to_inventory, hero, slot)
+            assert state(path, hero) == (sorted([(sword, 3, 4), (axe, 1, None)]), [])
+            
+            for action, args in ((equip_from_inventory, (hero, 1, high_level)),
+                                 (unequip_to_inventory, (hero, slot))):
+                try:
+                    await in_transaction(action, *args)
+                    raise AssertionError(f"{action.__name__}{args} went through")
+                except EquipError as e:
+                    print(f"Refused: {e}")
+            assert state(path, hero) == (sorted([(sword, 3, 4), (axe, 1, None)]), [])
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_duplicate_rows_fold_into_one_stack():
+    """Rows from before the stack index are merged per (item, transfers) at startup"""
+    def scenario(path):
+        (hero, other), item_id = add_characters(path, [0, 0])
+        conn = sqlite3.connect(path)
+        conn.execute("DROP INDEX idx_character_inventory_stack")
+        conn.executemany("INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining) "
+                         "VALUES (?, ?, ?, ?)", [(hero, item_id, 1, 10), (hero, item_id, 2, 10), (hero, item_id, 1, 3),
+                                                 (hero, item_id, 1, None), (hero, item_id, 1, None), (other, item_id, 1, 10)])
+        conn.commit()
+        conn.close()
+        
+        asyncio.run(database.db.initialize())
+        assert state(path, hero)[0] == sorted([(item_id, 3, 10), (item_id, 1, 3), (item_id, 2, None)])
+        assert state(path, other)[0] == [(item_id, 1, 10)]
+        
+        conn = sqlite3.connect(path)
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM character_inventory "
+                            "WHERE character_id = ? AND item_id = ?", (hero, item_id)).fetchall()
+        conn.close()
+        assert 'idx_character_inventory_stack' in plan[0][-1]
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_equip_and_unequip_keep_one_stack()
+    test_duplicate_rows_fold_into_one_stack()
+    print("All inventory stack tests passed")
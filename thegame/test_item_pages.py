@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.catalog import get_catalog, load_catalog
+from services.inventory import ITEM_SORTS, ITEM_VIEWS, page_items, parse_item_filters
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def fill(path, character_id, crew_id):
+    """One stack of every item per transfer count 1-3 in the inventory, and every item twice in the vault"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining)
+        SELECT ?, items.id, 1, t.value FROM items, json_each('[1, 2, 3]') t
+    """, (character_id,))
+    conn.execute("""
+        INSERT INTO crew_vault (crew_id, item_id, deposited_by)
+        SELECT ?, items.id, ? FROM items, json_each('[1, 2]')
+    """, (crew_id, character_id))
+    conn.commit()
+    conn.close()
+
+def stale_copies(conn, table):
+    """Rows whose copied slot, rarity, level or name differ from their item"""
+    return conn.execute(f"""
+        SELECT COUNT(*) FROM {table} t JOIN items i ON i.id = t.item_id
+        WHERE t.slot_id IS NOT i.slot_id OR t.rarity_id IS NOT i.rarity_id
+           OR t.level_requirement IS NOT i.level_requirement OR t.item_name IS NOT i.name
+    """).fetchone()[0]
+
+async def walk(view, owner_id, sort, **filters):
+    """Every page of a view, concatenated"""
+    rows, after = [], None
+    async with database.db.get_connection_context() as conn:
+        while True:
+            page, after = await page_items(conn, view, owner_id, sort, after=after, limit=25, **filters)
+            rows += page
+            if after is None:
+                return rows
+
+def test_pages_cover_the_view_in_order():
+    """Walking the pages of any sort and filter yields each matching row once, in sort order"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [0])
+        conn = sqlite3.connect(path)
+        crew_id = conn.execute("INSERT INTO crews (name, leader_id) VALUES ('Pagers', ?)", (hero,)).lastrowid
+        conn.commit()
+        conn.close()
+        fill(path, hero, crew_id)
+        asyncio.run(load_catalog())
+        catalog = get_catalog()
+        
+        conn = sqlite3.connect(path)
+        for view, owner_id in (('inventory', hero), ('vault', crew_id)):
+            table, owner = ITEM_VIEWS[view][:2]
+            everything = {row[0]: row[1:] for row in conn.execute(
+                f"SELECT id, slot_id, rarity_id, level_requirement, item_name FROM {table} WHERE {owner} = ?", (owner_id,))}
+            assert not stale_copies(conn, table)
+            for sort in ITEM_VIEWS[view][3]:
+                for filters in ({}, {'slot_id': catalog.slot_id('weapon')}, {'rarity_id': 2, 'min_level': 5, 'max_level': 40}):
+                    rows = asyncio.run(walk(view, owner_id, sort, **filters))
+                    expected = {row_id for row_id, (slot_id, rarity_id, level, _) in everything.items()
+                                if filters.get('slot_id', slot_id) == slot_id and filters.get('rarity_id', rarity_id) == rarity_id
+                                and filters.get('min_level', 1) <= level <= filters.get('max_level', 95)}
+                    assert len(rows) == len(expected) and {row['id'] for row in rows} == expected, (view, sort, filters)
+                    column, direction = ITEM_SORTS[sort]
+                    keys = [(row[column], row['id']) for row in rows]
+                    assert keys == sorted(keys, reverse=direction == 'DESC')
+                    
+                    # Each page is an index walk: no temporary sort of the owner's rows
+                    slot = "AND slot_id = 5" if 'slot_id' in filters else ""
+                    plan = " ".join(row[-1] for row in conn.execute(f"""
+                        EXPLAIN QUERY PLAN SELECT id FROM {table} WHERE {owner} = 1 {slot}
+                        AND +level_requirement BETWEEN 1 AND 95 ORDER BY {column} {direction}, id {direction} LIMIT 26"""))
+                    assert 'TEMP B-TREE' not in plan, plan
+            print(f"{view}: {len(everything)} rows paged by {ITEM_VIEWS[view][3]}")
+        conn.close()
+    run_on_fresh_database(scenario)
+
+def test_filters_from_query_string():
+    """Names map to ids, the cursor round-trips, and junk is refused"""
+    def scenario(path):
+        asyncio.run(load_catalog())
+        page_args, filters = parse_item_filters({'slot': 'weapon', 'rarity': 'Mythic', 'sort': 'level',
+                                                 'after_value': '40', 'after_id': '7'}, 'inventory')
+        assert page_args['slot_id'] == get_catalog().slot_id('weapon') and page_args['rarity_id'] == 5
+        assert page_args['after'] == (40, 7) and filters['sort'] == 'level'
+        # The inventory has no "newest" sort; unknown sorts fall back to the view's default
+        assert parse_item_filters({'sort': 'newest'}, 'inventory')[0]['sort'] == 'name'
+        assert parse_item_filters({}, 'vault')[0]['sort'] == 'newest'
+        for query in ({'slot': 'tail'}, {'min_level': 'x'}, {'sort': 'name', 'after_id': '3'}):
+            try:
+                parse_item_filters(query, 'inventory')
+                raise AssertionError(f"{query} accepted")
+            except ValueError:
+                pass
+    run_on_fresh_database(scenario)
+
+def test_existing_rows_are_backfilled():
+    """Rows from before the copied columns existed get them filled in once at startup"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [0])
+        fill(path, hero, 1)
+        conn = sqlite3.connect(path)
+        for table in ('character_inventory', 'crew_vault'):
+            conn.execute(f"DROP TRIGGER trg_{table}_item")
+            conn.execute(f"UPDATE {table} SET slot_id = NULL, rarity_id = NULL, level_requirement = NULL, item_name = NULL")
+        conn.commit()
+        assert stale_copies(conn, 'character_inventory') == 60
+        conn.close()
+        
+        asyncio.run(database.db.initialize())
+        conn = sqlite3.connect(path)
+        assert stale_copies(conn, 'character_inventory') == 0 and stale_copies(conn, 'crew_vault') == 0
+        conn.close()
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_pages_cover_the_view_in_order()
+    test_filters_from_query_string()
+    test_existing_rows_are_backfilled()
+    print("All item page tests passed")
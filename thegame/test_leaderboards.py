@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import random
+sys.path.insert(0, os.path.dirname(__file__))
+
+import asyncio
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+from types import SimpleNamespace
+
+from services.leaderboards import RankedSkipList, Leaderboard, CrewLadders, load_leaderboards
+from services.ranking_snapshots import RankingSnapshots, PAGE_SIZE, get_ranking_snapshots, load_ranking_snapshots
+from services.ranking_history import encode_samples, decode_samples, downsample
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def make_stats(character_id, rng):
+    return {'id': character_id, 'level': rng.randint(1, 60), 'experience': rng.randint(0, 10**6),
+            'gold': rng.randint(0, 10**5), 'total_power': rng.randint(0, 5000), 'wilderness_level': rng.randint(0, 3)}
+
+def test_skip_list_matches_sorted():
+    """Rank and slice agree with a plain sorted list through inserts and removes"""
+    rng = random.Random(7)
+    ladder = RankedSkipList()
+    keys = rng.sample(range(100000), 2000)
+    ladder.build(sorted(keys[:1000]))
+    for key in keys[1000:]:
+        ladder.insert(key)
+    for key in keys[:500]:
+        ladder.remove(key)
+    
+    expected = sorted(keys[500:])
+    assert len(ladder) == len(expected)
+    assert ladder.slice(0, len(expected)) == expected
+    for offset in (0, 1, 49, 700, 1450, 1499, 1500):
+        assert ladder.slice(offset, 50) == expected[offset:offset + 50]
+    for position in rng.sample(range(len(expected)), 100):
+        assert ladder.rank(expected[position]) == position + 1
+    print(f"Skip list of {len(ladder)} keys matches sorted()")
+
+def test_leaderboard_updates():
+    """Stat changes move a character on the ladder; excluded characters drop off"""
+    rng = random.Random(11)
+    board = Leaderboard('wilderness', lambda c: (-c['wilderness_level'], -c['level'], c['id']),
+                        include=lambda c: c['wilderness_level'] > 0)
+    stats = {character_id: make_stats(character_id, rng) for character_id in range(1, 301)}
+    board.seed(stats.values())
+    
+    for _ in range(500):
+        character = stats[rng.randint(1, 300)]
+        character['wilderness_level'] = rng.randint(0, 5)
+        character['level'] = rng.randint(1, 60)
+        board.update(character)
+    
+    ranked = sorted((c for c in stats.values() if c['wilderness_level'] > 0),
+                    key=lambda c: (-c['wilderness_level'], -c['level'], c['id']))
+    assert len(board) == len(ranked)
+    assert board.page(0, len(ranked)) == [c['id'] for c in ranked]
+    for position, character in enumerate(ranked, start=1):
+        assert board.rank(character['id']) == position
+    unranked = [c['id'] for c in stats.values() if c['wilderness_level'] == 0]
+    assert all(board.rank(character_id) is None for character_id in unranked)
+    print(f"{len(ranked)} ranked, {len(unranked)} off the wilderness ladder")
+
+def test_snapshot_pages():
+    """Snapshot rows are split into pages with their own ETag and JSON"""
+    rows = [{'ranking_type': 'gold', 'rank': rank, 'character_id': 1000 - rank, 'name': f"Char{rank}",
+             'class_name': 'Gangster', 'level': 1, 'value': 1000 - rank, 'last_active': None}
+            for rank in range(1, PAGE_SIZE * 2 + 8)]
+    snapshots = RankingSnapshots()
+    snapshots.load(rows, {'gold': 500}, '2025-01-01 00:00:00')
+    
+    assert [len(snapshots.page('gold', page).rows) for page in (1, 2, 3)] == [PAGE_SIZE, PAGE_SIZE, 7]
+    assert snapshots.page('gold', 4) is None
+    assert snapshots.page('power', 1).rows == []
+    assert snapshots.last_page('gold') == 10
+    body = json.loads(snapshots.page('gold', 2).json)
+    assert body['rankings'][0]['rank'] == PAGE_SIZE + 1 and body['last_page'] == 10
+    
+    etag = snapshots.page('gold', 1).etag
+    snapshots.load(rows, {'gold': 500}, '2025-01-01 00:05:00')
+    assert snapshots.page('gold', 1).etag != etag
+    print(f"Snapshot split into {len(snapshots.pages)} pages")
+
+def test_restart_reuses_only_a_current_snapshot():
+    """A snapshot from within the interval is served as is; an older one is retaken from the live ladders"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [100])
+        def store(taken_at):
+            conn = sqlite3.connect(path)
+            conn.execute("DELETE FROM ranking_snapshots")
+            conn.execute("INSERT INTO ranking_snapshots (ranking_type, rank, character_id, name, class_name, level, "
+                         "value, taken_at) VALUES ('gold', 1, ?, 'Stale', 'Gangster', 1, 5, ?)", (hero, taken_at))
+            conn.commit()
+            conn.close()
+        
+        async def restart():
+            await load_leaderboards()
+            await load_ranking_snapshots()
+            return get_ranking_snapshots()
+        
+        just_now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        store(just_now)
+        snapshots = asyncio.run(restart())
+        assert snapshots.taken_at == just_now and snapshots.page('gold', 1).rows[0]['name'] == 'Stale'
+        
+        store('2020-01-01 00:00:00')
+        snapshots = asyncio.run(restart())
+        assert snapshots.taken_at != '2020-01-01 00:00:00'
+        assert [(row['name'], row['value']) for row in snapshots.page('gold', 1).rows] == [('Trader0', 100)]
+    run_on_fresh_database(scenario)
+
+def test_crew_aggregates():
+    """Crew totals follow joins, leaves, stat changes and wins without recounting"""
+    rng = random.Random(5)
+    characters = {character_id: make_stats(character_id, rng) for character_id in range(1, 61)}
+    crew_of = {character_id: character_id % 4 + 1 for character_id in range(1, 41)}
+    ladders = CrewLadders()
+    ladders.seed([{'id': crew_id, 'pvp_wins': 0} for crew_id in range(1, 6)],
+                 [{'crew_id': crew_id, 'character_id': cid} for cid, crew_id in crew_of.items()],
+                 characters.values())
+    
+    for _ in range(300):
+        character_id = rng.randint(1, 60)
+        action = rng.random()
+        if action < 0.2:
+            crew_of[character_id] = rng.randint(1, 5)
+            stats = characters[character_id]
+            ladders.joined(crew_of[character_id], SimpleNamespace(id=character_id, total_power=stats['total_power'],
+                                                                  level=stats['level']))
+        elif action < 0.35:
+            crew_of.pop(character_id, None)
+            ladders.left(character_id)
+        elif action < 0.45:
+            ladders.pvp_win(character_id)
+        else:
+            characters[character_id]['total_power'] = rng.randint(0, 5000)
+            characters[character_id]['level'] = rng.randint(1, 60)
+            ladders.character_changed(characters[character_id])
+    
+    for crew_id, crew in ladders.crews.items():
+        members = [characters[cid] for cid, cr in crew_of.items() if cr == crew_id]
+        assert crew.members == len(members)
+        assert crew.total_power == sum(c['total_power'] for c in members)
+        assert crew.total_level == sum(c['level'] for c in members)
+    
+    by_power = sorted((c for c in ladders.crews.values() if c.members), key=lambda c: (-c.total_power, -c.members, c.id))
+    assert ladders.leaderboards['crew_power'].page(0, 10) == [c.id for c in by_power]
+    print(f"Crew power ranking: {[(c.id, c.total_power) for c in by_power]}")
+
+def test_history_encoding():
+    """Appended delta chunks decode to the same samples as one encoding; gaps fill forward"""
+    rng = random.Random(3)
+    samples, day = [], 739000
+    for _ in range(30):
+        day += rng.randint(1, 3)
+        samples.append((day, rng.randint(1, 10**6), rng.randint(1, 10**6), rng.randint(0, 50000),
+                        rng.randint(1, 95), rng.randint(0, 10**7)))
+    
+    blob = b''.join(encode_samples([sample], samples[i - 1] if i else None) for i, sample in enumerate(samples))
+    assert blob == encode_samples(samples)
+    assert decode_samples(blob) == samples
+    
+    series = downsample(samples[:3], samples[0][0] - 2, samples[2][0] + 4, 100)
+    assert [point['power_rank'] for point in series][-1] == samples[2][1]
+    assert len(series) == samples[2][0] + 4 - samples[0][0] + 1
+    assert len(downsample(samples, samples[0][0], samples[-1][0], 10)) <= 10
+    print(f"{len(samples)} samples in {len(blob)} bytes")
+
+if __name__ == "__main__":
+    test_skip_list_matches_sorted()
+    test_leaderboard_updates()
+    test_snapshot_pages()
+    test_restart_reuses_only_a_current_snapshot()
+    test_crew_aggregates()
+    test_history_encoding()
+    print("All leaderboard tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.catalog import load_catalog
+from services.character_service import EquipError, equip_from_inventory
+from services.loadouts import apply_loadout, get_loadouts, save_loadout
+from test_inventory_stacks import in_transaction, state
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def power(path, character_id):
+    conn = sqlite3.connect(path)
+    total_power = conn.execute("SELECT total_power FROM characters WHERE id = ?", (character_id,)).fetchone()[0]
+    conn.close()
+    return total_power
+
+def test_loadout_swaps_whole_set():
+    """Applying a loadout equips every item it lists at once; a missing item swaps nothing"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [0])
+        conn = sqlite3.connect(path)
+        # Two items for each of three slots
+        sets = [[row[0] for row in conn.execute(
+            "SELECT id FROM items WHERE slot_id = ? ORDER BY level_requirement, id LIMIT 2", (slot_id,))]
+            for slot_id in (1, 2, 5)]
+        pvp, farming = [pair[0] for pair in sets], [pair[1] for pair in sets]
+        conn.executemany("INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining) "
+                         "VALUES (?, ?, 1, 5)", [(hero, item_id) for item_id in pvp + farming])
+        conn.commit()
+        conn.close()
+        asyncio.run(load_catalog())
+        
+        async def play():
+            for item_id in pvp:
+                await in_transaction(equip_from_inventory, hero, 99, item_id)
+            pvp_id = await in_transaction(save_loadout, hero, 'PvP')
+            for item_id in farming:
+                await in_transaction(equip_from_inventory, hero, 99, item_id)
+            farming_id = await in_transaction(save_loadout, hero, ' Farming ')
+            async with database.db.get_connection_context() as conn:
+                loadouts = await get_loadouts(conn, hero)
+            assert [(loadout['name'], sorted(loadout['items'].values())) for loadout in loadouts] == \
+                [('Farming', sorted(farming)), ('PvP', sorted(pvp))]
+            
+            farming_power = power(path, hero)
+            assert await in_transaction(apply_loadout, hero, 99, pvp_id) == 3
+            assert sorted(item_id for _, item_id, _ in state(path, hero)[1]) == sorted(pvp)
+            assert sorted(item_id for item_id, _, _ in state(path, hero)[0]) == sorted(farming)
+            assert power(path, hero) > 0 and power(path, hero) != farming_power
+            # Already wearing it: nothing to do
+            assert await in_transaction(apply_loadout, hero, 99, pvp_id) == 0
+            
+            # One farming item is gone: the swap is refused and nothing moves
+            conn = sqlite3.connect(path)
+            conn.execute("DELETE FROM character_inventory WHERE character_id = ? AND item_id = ?", (hero, farming[-1]))
+            conn.commit()
+            conn.close()
+            before = state(path, hero)
+            try:
+                await in_transaction(apply_loadout, hero, 99, farming_id)
+                raise AssertionError("a loadout with a missing item was applied")
+            except EquipError as e:
+                print(f"Refused: {e}")
+            assert state(path, hero) == before
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_loadout_swaps_whole_set()
+    print("All loadout tests passed")
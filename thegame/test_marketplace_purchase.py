@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+from collections import Counter
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from services.marketplace import purchase_listing, ListingCache, PURCHASED, ALREADY_SOLD, INSUFFICIENT_GOLD
+
+PRICE = 500
+
+def run_on_fresh_database(scenario):
+    """Run scenario(path) against a throwaway copy of the game schema"""
+    original = database.db.db_path
+    database.db.db_path = os.path.join(tempfile.mkdtemp(), 'market.db')
+    try:
+        asyncio.run(database.db.initialize())
+        return scenario(database.db.db_path)
+    finally:
+        database.db.db_path = original
+
+def add_characters(path, golds):
+    conn = sqlite3.connect(path)
+    ids = [conn.execute("INSERT INTO characters (account_id, name, class_id, gold) VALUES (1, ?, 1, ?)",
+                        (f"Trader{n}", gold)).lastrowid for n, gold in enumerate(golds)]
+    item_id = conn.execute("SELECT id FROM items LIMIT 1").fetchone()[0]
+    conn.commit()
+    conn.close()
+    return ids, item_id
+
+def add_listing(path, seller_id, item_id):
+    conn = sqlite3.connect(path)
+    listing_id = conn.execute("""
+        INSERT INTO market_listings (seller_id, item_id, transfers_remaining, price, slot_id, rarity_id,
+                                     level_requirement, item_name)
+        SELECT ?, id, 3, ?, slot_id, rarity_id, level_requirement, name FROM items WHERE id = ?
+    """, (seller_id, PRICE, item_id)).lastrowid
+    conn.commit()
+    conn.close()
+    return listing_id
+
+async def buy_concurrently(purchases):
+    """Each (buyer, listing) purchase on its own connection, all at once"""
+    async def buy(buyer_id, listing_id):
+        async with database.db.get_connection_context() as conn:
+            outcome, _ = await purchase_listing(conn, buyer_id, listing_id)
+            return outcome
+    return await asyncio.gather(*(buy(buyer_id, listing_id) for buyer_id, listing_id in purchases))
+
+def test_one_winner_per_listing():
+    """Of many buyers racing for one listing exactly one gets it and pays once"""
+    def scenario(path):
+        (seller, *buyers), item_id = add_characters(path, [0] + [10000] * 25)
+        listing_id = add_listing(path, seller, item_id)
+        outcomes = asyncio.run(buy_concurrently([(buyer, listing_id) for buyer in buyers]))
+        
+        conn = sqlite3.connect(path)
+        gold = dict(conn.execute("SELECT id, gold FROM characters"))
+        owners = conn.execute("SELECT character_id, transfers_remaining FROM character_inventory").fetchall()
+        remaining = conn.execute("SELECT COUNT(*) FROM market_listings").fetchone()[0]
+        conn.close()
+        
+        print(f"Outcomes: {dict(Counter(outcomes))}")
+        assert Counter(outcomes) == {PURCHASED: 1, ALREADY_SOLD: len(buyers) - 1}
+        winner = buyers[outcomes.index(PURCHASED)]
+        assert owners == [(winner, 2)] and remaining == 0
+        assert gold[seller] == PRICE
+        assert gold[winner] == 10000 - PRICE
+        assert all(gold[buyer] == 10000 for buyer in buyers if buyer != winner)
+    run_on_fresh_database(scenario)
+
+def test_no_overspend():
+    """Parallel buys can't take a buyer below zero; unpaid listings stay up"""
+    def scenario(path):
+        (seller, buyer), item_id = add_characters(path, [0, PRICE * 2 + 1])
+        listings = [add_listing(path, seller, item_id) for _ in range(6)]
+        outcomes = asyncio.run(buy_concurrently([(buyer, listing_id) for listing_id in listings]))
+        
+        conn = sqlite3.connect(path)
+        gold = dict(conn.execute("SELECT id, gold FROM characters"))
+        bought = conn.execute("SELECT SUM(quantity) FROM character_inventory WHERE character_id = ?", (buyer,)).fetchone()[0]
+        remaining = conn.execute("SELECT COUNT(*) FROM market_listings").fetchone()[0]
+        conn.close()
+        
+        print(f"Outcomes: {dict(Counter(outcomes))}, buyer left with {gold[buyer]}")
+        assert Counter(outcomes) == {PURCHASED: 2, INSUFFICIENT_GOLD: 4}
+        assert gold[buyer] == 1 and gold[seller] == PRICE * 2
+        assert bought == 2 and remaining == 4
+    run_on_fresh_database(scenario)
+
+def test_trades_build_candles():
+    """Each trade updates its hour and day candle; a purchase records its trade"""
+    def scenario(path):
+        (seller, buyer), item_id = add_characters(path, [0, 10000])
+        conn = sqlite3.connect(path)
+        for price, quantity, at in [(100, 1, '2026-01-01 10:05:00'), (160, 2, '2026-01-01 10:20:00'),
+                                    (50, 1, '2026-01-01 10:59:59'), (90, 1, '2026-01-01 11:00:00')]:
+            conn.execute("INSERT INTO market_trades (item_id, seller_id, buyer_id, quantity, price, source, traded_at) "
+                         "VALUES (?, ?, ?, ?, ?, 'listing', ?)", (item_id, seller, buyer, quantity, price, at))
+        conn.commit()
+        candles = conn.execute("SELECT period, bucket, open, high, low, close, volume, trades, turnover "
+                               "FROM market_candles ORDER BY period, bucket").fetchall()
+        conn.close()
+        
+        assert candles == [
+            ('1d', '2026-01-01 00:00:00', 100, 100, 50, 90, 5, 4, 400),
+            ('1h', '2026-01-01 10:00:00', 100, 100, 50, 50, 4, 3, 310),
+            ('1h', '2026-01-01 11:00:00', 90, 90, 90, 90, 1, 1, 90),
+        ], candles
+        
+        listing_id = add_listing(path, seller, item_id)
+        assert asyncio.run(buy_concurrently([(buyer, listing_id)])) == [PURCHASED]
+        conn = sqlite3.connect(path)
+        trade = conn.execute("SELECT seller_id, buyer_id, price, source FROM market_trades ORDER BY id DESC").fetchone()
+        today = conn.execute("SELECT close FROM market_candles WHERE period = '1d' ORDER BY bucket DESC").fetchone()
+        conn.close()
+        assert trade == (seller, buyer, PRICE, 'listing') and today == (PRICE,)
+    run_on_fresh_database(scenario)
+
+def test_listing_cache_invalidation():
+    """A listing change drops only the pages that could show it; loads racing a write aren't stored"""
+    cache = ListingCache(max_entries=3)
+    everything = cache.key(None, 1, 95, 'name', None)
+    weapons = cache.key('weapon', 1, 20, 'name', None)
+    high_weapons = cache.key('weapon', 50, 95, 'price_low', None)
+    for key in (everything, weapons, high_weapons):
+        cache.put(key, ([], None), cache.generation)
+    assert cache.get(weapons) is not None and cache.get(cache.key('head', 1, 95, 'name', None)) is None
+    
+    cache.invalidate('weapon', 60)
+    assert cache.get(everything) is None and cache.get(high_weapons) is None
+    assert cache.get(weapons) is not None
+    cache.invalidate('head', 5)
+    assert cache.get(weapons) is not None
+    
+    generation = cache.generation
+    cache.invalidate('boots', 200)
+    cache.put(everything, ([], None), generation)
+    assert cache.get(everything) is None
+    print(cache.snapshot_metrics())
+    assert cache.snapshot_metrics()['hits'] == 3
+
+if __name__ == "__main__":
+    test_one_winner_per_listing()
+    test_no_overspend()
+    test_trades_build_candles()
+    test_listing_cache_invalidation()
+    print("All marketplace purchase tests passed")
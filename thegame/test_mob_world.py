@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.mob_world import MobWorld
+
+TEMPLATES = [
+    {'id': 1, 'name': 'Street Thug', 'hit_points': 60, 'attack': 6, 'hit_points_regen': 5,
+     'respawn_seconds': 3, 'wander_seconds': 2},
+    {'id': 2, 'name': 'Arena Brawler', 'hit_points': 150, 'attack': 14, 'hit_points_regen': 0},
+]
+SPAWNS = [
+    {'room_id': 1, 'mob_template_id': 1, 'spawn_count': 50},
+    {'room_id': 4, 'mob_template_id': 2, 'spawn_count': 2},
+]
+CONNECTIONS = [
+    {'from_room_id': 1, 'to_room_id': 2}, {'from_room_id': 2, 'to_room_id': 1},
+    {'from_room_id': 1, 'to_room_id': 3}, {'from_room_id': 3, 'to_room_id': 1},
+]
+
+def make_world():
+    world = MobWorld()
+    world.load(TEMPLATES, SPAWNS, CONNECTIONS)
+    return world
+
+def run_ticks(world, ticks):
+    for _ in range(ticks):
+        world._clock_start -= 1.0
+        world.tick()
+
+def test_regen_and_respawn():
+    """Damaged mobs regenerate; killed mobs respawn at home after their timer"""
+    world = make_world()
+    brawler = world.mobs_in_room(4)[0]
+    thug = world.get(1)
+    
+    thug_hp = thug.hit_points_current
+    world.apply_damage(thug, 20)
+    assert world.apply_damage(brawler, 1000)
+    assert not brawler.is_alive()
+    assert len(world.mobs_in_room(4)) == 1
+    
+    run_ticks(world, 1)
+    assert thug.hit_points_current == thug_hp - 15
+    run_ticks(world, 2)
+    assert not brawler.is_alive()
+    run_ticks(world, 88)
+    assert brawler.is_alive() and brawler.room_id == 4
+    assert thug.hit_points_current == 60
+
+def test_wanderers_follow_exits():
+    """Wandering mobs only ever move along room connections"""
+    world = make_world()
+    run_ticks(world, 10)
+    rooms = {world.get(mob_id).room_id for mob_id in range(1, 51)}
+    print(f"Thugs spread over rooms {sorted(rooms)}, {world.metrics['ticks']} ticks")
+    assert rooms <= {1, 2, 3}
+    assert len(rooms) > 1
+    assert {mob.room_id for mob in world.mobs_in_room(4)} == {4}
+
+if __name__ == "__main__":
+    test_regen_and_respawn()
+    test_wanderers_follow_exits()
+    print("All mob world tests passed")
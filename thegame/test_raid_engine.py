@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+from models.battle import Combatant
+from services.catalog import load_catalog
+from services.leaderboards import get_leaderboard, load_leaderboards
+from services.mob_world import get_mob_world, load_mob_world
+from services.raid_engine import RAID_CHECKPOINT_SECONDS, Raid, RaidEngine, RaidError
+from test_crew_limits import add_crew
+from test_inventory_stacks import in_transaction
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+BOSS_ID = 5
+
+def fighter(character_id, attack=400):
+    """Tough enough to outlast a few rounds with the boss"""
+    return Combatant(id=character_id, level=30, hit_points=100000, hit_points_max=100000, attack=attack)
+
+def hit_points(path, character_ids):
+    conn = sqlite3.connect(path)
+    rows = dict(conn.execute(f"SELECT id, hit_points_current FROM characters WHERE id IN "
+                             f"({', '.join('?' * len(character_ids))})", character_ids))
+    conn.close()
+    return [rows[character_id] for character_id in character_ids]
+
+def saved_raid(path, raid_id):
+    """(status, boss_hp, {character_id: (damage_dealt, attacks)}) as last written"""
+    conn = sqlite3.connect(path)
+    status, boss_hp = conn.execute("SELECT status, boss_hp FROM raids WHERE id = ?", (raid_id,)).fetchone()
+    members = {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT character_id, damage_dealt, attacks FROM raid_participants WHERE raid_id = ?", (raid_id,))}
+    conn.close()
+    return status, boss_hp, members
+
+def level_ladder_matches(path, character_id):
+    """Whether the in-memory level ladder ranks the character on what's committed"""
+    conn = sqlite3.connect(path)
+    level, experience = conn.execute("SELECT level, experience FROM characters WHERE id = ?", (character_id,)).fetchone()
+    conn.close()
+    return get_leaderboard('level').keys[character_id] == (-level, -experience, character_id)
+
+async def start_raid(path, character_ids):
+    """An active raid against the boss, led by the first character"""
+    await load_catalog()
+    await load_mob_world()
+    conn = sqlite3.connect(path)
+    conn.execute(f"UPDATE characters SET hit_points_current = 1000 WHERE id IN "
+                 f"({', '.join('?' * len(character_ids))})", character_ids)
+    conn.commit()
+    conn.close()
+    crew_id = add_crew(path, character_ids[0])
+    
+    engine = RaidEngine()
+    template = get_mob_world().templates[BOSS_ID]
+    raid = await in_transaction(engine.form, crew_id, character_ids[0], template, 1)
+    for character_id in character_ids[1:]:
+        await in_transaction(engine.join, raid, character_id)
+    await in_transaction(engine.launch, raid)
+    return engine, raid
+
+def test_boss_hp_is_shared_and_never_overspent():
+    """Damage comes off one pool, and what lands never exceeds what's left"""
+    raid = Raid(id=1, crew_id=1, leader_id=1, template=SimpleNamespace(hit_points=100), room_id=1,
+                boss_hp=100, status='active')
+    assert [raid.take_damage(amount) for amount in (60, -5, 30, 25, 10)] == [60, 0, 30, 10, 0]
+    assert raid.boss_hp == 0
+
+def test_queued_attacks_land_together_on_the_tick():
+    """Submitting only queues; one tick resolves every attack and writes the damage taken in one batch"""
+    def scenario(path):
+        ids, _ = add_characters(path, [0, 0, 0])
+        
+        async def play():
+            engine, raid = await start_raid(path, ids)
+            futures = [engine.submit(raid, character_id, fighter(character_id)) for character_id in ids]
+            try:
+                engine.submit(raid, ids[0], fighter(ids[0]))
+                raise AssertionError("two attacks queued at once")
+            except RaidError:
+                pass
+            assert not any(future.done() for future in futures)
+            assert raid.boss_hp == raid.boss_hp_max
+            
+            await engine.tick()
+            results = [future.result() for future in futures]
+            landed = sum(result['damage'] for result in results)
+            assert landed > 0 and raid.boss_hp == raid.boss_hp_max - landed
+            assert {character_id: member.damage_dealt for character_id, member in raid.members.items()} == \
+                {character_id: result['damage'] for character_id, result in zip(ids, results)}
+            assert hit_points(path, ids) == [1000 - result['taken'] for result in results]
+            assert not raid.pending
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_checkpoint_waits_until_due():
+    """Boss HP and damage totals are written when the checkpoint interval is up, not on every tick"""
+    def scenario(path):
+        ids, _ = add_characters(path, [0, 0])
+        
+        async def play():
+            engine, raid = await start_raid(path, ids)
+            for character_id in ids:
+                engine.submit(raid, character_id, fighter(character_id))
+            await engine.tick()
+            assert saved_raid(path, raid.id) == ('active', raid.boss_hp_max, {ids[0]: (0, 0), ids[1]: (0, 0)})
+            assert raid.dirty
+            
+            engine._last_checkpoint -= RAID_CHECKPOINT_SECONDS
+            await engine.tick()
+            members = {character_id: (member.damage_dealt, member.attacks) for character_id, member in raid.members.items()}
+            assert saved_raid(path, raid.id) == ('active', raid.boss_hp, members)
+            assert not raid.dirty
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_defeated_boss_pays_out_by_damage_share():
+    """The killing tick settles the raid: rewards split by damage, status saved, raid dropped from memory"""
+    def scenario(path):
+        ids, _ = add_characters(path, [0, 0])
+        
+        async def play():
+            engine, raid = await start_raid(path, ids)
+            raid.take_damage(raid.boss_hp - 1)
+            raid.members[ids[0]].damage_dealt = raid.boss_hp_max - 1
+            engine.submit(raid, ids[1], fighter(ids[1]))
+            await engine.tick()
+            
+            assert raid.status == 'defeated' and engine.get(raid.id) is None
+            status, boss_hp, members = saved_raid(path, raid.id)
+            assert (status, boss_hp) == ('defeated', 0)
+            assert members[ids[1]] == (1, 1)
+            conn = sqlite3.connect(path)
+            golds = dict(conn.execute("SELECT id, gold FROM characters"))
+            ended_at = conn.execute("SELECT ended_at FROM raids WHERE id = ?", (raid.id,)).fetchone()[0]
+            conn.close()
+            assert ended_at is not None
+            gold_reward = raid.template.gold_reward
+            assert golds[ids[0]] == int(gold_reward * (raid.boss_hp_max - 1) / raid.boss_hp_max)
+            assert golds[ids[1]] == int(gold_reward / raid.boss_hp_max)
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_failed_settlement_is_retried():
+    """A settlement that doesn't commit leaves the raid open in memory and writes nothing; the next tick settles it.
+    The ladders only see the rewards once they're committed"""
+    def scenario(path):
+        ids, _ = add_characters(path, [0, 0])
+        
+        async def play():
+            engine, raid = await start_raid(path, ids)
+            await load_leaderboards()
+            ranked = get_leaderboard('level').keys[ids[0]]
+            raid.take_damage(raid.boss_hp - 1)
+            raid.members[ids[0]].damage_dealt = raid.boss_hp_max - 1
+            engine.submit(raid, ids[1], fighter(ids[1]))
+            
+            settle = engine._settle
+            async def broken(conn, raid):
+                await settle(conn, raid)
+                raise RuntimeError("disk full")
+            engine._settle = broken
+            try:
+                await engine.tick()
+                raise AssertionError("settlement failure swallowed")
+            except RuntimeError:
+                pass
+            assert (raid.status, raid.outcome, raid.boss_hp) == ('active', 'defeated', 0)
+            assert engine.get(raid.id) is raid
+            assert saved_raid(path, raid.id)[:2] == ('active', raid.boss_hp_max)
+            assert hit_points(path, ids) == [1000, 1000]
+            assert get_leaderboard('level').keys[ids[0]] == ranked and level_ladder_matches(path, ids[0])
+            # The damage the boss dealt back waits for the next write too
+            assert list(engine._unsaved_damage) == [ids[1]]
+            try:
+                engine.submit(raid, ids[0], fighter(ids[0]))
+                raise AssertionError("attack queued against a beaten boss")
+            except RaidError:
+                pass
+            
+            engine._settle = settle
+            await engine.tick()
+            assert raid.status == 'defeated' and engine.get(raid.id) is None
+            assert saved_raid(path, raid.id)[:2] == ('defeated', 0)
+            assert engine._unsaved_damage == {}
+            assert get_leaderboard('level').keys[ids[0]] != ranked and level_ladder_matches(path, ids[0])
+        asyncio.run(play())
+    run_on_fresh_database(scenario)
+
+def test_refund_rage_caps_at_max():
+    """Refunding a raid's rage cost never fills the bar past its maximum"""
+    def scenario(path):
+        (hero,), _ = add_characters(path, [0])
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE characters SET rage_current = rage_max - 4 WHERE id = ?", (hero,))
+        conn.commit()
+        conn.close()
+        
+        async def refund(conn):
+            await database.db.queries.refund_rage(conn, character_id=hero, amount=10)
+        asyncio.run(in_transaction(refund))
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT rage_current = rage_max FROM characters WHERE id = ?", (hero,)).fetchone()[0] == 1
+        conn.close()
+    run_on_fresh_database(scenario)
+
+def test_boss_loot_names_the_right_items():
+    """The boss's loot is seeded by item name, once, however many times startup runs"""
+    def scenario(path):
+        asyncio.run(database.db.initialize())
+        conn = sqlite3.connect(path)
+        loot = conn.execute("""
+            SELECT i.name, l.drop_percent FROM mob_loot l JOIN items i ON i.id = l.item_id
+            WHERE l.mob_template_id = ? ORDER BY i.name
+        """, (BOSS_ID,)).fetchall()
+        conn.close()
+        assert [name for name, _ in loot] == sorted(['Steel Blade', 'Chain Mail', 'Steel Helmet', 'Plasma Rifle',
+                                                    'Power Armor', 'Power Core'])
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_boss_hp_is_shared_and_never_overspent()
+    test_queued_attacks_land_together_on_the_tick()
+    test_checkpoint_waits_until_due()
+    test_defeated_boss_pays_out_by_damage_share()
+    test_failed_settlement_is_retried()
+    test_refund_rage_caps_at_max()
+    test_boss_loot_names_the_right_items()
+    print("All raid engine tests passed")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from services.search import fts_query
+
+def test_fts_query_quotes_input():
+    """Player text becomes quoted prefix terms; FTS5 syntax and one-letter words are dropped"""
+    assert fts_query("Steel bla") == '"steel"* "bla"*'
+    assert fts_query('sword" OR name:(* x') == '"sword"* "or"* "name"*'
+    assert fts_query("  a ! ") is None
+    print(fts_query("Crown of Power"))
+
+def test_index_follows_catalog():
+    """Inserts, renames and deletes on items reach the index through the triggers"""
+    path = os.path.join(tempfile.mkdtemp(), 'search.db')
+    asyncio.run(Database(path).initialize())
+    conn = sqlite3.connect(path)
+    
+    def search(text):
+        return [row[0] for row in conn.execute(
+            "SELECT i.name FROM items_fts JOIN items i ON i.id = items_fts.rowid "
+            "WHERE items_fts MATCH ? ORDER BY bm25(items_fts, 10.0, 1.0)", (fts_query(text),))]
+    
+    assert sorted(search("steel")) == ['Steel Blade', 'Steel Helmet']
+    conn.execute("INSERT INTO items (name, slot_id, rarity_id, description) VALUES ('Zorblax Hammer', 5, 1, 'heavy')")
+    assert search("zorb") == ['Zorblax Hammer']
+    conn.execute("UPDATE items SET name = 'Quux Mallet' WHERE name = 'Zorblax Hammer'")
+    assert search("zorb") == [] and search("quu mal") == ['Quux Mallet']
+    conn.execute("DELETE FROM items WHERE name = 'Quux Mallet'")
+    assert search("quux") == []
+    # A name hit outranks a description hit
+    conn.execute("INSERT INTO items (name, slot_id, rarity_id, description) VALUES ('Plain Stick', 5, 1, 'not a blade')")
+    assert search("blade")[0] == 'Steel Blade'
+    conn.execute("INSERT INTO items_fts (items_fts, rank) VALUES ('integrity-check', 1)")
+    conn.close()
+    print("Index in sync with items")
+
+if __name__ == "__main__":
+    test_fts_query_quotes_input()
+    test_index_follows_catalog()
+    print("All search tests passed")
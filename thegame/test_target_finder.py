@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.target_finder import TargetIndex
+
+def make_character(character_id, level, room_id=1, hit_points=100):
+    return SimpleNamespace(id=character_id, name=f"Char{character_id}", level=level, total_power=level * 10,
+                           current_room_id=room_id, hit_points_current=hit_points)
+
+def make_index():
+    index = TargetIndex()
+    index.load([{'id': 1, 'zone_id': 1}, {'id': 2, 'zone_id': 1}, {'id': 3, 'zone_id': 2}])
+    return index
+
+def test_closest_levels_first():
+    """Targets come back within the band, nearest level first, never yourself"""
+    index = make_index()
+    attacker = make_character(1, 20)
+    index.update(attacker)
+    for character_id, level in enumerate([5, 18, 19, 21, 24, 26, 40], start=2):
+        index.update(make_character(character_id, level))
+    
+    levels = [entry.level for entry in index.find(attacker, band=5)]
+    print(f"Targets by level: {levels}")
+    assert levels[:2] in ([19, 21], [21, 19])
+    assert sorted(levels) == [18, 19, 21, 24]
+    assert [entry.level for entry in index.find(attacker, band=5, limit=1)] in ([19], [21])
+
+def test_rooms_zones_and_cooldowns():
+    """Room scope only sees the room, zone scope the zone; cooled-down and downed targets drop out"""
+    index = make_index()
+    attacker = make_character(1, 10, room_id=1)
+    index.update(attacker)
+    index.update(make_character(2, 10, room_id=1))
+    index.update(make_character(3, 10, room_id=2))
+    index.update(make_character(4, 10, room_id=3))
+    
+    assert [e.character_id for e in index.find(attacker)] == [2]
+    assert sorted(e.character_id for e in index.find(attacker, scope='zone')) == [2, 3]
+    
+    index.record_attack(1, 2)
+    assert index.cooldown_left(1, 2) > 0
+    assert [e.character_id for e in index.find(attacker, scope='zone')] == [3]
+    
+    index.update(make_character(3, 10, room_id=2, hit_points=0))
+    assert index.find(attacker, scope='zone') == []
+    assert 3 not in index.entries
+
+if __name__ == "__main__":
+    test_closest_levels_first()
+    test_rooms_zones_and_cooldowns()
+    print("All target finder tests passed")
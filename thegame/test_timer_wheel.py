@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import random
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.timer_wheel import TimerWheel
+
+def test_timers_fire_on_their_tick():
+    """Every timer fires exactly on its expiry tick, across all wheel levels"""
+    wheel = TimerWheel()
+    rng = random.Random(7)
+    expected = {}
+    for payload in range(2000):
+        delay = rng.choice([1, 5, 63, 64, 65, 4095, 4096, 5000, rng.randint(1, 20000)])
+        wheel.schedule(delay, payload)
+        expected[payload] = delay
+    
+    fired_at = {}
+    for tick in range(1, 20001):
+        for payload in wheel.advance():
+            fired_at[payload] = tick
+    
+    print(f"Fired {len(fired_at)} timers, {wheel.pending} pending")
+    assert fired_at == expected
+    assert wheel.pending == 0
+
+def test_cancelled_timer_never_fires():
+    """Cancelled timers are dropped in O(1) and never fire"""
+    wheel = TimerWheel()
+    keep = wheel.schedule(100, "keep")
+    drop = wheel.schedule(100, "drop")
+    assert wheel.cancel(drop)
+    assert not wheel.cancel(drop)
+    assert wheel.advance_to(100) == ["keep"]
+    assert keep.slot is None
+
+if __name__ == "__main__":
+    test_timers_fire_on_their_tick()
+    test_cancelled_timer_never_fires()
+    print("All timer wheel tests passed")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.catalog import load_catalog
+from services.trade import TradeDesk, TradeError
+from test_marketplace_purchase import run_on_fresh_database, add_characters
+
+def give_items(path, character_id, item_id, quantity, transfers):
+    conn = sqlite3.connect(path)
+    inventory_id = conn.execute("INSERT INTO character_inventory (character_id, item_id, quantity, transfers_remaining) "
+                                "VALUES (?, ?, ?, ?)", (character_id, item_id, quantity, transfers)).lastrowid
+    conn.commit()
+    conn.close()
+    return inventory_id
+
+def holdings(path):
+    conn = sqlite3.connect(path)
+    gold = dict(conn.execute("SELECT id, gold FROM characters"))
+    items = sorted(conn.execute("SELECT character_id, quantity, transfers_remaining FROM character_inventory"))
+    conn.close()
+    return gold, items
+
+def test_swap_settles_once_both_confirm():
+    """Items and gold move in one go, using a transfer; confirming a stale version is refused"""
+    def scenario(path):
+        (alice, bob), item_id = add_characters(path, [500, 1000])
+        stack = give_items(path, alice, item_id, 5, 3)
+        spent = give_items(path, alice, item_id, 1, 0)
+        desk = TradeDesk()
+        
+        async def play():
+            await load_catalog()
+            bob_window = desk.subscribe(bob)
+            session = desk.open(alice, bob)
+            for inventory_id, quantity in ((spent, 1), (stack, 6)):
+                try:
+                    await desk.stage_item(alice, inventory_id, quantity)
+                    raise AssertionError(f"staged {quantity} of stack {inventory_id}")
+                except TradeError:
+                    pass
+            await desk.stage_item(alice, stack, 2)
+            await desk.set_gold(bob, 300)
+            await desk.confirm(alice, session.version)
+            # Bob changes his offer after Alice confirmed: her confirmation no longer counts
+            await desk.set_gold(bob, 250)
+            assert not session.offers[alice].confirmed
+            try:
+                await desk.confirm(bob, session.version - 1)
+                raise AssertionError("a stale confirmation was accepted")
+            except TradeError:
+                pass
+            await desk.confirm(bob, session.version)
+            assert session.status == 'open'
+            await desk.confirm(alice, session.version)
+            return session, [bob_window.get_nowait() for _ in range(bob_window.qsize())]
+        session, pushed = asyncio.run(play())
+        
+        gold, items = holdings(path)
+        assert session.status == 'completed' and desk.session_for(alice) is None
+        assert gold == {alice: 750, bob: 750}
+        assert items == [(alice, 1, 0), (alice, 3, 3), (bob, 2, 2)]
+        assert pushed[-1]['status'] == 'completed' and pushed[-1]['them']['items'][0]['quantity'] == 2
+        print(f"{len(pushed)} updates pushed to Bob")
+    run_on_fresh_database(scenario)
+
+def test_vanished_item_fails_whole_trade():
+    """If a staged stack is gone by settlement nothing moves, and the trade reopens"""
+    def scenario(path):
+        (alice, bob), item_id = add_characters(path, [0, 1000])
+        stack = give_items(path, alice, item_id, 1, 1)
+        desk = TradeDesk()
+        
+        async def play():
+            await load_catalog()
+            session = desk.open(alice, bob)
+            await desk.stage_item(alice, stack, 1)
+            await desk.set_gold(bob, 400)
+            conn = sqlite3.connect(path)
+            conn.execute("DELETE FROM character_inventory WHERE id = ?", (stack,))
+            conn.commit()
+            conn.close()
+            await desk.confirm(alice, session.version)
+            try:
+                await desk.confirm(bob, session.version)
+                raise AssertionError("a trade with a missing item settled")
+            except TradeError as e:
+                print(f"Refused: {e}")
+            return session
+        session = asyncio.run(play())
+        
+        gold, items = holdings(path)
+        assert session.status == 'open' and not any(offer.confirmed for offer in session.offers.values())
+        assert gold == {alice: 0, bob: 1000} and items == []
+    run_on_fresh_database(scenario)
+
+if __name__ == "__main__":
+    test_swap_settles_once_both_confirm()
+    test_vanished_item_fails_whole_trade()
+    print("All trade tests passed")